@@ -0,0 +1,281 @@
+import asyncio
+import logging
+import os
+import time
+import weakref
+from collections import OrderedDict, deque
+from typing import AsyncGenerator, Callable, TypeVar
+
+from metrics import ADMISSION_REJECTED
+from rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised instead of admitting a request: 429 when the client is over its rate limit, 503 when the
+    upstream slots are busy and the wait queue is full or the request waited too long.
+
+    Attributes:
+        status_code (int): HTTP status to answer with (429 or 503).
+        reason (str): "rate_limited", "queue_full" or "wait_timeout".
+        retry_after (float): Seconds after which the client may retry.
+    """
+
+    def __init__(self, status_code: int, reason: str, retry_after: float):
+        super().__init__(f"Request rejected ({reason}); retry after {retry_after:.1f}s.")
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounds the upstream provider calls in flight and rate limits each client, failing fast when overloaded.
+
+    - Every upstream call (a quiz stream or an image generation) holds a slot from `acquire` until it ends.
+      At most `max_in_flight` slots are held in total, and at most `max_in_flight_per_model` per model.
+    - A request that finds no free slot waits in a FIFO queue of at most `max_queue` requests, for at most
+      `max_wait` seconds; otherwise it is rejected with 503. Waiters are admitted in arrival order, but one
+      waiting for a busy model does not hold up one for a model with a free slot.
+    - `check_rate` applies a token bucket per client (an IP address or API key): `client_rate` requests per
+      second with bursts of `client_burst`, rejecting with 429. At most `max_clients` buckets are kept;
+      the least recently seen client is forgotten first. A `client_rate` of 0 disables it.
+
+    Configured from the environment by `from_env`:
+      - ADMISSION_MAX_IN_FLIGHT, ADMISSION_MAX_IN_FLIGHT_PER_MODEL: the slot limits (default 64 and 32).
+      - ADMISSION_MAX_QUEUE, ADMISSION_MAX_WAIT_SECONDS: the wait queue (default 128 requests, 5 seconds).
+      - CLIENT_RATE_LIMIT_PER_MINUTE, CLIENT_RATE_LIMIT_BURST: the per-client limit (default 60 and 30).
+      - CLIENT_API_KEY_HEADER: header identifying a client instead of its IP address (default "X-API-Key").
+      - ADMISSION_TRUST_FORWARDED_FOR: set to "true" behind a trusted proxy to identify clients by the
+        first X-Forwarded-For address (default "false").
+
+    Not thread-safe: use it from the event loop.
+
+    Args:
+        max_in_flight (int, optional): Maximum slots held in total.
+        max_in_flight_per_model (int, optional): Maximum slots held per model.
+        max_queue (int, optional): Maximum requests waiting for a slot.
+        max_wait (float, optional): Seconds a request may wait for a slot.
+        client_rate (float, optional): Requests per second allowed per client (0 disables the limit).
+        client_burst (float, optional): Requests a client may make at once.
+        max_clients (int, optional): Maximum client buckets kept.
+        api_key_header (str, optional): Header whose value identifies a client.
+        trust_forwarded_for (bool, optional): Identify clients by the X-Forwarded-For header.
+        clock (Callable[[], float], optional): Time source, replaceable in tests. Defaults to time.monotonic.
+
+    Attributes:
+        admitted (int): Requests given a slot.
+        queued (int): Requests that had to wait for their slot.
+        rejected (dict[str, int]): Rejected requests by reason.
+        peak_queue_depth (int): Most requests ever waiting at once.
+    """
+
+    DEFAULT_MAX_IN_FLIGHT = 64
+    DEFAULT_MAX_IN_FLIGHT_PER_MODEL = 32
+    DEFAULT_MAX_QUEUE = 128
+    DEFAULT_MAX_WAIT = 5.0
+    DEFAULT_CLIENT_RATE_PER_MINUTE = 60.0
+    DEFAULT_CLIENT_BURST = 30.0
+    DEFAULT_MAX_CLIENTS = 10000
+    DEFAULT_API_KEY_HEADER = "X-API-Key"
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        """Builds a controller configured from environment variables, falling back to the class defaults."""
+        rate_per_minute = float(os.getenv("CLIENT_RATE_LIMIT_PER_MINUTE", cls.DEFAULT_CLIENT_RATE_PER_MINUTE))
+        return cls(
+            max_in_flight=int(os.getenv("ADMISSION_MAX_IN_FLIGHT", cls.DEFAULT_MAX_IN_FLIGHT)),
+            max_in_flight_per_model=int(
+                os.getenv("ADMISSION_MAX_IN_FLIGHT_PER_MODEL", cls.DEFAULT_MAX_IN_FLIGHT_PER_MODEL)
+            ),
+            max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", cls.DEFAULT_MAX_QUEUE)),
+            max_wait=float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", cls.DEFAULT_MAX_WAIT)),
+            client_rate=rate_per_minute / 60,
+            client_burst=float(os.getenv("CLIENT_RATE_LIMIT_BURST", cls.DEFAULT_CLIENT_BURST)),
+            api_key_header=os.getenv("CLIENT_API_KEY_HEADER", cls.DEFAULT_API_KEY_HEADER),
+            trust_forwarded_for=os.getenv("ADMISSION_TRUST_FORWARDED_FOR", "false").lower() == "true",
+        )
+
+    def __init__(
+        self,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        max_in_flight_per_model: int = DEFAULT_MAX_IN_FLIGHT_PER_MODEL,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        max_wait: float = DEFAULT_MAX_WAIT,
+        client_rate: float = DEFAULT_CLIENT_RATE_PER_MINUTE / 60,
+        client_burst: float = DEFAULT_CLIENT_BURST,
+        max_clients: int = DEFAULT_MAX_CLIENTS,
+        api_key_header: str = DEFAULT_API_KEY_HEADER,
+        trust_forwarded_for: bool = False,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_in_flight_per_model = max_in_flight_per_model
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.max_clients = max_clients
+        self.api_key_header = api_key_header
+        self.trust_forwarded_for = trust_forwarded_for
+        self._clock = clock
+        self._in_flight = 0
+        self._in_flight_by_model: dict[str, int] = {}
+        # (model, future) of each request waiting for a slot, oldest first; the future is resolved on admission.
+        self._waiters: deque[tuple[str, asyncio.Future]] = deque()
+        # client -> its token bucket, least recently seen first.
+        self._clients: OrderedDict[str, TokenBucket] = OrderedDict()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = {"rate_limited": 0, "queue_full": 0, "wait_timeout": 0}
+        self.peak_queue_depth = 0
+
+    @property
+    def in_flight(self) -> int:
+        """Slots currently held."""
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        """Requests currently waiting for a slot."""
+        return len(self._waiters)
+
+    def check_rate(self, client: str) -> None:
+        """
+        Takes one request from the client's token bucket.
+
+        Args:
+            client (str): Identifies the client, e.g. "ip:203.0.113.7" or "key:<api key>".
+
+        Raises:
+            AdmissionRejected: With status 429 if the client is over its rate limit.
+        """
+        if self.client_rate <= 0:
+            return
+        bucket = self._clients.pop(client, None)
+        if bucket is None:
+            bucket = TokenBucket(self.client_rate, self.client_burst, self._clock)
+            if len(self._clients) >= self.max_clients:
+                self._clients.popitem(last=False)
+        self._clients[client] = bucket
+        if not bucket.try_acquire():
+            self.rejected["rate_limited"] += 1
+            ADMISSION_REJECTED.labels("rate_limited").inc()
+            raise AdmissionRejected(429, "rate_limited", bucket.time_until_available())
+
+    async def acquire(self, model: str) -> Callable[[], None]:
+        """
+        Waits for an upstream slot for `model`.
+
+        Args:
+            model (str): The model called.
+
+        Returns:
+            Callable[[], None]: Releases the slot; calling it more than once has no further effect.
+
+        Raises:
+            AdmissionRejected: With status 503 if the wait queue is full or no slot frees up within `max_wait`.
+        """
+        if not self._has_room(model):
+            await self._await_slot(model)
+        else:
+            self._take(model)
+        self.admitted += 1
+
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self._release(model)
+
+        return release
+
+    @staticmethod
+    def hold_until_closed(stream: AsyncGenerator[T, None], release: Callable[[], None]) -> AsyncGenerator[T, None]:
+        """
+        Wraps an async stream so the slot is released when it ends, is closed, or is garbage-collected
+        without ever being iterated (e.g. a response abandoned before its body started).
+        """
+
+        async def held():
+            try:
+                async for item in stream:
+                    yield item
+            finally:
+                release()
+                await stream.aclose()
+
+        wrapped = held()
+        weakref.finalize(wrapped, release)
+        return wrapped
+
+    async def _await_slot(self, model: str) -> None:
+        if len(self._waiters) >= self.max_queue:
+            self.rejected["queue_full"] += 1
+            ADMISSION_REJECTED.labels("queue_full").inc()
+            raise AdmissionRejected(503, "queue_full", self.max_wait)
+        waiter = (model, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        self.queued += 1
+        self.peak_queue_depth = max(self.peak_queue_depth, len(self._waiters))
+        future = waiter[1]
+        try:
+            await asyncio.wait_for(future, self.max_wait)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # Admitted just as the wait ended: hand the slot on.
+                self._release(model)
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected["wait_timeout"] += 1
+                ADMISSION_REJECTED.labels("wait_timeout").inc()
+                raise AdmissionRejected(503, "wait_timeout", self.max_wait) from None
+            raise
+
+    def _has_room(self, model: str) -> bool:
+        if self._in_flight >= self.max_in_flight:
+            return False
+        return self._in_flight_by_model.get(model, 0) < self.max_in_flight_per_model
+
+    def _take(self, model: str) -> None:
+        self._in_flight += 1
+        self._in_flight_by_model[model] = self._in_flight_by_model.get(model, 0) + 1
+
+    def _release(self, model: str) -> None:
+        self._in_flight -= 1
+        remaining = self._in_flight_by_model[model] - 1
+        if remaining:
+            self._in_flight_by_model[model] = remaining
+        else:
+            del self._in_flight_by_model[model]
+        # Hand freed slots to the oldest waiters that fit.
+        for waiter in list(self._waiters):
+            if self._in_flight >= self.max_in_flight:
+                break
+            waiting_model, future = waiter
+            if future.done():
+                self._waiters.remove(waiter)
+            elif self._has_room(waiting_model):
+                self._waiters.remove(waiter)
+                self._take(waiting_model)
+                future.set_result(None)
+
+    def stats(self) -> dict:
+        """Returns slot usage, queue depth and admission counts as a JSON-serialisable dictionary."""
+        return {
+            "in_flight": self._in_flight,
+            "in_flight_by_model": dict(self._in_flight_by_model),
+            "queue_depth": len(self._waiters),
+            "peak_queue_depth": self.peak_queue_depth,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": dict(self.rejected),
+            "clients": len(self._clients),
+        }
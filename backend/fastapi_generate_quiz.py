@@ -1,24 +1,59 @@
 # GPTeasers FastAPI Backend
 # AI-powered quiz generation and image creation service
 # https://platform.openai.com/docs/api-reference/streaming
+import asyncio
 import logging
-from typing import Optional
+import math
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Optional
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, Query
+from fastapi import Depends, FastAPI, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, field_validator
 
+import metrics
+from admission import AdmissionRejected
 from generate_image import ImageGenerator
-from generate_quiz import QuizGenerator
+from generate_quiz import ModelRouter, QuizGenerator
+from image_store import ImageStore
+from log_config import REQUEST_ID_HEADER, RequestIdMiddleware, configure_logging, shutdown_logging
+from provider_registry import ProviderRegistry
+from quiz_batch import BatchJob, BatchResult
+from resilience import CircuitOpenError, ProviderTimeoutError
+from sse_events import NDJSONResponse, SSEResponse, aheartbeat, aquiz_with_image
+from sse_replay import aresumable_quiz
+from stream_output import negotiate_encoding
 
-# Load environment variables from .env file
-load_dotenv()
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Loads the .env file, configures logging and creates the provider registry once per worker; closes it
+    and flushes the logs on shutdown.
+
+    The provider SDKs are loaded and the registry started in the background (`ProviderRegistry.astart`), so
+    the server starts accepting connections straight away: /ready reports "not ready" until the warm-up has
+    finished, and requests needing the providers wait for it.
+    """
+    load_dotenv()
+    configure_logging()
+    providers = ProviderRegistry.from_env()
+    app.state.providers = providers
+    app.state.warm_up = asyncio.create_task(providers.astart())
+    yield
+    app.state.warm_up.cancel()
+    await asyncio.gather(app.state.warm_up, return_exceptions=True)
+    try:
+        await providers.aclose()
+    finally:
+        shutdown_logging()
+
+
 # Copy Azure Docs Example
 # https://github.com/Azure-Samples/fastapi-on-azure-functions/tree/main
 app = FastAPI(
@@ -44,15 +79,24 @@ app = FastAPI(
     ### Usage Examples:
     - Quiz Generation: `/GenerateQuiz?topic=Python&difficulty=medium&n_questions=5`
     - Image Creation: `/GenerateImage?prompt=A beautiful sunset over mountains`
+    - Quiz and Image in one stream: `/GenerateQuizWithImage?topic=Python&difficulty=medium&n_questions=5`
+    - Many quizzes in one call: `POST /GenerateQuizBatch` (results streamed as NDJSON)
+    - Stored Images: `/Images/{image_id}` (the URL returned by `/GenerateImage`)
     - Model Discovery: `/SupportedModels`
+    - Readiness Probe: `/ready`
+    - Routing Statistics: `/RoutingStats`
+    - Admission Statistics: `/AdmissionStats`
+    - Prometheus Metrics: `/metrics`
 
     ### Architecture:
     - Streams quiz questions in real-time using Server-Sent Events (SSE)
+    - Generates the quiz image concurrently with the questions on `/GenerateQuizWithImage` (named SSE events)
     - Uses LiteLLM for universal AI provider abstraction
     - CORS enabled for frontend integration
     - Comprehensive error handling and logging
     """,
     version="1.0.0",
+    lifespan=lifespan,
     contact={
         "name": "GPTeasers Development Team",
         "email": "DJSaunders1997@gmail.com",
@@ -70,18 +114,114 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=[REQUEST_ID_HEADER],
 )
+# Compresses JSON and other whole responses. Streamed responses compress themselves, flushing every frame
+# (see stream_output.py), and always set Content-Encoding, so the middleware passes them through.
+app.add_middleware(GZipMiddleware, minimum_size=500, compresslevel=6)
+# Tags every log line of a request with its X-Request-ID.
+app.add_middleware(RequestIdMiddleware)
+
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError) -> JSONResponse:
+    """Fails fast with 503 while the provider's circuit breaker is open, telling clients when to retry."""
+    logger.warning(str(exc))
+    return JSONResponse(
+        content={"error": f"The {exc.provider} provider is temporarily unavailable, please retry later."},
+        status_code=503,
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected) -> JSONResponse:
+    """Answers requests over a client's rate limit with 429, and requests the server has no room for with 503."""
+    logger.warning("%s: %s", request.url.path, exc)
+    return JSONResponse(
+        content={"error": "Too many requests, please retry later."},
+        status_code=exc.status_code,
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
+
+
+@app.exception_handler(ProviderTimeoutError)
+async def provider_timeout_handler(request: Request, exc: ProviderTimeoutError) -> JSONResponse:
+    """Reports a provider that did not answer in time (after any retries) as a gateway timeout."""
+    logger.error(str(exc))
+    return JSONResponse(content={"error": str(exc)}, status_code=504)
+
+
+async def get_providers(request: Request) -> ProviderRegistry:
+    """
+    FastAPI dependency returning the worker's ProviderRegistry created in the lifespan, once it has started.
+
+    Requests arriving while the provider SDKs are still loading wait for them (shielded, so a client
+    leaving does not cancel the warm-up) rather than load them on the event loop.
+    """
+    await asyncio.shield(request.app.state.warm_up)
+    return request.app.state.providers
 
 
-@app.get("/GenerateQuiz")
+def client_id(request: Request, providers: ProviderRegistry) -> str:
+    """
+    Identifies the client a request is rate limited as: its API key header if sent, otherwise its IP address
+    (the first X-Forwarded-For address when the admission controller trusts that header).
+    """
+    admission = providers.admission
+    api_key = request.headers.get(admission.api_key_header)
+    if api_key:
+        return f"key:{api_key}"
+    forwarded_for = request.headers.get("X-Forwarded-For") if admission.trust_forwarded_for else None
+    if forwarded_for:
+        return f"ip:{forwarded_for.split(',')[0].strip()}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+def check_client_rate(request: Request, providers: ProviderRegistry = Depends(get_providers)) -> None:
+    """FastAPI dependency applying the per-client rate limit; raises AdmissionRejected (429) when it is exceeded."""
+    providers.admission.check_rate(client_id(request, providers))
+
+
+def stream_options(request: Request, providers: ProviderRegistry) -> dict:
+    """
+    Returns the output options of a streamed response: the window its frames are coalesced over, and the
+    encoding it is compressed with (none if compression is off or the client does not accept gzip or brotli).
+    """
+    accept_encoding = request.headers.get("Accept-Encoding") if providers.stream_compression else None
+    return {"coalesce_window": providers.stream_coalesce_window, "encoding": negotiate_encoding(accept_encoding)}
+
+
+def get_image_generator(providers: ProviderRegistry = Depends(get_providers)) -> ImageGenerator:
+    """FastAPI dependency returning the worker's shared ImageGenerator."""
+    return providers.get_image_generator()
+
+
+@app.get("/GenerateQuiz", dependencies=[Depends(check_client_rate)])
 async def generate_quiz_endpoint(
+    request: Request,
     topic: str = Query(..., description="The subject for the quiz (e.g., 'UK History')"),
     difficulty: str = Query(..., description="The desired difficulty (e.g., 'easy', 'medium', 'hard')"),
     n_questions: int = Query(10, description="Number of questions to generate (defaults to 10)"),
     model: Optional[str] = Query(
         None,
-        description="The model to use. If not provided, the default from QuizGenerator is used",
+        description=(
+            "The model to use, or 'any' for the currently fastest model. "
+            "If not provided, the default from QuizGenerator is used"
+        ),
     ),
+    cache: bool = Query(True, description="Set to false to skip the quiz cache and generate a fresh quiz"),
+    session_id: Optional[str] = Query(
+        None,
+        max_length=128,
+        description="Identifies the client session; questions already sent to the session are not repeated",
+    ),
+    last_event_id: Optional[str] = Header(
+        None,
+        alias="Last-Event-ID",
+        description="Sent by EventSource when it reconnects: the stream resumes after this question",
+    ),
+    providers: ProviderRegistry = Depends(get_providers),
 ) -> StreamingResponse:
     """
     FastAPI endpoint to generate a quiz based on topic, difficulty, and model.
@@ -90,25 +230,72 @@ async def generate_quiz_endpoint(
       - topic: The subject for the quiz (e.g., "UK History").
       - difficulty: The desired difficulty (e.g., "easy", "medium").
       - n_questions: (Optional) Number of questions to generate (defaults to 10).
-    - model: (Optional) AI model to use; defaults to QuizGenerator's default.
+      - model: (Optional) AI model to use, or "any" for the fastest healthy model; defaults to QuizGenerator's default.
+      - cache: (Optional) Set to false to bypass cached quizzes for this request (defaults to true).
+      - session_id: (Optional) Client session id, used to avoid repeating questions within a session.
+
+    Headers:
+      - Last-Event-ID: (Optional) Sent by EventSource when it reconnects. The stream resumes after that
+        question: missed questions are replayed, and only the questions still missing are generated.
 
     Returns:
-      - StreamingResponse: Streams quiz questions in SSE format.
+      - StreamingResponse: Streams quiz questions in SSE format, each with an `id:`, then a `done` event
+        ({"questions", "resumed", "seconds"}), after an `error` event if the quiz failed. A comment is sent
+        whenever the stream has been idle for SSE_HEARTBEAT_SECONDS (see sse_replay.py).
     """
-    logger.info(f"Quiz request: topic={topic}, difficulty={difficulty}, n_questions={n_questions}, model={model}")
-
-    logging.info(f"Generating quiz with: {topic=}, {difficulty=}, {n_questions=}, {model=}.")
-
-    # Create a QuizGenerator instance.
+    logger.info(
+        "Quiz request: topic=%r, difficulty=%r, n_questions=%d, model=%r, cache=%s, last_event_id=%r",
+        topic,
+        difficulty,
+        n_questions,
+        model,
+        cache,
+        last_event_id,
+    )
+
+    # Reuse the worker's QuizGenerator for this model rather than building one per request.
     # TODO: rename to quiz creator ?
-    if model is not None:
-        quiz_generator = QuizGenerator(model=model)
-    else:
-        quiz_generator = QuizGenerator()
-    generator = quiz_generator.generate_quiz(topic, difficulty, n_questions)
-
+    quiz_generator = providers.get_quiz_generator(model)
+    stream, received = providers.replay_buffer.open(n_questions, last_event_id)
+
+    async def astart_questions(count: int):
+        # The rest of a resumed quiz: fresh questions, which the session history keeps from repeating earlier ones.
+        return await quiz_generator.agenerate_quiz(topic, difficulty, count, use_cache=False, session_id=session_id)
+
+    first_questions = None
+    if received == 0:
+        # Use the async path so the stream is driven by the event loop rather than a threadpool worker.
+        first_questions = asyncio.ensure_future(
+            quiz_generator.agenerate_quiz(topic, difficulty, n_questions, use_cache=cache, session_id=session_id)
+        )
+        try:
+            # Errors before the stream starts are answered with their status code. A stream slower to start
+            # than a heartbeat (e.g. a reasoning model warming up) is answered straight away, with heartbeats.
+            await asyncio.wait((first_questions,), timeout=providers.sse_heartbeat or None)
+        except BaseException:
+            first_questions.cancel()
+            raise
+        if first_questions.done():
+            first_questions.result()
+
+    events = aresumable_quiz(providers.replay_buffer, stream, received, astart_questions, first_questions)
     # Return the quiz as a streaming response in SSE format.
-    return StreamingResponse(generator, media_type="text/event-stream")
+    return SSEResponse(
+        count_connection("GenerateQuiz", aheartbeat(events, providers.sse_heartbeat)),
+        **stream_options(request, providers),
+    )
+
+
+async def count_connection(endpoint: str, stream):
+    """Streams `stream`, counting it in the active SSE connections gauge while it is being sent."""
+    active = metrics.SSE_CONNECTIONS_ACTIVE.labels(endpoint)
+    active.inc()
+    try:
+        async for event in stream:
+            yield event
+    finally:
+        active.dec()
+        await stream.aclose()
 
 
 @app.get("/SupportedModels")
@@ -117,45 +304,329 @@ async def get_supported_models() -> JSONResponse:
     FastAPI endpoint to retrieve the list of supported AI models.
 
     Returns:
-      - JSONResponse: Contains an array of supported model names.
+      - JSONResponse: Contains an array of supported model names, followed by "any" (route to the fastest model).
     """
     logger.info("Retrieving supported models list.")
 
-    supported_models = QuizGenerator.SUPPORTED_MODELS
+    supported_models = QuizGenerator.SUPPORTED_MODELS + [ModelRouter.ANY_MODEL]
 
-    logger.info(f"Returning {len(supported_models)} supported models.")
+    logger.info("Returning %d supported models.", len(supported_models))
     return JSONResponse(content={"models": supported_models}, status_code=200)
 
 
-@app.get("/GenerateImage")
+@app.get("/ready")
+async def get_readiness(request: Request) -> JSONResponse:
+    """
+    Readiness probe: whether this worker has loaded the provider SDKs and can serve quizzes without delay.
+
+    Returns:
+      - JSONResponse: {"ready": true, "warm_up_seconds": <seconds the SDKs took to load>}, or 503 with
+        {"ready": false} while they are loading (or if loading them failed).
+    """
+    warm_up = request.app.state.warm_up
+    if not warm_up.done() or warm_up.cancelled() or warm_up.exception() is not None:
+        return JSONResponse(content={"ready": False}, status_code=503)
+    providers = request.app.state.providers
+    return JSONResponse(content={"ready": True, "warm_up_seconds": providers.warm_up_seconds}, status_code=200)
+
+
+@app.get("/RoutingStats")
+async def get_routing_stats(providers: ProviderRegistry = Depends(get_providers)) -> JSONResponse:
+    """
+    FastAPI endpoint to inspect the latency statistics used for model routing and hedging.
+
+    Returns:
+      - JSONResponse: Per model: time-to-first-token and tokens-per-second EWMAs, p95 time to the first
+        question, request, failure and hedge counts, and whether the model is currently healthy.
+        Per provider: circuit breaker state and recent failure rate, and the number of retries made.
+    """
+    return JSONResponse(
+        content={"models": providers.model_router.stats(), "providers": providers.resilience.stats()},
+        status_code=200,
+    )
+
+
+@app.get("/AdmissionStats")
+async def get_admission_stats(providers: ProviderRegistry = Depends(get_providers)) -> JSONResponse:
+    """
+    FastAPI endpoint to inspect admission control.
+
+    Returns:
+      - JSONResponse: Upstream calls in flight (in total and per model), wait queue depth and its peak,
+        and the numbers of admitted, queued and rejected requests (by reason).
+    """
+    return JSONResponse(content=providers.admission.stats(), status_code=200)
+
+
+@app.get("/metrics")
+async def get_metrics(providers: ProviderRegistry = Depends(get_providers)) -> Response:
+    """
+    FastAPI endpoint exposing Prometheus metrics in the text exposition format.
+
+    Returns:
+      - Response: Quiz stream latencies (time to first chunk and question, gaps between questions, duration),
+        question parse time, dropped items, token counts, active SSE connections, image generation latency,
+        and admission slots, queue depth and rejections.
+    """
+    metrics.ADMISSION_IN_FLIGHT.set(providers.admission.in_flight)
+    metrics.ADMISSION_QUEUE_DEPTH.set(providers.admission.queue_depth)
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
+async def agenerate_image_url(
+    request: Request, prompt: str, image_generator: ImageGenerator, providers: ProviderRegistry
+) -> Optional[str]:
+    """
+    Generates an image for `prompt` under admission control and returns its URL.
+
+    With the image store, the image is kept on local disk and the URL points at /Images/{image_id}; a repeat
+    prompt is answered from the store without calling the provider. If the image cannot be stored, the
+    provider's temporary URL is returned instead.
+
+    Returns:
+        Optional[str]: The image URL, or None if the generation failed.
+    """
+
+    async def agenerate_url() -> Optional[str]:
+        # Await the async API so the event loop keeps serving quiz streams while the image is generated.
+        release = await providers.admission.acquire(ImageGenerator.MODEL)
+        try:
+            return await image_generator.agenerate_image(prompt)
+        finally:
+            release()
+
+    image_store = providers.image_store
+    if image_store is None:
+        return await agenerate_url()
+    key = image_store.make_key(prompt, ImageGenerator.DEFAULT_SIZE, ImageGenerator.MODEL)
+    image_id, image_url = await image_store.aget_or_create(key, agenerate_url, providers.http_client)
+    if image_id is not None:
+        return str(request.url_for("get_image", image_id=image_id))
+    return image_url
+
+
+@app.get("/GenerateImage", dependencies=[Depends(check_client_rate)])
 async def generate_image_endpoint(
+    request: Request,
     prompt: str = Query(..., description="The prompt for image generation"),
+    image_generator: ImageGenerator = Depends(get_image_generator),
+    providers: ProviderRegistry = Depends(get_providers),
 ) -> JSONResponse:
     """
     FastAPI endpoint to generate an image based on a provided prompt.
 
+    When the image store is enabled, the image is kept on local disk and its URL points at /Images/{image_id}
+    (see `agenerate_image_url`).
+
     Query Parameters:
       - prompt: The prompt for image generation.
 
     Returns:
       - JSONResponse: Contains the generated image URL or an error message.
     """
-    logger.info("Processing image generation request.")
-
-    logger.info(f"Received image prompt: {prompt}")
-    image_generator = ImageGenerator()
-    image_url = image_generator.generate_image(prompt)
+    logger.info("Image request: prompt=%r", prompt)
+    image_url = await agenerate_image_url(request, prompt, image_generator, providers)
 
     if image_url is None:
         error_message = "Error - Image generation failed."
         logger.error(error_message)
         return JSONResponse(content={"error": error_message}, status_code=500)
 
-    logger.info(f"Generated image for prompt '{prompt}': {image_url}")
+    # Image URLs are long signed links: only logged when debugging.
+    logger.debug("Generated image URL: %s", image_url)
     return JSONResponse(content={"image_url": image_url}, status_code=200)
 
 
+@app.get("/Images/{image_id}", name="get_image")
+async def get_image(image_id: str, request: Request, providers: ProviderRegistry = Depends(get_providers)) -> Response:
+    """
+    FastAPI endpoint serving an image kept by the image store.
+
+    An image id always refers to the same bytes, so the response may be cached by clients for a year,
+    and a request whose If-None-Match matches the image's ETag is answered with 304 Not Modified.
+
+    Path Parameters:
+      - image_id: The id in the URL returned by /GenerateImage.
+
+    Returns:
+      - FileResponse: The PNG image (sent with sendfile where the server supports it), or 404 if it is not stored.
+    """
+    image_store = providers.image_store
+    path = image_store.file_for(image_id) if image_store is not None else None
+    if path is None:
+        return JSONResponse(content={"error": "Image not found."}, status_code=404)
+
+    etag = ImageStore.etag_for(image_id)
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if_none_match = request.headers.get("If-None-Match", "")
+    if if_none_match.strip() == "*" or etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=ImageStore.MEDIA_TYPE, headers=headers)
+
+
+@app.get("/GenerateQuizWithImage", dependencies=[Depends(check_client_rate)])
+async def generate_quiz_with_image_endpoint(
+    request: Request,
+    topic: str = Query(..., description="The subject for the quiz (e.g., 'UK History')"),
+    difficulty: str = Query(..., description="The desired difficulty (e.g., 'easy', 'medium', 'hard')"),
+    n_questions: int = Query(10, description="Number of questions to generate (defaults to 10)"),
+    model: Optional[str] = Query(
+        None,
+        description=(
+            "The model to use, or 'any' for the currently fastest model. "
+            "If not provided, the default from QuizGenerator is used"
+        ),
+    ),
+    cache: bool = Query(True, description="Set to false to skip the quiz cache and generate a fresh quiz"),
+    session_id: Optional[str] = Query(
+        None,
+        max_length=128,
+        description="Identifies the client session; questions already sent to the session are not repeated",
+    ),
+    image_prompt: Optional[str] = Query(None, description="The prompt for the image (defaults to the topic)"),
+    image_generator: ImageGenerator = Depends(get_image_generator),
+    providers: ProviderRegistry = Depends(get_providers),
+) -> StreamingResponse:
+    """
+    FastAPI endpoint streaming a quiz and its image over one SSE connection.
+
+    The image is generated concurrently with the quiz, starting before the quiz's provider call, and is sent
+    as soon as it is ready, so it usually arrives alongside the first questions. Events are named
+    (see sse_events.py): `question` (as sent by /GenerateQuiz), `image` ({"image_url": ...}),
+    `error` ({"source": "quiz" or "image", "error": ...}) and a final `done`.
+
+    Query Parameters:
+      - topic, difficulty, n_questions, model, cache, session_id: As for /GenerateQuiz.
+      - image_prompt: (Optional) The prompt for the image; defaults to the topic.
+
+    Returns:
+      - StreamingResponse: Streams named quiz and image events in SSE format.
+    """
+    image_prompt = image_prompt or topic
+    logger.info(
+        "Quiz with image request: topic=%r, difficulty=%r, n_questions=%d, model=%r, cache=%s, image_prompt=%r",
+        topic,
+        difficulty,
+        n_questions,
+        model,
+        cache,
+        image_prompt,
+    )
+
+    quiz_generator = providers.get_quiz_generator(model)
+    image_url = asyncio.create_task(agenerate_image_url(request, image_prompt, image_generator, providers))
+    try:
+        questions = await quiz_generator.agenerate_quiz(
+            topic, difficulty, n_questions, use_cache=cache, session_id=session_id
+        )
+    except BaseException:
+        # The quiz could not start: the error is answered with its status code, and the image is not needed.
+        image_url.cancel()
+        raise
+
+    events = aquiz_with_image(questions, image_url)
+    return SSEResponse(
+        count_connection("GenerateQuizWithImage", aheartbeat(events, providers.sse_heartbeat)),
+        **stream_options(request, providers),
+    )
+
+
+class BatchJobRequest(BaseModel):
+    """One quiz of a /GenerateQuizBatch request."""
+
+    job_id: Optional[str] = Field(
+        None, max_length=128, description="Identifies the quiz in the results (default: its index)"
+    )
+    topic: str = Field(..., description="The subject for the quiz (e.g., 'UK History')")
+    difficulty: str = Field(..., description="The desired difficulty (e.g., 'easy', 'medium', 'hard')")
+    n_questions: int = Field(10, ge=1, description="Number of questions to generate (defaults to 10)")
+    model: Optional[str] = Field(None, description="The model to use, or 'any' for the currently fastest model")
+
+
+# Bounds the work (and the journal) a single batch request can queue.
+MAX_BATCH_JOBS = 1000
+
+
+class BatchRequest(BaseModel):
+    """The body of a /GenerateQuizBatch request."""
+
+    jobs: list[BatchJobRequest] = Field(..., min_length=1, max_length=MAX_BATCH_JOBS)
+    batch_id: Optional[str] = Field(
+        None,
+        pattern=r"^[A-Za-z0-9_-]{1,64}$",
+        description="Names the batch's journal, so it can be resumed; defaults to a digest of the jobs",
+    )
+
+    @field_validator("jobs")
+    @classmethod
+    def job_ids_are_unique(cls, jobs: list[BatchJobRequest]) -> list[BatchJobRequest]:
+        job_ids = [job.job_id if job.job_id is not None else str(i) for i, job in enumerate(jobs)]
+        if len(set(job_ids)) != len(job_ids):
+            raise ValueError("Job ids must be unique within a batch.")
+        return jobs
+
+    def to_jobs(self) -> list[BatchJob]:
+        """Returns the batch's jobs, each identified by its job_id or its index."""
+        return [
+            BatchJob(
+                job.job_id if job.job_id is not None else str(i), job.topic, job.difficulty, job.n_questions, job.model
+            )
+            for i, job in enumerate(self.jobs)
+        ]
+
+
+async def aencode_results(results: AsyncGenerator[BatchResult, None]) -> AsyncGenerator[bytes, None]:
+    """Frames batch results as NDJSON, one line per finished quiz, closing the batch when the response ends."""
+    try:
+        async for result in results:
+            yield result.to_json().encode() + b"\n"
+    finally:
+        await results.aclose()
+
+
+@app.post("/GenerateQuizBatch", dependencies=[Depends(check_client_rate)])
+async def generate_quiz_batch_endpoint(
+    request: Request, batch: BatchRequest, providers: ProviderRegistry = Depends(get_providers)
+) -> StreamingResponse:
+    """
+    FastAPI endpoint generating many quizzes in one call, e.g. a whole curriculum.
+
+    The quizzes run on a pool of workers per provider (BATCH_MAX_CONCURRENCY_PER_PROVIDER at once against each)
+    instead of one request per quiz, and are not subject to the interactive endpoints' admission limits.
+    Each quiz is streamed as one NDJSON line as soon as it is finished, in completion order:
+    {"job_id", "status": "ok" or "error", "topic", "difficulty", "n_questions", "model", "questions", "resumed"}
+    plus "error" for a failed quiz. A failed quiz does not stop the batch.
+
+    Finished quizzes are journalled (BATCH_JOURNAL_PATH): submitting the same batch again, e.g. after a dropped
+    connection, replays them with "resumed": true and generates only the rest.
+
+    Body:
+      - jobs: The quizzes, each {"topic", "difficulty", "n_questions", "model", "job_id"}; at most 1000.
+      - batch_id: (Optional) Names the batch's journal; defaults to a digest of the jobs.
+
+    Returns:
+      - StreamingResponse: Streams one NDJSON line per quiz.
+    """
+    jobs = batch.to_jobs()
+    logger.info("Quiz batch request: %d jobs, batch_id=%r", len(jobs), batch.batch_id)
+
+    # Checks the API keys before the response starts; each job's model (or "any") is resolved by generator_for.
+    results = providers.get_quiz_generator().agenerate_batch(
+        jobs,
+        generator_for=providers.get_quiz_generator,
+        max_concurrency_per_provider=providers.batch_concurrency,
+        journal=providers.batch_journal,
+        batch_id=batch.batch_id,
+    )
+    return NDJSONResponse(
+        count_connection("GenerateQuizBatch", aencode_results(results)), **stream_options(request, providers)
+    )
+
+
 # Run with uvicorn fastapi_generate_quiz:app --reload --host 0.0.0.0 --port 8000 --log-level debug
 # Access with curl "http://localhost:8000/GenerateQuiz?topic=UK%20History&difficulty=easy&n_questions=3"
 # Access with curl "http://localhost:8000/GenerateImage?prompt=A%20Juicy%20Burger"
+# Access with curl -N "http://localhost:8000/GenerateQuizWithImage?topic=UK%20History&difficulty=easy&n_questions=3"
+# Access with curl -N -X POST "http://localhost:8000/GenerateQuizBatch" -H "Content-Type: application/json" \
+#   -d '{"jobs": [{"topic": "UK History", "difficulty": "easy"}, {"topic": "Python", "difficulty": "hard"}]}'
 # This simple example works!
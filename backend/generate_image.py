@@ -1,14 +1,29 @@
+import asyncio
 import logging
 import os
+import time
 from typing import Optional
 
-from openai import OpenAI
+from lazy_imports import lazy_import
+from log_config import configure_logging
+from metrics import IMAGE_GENERATION, outcome_of
+from resilience import CircuitOpenError, ProviderTimeoutError, Resilience
+
+# Imported on first use; see lazy_imports.py.
+openai = lazy_import("openai")
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
 
 class ImageGenerator:
+    # The OpenAI API's default image model, used when no model is given.
+    MODEL = "dall-e-2"
+    # Size of the generated images, used when no size is given.
+    DEFAULT_SIZE = "256x256"
+    # Defaults for the async API; see __init__.
+    DEFAULT_MAX_CONCURRENCY = 4
+    DEFAULT_TIMEOUT = 60.0
+
     @classmethod
     def get_api_key_from_env(cls) -> str:
         """Retrieves the OpenAI API key from environment variables.
@@ -24,21 +39,51 @@ class ImageGenerator:
             raise ValueError("Environment variable OPENAI_API_KEY is not set. Please ensure it's set and try again.")
         return api_key
 
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        async_client: Optional["openai.AsyncOpenAI"] = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        timeout: float = DEFAULT_TIMEOUT,
+        resilience: Optional[Resilience] = None,
+    ):
         """Initialises the ImageGenerator.
 
         If `api_key` is not provided, it is retrieved from the environment
-        using `get_api_key_from_env`.
+        using `get_api_key_from_env`. The sync client used by `generate_image` is only created when that
+        method is first called.
 
         Args:
             api_key (str, optional): The OpenAI API key to use. Defaults to None.
+            async_client (AsyncOpenAI, optional): A shared async client to use for `agenerate_image`.
+                If not provided, one is created for this instance.
+            max_concurrency (int, optional): Maximum number of in-flight async image generations.
+                Defaults to DEFAULT_MAX_CONCURRENCY.
+            timeout (float, optional): Seconds to wait for an image generation before giving up.
+                Defaults to DEFAULT_TIMEOUT.
+            resilience (Resilience, optional): Retries and the OpenAI circuit breaker for `agenerate_image`.
+                Defaults to None (a single attempt).
         """
         if api_key is None:
             api_key = self.get_api_key_from_env()
 
-        self.client = OpenAI(api_key=api_key)
-
-    def generate_image(self, prompt: str, n: int = 1, size: str = "256x256") -> Optional[str]:
+        self._api_key = api_key
+        self.async_client = (
+            async_client if async_client is not None else openai.AsyncOpenAI(api_key=api_key, timeout=timeout)
+        )
+        self.timeout = timeout
+        self._client: Optional["openai.OpenAI"] = None
+        self.resilience = resilience
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @property
+    def client(self) -> "openai.OpenAI":
+        """The sync OpenAI client used by `generate_image`, created on first use: the async API never needs it."""
+        if self._client is None:
+            self._client = openai.OpenAI(api_key=self._api_key, timeout=self.timeout)
+        return self._client
+
+    def generate_image(self, prompt: str, n: int = 1, size: str = DEFAULT_SIZE) -> Optional[str]:
         """Generates an image based on the provided prompt.
 
         Args:
@@ -50,9 +95,9 @@ class ImageGenerator:
             Optional[str]: The URL of the generated image if successful,
             or `None` if an error occurred.
         """
-        logger.info(f"Generating image with prompt: {prompt=}")
+        logger.debug("Generating image with prompt: prompt=%r", prompt)
         image_url = self._get_image_url(prompt, n, size)
-        logger.info(f"Generated image URL: {image_url}")
+        logger.debug("Generated image URL: %s", image_url)
         return image_url
 
     def _get_image_url(self, prompt: str, n: int, size: str) -> Optional[str]:
@@ -71,12 +116,83 @@ class ImageGenerator:
             response = self.client.images.generate(prompt=prompt, n=n, size=size)
             return response.data[0].url
         except Exception as e:
-            logger.error(f"Error when calling OpenAI API: {e}")
+            logger.error("Error when calling OpenAI API: %s", e)
+            return None
+
+    async def agenerate_image(self, prompt: str, n: int = 1, size: str = DEFAULT_SIZE) -> Optional[str]:
+        """Asynchronously generates an image based on the provided prompt.
+
+        Uses the shared `AsyncOpenAI` client so the event loop is never blocked while the
+        provider works. At most `max_concurrency` generations run at once; further calls wait their turn.
+
+        Args:
+            prompt (str): The textual description for the image to be generated.
+            n (int, optional): The number of images to generate. Defaults to 1.
+            size (str, optional): The size of the generated image. Defaults to "256x256".
+
+        Returns:
+            Optional[str]: The URL of the generated image if successful, or `None` if an error occurred.
+
+        Raises:
+            ProviderTimeoutError: If the generation (and any retries) timed out.
+            CircuitOpenError: If the OpenAI circuit breaker is open.
+        """
+        logger.debug("Generating image with prompt: prompt=%r", prompt)
+        image_url = await self._aget_image_url(prompt, n, size)
+        logger.debug("Generated image URL: %s", image_url)
+        return image_url
+
+    async def _aget_image_url(self, prompt: str, n: int, size: str) -> Optional[str]:
+        """Makes the async API call to generate images using OpenAI and returns the URL.
+
+        Args:
+            prompt (str): The textual description for the image to be generated.
+            n (int): The number of images to generate.
+            size (str): The size of the generated image (e.g., "256x256").
+
+        Returns:
+            Optional[str]: The URL of the first generated image, or `None` if an error occurred.
+            The latency and outcome are recorded in the image generation metric.
+
+        Raises:
+            ProviderTimeoutError: If the generation (and any retries) timed out.
+            CircuitOpenError: If the OpenAI circuit breaker is open.
+        """
+
+        async def attempt():
+            try:
+                return await asyncio.wait_for(
+                    self.async_client.images.generate(prompt=prompt, n=n, size=size),
+                    timeout=self.timeout,
+                )
+            except asyncio.TimeoutError:
+                raise ProviderTimeoutError(f"Provider 'openai' did not respond within {self.timeout}s.") from None
+
+        started = time.perf_counter()
+        outcome = "cancelled"
+        try:
+            async with self._semaphore:
+                if self.resilience is None:
+                    response = await attempt()
+                else:
+                    response = await self.resilience.acall("openai", attempt)
+            outcome = "ok"
+            return response.data[0].url
+        except (ProviderTimeoutError, CircuitOpenError) as e:
+            # Left to the API's exception handlers, which answer 504 and 503 as they do for quiz providers.
+            outcome = outcome_of(e)
+            raise
+        except Exception as e:
+            outcome = "error"
+            logger.error("Error when calling OpenAI API: %s", e)
             return None
+        finally:
+            IMAGE_GENERATION.labels(self.MODEL, outcome).observe(time.perf_counter() - started)
 
 
 if __name__ == "__main__":
     # Example usage:
+    configure_logging()
     image_generator = ImageGenerator()  # Uses environment variable if no API key is provided
     prompt_text = "Crested Gecko showcasing its distinct crests and colouration. Pixel Art"
     image_url = image_generator.generate_image(prompt_text)
@@ -1,23 +1,286 @@
+import asyncio
+import functools
+import hashlib
 import json
 import logging
+import math
 import os
-from typing import Generator, Optional
+import time
+from collections import deque
+from typing import TYPE_CHECKING, AsyncGenerator, Callable, Generator, Iterable, Optional
 
-import litellm
-from dotenv import load_dotenv
+import metrics
+from admission import AdmissionController
+from lazy_imports import lazy_import
+from log_config import configure_logging
+from quiz_batch import BatchJob, BatchJournal, BatchResult, arun_batch
+from quiz_cache import QuizCache
+from quiz_coalescer import QuizCoalescer
+from quiz_question import QuizQuestion
+from quiz_sharding import amerge_questions, split_questions
+from resilience import Resilience, Timeouts, is_retryable
+from response_stream_parser import ResponseStreamParser, StreamComplete
 
-from response_stream_parser import ResponseStreamParser
+if TYPE_CHECKING:
+    # question_pool imports this module; only needed for annotations.
+    from question_pool import QuestionPool, SessionHistory
 
-# Load environment variables
-load_dotenv()
+# Imported on first use; see lazy_imports.py.
+litellm = lazy_import("litellm")
 
-# Set up logging
 logger = logging.getLogger(__name__)
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
+
+
+def provider_of(model: str) -> str:
+    """Returns the provider a litellm model name is served by, e.g. "gemini" for "gemini/gemini-2.0-flash"."""
+    return model.split("/", 1)[0] if "/" in model else "openai"
+
+
+@functools.lru_cache(maxsize=None)
+def prompt_cache_params(model: str, cache_key: str) -> dict:
+    """
+    Returns the completion parameters that help `model`'s provider reuse a cached prompt prefix,
+    for the parameters litellm supports for the model:
+      - prompt_cache_key: requests sharing a prefix send the same key, so they reach the same cache.
+        OpenAI models always get it, in the request body if litellm does not know the parameter yet.
+      - stream_options: asks for usage on the last chunk, which reports the prompt tokens read from the cache.
+
+    Providers that cache prefixes automatically, or not at all, get no parameters.
+    """
+    supported = litellm.get_supported_openai_params(model=model) or []
+    params = {}
+    if "prompt_cache_key" in supported:
+        params["prompt_cache_key"] = cache_key
+    elif provider_of(model) == "openai":
+        params["extra_body"] = {"prompt_cache_key": cache_key}
+    if "stream_options" in supported:
+        params["stream_options"] = {"include_usage": True}
+    return params
+
+
+class ModelStats:
+    """
+    Rolling latency and health statistics for one model, kept by ModelRouter.
+
+    Attributes:
+        ttft (Optional[float]): EWMA of the seconds from request to first token, or None before any sample.
+        tokens_per_second (Optional[float]): EWMA of the decode rate after the first token.
+        first_question_times (deque[float]): The most recent seconds-to-first-question samples, used for
+            the hedging deadline.
+        requests (int): Streams completed successfully.
+        failures (int): Streams that failed to start or failed mid-stream.
+        consecutive_failures (int): Failures since the last successful stream.
+        unhealthy_until (float): Clock time until which the model is skipped by routing.
+        hedges (int): Requests to this model that were hedged with a backup model.
+        hedge_wins (int): Hedged requests this model won as the backup.
+    """
+
+    __slots__ = (
+        "ttft",
+        "tokens_per_second",
+        "first_question_times",
+        "requests",
+        "failures",
+        "consecutive_failures",
+        "unhealthy_until",
+        "hedges",
+        "hedge_wins",
+    )
+
+    def __init__(self, window: int):
+        self.ttft: Optional[float] = None
+        self.tokens_per_second: Optional[float] = None
+        self.first_question_times: deque[float] = deque(maxlen=window)
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def p95_first_question(self) -> Optional[float]:
+        """Returns the 95th percentile of the recent seconds-to-first-question samples, or None without samples."""
+        if not self.first_question_times:
+            return None
+        ordered = sorted(self.first_question_times)
+        return ordered[min(len(ordered) - 1, math.ceil(0.95 * len(ordered)) - 1)]
+
+    def to_dict(self) -> dict:
+        """Returns the statistics as a JSON-serialisable dictionary."""
+        return {
+            "ttft_seconds": self.ttft,
+            "tokens_per_second": self.tokens_per_second,
+            "p95_first_question_seconds": self.p95_first_question(),
+            "samples": len(self.first_question_times),
+            "requests": self.requests,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
+
+
+class ModelRouter:
+    """
+    Tracks per-model latency to route "any model" requests and to decide when to hedge.
+
+    For every stream a QuizGenerator records the time to first token, the decode rate and the time to the
+    first valid question. Time to first token and tokens per second are exponentially weighted moving
+    averages (weight `alpha` for the newest sample); first-question times are kept in a rolling window of
+    `window` samples, whose 95th percentile is the hedging deadline.
+
+    A model is healthy when its provider's API key is configured, its provider's circuit breaker (if the
+    router is given a Resilience) is not open, and it has not failed `failure_threshold` times in a row in
+    the last `cooldown` seconds. `fastest` picks the healthy model with the lowest expected
+    time to stream a quiz; models without samples yet are tried first, so every model gets measured.
+
+    One router is shared by every QuizGenerator of a worker (see ProviderRegistry).
+
+    Args:
+        models (list[str], optional): Models eligible for routing. Defaults to QuizGenerator.SUPPORTED_MODELS.
+        alpha (float, optional): EWMA weight of the newest sample.
+        window (int, optional): Number of first-question samples kept per model.
+        min_samples (int, optional): Samples needed before a model's hedging deadline is trusted.
+        failure_threshold (int, optional): Consecutive failures after which a model is skipped.
+        cooldown (float, optional): Seconds a failing model is skipped for.
+        clock (Callable[[], float], optional): Time source, replaceable in tests. Defaults to time.monotonic.
+        resilience (Resilience, optional): Provides the providers' circuit breakers. Defaults to None.
+    """
+
+    ANY_MODEL = "any"
+
+    DEFAULT_ALPHA = 0.2
+    DEFAULT_WINDOW = 100
+    DEFAULT_MIN_SAMPLES = 5
+    DEFAULT_FAILURE_THRESHOLD = 3
+    DEFAULT_COOLDOWN = 30.0
+
+    # Rough completion tokens per question, to weigh decode rate against time to first token.
+    TOKENS_PER_QUESTION = 120
+
+    def __init__(
+        self,
+        models: Optional[list[str]] = None,
+        alpha: float = DEFAULT_ALPHA,
+        window: int = DEFAULT_WINDOW,
+        min_samples: int = DEFAULT_MIN_SAMPLES,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        cooldown: float = DEFAULT_COOLDOWN,
+        clock: Callable[[], float] = time.monotonic,
+        resilience: Optional[Resilience] = None,
+    ):
+        self.models = list(models if models is not None else QuizGenerator.SUPPORTED_MODELS)
+        self.alpha = alpha
+        self.window = window
+        self.min_samples = min_samples
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.resilience = resilience
+        self._stats: dict[str, ModelStats] = {}
+
+    def stats_for(self, model: str) -> ModelStats:
+        """Returns the statistics of a model, creating them on first use."""
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = self._stats[model] = ModelStats(self.window)
+        return stats
+
+    def _ewma(self, current: Optional[float], sample: float) -> float:
+        return sample if current is None else self.alpha * sample + (1 - self.alpha) * current
+
+    def record_first_token(self, model: str, seconds: float) -> None:
+        """Records the seconds from sending a request to receiving its first token."""
+        stats = self.stats_for(model)
+        stats.ttft = self._ewma(stats.ttft, seconds)
+
+    def record_decode(self, model: str, tokens: int, seconds: float) -> None:
+        """Records the tokens streamed after the first one and the seconds they took."""
+        if tokens > 0 and seconds > 0:
+            stats = self.stats_for(model)
+            stats.tokens_per_second = self._ewma(stats.tokens_per_second, tokens / seconds)
+
+    def record_first_question(self, model: str, seconds: float) -> None:
+        """Records the seconds from sending a request to receiving its first valid question."""
+        self.stats_for(model).first_question_times.append(seconds)
+
+    def record_success(self, model: str) -> None:
+        """Records a stream that completed, resetting the model's failure streak."""
+        stats = self.stats_for(model)
+        stats.requests += 1
+        stats.consecutive_failures = 0
+
+    def record_failure(self, model: str) -> None:
+        """Records a stream that failed; after `failure_threshold` in a row the model is skipped for `cooldown`."""
+        stats = self.stats_for(model)
+        stats.failures += 1
+        stats.consecutive_failures += 1
+        if stats.consecutive_failures >= self.failure_threshold:
+            stats.unhealthy_until = self.clock() + self.cooldown
+
+    def record_hedge(self, model: str, backup_model: str, backup_won: bool) -> None:
+        """Records that a request to `model` was hedged with `backup_model`, and whether the backup won."""
+        self.stats_for(model).hedges += 1
+        if backup_won:
+            self.stats_for(backup_model).hedge_wins += 1
+
+    def is_healthy(self, model: str) -> bool:
+        """Returns True if the model's API key is configured and it is not cooling down after failures."""
+        stats = self._stats.get(model)
+        if stats is not None and stats.unhealthy_until > self.clock():
+            return False
+        if self.resilience is not None and not self.resilience.is_available(provider_of(model)):
+            return False
+        return litellm.validate_environment(model=model)["keys_in_environment"]
+
+    def expected_seconds(self, model: str, n_questions: int = 10) -> float:
+        """
+        Estimates the seconds to stream a quiz from a model: time to first token plus decode time.
+
+        Returns:
+            float: The estimate, or 0.0 for a model without samples (so it is tried and measured).
+        """
+        stats = self._stats.get(model)
+        if stats is None or stats.ttft is None:
+            return 0.0
+        if not stats.tokens_per_second:
+            return stats.ttft
+        return stats.ttft + n_questions * self.TOKENS_PER_QUESTION / stats.tokens_per_second
+
+    def fastest(self, n_questions: int = 10, exclude_providers: Iterable[str] = ()) -> Optional[str]:
+        """
+        Picks the healthy model expected to stream a quiz soonest.
+
+        Args:
+            n_questions (int, optional): Size of the quiz, weighing decode rate against time to first token.
+            exclude_providers (Iterable[str], optional): Providers (see `provider_of`) to leave out.
+
+        Returns:
+            Optional[str]: The model, or None if no model is eligible. Ties go to the earlier model in `models`.
+        """
+        excluded = set(exclude_providers)
+        candidates = [model for model in self.models if provider_of(model) not in excluded and self.is_healthy(model)]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda model: self.expected_seconds(model, n_questions))
+
+    def hedge_delay(self, model: str) -> Optional[float]:
+        """
+        Returns the seconds to wait for a model's first question before hedging: the 95th percentile of its
+        recent first-question times, or None until `min_samples` have been recorded.
+        """
+        stats = self._stats.get(model)
+        if stats is None or len(stats.first_question_times) < self.min_samples:
+            return None
+        return stats.p95_first_question()
+
+    def backup_for(self, model: str, n_questions: int = 10) -> Optional[str]:
+        """Returns the fastest healthy model on a different provider, to hedge a slow request with."""
+        return self.fastest(n_questions, exclude_providers=[provider_of(model)])
+
+    def stats(self) -> dict:
+        """Returns every model's statistics and health, keyed by model."""
+        return {model: {**self.stats_for(model).to_dict(), "healthy": self.is_healthy(model)} for model in self.models}
 
 
 class QuizGenerator:
@@ -30,6 +293,16 @@ class QuizGenerator:
         "azure_ai/DeepSeek-R1",
     ]
 
+    # Model used when the caller does not request one.
+    DEFAULT_MODEL = "gpt-3.5-turbo"
+
+    # A sharded quiz is never split into shards smaller than this, so short quizzes stay one LLM call.
+    MIN_QUESTIONS_PER_SHARD = 5
+    # Rough characters per token of English text, to estimate prompt tokens when the provider reports no usage.
+    CHARS_PER_TOKEN = 4
+    # Quizzes of a batch streamed at once from each provider (see `agenerate_batch`).
+    DEFAULT_BATCH_CONCURRENCY = 4
+
     example_question_1 = json.dumps(
         {
             "question_id": 1,
@@ -68,6 +341,20 @@ class QuizGenerator:
 
     EXAMPLE_RESPONSE = example_question_1 + "\n" + example_question_2
 
+    # The fixed instructions and examples, sent as the system message of every request and built once.
+    # Nothing request-specific goes in here, so that providers can cache it as a prompt prefix;
+    # the topic, difficulty and number of questions follow in a short user message (see `_create_role`).
+    SYSTEM_PROMPT = (
+        "You are an AI that generates quiz questions. "
+        "You will be given a topic (e.g., Roman History), a difficulty level and a number of questions. "
+        f"Provide the questions in JSON format similar to this example: \n{EXAMPLE_RESPONSE}. "
+        "ENSURE THESE ARE CORRECT. DO NOT INCLUDE INCORRECT ANSWERS! "
+        "DO NOT PREFIX THE RESPONSE WITH ANYTHING EXCEPT THE RAW JSON! "
+        "Return each question on a new line."
+    )
+    # Sent as the prompt cache key where supported: it changes only when the system prompt does.
+    SYSTEM_PROMPT_KEY = "quiz-" + hashlib.sha256(SYSTEM_PROMPT.encode()).hexdigest()[:16]
+
     @classmethod
     def check_api_key_from_env(cls) -> None:
         """Check if at least one API key is available.
@@ -100,14 +387,23 @@ class QuizGenerator:
             str: A supported model name.
         """
         if model not in QuizGenerator.SUPPORTED_MODELS:
-            logger.warning(f"Model '{model}' is not supported. Defaulting to 'gpt-4-turbo'.")
+            logger.warning("Model '%s' is not supported. Defaulting to 'gpt-4-turbo'.", model)
             return "gpt-4-turbo"
         return model
 
     def __init__(
         self,
         api_key: Optional[str] = None,
-        model: str = "gpt-3.5-turbo",
+        model: str = DEFAULT_MODEL,
+        cache: Optional[QuizCache] = None,
+        coalescer: Optional[QuizCoalescer] = None,
+        pool: Optional["QuestionPool"] = None,
+        sessions: Optional["SessionHistory"] = None,
+        shards: int = 1,
+        router: Optional[ModelRouter] = None,
+        hedging: bool = False,
+        resilience: Optional[Resilience] = None,
+        admission: Optional[AdmissionController] = None,
     ):
         """
         Initializes the QuizGenerator.
@@ -118,6 +414,24 @@ class QuizGenerator:
         Args:
             api_key (str, optional): The API key to use. Defaults to None.
             model (str, optional): The model name to use. Defaults to "gpt-3.5-turbo".
+            cache (QuizCache, optional): Cache of finished quizzes used by `agenerate_quiz`.
+                Defaults to None (no caching).
+            coalescer (QuizCoalescer, optional): Shares one upstream stream between identical concurrent
+                `agenerate_quiz` requests. Defaults to None (every request starts its own stream).
+            pool (QuestionPool, optional): Pre-generated questions for popular topics, served first by
+                `agenerate_quiz`. Defaults to None.
+            sessions (SessionHistory, optional): Questions sent to each client session, so `agenerate_quiz`
+                does not repeat them. Defaults to None.
+            shards (int, optional): Maximum number of concurrent LLM calls a quiz generated by
+                `agenerate_questions` is split across. Defaults to 1 (one call per quiz).
+            router (ModelRouter, optional): Records the latency and failures of every async stream.
+                Defaults to None (no routing statistics).
+            hedging (bool, optional): With a router, hedge slow requests with a backup model on another
+                provider (see `agenerate_questions`). Defaults to False.
+            resilience (Resilience, optional): Timeouts, retries before the first question, and circuit
+                breakers for the async streams. Defaults to None (no timeouts on async streams).
+            admission (AdmissionController, optional): Bounds the upstream quiz streams in flight; a request
+                waits for a slot (per model) before its stream starts. Defaults to None (no bound).
         """
         self.check_api_key_from_env()
 
@@ -125,7 +439,19 @@ class QuizGenerator:
         self.model = QuizGenerator.check_model_is_supported(model)
 
         # Use the separate parser class to handle the stream.
-        self.parser = ResponseStreamParser()
+        # Questions are validated, normalised and renumbered as they stream; invalid items are dropped.
+        self.parser = ResponseStreamParser(validate_questions=True, model=self.model)
+        # The async (endpoint) path yields pre-encoded SSE bytes without re-serialising each question.
+        self.sse_parser = ResponseStreamParser(emit_bytes=True, validate_questions=True, model=self.model)
+        self.cache = cache
+        self.coalescer = coalescer
+        self.pool = pool
+        self.sessions = sessions
+        self.shards = max(1, shards)
+        self.router = router
+        self.hedging = hedging
+        self.resilience = resilience
+        self.admission = admission
 
     def generate_quiz(self, topic: str, difficulty: str, n_questions: int = 10) -> Generator[str, None, None]:
         """
@@ -140,32 +466,496 @@ class QuizGenerator:
             Generator[str, None, None]: A generator yielding JSON-formatted quiz questions as SSE strings.
         """
         prompt = self._create_role(topic, difficulty, n_questions)
-        logger.info(f"Prompt for LLM: {prompt}")
+        logger.debug("Prompt for LLM: %s", prompt)
         llm_stream = self._create_llm_stream(prompt)
         # Use the separate parser class to handle the stream
         return self.parser.parse_stream(llm_stream)
 
-    def _create_role(self, topic: str, difficulty: str, n_questions: int) -> str:
+    async def agenerate_quiz(
+        self,
+        topic: str,
+        difficulty: str,
+        n_questions: int = 10,
+        use_cache: bool = True,
+        session_id: Optional[str] = None,
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        Asynchronously generate a quiz using litellm's async streaming completion API.
+
+        This is the path used by the FastAPI endpoint. The upstream stream is consumed on the event loop,
+        so an open quiz stream does not hold a threadpool worker for its whole lifetime.
+        The synchronous `generate_quiz` is kept for scripts and `print_quiz`.
+
+        Questions are yielded as pre-encoded SSE frames (bytes) built from the model's original JSON text,
+        ready to be written by StreamingResponse.
+
+        Questions are served from the first source that can provide them:
+          1. The question pool, when the topic is pre-generated and enough questions are pooled.
+          2. The cache, when a quiz for the same model, topic, difficulty and number of questions is cached.
+          3. The LLM, through the coalescer when there is one.
+
+        When the generator has a cache, a quiz already cached for the same model, topic, difficulty and
+        number of questions is replayed without calling the LLM. Otherwise the validated questions are
+        stored once the stream completes; streams the client abandons are not cached.
+
+        When the generator has a coalescer, identical requests that arrive while a stream for them is
+        running share that one upstream stream instead of starting their own (see `QuizCoalescer`).
+
+        Parameters:
+            topic (str): The subject for the quiz (e.g., 'Roman History').
+            difficulty (str): The desired difficulty (e.g., 'Easy', 'Medium').
+            n_questions (int, optional): Number of questions required. Defaults to 10.
+            use_cache (bool, optional): Set to False to skip a cached quiz and generate a fresh one,
+                which then replaces the cached entry. Defaults to True.
+            session_id (str, optional): Identifies the client session. With session history, questions
+                already sent to the session are not sent again. Defaults to None.
+
+        Returns:
+            AsyncGenerator[bytes, None]: An async generator yielding JSON-formatted quiz questions as SSE bytes.
+        """
+        if self.sessions is None:
+            session_id = None
+        seen = self.sessions.seen(session_id) if session_id is not None else ()
+
+        if self.pool is not None:
+            pooled_questions = self.pool.take(self.model, topic, difficulty, n_questions, exclude=seen)
+            if pooled_questions is not None:
+                logger.info(
+                    "Serving %d pooled questions for topic=%r, difficulty=%r.", len(pooled_questions), topic, difficulty
+                )
+                return self._areplay_questions(pooled_questions, session_id)
+
+        key = QuizCache.make_key(self.model, topic, difficulty, n_questions)
+        if self.cache is not None and use_cache:
+            cached_questions = self.cache.get(key)
+            # A session that has already been sent this quiz gets a fresh one instead.
+            if cached_questions is not None and not any(question.dedupe_key in seen for question in cached_questions):
+                logger.info(
+                    "Serving %d cached questions for topic=%r, difficulty=%r.", len(cached_questions), topic, difficulty
+                )
+                return self._areplay_questions(cached_questions, session_id)
+
+        start = functools.partial(self._astart_questions, topic, difficulty, n_questions, key)
+        if self.coalescer is not None:
+            questions = await self.coalescer.join(key, start)
+        else:
+            # Awaited here (not inside the generator) so provider errors surface before the response starts.
+            questions = await start()
+        return self._aencode_questions(questions, session_id)
+
+    async def agenerate_questions(
+        self, topic: str, difficulty: str, n_questions: int = 10
+    ) -> AsyncGenerator[QuizQuestion, None]:
+        """
+        Starts a fresh LLM stream and returns its validated questions, bypassing the pool, cache and coalescer.
+
+        Used to fill the question pool. The upstream stream is created before returning, so provider errors
+        are raised here; closing the returned generator closes the upstream stream. The upstream stream is also
+        stopped as soon as `n_questions` valid questions have arrived, even if the model keeps generating.
+
+        With `shards` > 1, a quiz of at least 2 * MIN_QUESTIONS_PER_SHARD questions is split across
+        concurrent LLM calls, each asked for its own range of question ids and its own aspect of the topic.
+        Their questions are merged in arrival order, near-duplicates are dropped and ids are renumbered
+        (see `amerge_questions`), so the last question arrives after roughly 1/shards of the decode time.
+
+        With `hedging` and a router, an unsharded quiz whose first question has not arrived within the
+        model's p95 first-question time is hedged: the same prompt is sent to the fastest healthy model on
+        another provider, the stream that produces a valid question first is kept and the other is closed.
+
+        With resilience, streams time out if the provider does not connect, start streaming or send the next
+        chunk in time. Retryable failures are retried with backoff until the first question has arrived (so
+        nothing is ever sent twice); later failures end the stream. While the provider's circuit breaker is
+        open, an unsharded quiz is rerouted to the fastest healthy model if there is a router, and otherwise
+        CircuitOpenError is raised without calling the provider.
+
+        Parameters:
+            topic (str): The quiz subject.
+            difficulty (str): The quiz difficulty.
+            n_questions (int, optional): Number of questions to generate. Defaults to 10.
+
+        Returns:
+            AsyncGenerator[QuizQuestion, None]: The validated questions, in order.
+        """
+        started = time.perf_counter()
+        shard_sizes = split_questions(n_questions, self.shards, self.MIN_QUESTIONS_PER_SHARD)
+        if len(shard_sizes) == 1:
+            prompt = self._create_role(topic, difficulty, n_questions)
+            logger.info("Requesting %d questions from %s.", n_questions, self.model)
+            logger.debug("Prompt for LLM: %s", prompt)
+            if self.router is not None or self.resilience is not None:
+                return await self._astart_single_stream(prompt, n_questions)
+            llm_stream = await self._acreate_llm_stream(prompt)
+            questions = self.sse_parser.aparse_questions(llm_stream, max_questions=n_questions)
+            return self._ameasure_questions(self.model, questions, started)
+
+        prompts = []
+        first_id = 1
+        for shard, shard_size in enumerate(shard_sizes, start=1):
+            prompts.append(self._create_role(topic, difficulty, shard_size, shard=(shard, len(shard_sizes), first_id)))
+            first_id += shard_size
+        logger.info("Splitting %d questions across %d shards of %s.", n_questions, len(prompts), self.model)
+        logger.debug("First shard prompt: %s", prompts[0])
+
+        results = await asyncio.gather(
+            *[
+                self._acall_provider(self.model, functools.partial(self._acreate_llm_stream, prompt))
+                for prompt in prompts
+            ],
+            return_exceptions=True,
+        )
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            # Release the shards that did start before failing the whole quiz.
+            for result in results:
+                if not isinstance(result, BaseException) and hasattr(result, "aclose"):
+                    await result.aclose()
+            raise errors[0]
+        merged = amerge_questions(
+            [
+                self.sse_parser.aparse_questions(llm_stream, max_questions=shard_size)
+                for llm_stream, shard_size in zip(results, shard_sizes)
+            ]
+        )
+        return self._ameasure_questions(self.model, merged, started)
+
+    async def agenerate_question_list(self, topic: str, difficulty: str, n_questions: int = 10) -> list[QuizQuestion]:
+        """
+        Generates a whole quiz and returns its validated questions once the stream has completed.
+
+        A quiz cached for the same model, topic, difficulty and number of questions is returned without calling
+        the LLM; otherwise the quiz is generated by `agenerate_questions` and cached. Used by batches, which
+        return each quiz whole rather than streaming its questions.
+
+        Parameters:
+            topic (str): The quiz subject.
+            difficulty (str): The quiz difficulty.
+            n_questions (int, optional): Number of questions to generate. Defaults to 10.
+
+        Returns:
+            list[QuizQuestion]: The validated questions, in order.
+        """
+        key = QuizCache.make_key(self.model, topic, difficulty, n_questions)
+        if self.cache is not None:
+            cached_questions = self.cache.get(key)
+            if cached_questions is not None:
+                return list(cached_questions)
+        questions = self._acache_questions(await self.agenerate_questions(topic, difficulty, n_questions), key)
+        return [question async for question in questions]
+
+    def agenerate_batch(
+        self,
+        jobs: list[BatchJob],
+        generator_for: Optional[Callable[[Optional[str]], "QuizGenerator"]] = None,
+        max_concurrency_per_provider: int = DEFAULT_BATCH_CONCURRENCY,
+        journal: Optional[BatchJournal] = None,
+        batch_id: Optional[str] = None,
+    ) -> AsyncGenerator[BatchResult, None]:
+        """
+        Generates a batch of quizzes, yielding each quiz as soon as it is finished (see `arun_batch`).
+
+        The quizzes run on a pool of workers per provider, up to `max_concurrency_per_provider` at once
+        against each, rather than one request per quiz from the client. A failing quiz yields an error result
+        and the rest of the batch carries on. With a journal, finished quizzes are journalled, and submitting
+        the same batch again resumes it: journalled quizzes are replayed and only the rest are generated.
+
+        Parameters:
+            jobs (list[BatchJob]): The quizzes, each with an id unique within the batch.
+            generator_for (Callable[[Optional[str]], QuizGenerator], optional): Returns the generator of a job's
+                model, e.g. `ProviderRegistry.get_quiz_generator`. Defaults to this generator for its own model
+                (or no model) and, for each other model, a new generator with this one's settings.
+            max_concurrency_per_provider (int, optional): Quizzes streamed at once from each provider.
+                Defaults to DEFAULT_BATCH_CONCURRENCY.
+            journal (BatchJournal, optional): Journal of finished quizzes. Defaults to None (not resumable).
+            batch_id (str, optional): Names the batch's journal. Defaults to a digest of the jobs.
+
+        Returns:
+            AsyncGenerator[BatchResult, None]: One result per job, in completion order.
+
+        Raises:
+            ValueError: When iterated, if two jobs share an id or the batch id is invalid.
+        """
+        if generator_for is None:
+            generators = {self.model: self}
+
+            def generator_for(model: Optional[str]) -> "QuizGenerator":
+                if model == ModelRouter.ANY_MODEL:
+                    model = self.router.fastest() if self.router is not None else None
+                model = QuizGenerator.check_model_is_supported(model or self.model)
+                if model not in generators:
+                    generators[model] = QuizGenerator(
+                        model=model,
+                        cache=self.cache,
+                        coalescer=self.coalescer,
+                        pool=self.pool,
+                        sessions=self.sessions,
+                        shards=self.shards,
+                        router=self.router,
+                        hedging=self.hedging,
+                        resilience=self.resilience,
+                        admission=self.admission,
+                    )
+                return generators[model]
+
+        return arun_batch(jobs, generator_for, provider_of, max_concurrency_per_provider, journal, batch_id)
+
+    async def _astart_single_stream(self, prompt: str, n_questions: int) -> AsyncGenerator[QuizQuestion, None]:
         """
-        Creates the prompt to be sent to the LLM.
+        Starts the stream for the generator's model and waits for its first question, retrying failures
+        before it (with resilience), recording its first-question time (with a router), and hedging it with a
+        backup model when `hedging` is on and the first question is later than the model's hedge deadline.
+
+        Parameters:
+            prompt (str): The prompt string.
+            n_questions (int): Number of questions requested, used to pick the backup model.
+
+        Returns:
+            AsyncGenerator[QuizQuestion, None]: The validated questions of the winning stream.
+
+        Raises:
+            Exception: The provider error, if every started stream failed before producing a question.
+        """
+
+        async def start(model: str):
+            started = time.perf_counter()
+            questions, first = await self._acall_provider(
+                model, functools.partial(self._afirst_question, prompt, n_questions, model, started)
+            )
+            return model, questions, first, time.perf_counter() - started
+
+        primary_model = self.model
+        if self.resilience is not None and not self.resilience.is_available(provider_of(primary_model)):
+            reroute_model = self.router.backup_for(primary_model, n_questions) if self.router is not None else None
+            if reroute_model is not None:
+                logger.warning("Circuit open for %s; rerouting to %s.", primary_model, reroute_model)
+                primary_model = reroute_model
+
+        # Tasks in start order, so the primary wins ties.
+        tasks = [asyncio.create_task(start(primary_model))]
+        backup_model = None
+        deadline = self.router.hedge_delay(primary_model) if self.router is not None and self.hedging else None
+        winner = None
+        error = None
+        try:
+            if deadline is not None:
+                done, _ = await asyncio.wait(tasks, timeout=deadline)
+                if not done:
+                    backup_model = self.router.backup_for(primary_model, n_questions)
+                    if backup_model is not None:
+                        logger.info(
+                            "No question from %s within %.2fs; hedging with %s.", primary_model, deadline, backup_model
+                        )
+                        tasks.append(asyncio.create_task(start(backup_model)))
+
+            pending = set(tasks)
+            while pending and winner is None:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in tasks:
+                    if not task.done() or task in pending or winner is not None:
+                        continue
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif task.result()[2] is not None or not pending:
+                        winner = task.result()
+        finally:
+            # Close every stream but the winner's: cancel the ones still starting, close the ones that started.
+            for task in tasks:
+                task.cancel()
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            for result in results:
+                if isinstance(result, tuple) and result is not winner:
+                    await result[1].aclose()
+
+        if winner is None:
+            raise error
+        model, questions, first, seconds = winner
+        if self.router is not None and first is not None:
+            self.router.record_first_question(model, seconds)
+        if backup_model is not None:
+            self.router.record_hedge(primary_model, backup_model, backup_won=model == backup_model)
+        return self._aprepend_question(model, first, questions)
+
+    async def _afirst_question(
+        self, prompt: str, n_questions: int, model: str, started: float
+    ) -> tuple[AsyncGenerator[QuizQuestion, None], Optional[QuizQuestion]]:
+        """
+        Starts a stream of `n_questions` questions and waits for its first valid question: one attempt for
+        `Resilience.acall`. `started` (from `time.perf_counter()`) is when the quiz started, for the stream's metrics.
+
+        Returns:
+            tuple: The stream's remaining questions, and its first question (None if it produced none).
+        """
+        llm_stream = await self._acreate_llm_stream(prompt, model)
+        questions = self._ameasure_questions(
+            model, self.sse_parser.aparse_questions(llm_stream, max_questions=n_questions), started
+        )
+        try:
+            return questions, await anext(questions, None)
+        except BaseException:
+            await questions.aclose()
+            raise
+
+    async def _acall_provider(self, model: str, attempt):
+        """Runs `attempt` through the resilience layer for the model's provider, or directly without one."""
+        if self.resilience is None:
+            return await attempt()
+        return await self.resilience.acall(provider_of(model), attempt)
+
+    async def _aprepend_question(
+        self, model: str, first: Optional[QuizQuestion], questions: AsyncGenerator[QuizQuestion, None]
+    ) -> AsyncGenerator[QuizQuestion, None]:
+        """
+        Yields `first` (if any) and then the rest of `questions`, closing them when done.
+        A failure after the first question is not retried, but still counts against the provider's breaker.
+        """
+        try:
+            if first is not None:
+                yield first
+            async for question in questions:
+                yield question
+        except Exception as e:
+            if self.resilience is not None and is_retryable(e):
+                self.resilience.breaker(provider_of(model)).record_failure()
+            raise
+        finally:
+            await questions.aclose()
+
+    async def _astart_questions(
+        self, topic: str, difficulty: str, n_questions: int, cache_key: str
+    ) -> AsyncGenerator[QuizQuestion, None]:
+        """
+        Starts the upstream LLM stream for a quiz request.
 
         Parameters:
             topic (str): The quiz subject.
             difficulty (str): The quiz difficulty.
             n_questions (int): Number of questions to generate.
+            cache_key (str): Key the finished quiz is cached under.
+
+        With an admission controller, an upstream slot for the model is held until the stream ends.
+
+        Returns:
+            AsyncGenerator[QuizQuestion, None]: The validated questions, cached once the stream completes.
+
+        Raises:
+            AdmissionRejected: If no upstream slot frees up in time.
+        """
+        if self.admission is None:
+            questions = await self.agenerate_questions(topic, difficulty, n_questions)
+            return self._acache_questions(questions, cache_key)
+        release = await self.admission.acquire(self.model)
+        try:
+            questions = await self.agenerate_questions(topic, difficulty, n_questions)
+        except BaseException:
+            release()
+            raise
+        return self._acache_questions(self.admission.hold_until_closed(questions, release), cache_key)
+
+    async def _acache_questions(
+        self, questions: AsyncGenerator[QuizQuestion, None], cache_key: str
+    ) -> AsyncGenerator[QuizQuestion, None]:
+        """
+        Passes streamed questions through and caches the quiz once the stream has completed.
+
+        Parameters:
+            questions (AsyncGenerator[QuizQuestion, None]): Validated questions from the parser.
+            cache_key (str): Key to store the finished quiz under.
+
+        Yields:
+            QuizQuestion: Each question, unchanged.
+        """
+        received = []
+        try:
+            async for question in questions:
+                received.append(question)
+                yield question
+        finally:
+            await questions.aclose()
+        # Only reached when the stream ran to completion, not when the client disconnected.
+        if self.cache is not None:
+            self.cache.set(cache_key, received)
+
+    async def _aencode_questions(
+        self, questions: AsyncGenerator[QuizQuestion, None], session_id: Optional[str] = None
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        Frames streamed questions as SSE bytes, closing the question stream when the response ends.
+
+        Parameters:
+            questions (AsyncGenerator[QuizQuestion, None]): Validated questions.
+            session_id (str, optional): Client session; questions it has already been sent are skipped.
+
+        Yields:
+            bytes: One SSE frame per question.
+        """
+        try:
+            async for question in questions:
+                if self._send_to_session(question, session_id):
+                    yield self.sse_parser.encode_question(question)
+        finally:
+            await questions.aclose()
+
+    async def _areplay_questions(
+        self, questions: Iterable[QuizQuestion], session_id: Optional[str] = None
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        Replays pooled or cached questions as SSE bytes.
+
+        Parameters:
+            questions (Iterable[QuizQuestion]): The questions to send.
+            session_id (str, optional): Client session; questions it has already been sent are skipped.
+
+        Yields:
+            bytes: One SSE frame per question.
+        """
+        for question in questions:
+            if self._send_to_session(question, session_id):
+                yield self.sse_parser.encode_question(question)
+
+    def _send_to_session(self, question: QuizQuestion, session_id: Optional[str]) -> bool:
+        """
+        Records a question against the client session, unless the session has already been sent it.
+
+        Returns:
+            bool: True if the question should be sent.
+        """
+        if session_id is None:
+            return True
+        if question.dedupe_key in self.sessions.seen(session_id):
+            logger.debug("Skipping question already sent to the session: %r", question.question)
+            return False
+        self.sessions.record(session_id, question)
+        return True
+
+    def _create_role(
+        self, topic: str, difficulty: str, n_questions: int, shard: Optional[tuple[int, int, int]] = None
+    ) -> str:
+        """
+        Creates the user message of a quiz request: the topic, difficulty and number of questions.
+        It follows the fixed SYSTEM_PROMPT (see `_create_messages`).
+
+        Parameters:
+            topic (str): The quiz subject.
+            difficulty (str): The quiz difficulty.
+            n_questions (int): Number of questions to generate.
+            shard (tuple[int, int, int], optional): For one shard of a sharded quiz: the shard number
+                (from 1), the number of shards and the first question id of the shard. Defaults to None.
 
         Returns:
             str: The prompt string.
         """
-        return (
-            f"You are an AI that generates quiz questions. "
-            f"You will be given a topic (e.g., Roman History) with a difficulty level. "
-            f"Provide {n_questions} responses in JSON format similar to this example: \n{self.EXAMPLE_RESPONSE}. "
-            f"Generate similar responses for the topic '{topic}' with a difficulty of '{difficulty}'. "
-            f"ENSURE THESE ARE CORRECT. DO NOT INCLUDE INCORRECT ANSWERS! "
-            f"DO NOT PREFIX THE RESPONSE WITH ANYTHING EXCEPT THE RAW JSON! "
-            f"Return each question on a new line."
-        )
+        prompt = f"Provide {n_questions} responses for the topic '{topic}' with a difficulty of '{difficulty}'."
+        if shard is not None:
+            number, count, first_id = shard
+            prompt += (
+                f" This is part {number} of {count} of a larger quiz, written separately: number the questions "
+                f"from {first_id} to {first_id + n_questions - 1}, and divide the topic into {count} distinct "
+                f"sub-themes, asking only about sub-theme {number} so that no question repeats another part."
+            )
+        return prompt
+
+    def _create_messages(self, prompt: str) -> list[dict]:
+        """Returns the messages of a request: the static system prompt, then the request's user prompt."""
+        return [{"role": "system", "content": self.SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
 
     def _create_llm_stream(self, prompt: str):
         """
@@ -178,12 +968,153 @@ class QuizGenerator:
             Generator: A generator yielding streamed response chunks from the LLM.
         """
         # The completion function supports a stream flag.
+        # The timeout bounds each read, so a stalled provider cannot hold the calling thread forever.
+        timeouts = self.resilience.timeouts_for(provider_of(self.model)) if self.resilience else Timeouts()
         return litellm.completion(
             model=self.model,
-            messages=[{"role": "user", "content": prompt}],
+            messages=self._create_messages(prompt),
             stream=True,
+            timeout=timeouts.first_token,
+            **prompt_cache_params(self.model, self.SYSTEM_PROMPT_KEY),
         )
 
+    async def _acreate_llm_stream(self, prompt: str, model: Optional[str] = None):
+        """
+        Creates an async streaming response from litellm based on the given prompt.
+
+        With resilience, the connect, first-token and idle timeouts are applied.
+        The stream's time to first chunk and token counts are recorded in the metrics, and with a router,
+        its time to first token, decode rate and failures are recorded for routing.
+
+        Parameters:
+            prompt (str): The prompt string.
+            model (str, optional): The model to call. Defaults to the generator's model.
+
+        Returns:
+            AsyncIterator: An async iterator yielding streamed response chunks from the LLM.
+        """
+        model = model or self.model
+        started = time.perf_counter()
+        try:
+            request = litellm.acompletion(
+                model=model,
+                messages=self._create_messages(prompt),
+                stream=True,
+                **prompt_cache_params(model, self.SYSTEM_PROMPT_KEY),
+            )
+            if self.resilience is None:
+                llm_stream = await request
+            else:
+                provider = provider_of(model)
+                llm_stream = self.resilience.astream(provider, await self.resilience.aconnect(provider, request))
+        except Exception:
+            if self.router is not None:
+                self.router.record_failure(model)
+            raise
+        return self._ameasure_stream(model, llm_stream, started, prompt)
+
+    async def _ameasure_stream(self, model: str, llm_stream, started: float, prompt: str):
+        """
+        Passes an LLM stream through, recording its latency, token counts and outcome in the metrics,
+        and with the router.
+
+        Only local counters are updated per chunk; everything is recorded once the stream ends. Tokens are
+        taken from the usage the provider reports on its last chunk, or else estimated: one token per chunk
+        out, and CHARS_PER_TOKEN characters of system and user prompt per token in. Input tokens served
+        from the provider's prompt cache are counted when it reports them.
+
+        Parameters:
+            model (str): The model streaming.
+            llm_stream: The async stream from litellm.
+            started (float): `time.perf_counter()` when the request was sent.
+            prompt (str): The prompt sent.
+
+        Yields:
+            Each chunk, unchanged.
+        """
+        first_token_at = None
+        tokens = 0
+        last_chunk = None
+        error = GeneratorExit()
+        try:
+            async for chunk in llm_stream:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    if self.router is not None:
+                        self.router.record_first_token(model, first_token_at - started)
+                else:
+                    tokens += 1
+                last_chunk = chunk
+                yield chunk
+            error = None
+        except StreamComplete:
+            # The parser has every question it asked for: a complete stream, stopped before the model finished.
+            error = None
+        except Exception as e:
+            error = e
+            if self.router is not None:
+                self.router.record_failure(model)
+            raise
+        finally:
+            aclose = getattr(llm_stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            outcome = metrics.outcome_of(error)
+            if first_token_at is not None:
+                metrics.QUIZ_TIME_TO_FIRST_CHUNK.labels(model, outcome).observe(first_token_at - started)
+            usage = getattr(last_chunk, "usage", None)
+            tokens_in = getattr(usage, "prompt_tokens", None)
+            if not isinstance(tokens_in, int):
+                tokens_in = math.ceil((len(self.SYSTEM_PROMPT) + len(prompt)) / self.CHARS_PER_TOKEN)
+            tokens_cached = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None)
+            if isinstance(tokens_cached, int):
+                metrics.LLM_TOKENS.labels(model, "cached").inc(tokens_cached)
+            tokens_out = getattr(usage, "completion_tokens", None)
+            if not isinstance(tokens_out, int):
+                tokens_out = tokens + (first_token_at is not None)
+            metrics.LLM_TOKENS.labels(model, "in").inc(tokens_in)
+            metrics.LLM_TOKENS.labels(model, "out").inc(tokens_out)
+        if self.router is not None:
+            if first_token_at is not None:
+                self.router.record_decode(model, tokens, time.perf_counter() - first_token_at)
+            self.router.record_success(model)
+
+    @staticmethod
+    async def _ameasure_questions(
+        model: str, questions: AsyncGenerator[QuizQuestion, None], started: float
+    ) -> AsyncGenerator[QuizQuestion, None]:
+        """
+        Passes a quiz's validated questions through, recording its time to first question, the gaps between
+        questions and its duration in the metrics once the stream ends, labelled by model and outcome.
+
+        Parameters:
+            model (str): The model streaming.
+            questions (AsyncGenerator[QuizQuestion, None]): The validated questions.
+            started (float): `time.perf_counter()` when the quiz started.
+
+        Yields:
+            QuizQuestion: Each question, unchanged.
+        """
+        arrivals = []
+        error = GeneratorExit()
+        try:
+            async for question in questions:
+                arrivals.append(time.perf_counter())
+                yield question
+            error = None
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            await questions.aclose()
+            outcome = metrics.outcome_of(error)
+            if arrivals:
+                metrics.QUIZ_TIME_TO_FIRST_QUESTION.labels(model, outcome).observe(arrivals[0] - started)
+                gaps = metrics.QUIZ_INTER_QUESTION_GAP.labels(model, outcome)
+                for previous, arrival in zip(arrivals, arrivals[1:]):
+                    gaps.observe(arrival - previous)
+            metrics.QUIZ_STREAM_DURATION.labels(model, outcome).observe(time.perf_counter() - started)
+
     @staticmethod
     def print_quiz(generator: Generator[str, None, None]):
         """
@@ -195,16 +1126,19 @@ class QuizGenerator:
         questions = []
         try:
             for idx, question in enumerate(generator, start=1):
-                logger.info(f"Item {idx}: {question}")
+                logger.info("Item %d: %s", idx, question)
                 questions.append(question)
             return questions
         except Exception as e:
-            logger.error(f"Error during quiz generation: {e}")
+            logger.error("Error during quiz generation: %s", e)
 
 
 if __name__ == "__main__":
-    # For detailed output during testing, set the logger level to DEBUG.
-    logger.setLevel(logging.DEBUG)
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    # For detailed output during testing, log at DEBUG.
+    configure_logging(level="DEBUG")
 
     print(f"Supported models: {QuizGenerator.SUPPORTED_MODELS}")
 
@@ -0,0 +1,297 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+from quiz_cache import QuizCache
+
+logger = logging.getLogger(__name__)
+
+
+class ImageStore:
+    """
+    Keeps generated images on local disk, keyed by a hash of the normalised prompt, so a repeat prompt
+    is answered without calling the provider, and with a URL that does not expire like the provider's.
+
+    - Each image is downloaded once from the provider's temporary URL and written to
+      "<prompt key>-<content digest>.png" in `path`. The file name without its extension is the image id
+      served at /Images/{image_id}: an id always refers to the same bytes, so responses can be cached
+      by clients for a year and the content digest doubles as the ETag.
+    - The images' total size is kept under `max_bytes` by evicting the least recently used ones. The order
+      is kept in memory and in the files' modification times, so it is recovered when the store restarts.
+    - Concurrent requests for the same prompt share one generation and download.
+
+    Configured from the environment by `from_env`:
+      - IMAGE_STORE_PATH: Directory the images are kept in (default "image_store").
+      - IMAGE_STORE_MAX_MB: Maximum total size of the images, in megabytes (default 512; 0 disables the store).
+
+    Not thread-safe: use it from the event loop. Files are written and deleted on worker threads.
+
+    Args:
+        path (str): Directory the images are kept in; created when the first image is stored.
+        max_bytes (int): Maximum total size of the images.
+
+    Attributes:
+        hits (int): Prompts answered from the store.
+        misses (int): Prompts that had to be generated.
+    """
+
+    DEFAULT_PATH = "image_store"
+    DEFAULT_MAX_MB = 512
+    # Largest download accepted from a provider URL.
+    MAX_IMAGE_BYTES = 20 * 1024 * 1024
+    SUFFIX = ".png"
+    MEDIA_TYPE = "image/png"
+    _ID_PATTERN = re.compile(r"([0-9a-f]{64})-([0-9a-f]{16})")
+
+    @classmethod
+    def from_env(cls) -> Optional["ImageStore"]:
+        """
+        Builds a store configured from environment variables.
+
+        Returns:
+            Optional[ImageStore]: The store, or None if IMAGE_STORE_MAX_MB is 0.
+        """
+        max_mb = float(os.getenv("IMAGE_STORE_MAX_MB", cls.DEFAULT_MAX_MB))
+        if max_mb <= 0:
+            return None
+        return cls(os.getenv("IMAGE_STORE_PATH", cls.DEFAULT_PATH), max_bytes=int(max_mb * 1024 * 1024))
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        # prompt key -> (image id, size in bytes), least recently used first.
+        self._images: OrderedDict[str, tuple[str, int]] = OrderedDict()
+        self._total_bytes = 0
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    @property
+    def total_bytes(self) -> int:
+        """Total size of the stored images."""
+        return self._total_bytes
+
+    @staticmethod
+    def make_key(prompt: str, size: str, model: str) -> str:
+        """
+        Builds the key of an image request.
+
+        Example:
+            >>> ImageStore.make_key("A Juicy Burger", "256x256", "dall-e-2") == ImageStore.make_key(
+            ...     "  a juicy   burger", "256x256", "dall-e-2"
+            ... )
+            True
+
+        Returns:
+            str: A hex SHA-256 digest of the model, size and normalised prompt.
+        """
+        normalised = [model, size, QuizCache.normalise_text(prompt)]
+        return hashlib.sha256(json.dumps(normalised).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the id of the image stored for `key`, marking it as recently used, or None."""
+        entry = self._images.get(key)
+        if entry is None:
+            return None
+        self._images.move_to_end(key)
+        try:
+            os.utime(self._file_for(entry[0]))
+        except OSError:
+            # Deleted behind our back: forget it and generate it again.
+            del self._images[key]
+            self._total_bytes -= entry[1]
+            return None
+        return entry[0]
+
+    def file_for(self, image_id: str) -> Optional[str]:
+        """
+        Returns the path of a stored image, or None if `image_id` is malformed or not stored.
+        Only ids of the form "<prompt key>-<content digest>" are accepted, so no other file can be served.
+        """
+        match = self._ID_PATTERN.fullmatch(image_id)
+        if match is None:
+            return None
+        entry = self._images.get(match.group(1))
+        if entry is None or entry[0] != image_id:
+            return None
+        return self._file_for(image_id)
+
+    @staticmethod
+    def etag_for(image_id: str) -> str:
+        """Returns the ETag of an image: its content digest, quoted."""
+        return f'"{image_id.rsplit("-", 1)[1]}"'
+
+    async def aput(self, key: str, data: bytes) -> str:
+        """
+        Stores an image, evicting the least recently used images if the store is over its size.
+
+        Args:
+            key (str): A key from `make_key`.
+            data (bytes): The image.
+
+        Returns:
+            str: The image id.
+        """
+        image_id = f"{key}-{hashlib.sha256(data).hexdigest()[:16]}"
+        await asyncio.to_thread(self._write, self._file_for(image_id), data)
+        previous = self._images.pop(key, None)
+        if previous is not None:
+            self._total_bytes -= previous[1]
+        self._images[key] = (image_id, len(data))
+        self._total_bytes += len(data)
+
+        evicted = []
+        if previous is not None and previous[0] != image_id:
+            evicted.append(self._file_for(previous[0]))
+        while self._total_bytes > self.max_bytes and len(self._images) > 1:
+            _, (old_id, old_size) = self._images.popitem(last=False)
+            self._total_bytes -= old_size
+            evicted.append(self._file_for(old_id))
+        if evicted:
+            await asyncio.to_thread(self._remove, evicted)
+        return image_id
+
+    async def aget_or_create(
+        self,
+        key: str,
+        agenerate_url: Callable[[], Awaitable[Optional[str]]],
+        http_client: Optional[httpx.AsyncClient] = None,
+    ) -> tuple[Optional[str], Optional[str]]:
+        """
+        Returns the image stored for `key`, or generates, downloads and stores it.
+
+        Concurrent calls for the same key share one generation.
+
+        Args:
+            key (str): A key from `make_key`.
+            agenerate_url (Callable[[], Awaitable[Optional[str]]]): Generates the image and returns the
+                provider's URL for it, or None if the generation failed.
+            http_client (httpx.AsyncClient, optional): Client to download with. Defaults to a new client.
+
+        Returns:
+            tuple[Optional[str], Optional[str]]: (image id, None) once the image is stored;
+            (None, provider URL) if it was generated but could not be downloaded; (None, None) if the
+            generation failed.
+        """
+        image_id = self.get(key)
+        if image_id is not None:
+            self.hits += 1
+            return image_id, None
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            return await asyncio.shield(in_flight)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await self._acreate(key, agenerate_url, http_client)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Retrieved here so an exception nobody else awaited is not reported as unhandled.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._in_flight[key]
+
+    async def _acreate(
+        self,
+        key: str,
+        agenerate_url: Callable[[], Awaitable[Optional[str]]],
+        http_client: Optional[httpx.AsyncClient],
+    ) -> tuple[Optional[str], Optional[str]]:
+        url = await agenerate_url()
+        if url is None:
+            return None, None
+        try:
+            data = await self.adownload(url, http_client)
+            return await self.aput(key, data), None
+        except (httpx.HTTPError, OSError, ValueError) as e:
+            logger.error("Could not store the generated image, serving the provider URL: %s", e)
+            return None, url
+
+    @classmethod
+    async def adownload(cls, url: str, http_client: Optional[httpx.AsyncClient] = None) -> bytes:
+        """
+        Downloads an image.
+
+        Raises:
+            httpx.HTTPError: If the request fails or answers with an error status.
+            ValueError: If the image is larger than MAX_IMAGE_BYTES.
+        """
+        if http_client is None:
+            async with httpx.AsyncClient() as client:
+                return await cls.adownload(url, client)
+        async with http_client.stream("GET", url) as response:
+            response.raise_for_status()
+            chunks = []
+            received = 0
+            async for chunk in response.aiter_bytes():
+                received += len(chunk)
+                if received > cls.MAX_IMAGE_BYTES:
+                    raise ValueError(f"Image is larger than {cls.MAX_IMAGE_BYTES} bytes.")
+                chunks.append(chunk)
+        return b"".join(chunks)
+
+    def stats(self) -> dict:
+        """Returns the number and size of the stored images and the hit and miss counts."""
+        return {"images": len(self._images), "bytes": self._total_bytes, "hits": self.hits, "misses": self.misses}
+
+    def _file_for(self, image_id: str) -> str:
+        return os.path.join(self.path, image_id + self.SUFFIX)
+
+    def _load(self) -> None:
+        """Indexes the images already on disk, least recently used first."""
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return
+        found = []
+        for name in names:
+            match = self._ID_PATTERN.fullmatch(name.removesuffix(self.SUFFIX))
+            if match is None or not name.endswith(self.SUFFIX):
+                continue
+            stat = os.stat(os.path.join(self.path, name))
+            found.append((stat.st_mtime, match.group(1), match.group(0), stat.st_size))
+        for _, key, image_id, size in sorted(found):
+            previous = self._images.pop(key, None)
+            if previous is not None:
+                # An older image for the same prompt, left behind by a crash: keep the newest.
+                self._total_bytes -= previous[1]
+                self._remove([self._file_for(previous[0])])
+            self._images[key] = (image_id, size)
+            self._total_bytes += size
+
+    def _write(self, file: str, data: bytes) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        # Written under a temporary name and renamed, so a reader never sees a partial image.
+        temporary = f"{file}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.replace(temporary, file)
+
+    @staticmethod
+    def _remove(files: list[str]) -> None:
+        for file in files:
+            try:
+                os.remove(file)
+            except FileNotFoundError:
+                pass
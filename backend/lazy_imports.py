@@ -0,0 +1,85 @@
+"""
+Lazy imports of the provider SDKs, which dominate the backend's start-up time and memory.
+
+`litellm` takes seconds to import (and imports `openai`, itself about a second), so importing them when the
+app module loads made every cold start, CLI run and test session pay for them before doing anything.
+Modules that use them bind the name with `lazy_import` instead:
+
+    litellm = lazy_import("litellm")
+
+The module's code runs the first time one of its attributes is used, and the name is then the real module:
+`litellm.acompletion(...)` and `patch("litellm.acompletion")` work unchanged. The API server loads the SDKs
+on a worker thread at start-up (see `ProviderRegistry.astart`) rather than on the event loop during its
+first request.
+
+Unlike a normal import, an error raised by the module's code surfaces at that first attribute use, not at the
+`lazy_import` line, and only once: the half-initialised module stays bound, and later attribute uses raise
+AttributeError instead of the original error. `load` drops a module that fails from sys.modules and re-raises
+the error, so a later `load` or import runs it again; names already bound by `lazy_import` keep the broken
+module.
+"""
+
+import importlib
+import importlib.util
+import sys
+import time
+from types import ModuleType
+
+# The SDKs the provider clients are built on, in the order they are loaded (litellm imports openai).
+PROVIDER_SDKS = ("openai", "litellm")
+
+# Names of the modules `lazy_import` registered before their code ran.
+_lazy_names: set[str] = set()
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Returns module `name` without running it: it is loaded the first time one of its attributes is used.
+
+    An already imported module is returned as it is. Raises ModuleNotFoundError straight away if the module
+    is not installed.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    _lazy_names.add(name)
+    return module
+
+
+def is_loaded(name: str) -> bool:
+    """Returns True if module `name` has been imported and its code has run."""
+    module = sys.modules.get(name)
+    if module is None:
+        return False
+    # The lazy loader turns the module back into a plain ModuleType when its code runs.
+    return name not in _lazy_names or type(module) is ModuleType
+
+
+def load(*names: str) -> float:
+    """
+    Loads modules now, whether or not they were imported lazily.
+
+    A module whose code raises is removed from sys.modules before the error is re-raised, so the next `load`
+    runs it again instead of finding a half-initialised module.
+
+    Returns:
+        float: Seconds taken.
+    """
+    started = time.perf_counter()
+    for name in names:
+        try:
+            module = importlib.import_module(name)
+            # Any attribute access runs a lazily imported module.
+            getattr(module, "__name__")
+        except Exception:
+            sys.modules.pop(name, None)
+            raise
+    return time.perf_counter() - started
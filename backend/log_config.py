@@ -0,0 +1,215 @@
+"""
+Logging for the backend: configured once at startup by `configure_logging` (and undone at shutdown by
+`shutdown_logging`), never at import time.
+
+- Records are handed to a queue on the calling thread and formatted and written by a background
+  listener thread, so the event loop never blocks on a slow stderr or log collector.
+- Modules log with lazy %-style arguments (`logger.info("Serving %d questions", n)`): nothing is
+  formatted for records below the level, and the rest are formatted on the listener thread.
+- Every record carries the id of the HTTP request it was logged for (`RequestIdMiddleware` sets it in
+  a context variable), so the endpoint, generator and parser lines of one request can be correlated.
+- INFO and DEBUG lines logged for a request can be sampled: a fraction of requests keep them, decided
+  from the request id so that a request's lines are kept or dropped together. Warnings and errors,
+  and lines logged outside a request, are always kept.
+
+Configured from the environment:
+  - LOG_LEVEL: the root level (default "INFO").
+  - LOG_FORMAT: "text" (default) or "json", one JSON object per line.
+  - LOG_SAMPLE_RATE: fraction of requests whose INFO and DEBUG lines are kept (default 1.0).
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import uuid
+import zlib
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional, TextIO
+
+# Id of the HTTP request being handled; "-" outside a request (startup, background refills).
+REQUEST_ID: ContextVar[str] = ContextVar("request_id", default="-")
+
+REQUEST_ID_HEADER = "X-Request-ID"
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - [%(request_id)s] %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Attributes every LogRecord has; anything else on a record was passed in `extra` and is logged as a field.
+_RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+# The running listener, the root handler feeding it and the root level it replaced.
+_listener: Optional[QueueListener] = None
+_handler: Optional[logging.Handler] = None
+_previous_level = logging.WARNING
+
+
+def new_request_id() -> str:
+    """Returns a random id for a request that did not bring its own."""
+    return uuid.uuid4().hex[:16]
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Tags each record with the current request id, and drops the INFO and DEBUG records of requests
+    that are not sampled.
+
+    Args:
+        sample_rate (float, optional): Fraction of requests whose INFO and DEBUG records are kept.
+    """
+
+    def __init__(self, sample_rate: float = 1.0):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self._threshold = int(min(max(sample_rate, 0.0), 1.0) * 0xFFFFFFFF)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        request_id = REQUEST_ID.get()
+        record.request_id = request_id
+        if record.levelno >= logging.WARNING or request_id == "-" or self.sample_rate >= 1.0:
+            return True
+        return zlib.crc32(request_id.encode()) < self._threshold
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object: time, level, logger, request id, message and any `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    A QueueHandler that enqueues records unformatted, leaving the formatting to the listener thread.
+
+    The stock QueueHandler formats each record on the calling thread so that it can be pickled;
+    the queue here never leaves the process, so the listener formats it instead. Log arguments should
+    therefore not be mutated after they are logged.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class _StderrHandler(logging.StreamHandler):
+    """Writes to whatever `sys.stderr` is when a record is emitted, rather than when the handler was made."""
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+
+    @property
+    def stream(self) -> TextIO:
+        return sys.stderr
+
+
+def configure_logging(
+    level: Optional[str] = None,
+    log_format: Optional[str] = None,
+    sample_rate: Optional[float] = None,
+    stream: Optional[TextIO] = None,
+) -> QueueListener:
+    """
+    Routes the root logger through a queue to a listener thread that formats and writes the records.
+
+    Only the first call configures logging; later calls return the running listener unchanged,
+    so it is safe to call from the app's startup and from scripts alike.
+
+    Args:
+        level (str, optional): The root level. Defaults to LOG_LEVEL, else "INFO".
+        log_format (str, optional): "text" or "json". Defaults to LOG_FORMAT, else "text".
+        sample_rate (float, optional): Fraction of requests whose INFO and DEBUG lines are kept.
+            Defaults to LOG_SAMPLE_RATE, else 1.0.
+        stream (TextIO, optional): Where to write. Defaults to the current stderr.
+
+    Returns:
+        QueueListener: The running listener; it is stopped, flushing the queue, by `shutdown_logging` or at exit.
+    """
+    global _listener, _handler, _previous_level
+    if _listener is not None:
+        return _listener
+
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    log_format = (log_format or os.getenv("LOG_FORMAT", "text")).lower()
+    if sample_rate is None:
+        sample_rate = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
+    output = _StderrHandler() if stream is None else logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT, DATE_FORMAT))
+    handler = DeferredQueueHandler(queue.SimpleQueue())
+    # Filtered on the logging thread: the request id lives in that thread's context.
+    handler.addFilter(RequestContextFilter(sample_rate))
+
+    root = logging.getLogger()
+    _previous_level = root.level
+    root.setLevel(level)
+    root.addHandler(handler)
+    _handler = handler
+    _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.unregister(shutdown_logging)
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging() -> None:
+    """Writes out the queued records, stops the listener and restores the root logger; a no-op if not configured."""
+    global _listener, _handler
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    root.removeHandler(_handler)
+    root.setLevel(_previous_level)
+    _listener.stop()
+    _listener = _handler = None
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware giving every HTTP request an id for its log lines.
+
+    The id is taken from the request's X-Request-ID header when it sends a usable one, else generated,
+    and is returned in the response's X-Request-ID header. It is set for the whole request, including
+    while a streaming response body is sent.
+    """
+
+    MAX_LENGTH = 64
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+        if not request_id or len(request_id) > self.MAX_LENGTH or not request_id.isprintable():
+            request_id = new_request_id()
+        header = (b"x-request-id", request_id.encode("latin-1"))
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), header]
+            await send(message)
+
+        token = REQUEST_ID.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            REQUEST_ID.reset(token)
@@ -0,0 +1,288 @@
+"""
+Prometheus metrics for the quiz and image hot paths, served in the text exposition format at /metrics.
+
+A small self-contained implementation of counters, gauges and histograms, so the backend needs no
+metrics client library. Metrics are process-wide, as with any Prometheus client: each one is declared
+once below and registered with `REGISTRY`.
+
+Instrumented code keeps its per-chunk work to local counters and timestamps and records into these
+metrics once per question or per stream, so the cost on the streaming path is a few dictionary
+lookups per stream (see the metrics benchmark in tests/test_benchmarks.py).
+"""
+
+import asyncio
+import bisect
+import math
+from typing import Iterable, Optional
+
+# Content type of the Prometheus text exposition format.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds: from a few milliseconds (cache hits, first chunks) to a minute (long streams, images).
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Seconds: parsing and validating one question takes microseconds.
+PARSE_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 1e-2)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return f"{{{pairs}}}" if pairs else ""
+
+
+class MetricsRegistry:
+    """Collects metrics and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: list["_Metric"] = []
+
+    def register(self, metric: "_Metric") -> None:
+        if any(existing.name == metric.name for existing in self._metrics):
+            raise ValueError(f"Metric '{metric.name}' is already registered.")
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        """Returns every registered metric in the Prometheus text exposition format."""
+        return "".join(metric.render() for metric in self._metrics)
+
+
+REGISTRY = MetricsRegistry()
+
+
+class _Metric:
+    """Base class: a named metric whose children (one per label combination) are created on first use."""
+
+    TYPE = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        registry: Optional[MetricsRegistry] = REGISTRY,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], object] = {}
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values: str):
+        """Returns the child for these label values (in `labelnames` order), creating it on first use."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}\n", f"# TYPE {self.name} {self.TYPE}\n"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(_format_labels(self.labelnames, values), values, child))
+        return "".join(lines)
+
+    def _render_child(self, labels: str, values: tuple[str, ...], child) -> list[str]:
+        return [f"{self.name}{labels} {_format_value(child.value)}\n"]
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    """
+    A monotonically increasing count, e.g. `TOKENS.labels("gpt-4", "out").inc(12)`.
+    The name should end in "_total".
+    """
+
+    TYPE = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Increments the unlabelled counter."""
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, e.g. the number of open connections."""
+
+    TYPE = "gauge"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class _HistogramChild:
+    __slots__ = ("_bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self._bounds = bounds
+        # Non-cumulative: counts[i] observations fell in (bounds[i - 1], bounds[i]]; the last is +Inf.
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self._bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    """
+    Observations counted in cumulative buckets, e.g. `LATENCY.labels("gpt-4", "ok").observe(0.42)`.
+
+    Args:
+        buckets (Iterable[float], optional): Upper bounds of the buckets, in increasing order.
+            Defaults to LATENCY_BUCKETS; a +Inf bucket is always added.
+    """
+
+    TYPE = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = LATENCY_BUCKETS,
+        registry: Optional[MetricsRegistry] = REGISTRY,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        """Observes a value on the unlabelled histogram."""
+        self.labels().observe(value)
+
+    def _render_child(self, labels: str, values: tuple[str, ...], child: _HistogramChild) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), child.counts):
+            cumulative += count
+            bucket_labels = _format_labels(self.labelnames + ("le",), values + (_format_value(bound),))
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}\n")
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}\n")
+        lines.append(f"{self.name}_count{labels} {child.count}\n")
+        return lines
+
+
+def outcome_of(error: Optional[BaseException]) -> str:
+    """
+    Classifies how a stream or call ended, for the "outcome" label.
+
+    Returns:
+        str: "ok" (no error), "timeout", "cancelled" (closed or cancelled before the end), or "error".
+    """
+    if error is None:
+        return "ok"
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError)):
+        return "timeout"
+    if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+        return "cancelled"
+    return "error"
+
+
+# Quiz streams, labelled by the model called and how the stream ended.
+QUIZ_TIME_TO_FIRST_CHUNK = Histogram(
+    "gpteasers_quiz_time_to_first_chunk_seconds",
+    "Seconds from sending a quiz request to the provider to its first streamed chunk.",
+    ("model", "outcome"),
+)
+QUIZ_TIME_TO_FIRST_QUESTION = Histogram(
+    "gpteasers_quiz_time_to_first_question_seconds",
+    "Seconds from starting a quiz stream to its first valid question.",
+    ("model", "outcome"),
+)
+QUIZ_INTER_QUESTION_GAP = Histogram(
+    "gpteasers_quiz_inter_question_gap_seconds",
+    "Seconds between consecutive valid questions of a quiz stream.",
+    ("model", "outcome"),
+)
+QUIZ_STREAM_DURATION = Histogram(
+    "gpteasers_quiz_stream_duration_seconds",
+    "Seconds from starting a quiz stream until it ended.",
+    ("model", "outcome"),
+)
+QUIZ_QUESTION_PARSE = Histogram(
+    "gpteasers_quiz_question_parse_seconds",
+    "Seconds spent parsing and validating each complete object of a quiz stream.",
+    ("model", "outcome"),
+    buckets=PARSE_BUCKETS,
+)
+QUIZ_ITEMS_DROPPED = Counter(
+    "gpteasers_quiz_items_dropped_total",
+    "Streamed objects dropped: invalid JSON, or rejected by question validation (invalid or duplicate).",
+    ("model", "reason"),
+)
+LLM_TOKENS = Counter(
+    "gpteasers_llm_tokens_total",
+    "Tokens sent to (in) and streamed from (out) the providers, estimated when the provider reports no usage; "
+    "cached: input tokens the provider served from its prompt cache.",
+    ("model", "direction"),
+)
+SSE_CONNECTIONS_ACTIVE = Gauge(
+    "gpteasers_sse_connections_active",
+    "Server-sent event responses currently streaming.",
+    ("endpoint",),
+)
+SSE_RESUMES = Counter(
+    "gpteasers_sse_resumes_total",
+    "Quiz streams resumed with Last-Event-ID, by where the missing questions came from (replay, regenerated).",
+    ("source",),
+)
+
+# Images, labelled by the image model and how the call ended.
+IMAGE_GENERATION = Histogram(
+    "gpteasers_image_generation_seconds",
+    "Seconds to generate an image, including waiting for a free slot and retries.",
+    ("model", "outcome"),
+)
+
+# Admission control (see admission.py).
+ADMISSION_IN_FLIGHT = Gauge("gpteasers_admission_in_flight", "Upstream provider calls holding an admission slot.")
+ADMISSION_QUEUE_DEPTH = Gauge("gpteasers_admission_queue_depth", "Requests waiting for an admission slot.")
+ADMISSION_REJECTED = Counter(
+    "gpteasers_admission_rejected_total",
+    "Requests rejected by admission control, by reason (rate_limited, queue_full, wait_timeout).",
+    ("reason",),
+)
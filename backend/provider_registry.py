@@ -0,0 +1,312 @@
+import asyncio
+import logging
+import os
+from typing import Optional
+
+import httpx
+
+from admission import AdmissionController
+from generate_image import ImageGenerator
+from generate_quiz import ModelRouter, QuizGenerator
+from image_store import ImageStore
+from lazy_imports import PROVIDER_SDKS, lazy_import, load
+from question_pool import QuestionPool, SessionHistory
+from quiz_batch import BatchJournal
+from quiz_cache import QuizCache
+from quiz_coalescer import QuizCoalescer
+from quiz_store import QuizStore
+from resilience import Resilience
+from sse_replay import ReplayBuffer
+
+# Imported on first use; see lazy_imports.py.
+litellm = lazy_import("litellm")
+openai = lazy_import("openai")
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderRegistry:
+    """
+    Owns the provider clients and HTTP connection pools for one worker process.
+
+    Created once in the FastAPI lifespan and handed to the endpoints through dependencies,
+    so requests reuse warm keep-alive connections instead of opening (and TLS-handshaking)
+    a new one per call.
+
+    - One `httpx.AsyncClient` connection pool is shared by all async provider traffic:
+      it is installed as `litellm.aclient_session` for quiz streams and passed to the
+      `AsyncOpenAI` client used for images.
+    - One `QuizGenerator` is kept per model, so API keys are checked once per model rather than per request.
+      All of them share one `QuizCache` of finished quizzes (configured by the QUIZ_CACHE_* variables)
+      and one `QuizCoalescer`, so identical concurrent requests share one upstream stream. With QUIZ_STORE_PATH,
+      the cache is warmed by the quizzes generated offline by quiz_bulk.py.
+      Large quizzes are split across up to QUIZ_SHARDS concurrent LLM calls (default 1: no sharding).
+    - One `ModelRouter` recording every model's latency, used to route "any" model requests to the fastest
+      healthy model and, with QUIZ_HEDGING=true, to hedge slow requests with a backup model.
+    - One `Resilience` with the provider timeouts, retry policy and per-provider circuit breakers, shared by
+      the quiz generators, the router (an open breaker makes a model unhealthy) and the image generator.
+    - One `AdmissionController` bounding the upstream quiz streams and image generations in flight,
+      and rate limiting each client.
+    - An optional `QuestionPool` of pre-generated questions for popular topics, refilled by a background
+      worker that runs while the registry is started, and a `SessionHistory` so sessions are not sent repeats.
+    - One `ImageGenerator` is created on first use, sharing the pooled `AsyncOpenAI` client.
+    - An optional `ImageStore` keeping generated images on local disk (configured by the IMAGE_STORE_*
+      variables), so repeat prompts are served without calling the provider.
+    - An optional `BatchJournal` of finished batch quizzes (BATCH_JOURNAL_PATH), so interrupted batches resume,
+      and the number of batch quizzes streamed at once per provider (BATCH_MAX_CONCURRENCY_PER_PROVIDER).
+
+    - One `ReplayBuffer` of recent quiz streams, so an EventSource reconnecting with Last-Event-ID resumes its
+      stream (SSE_REPLAY_* variables), and the SSE heartbeat interval (SSE_HEARTBEAT_SECONDS).
+    - The output settings of streamed responses: the window frames are coalesced over into one write
+      (STREAM_COALESCE_SECONDS) and whether they are compressed for clients that accept it (STREAM_COMPRESSION).
+
+    The provider SDKs are imported lazily (see lazy_imports.py). `astart` loads them on a worker thread before
+    starting the registry, so the API server's event loop keeps running while they load.
+
+    Pool limits can be tuned with PROVIDER_MAX_CONNECTIONS, PROVIDER_MAX_KEEPALIVE_CONNECTIONS and
+    PROVIDER_KEEPALIVE_EXPIRY_SECONDS (see `from_env`).
+    """
+
+    DEFAULT_MAX_CONNECTIONS = 100
+    DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+    DEFAULT_KEEPALIVE_EXPIRY = 30.0
+    # Seconds an SSE stream may be idle before a heartbeat comment is sent; proxies commonly drop streams
+    # idle for 30-60 seconds.
+    DEFAULT_SSE_HEARTBEAT = 15.0
+    # Seconds a streamed frame may wait for the frames right behind it, to be sent in the same write.
+    DEFAULT_STREAM_COALESCE_WINDOW = 0.005
+
+    @classmethod
+    def from_env(cls) -> "ProviderRegistry":
+        """
+        Builds a registry configured from environment variables, falling back to the class defaults.
+
+        Returns:
+            ProviderRegistry: A registry that has not been started yet.
+        """
+        return cls(
+            max_connections=int(os.getenv("PROVIDER_MAX_CONNECTIONS", cls.DEFAULT_MAX_CONNECTIONS)),
+            max_keepalive_connections=int(
+                os.getenv("PROVIDER_MAX_KEEPALIVE_CONNECTIONS", cls.DEFAULT_MAX_KEEPALIVE_CONNECTIONS)
+            ),
+            keepalive_expiry=float(os.getenv("PROVIDER_KEEPALIVE_EXPIRY_SECONDS", cls.DEFAULT_KEEPALIVE_EXPIRY)),
+            image_max_concurrency=int(os.getenv("IMAGE_MAX_CONCURRENCY", ImageGenerator.DEFAULT_MAX_CONCURRENCY)),
+            image_timeout=float(os.getenv("IMAGE_TIMEOUT_SECONDS", ImageGenerator.DEFAULT_TIMEOUT)),
+            quiz_cache=QuizCache.from_env(store=QuizStore.from_env()),
+            quiz_coalescer=QuizCoalescer() if os.getenv("QUIZ_COALESCING", "true").lower() != "false" else None,
+            question_pool=QuestionPool.from_env(),
+            quiz_shards=int(os.getenv("QUIZ_SHARDS", 1)),
+            quiz_hedging=os.getenv("QUIZ_HEDGING", "false").lower() == "true",
+            resilience=Resilience.from_env(),
+            admission=AdmissionController.from_env(),
+            image_store=ImageStore.from_env(),
+            batch_journal=BatchJournal.from_env(),
+            batch_concurrency=int(
+                os.getenv("BATCH_MAX_CONCURRENCY_PER_PROVIDER", QuizGenerator.DEFAULT_BATCH_CONCURRENCY)
+            ),
+            replay_buffer=ReplayBuffer.from_env(),
+            sse_heartbeat=float(os.getenv("SSE_HEARTBEAT_SECONDS", cls.DEFAULT_SSE_HEARTBEAT)),
+            stream_coalesce_window=float(os.getenv("STREAM_COALESCE_SECONDS", cls.DEFAULT_STREAM_COALESCE_WINDOW)),
+            stream_compression=os.getenv("STREAM_COMPRESSION", "true").lower() != "false",
+        )
+
+    def __init__(
+        self,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+        image_max_concurrency: int = ImageGenerator.DEFAULT_MAX_CONCURRENCY,
+        image_timeout: float = ImageGenerator.DEFAULT_TIMEOUT,
+        openai_base_url: Optional[str] = None,
+        quiz_cache: Optional[QuizCache] = None,
+        quiz_coalescer: Optional[QuizCoalescer] = None,
+        question_pool: Optional[QuestionPool] = None,
+        session_history: Optional[SessionHistory] = None,
+        quiz_shards: int = 1,
+        model_router: Optional[ModelRouter] = None,
+        quiz_hedging: bool = False,
+        resilience: Optional[Resilience] = None,
+        admission: Optional[AdmissionController] = None,
+        image_store: Optional[ImageStore] = None,
+        batch_journal: Optional[BatchJournal] = None,
+        batch_concurrency: int = QuizGenerator.DEFAULT_BATCH_CONCURRENCY,
+        replay_buffer: Optional[ReplayBuffer] = None,
+        sse_heartbeat: float = DEFAULT_SSE_HEARTBEAT,
+        stream_coalesce_window: float = DEFAULT_STREAM_COALESCE_WINDOW,
+        stream_compression: bool = True,
+    ):
+        """
+        Initialises the registry. No clients are created until `start` is called.
+
+        Args:
+            max_connections (int, optional): Maximum open connections in the shared pool.
+            max_keepalive_connections (int, optional): Maximum idle connections kept alive for reuse.
+            keepalive_expiry (float, optional): Seconds an idle connection is kept alive.
+            image_max_concurrency (int, optional): Concurrency cap passed to the ImageGenerator.
+            image_timeout (float, optional): Timeout passed to the ImageGenerator.
+            openai_base_url (str, optional): Override for the OpenAI API base URL (e.g. a local fake provider).
+            quiz_cache (QuizCache, optional): Cache shared by the quiz generators. Defaults to None (no caching).
+            quiz_coalescer (QuizCoalescer, optional): Coalescer shared by the quiz generators.
+                Defaults to None (no coalescing).
+            question_pool (QuestionPool, optional): Pre-generated questions for popular topics, refilled while
+                the registry is started. Defaults to None (no pool).
+            session_history (SessionHistory, optional): Questions sent to each client session.
+                Defaults to a new SessionHistory.
+            quiz_shards (int, optional): Maximum concurrent LLM calls a large quiz is split across.
+                Defaults to 1 (no sharding).
+            model_router (ModelRouter, optional): Latency statistics shared by the quiz generators, used to
+                route "any" model requests and to hedge. Defaults to a new ModelRouter.
+            quiz_hedging (bool, optional): Hedge slow quiz requests with a backup model. Defaults to False.
+            resilience (Resilience, optional): Timeouts, retries and circuit breakers for provider calls.
+                Defaults to a new Resilience with the default settings.
+            admission (AdmissionController, optional): Upstream concurrency limits and per-client rate limits.
+                Defaults to a new AdmissionController with the default settings.
+            image_store (ImageStore, optional): Local store of generated images. Defaults to None (no store).
+            batch_journal (BatchJournal, optional): Journal of finished batch quizzes. Defaults to None
+                (batches are not resumable).
+            batch_concurrency (int, optional): Batch quizzes streamed at once from each provider.
+            replay_buffer (ReplayBuffer, optional): Recent quiz streams, replayed to reconnecting clients.
+                Defaults to a new ReplayBuffer with the default settings.
+            sse_heartbeat (float, optional): Seconds an SSE stream may be idle before a heartbeat is sent
+                (0 sends none).
+            stream_coalesce_window (float, optional): Seconds a streamed frame waits for the next ones, to send
+                them in one write (0 sends every frame on its own).
+            stream_compression (bool, optional): Compress streamed responses for clients that accept gzip or
+                brotli. Defaults to True.
+        """
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.image_max_concurrency = image_max_concurrency
+        self.image_timeout = image_timeout
+        self.openai_base_url = openai_base_url
+        self.quiz_cache = quiz_cache
+        self.quiz_coalescer = quiz_coalescer
+        self.question_pool = question_pool
+        self.session_history = session_history if session_history is not None else SessionHistory()
+        self.quiz_shards = quiz_shards
+        self.resilience = resilience if resilience is not None else Resilience()
+        self.admission = admission if admission is not None else AdmissionController()
+        self.model_router = model_router if model_router is not None else ModelRouter(resilience=self.resilience)
+        self.quiz_hedging = quiz_hedging
+        self.image_store = image_store
+        self.batch_journal = batch_journal
+        self.batch_concurrency = batch_concurrency
+        self.replay_buffer = replay_buffer if replay_buffer is not None else ReplayBuffer()
+        self.sse_heartbeat = sse_heartbeat
+        self.stream_coalesce_window = stream_coalesce_window
+        self.stream_compression = stream_compression
+
+        # Seconds `astart` took to load the provider SDKs; None until it has.
+        self.warm_up_seconds: Optional[float] = None
+        self.http_client: Optional[httpx.AsyncClient] = None
+        self._quiz_generators: dict[str, QuizGenerator] = {}
+        self._image_generator: Optional[ImageGenerator] = None
+
+    def start(self) -> None:
+        """
+        Creates the shared connection pool and installs it as litellm's async session.
+        Also starts the question pool's refill worker, if there is a pool (this needs a running event loop).
+        """
+        self.http_client = openai.DefaultAsyncHttpxClient(limits=self.limits)
+        litellm.aclient_session = self.http_client
+        if self.question_pool is not None:
+            self.question_pool.start(self.get_quiz_generator)
+        logger.info("Provider registry started with %s", self.limits)
+
+    async def astart(self) -> None:
+        """
+        Loads the provider SDKs on a worker thread, then starts the registry (see `start`).
+
+        Called in the background by the API server's lifespan: the server answers its readiness probe with
+        "not ready" until this has finished, and requests needing the providers wait for it.
+        """
+        try:
+            self.warm_up_seconds = await asyncio.to_thread(load, *PROVIDER_SDKS)
+        except Exception:
+            logger.exception("Failed to load the provider SDKs; the worker will not become ready.")
+            raise
+        logger.info("Loaded the provider SDKs in %.2fs.", self.warm_up_seconds)
+        self.start()
+
+    async def aclose(self) -> None:
+        """Stops the question pool worker and closes the shared connection pool. Called when the worker shuts down."""
+        if self.question_pool is not None:
+            await self.question_pool.aclose()
+        if self.http_client is not None:
+            # Only set once `start` has run, so litellm is loaded: this never imports it at shutdown.
+            if litellm.aclient_session is self.http_client:
+                litellm.aclient_session = None
+            await self.http_client.aclose()
+            self.http_client = None
+        self._quiz_generators.clear()
+        self._image_generator = None
+        if self.quiz_cache is not None:
+            self.quiz_cache.close()
+        logger.info("Provider registry closed.")
+
+    def get_quiz_generator(self, model: Optional[str] = None) -> QuizGenerator:
+        """
+        Returns the shared QuizGenerator for a model, creating it on first use.
+
+        Unsupported models resolve to the same fallback as `QuizGenerator.check_model_is_supported`,
+        so arbitrary user input cannot grow the registry. The model "any" resolves to the fastest healthy
+        model according to the router (or the default model if none is healthy).
+
+        Args:
+            model (str, optional): The requested model, or "any". Defaults to QuizGenerator.DEFAULT_MODEL.
+
+        Returns:
+            QuizGenerator: The generator for the resolved model.
+
+        Raises:
+            ValueError: If no API keys are configured.
+        """
+        if model == ModelRouter.ANY_MODEL:
+            model = self.model_router.fastest()
+        model = QuizGenerator.check_model_is_supported(model or QuizGenerator.DEFAULT_MODEL)
+        quiz_generator = self._quiz_generators.get(model)
+        if quiz_generator is None:
+            quiz_generator = QuizGenerator(
+                model=model,
+                cache=self.quiz_cache,
+                coalescer=self.quiz_coalescer,
+                pool=self.question_pool,
+                sessions=self.session_history,
+                shards=self.quiz_shards,
+                router=self.model_router,
+                hedging=self.quiz_hedging,
+                resilience=self.resilience,
+                admission=self.admission,
+            )
+            self._quiz_generators[model] = quiz_generator
+        return quiz_generator
+
+    def get_image_generator(self) -> ImageGenerator:
+        """
+        Returns the shared ImageGenerator, creating it (and its pooled AsyncOpenAI client) on first use.
+
+        Returns:
+            ImageGenerator: The process-wide image generator.
+
+        Raises:
+            ValueError: If OPENAI_API_KEY is not set.
+        """
+        if self._image_generator is None:
+            api_key = ImageGenerator.get_api_key_from_env()
+            async_client = openai.AsyncOpenAI(
+                api_key=api_key,
+                base_url=self.openai_base_url,
+                http_client=self.http_client,
+                timeout=self.image_timeout,
+            )
+            self._image_generator = ImageGenerator(
+                api_key=api_key,
+                async_client=async_client,
+                max_concurrency=self.image_max_concurrency,
+                timeout=self.image_timeout,
+                resilience=self.resilience,
+            )
+        return self._image_generator
@@ -0,0 +1,378 @@
+import asyncio
+import dataclasses
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Container, Iterable, Optional
+
+from generate_quiz import QuizGenerator, provider_of
+from quiz_cache import QuizCache
+from quiz_question import QuizQuestion
+from rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+def _split_env_list(name: str, default: str = "") -> list[str]:
+    """Reads a comma-separated environment variable into a list of non-empty, stripped items."""
+    return [item.strip() for item in os.getenv(name, default).split(",") if item.strip()]
+
+
+class SessionHistory:
+    """
+    Remembers which questions each client session has been sent, so they are not repeated to it.
+
+    Sessions are kept in least- to most-recently-used order; the oldest are forgotten beyond `max_sessions`
+    or once idle for `ttl` seconds. Each session remembers at most `max_questions` questions (the oldest
+    are forgotten first). Questions are identified by `QuizQuestion.dedupe_key`.
+
+    Args:
+        max_sessions (int, optional): Maximum number of sessions remembered.
+        max_questions (int, optional): Maximum number of questions remembered per session.
+        ttl (float, optional): Seconds an idle session is remembered.
+        clock (Callable[[], float], optional): Time source, replaceable in tests. Defaults to time.monotonic.
+    """
+
+    DEFAULT_MAX_SESSIONS = 10000
+    DEFAULT_MAX_QUESTIONS = 500
+    DEFAULT_TTL = 6 * 60 * 60.0
+
+    def __init__(
+        self,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        max_questions: int = DEFAULT_MAX_QUESTIONS,
+        ttl: float = DEFAULT_TTL,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_sessions = max_sessions
+        self.max_questions = max_questions
+        self.ttl = ttl
+        self._clock = clock
+        # session id -> (last used, question keys in the order they were sent)
+        self._sessions: OrderedDict[str, tuple[float, dict[str, None]]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def seen(self, session_id: str) -> Container[str]:
+        """
+        Returns the dedupe keys of the questions already sent to a session.
+
+        Args:
+            session_id (str): The client session.
+
+        Returns:
+            Container[str]: Supports `key in seen`; empty for unknown or expired sessions.
+        """
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return ()
+        last_used, keys = entry
+        if last_used + self.ttl <= self._clock():
+            del self._sessions[session_id]
+            return ()
+        return keys
+
+    def record(self, session_id: str, question: QuizQuestion) -> None:
+        """
+        Records that a question was sent to a session.
+
+        Args:
+            session_id (str): The client session.
+            question (QuizQuestion): The question sent.
+        """
+        entry = self._sessions.pop(session_id, None)
+        keys = entry[1] if entry is not None else {}
+        keys[question.dedupe_key] = None
+        if len(keys) > self.max_questions:
+            del keys[next(iter(keys))]
+        self._sessions[session_id] = (self._clock(), keys)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+
+class QuestionPool:
+    """
+    Keeps pools of pre-generated, validated questions for popular topics, so requests for them are
+    answered instantly instead of waiting for a cold LLM round-trip.
+
+    There is one pool per (model, topic, difficulty) in the configured lists. A background worker,
+    started from the FastAPI lifespan, refills every pool that drops below `low_water` by generating
+    `refill_size` questions with the model's QuizGenerator:
+      - Refills are rate-limited per provider (`refills_per_minute`), so warming the pool cannot eat
+        the provider quota that live requests need.
+      - At most `max_questions` questions are held across all pools, which bounds memory.
+
+    `take` hands out questions and removes them from the pool, skipping any the client session has
+    already been sent.
+
+    Configured from the environment by `from_env`:
+      - QUESTION_POOL_TOPICS: Comma-separated topics to pre-generate; the pool is disabled when empty (default).
+      - QUESTION_POOL_DIFFICULTIES: Comma-separated difficulties (default "easy,medium,hard").
+      - QUESTION_POOL_MODELS: Comma-separated models (default QuizGenerator.DEFAULT_MODEL).
+      - QUESTION_POOL_LOW_WATER: Refill a pool once it holds fewer questions than this (default 20).
+      - QUESTION_POOL_REFILL_SIZE: Questions generated per refill (default 10).
+      - QUESTION_POOL_MAX_QUESTIONS: Maximum questions held across all pools (default 5000).
+      - QUESTION_POOL_REFILLS_PER_MINUTE: Refill rate limit per provider (default 6).
+
+    Attributes:
+        hits (int): Requests answered from the pool.
+        misses (int): Requests for a pooled topic that the pool could not answer.
+    """
+
+    DEFAULT_DIFFICULTIES = "easy,medium,hard"
+    DEFAULT_LOW_WATER = 20
+    DEFAULT_REFILL_SIZE = 10
+    DEFAULT_MAX_QUESTIONS = 5000
+    DEFAULT_REFILLS_PER_MINUTE = 6.0
+    # Longest the worker sleeps before re-checking the pools when nothing wakes it.
+    POLL_INTERVAL = 5.0
+
+    @classmethod
+    def from_env(cls) -> Optional["QuestionPool"]:
+        """
+        Builds a pool configured from environment variables.
+
+        Returns:
+            Optional[QuestionPool]: The pool, or None if QUESTION_POOL_TOPICS is empty.
+        """
+        topics = _split_env_list("QUESTION_POOL_TOPICS")
+        if not topics:
+            return None
+        return cls(
+            topics=topics,
+            difficulties=_split_env_list("QUESTION_POOL_DIFFICULTIES", cls.DEFAULT_DIFFICULTIES),
+            models=_split_env_list("QUESTION_POOL_MODELS", QuizGenerator.DEFAULT_MODEL),
+            low_water=int(os.getenv("QUESTION_POOL_LOW_WATER", cls.DEFAULT_LOW_WATER)),
+            refill_size=int(os.getenv("QUESTION_POOL_REFILL_SIZE", cls.DEFAULT_REFILL_SIZE)),
+            max_questions=int(os.getenv("QUESTION_POOL_MAX_QUESTIONS", cls.DEFAULT_MAX_QUESTIONS)),
+            refills_per_minute=float(os.getenv("QUESTION_POOL_REFILLS_PER_MINUTE", cls.DEFAULT_REFILLS_PER_MINUTE)),
+        )
+
+    def __init__(
+        self,
+        topics: Iterable[str],
+        difficulties: Iterable[str],
+        models: Iterable[str],
+        low_water: int = DEFAULT_LOW_WATER,
+        refill_size: int = DEFAULT_REFILL_SIZE,
+        max_questions: int = DEFAULT_MAX_QUESTIONS,
+        refills_per_minute: float = DEFAULT_REFILLS_PER_MINUTE,
+    ):
+        """
+        Initialises empty pools. Nothing is generated until `start` is called.
+
+        Args:
+            topics (Iterable[str]): Topics to pre-generate.
+            difficulties (Iterable[str]): Difficulties to pre-generate for every topic.
+            models (Iterable[str]): Models to pre-generate with; unsupported ones resolve as in QuizGenerator.
+            low_water (int, optional): Refill a pool once it holds fewer questions than this.
+            refill_size (int, optional): Questions generated per refill.
+            max_questions (int, optional): Maximum questions held across all pools.
+            refills_per_minute (float, optional): Refills allowed per provider per minute
+                (with bursts of up to one refill per pool).
+        """
+        self.low_water = low_water
+        self.refill_size = refill_size
+        self.max_questions = max_questions
+        self.refills_per_minute = refills_per_minute
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+
+        # (model, normalised topic, normalised difficulty) -> (topic, difficulty) as configured, and the pool itself.
+        self._requests: dict[tuple[str, str, str], tuple[str, str]] = {}
+        self._pools: dict[tuple[str, str, str], deque[QuizQuestion]] = {}
+        # Dedupe keys of the questions each pool holds.
+        self._pooled_keys: dict[tuple[str, str, str], set[str]] = {}
+        # dict.fromkeys keeps the order while dropping models that resolve to the same fallback.
+        for model in dict.fromkeys(QuizGenerator.check_model_is_supported(model) for model in models):
+            for topic in topics:
+                for difficulty in difficulties:
+                    key = self._key(model, topic, difficulty)
+                    self._requests[key] = (topic, difficulty)
+                    self._pools[key] = deque()
+                    self._pooled_keys[key] = set()
+
+        pools_per_provider: dict[str, int] = {}
+        for model, _, _ in self._pools:
+            pools_per_provider[provider_of(model)] = pools_per_provider.get(provider_of(model), 0) + 1
+        self._limiters = {
+            provider: TokenBucket(rate=refills_per_minute / 60.0, capacity=max(1, n_pools))
+            for provider, n_pools in pools_per_provider.items()
+        }
+
+        self._get_quiz_generator: Optional[Callable[[str], QuizGenerator]] = None
+        self._refilling: dict[tuple[str, str, str], asyncio.Task] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _key(model: str, topic: str, difficulty: str) -> tuple[str, str, str]:
+        return model, QuizCache.normalise_text(topic), QuizCache.normalise_text(difficulty)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def available(self, model: str, topic: str, difficulty: str) -> int:
+        """Returns how many questions the pool for (model, topic, difficulty) holds (0 if it is not pooled)."""
+        return len(self._pools.get(self._key(model, topic, difficulty), ()))
+
+    def take(
+        self, model: str, topic: str, difficulty: str, n_questions: int, exclude: Container[str] = ()
+    ) -> Optional[list[QuizQuestion]]:
+        """
+        Removes `n_questions` questions from a pool, if it can provide them all.
+
+        Args:
+            model (str): The resolved model of the request.
+            topic (str): The requested topic.
+            difficulty (str): The requested difficulty.
+            n_questions (int): Number of questions required.
+            exclude (Container[str], optional): Dedupe keys of questions the client has already been sent;
+                they are left in the pool for other clients.
+
+        Returns:
+            Optional[list[QuizQuestion]]: Copies of the questions, numbered from 1, or None if the topic is
+            not pooled or the pool cannot provide `n_questions` new questions.
+        """
+        key = self._key(model, topic, difficulty)
+        pool = self._pools.get(key)
+        if pool is None:
+            return None
+
+        selected: list[QuizQuestion] = []
+        skipped: list[QuizQuestion] = []
+        while pool and len(selected) < n_questions:
+            question = pool.popleft()
+            if question.dedupe_key in exclude:
+                skipped.append(question)
+            else:
+                selected.append(question)
+
+        if len(selected) < n_questions:
+            pool.extendleft(reversed(selected + skipped))
+            self.misses += 1
+            self._wake_worker()
+            return None
+
+        pool.extendleft(reversed(skipped))
+        self._pooled_keys[key].difference_update(question.dedupe_key for question in selected)
+        self.size -= len(selected)
+        self.hits += 1
+        if len(pool) < self.low_water:
+            self._wake_worker()
+        return [
+            dataclasses.replace(question, question_id=question_id, raw=None)
+            for question_id, question in enumerate(selected, start=1)
+        ]
+
+    def add(self, model: str, topic: str, difficulty: str, question: QuizQuestion) -> bool:
+        """
+        Adds a question to a pool, unless the pool already holds it or the memory cap is reached.
+
+        Returns:
+            bool: True if the question was added.
+        """
+        key = self._key(model, topic, difficulty)
+        pool = self._pools.get(key)
+        if pool is None or self.size >= self.max_questions:
+            return False
+        pooled_keys = self._pooled_keys[key]
+        if question.dedupe_key in pooled_keys:
+            return False
+        pool.append(question)
+        pooled_keys.add(question.dedupe_key)
+        self.size += 1
+        return True
+
+    def start(self, get_quiz_generator: Callable[[str], QuizGenerator]) -> None:
+        """
+        Starts the background refill worker. Must be called from the running event loop.
+
+        Args:
+            get_quiz_generator (Callable[[str], QuizGenerator]): Returns the generator for a model,
+                e.g. `ProviderRegistry.get_quiz_generator`.
+        """
+        self._get_quiz_generator = get_quiz_generator
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Question pool started for %d (model, topic, difficulty) pools.", len(self._pools))
+
+    async def aclose(self) -> None:
+        """Stops the worker and any refills in progress."""
+        tasks = list(self._refilling.values())
+        if self._task is not None:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._refilling.clear()
+
+    def _wake_worker(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self) -> None:
+        """Refills pools below the low-water mark, then sleeps until woken or the next refill is allowed."""
+        while True:
+            timeout = self._schedule_refills()
+            # asyncio.wait rather than wait_for: wait_for can swallow the cancellation from `aclose`
+            # when the wake-up lands at the same moment, leaving the worker running forever.
+            waiter = asyncio.ensure_future(self._wake.wait())
+            try:
+                await asyncio.wait([waiter], timeout=timeout)
+            finally:
+                waiter.cancel()
+            self._wake.clear()
+
+    def _schedule_refills(self) -> float:
+        """
+        Starts a refill for each pool below the low-water mark, emptiest first,
+        within the per-provider rate limits and the memory cap.
+
+        Returns:
+            float: Seconds until the worker should check again.
+        """
+        timeout = self.POLL_INTERVAL
+        for key, pool in sorted(self._pools.items(), key=lambda item: len(item[1])):
+            if len(pool) >= self.low_water or key in self._refilling:
+                continue
+            if self.size + self.refill_size * (len(self._refilling) + 1) > self.max_questions:
+                break
+            limiter = self._limiters[provider_of(key[0])]
+            if not limiter.try_acquire():
+                timeout = min(timeout, limiter.time_until_available())
+                continue
+            self._refilling[key] = asyncio.create_task(self._refill(key))
+        return timeout
+
+    async def _refill(self, key: tuple[str, str, str]) -> None:
+        """Generates `refill_size` questions for one pool."""
+        model = key[0]
+        topic, difficulty = self._requests[key]
+        added = 0
+        try:
+            quiz_generator = self._get_quiz_generator(model)
+            questions = await quiz_generator.agenerate_questions(topic, difficulty, self.refill_size)
+            try:
+                async for question in questions:
+                    added += self.add(model, topic, difficulty, question)
+            finally:
+                await questions.aclose()
+            logger.info(
+                "Refilled question pool for model=%r, topic=%r, difficulty=%r with %d questions.",
+                model,
+                topic,
+                difficulty,
+                added,
+            )
+        except Exception as e:
+            logger.error(
+                "Error refilling question pool for model=%r, topic=%r, difficulty=%r: %s", model, topic, difficulty, e
+            )
+        finally:
+            del self._refilling[key]
+            self._wake_worker()
@@ -0,0 +1,278 @@
+"""
+Batch quiz generation: many quizzes in one call, for bulk generation of curricula.
+
+A batch is a list of jobs, each a (topic, difficulty, n_questions, model) quiz with an id. `arun_batch` runs
+them on a pool of workers per provider, so at most `max_concurrency_per_provider` quizzes stream from each
+provider at once and throughput scales with that setting rather than with client round-trips. Results are
+yielded as each job finishes, in completion order and tagged with the job id.
+
+With a `BatchJournal`, every finished job is appended to the batch's journal file. When the same batch is
+submitted again (e.g. after a restart), its finished jobs are replayed from the journal and only the rest
+are generated.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+from collections import defaultdict, deque
+from dataclasses import asdict, dataclass, field
+from typing import TYPE_CHECKING, AsyncGenerator, Callable, Optional, Sequence
+
+from quiz_question import QuizQuestion
+
+if TYPE_CHECKING:
+    # Only for annotations: generate_quiz imports this module.
+    from generate_quiz import QuizGenerator
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class BatchJob:
+    """
+    One quiz of a batch.
+
+    Attributes:
+        job_id (str): Identifies the job in the batch's results; unique within the batch.
+        topic (str): The quiz subject.
+        difficulty (str): The quiz difficulty.
+        n_questions (int): Number of questions to generate.
+        model (str, optional): The model to use, or "any". Defaults to the default model.
+    """
+
+    job_id: str
+    topic: str
+    difficulty: str
+    n_questions: int = 10
+    model: Optional[str] = None
+
+
+@dataclass
+class BatchResult:
+    """
+    The outcome of a batch job: its questions, or the error that stopped it.
+
+    Attributes:
+        job (BatchJob): The job.
+        model (str, optional): The model that generated the quiz (resolved from "any"), if one was chosen.
+        questions (list[QuizQuestion]): The validated questions; empty if the job failed.
+        error (str, optional): Why the job failed, or None if it succeeded.
+        resumed (bool): True if the result was replayed from the batch's journal.
+    """
+
+    job: BatchJob
+    model: Optional[str] = None
+    questions: list[QuizQuestion] = field(default_factory=list)
+    error: Optional[str] = None
+    resumed: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def to_dict(self) -> dict:
+        """Returns the result as one NDJSON record: the job, its status and its questions or error."""
+        data = {
+            "job_id": self.job.job_id,
+            "status": "ok" if self.ok else "error",
+            "topic": self.job.topic,
+            "difficulty": self.job.difficulty,
+            "n_questions": self.job.n_questions,
+            "model": self.model,
+            "questions": [question.to_dict() for question in self.questions],
+            "resumed": self.resumed,
+        }
+        if not self.ok:
+            data["error"] = self.error
+        return data
+
+    def to_json(self) -> str:
+        """Returns the result as a compact JSON line, without the newline."""
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BatchResult":
+        """Rebuilds a successful result from its `to_dict` record, e.g. a journal line."""
+        job = BatchJob(data["job_id"], data["topic"], data["difficulty"], data["n_questions"], data.get("model"))
+        questions = [QuizQuestion.from_dict(question) for question in data["questions"]]
+        return cls(job, data.get("model"), [question for question in questions if question is not None])
+
+
+def make_batch_id(jobs: Sequence[BatchJob]) -> str:
+    """
+    Derives a batch id from its jobs, so a batch submitted again without an id resumes from its journal.
+
+    Returns:
+        str: The first 16 hex digits of a SHA-256 digest of the jobs.
+    """
+    return hashlib.sha256(json.dumps([asdict(job) for job in jobs]).encode()).hexdigest()[:16]
+
+
+class BatchJournal:
+    """
+    Append-only journals of finished batch jobs, one JSON Lines file per batch in `path`, so a batch
+    interrupted by a restart or a dropped connection can resume without regenerating finished quizzes.
+
+    Only successful jobs are journalled: failed jobs are tried again when the batch resumes. A line left
+    half-written by a crash is ignored.
+
+    Configured from the environment by `from_env`:
+      - BATCH_JOURNAL_PATH: Directory of the journals (default "batch_journal"; empty to disable).
+
+    Args:
+        path (str): Directory of the journals; created when the first job is journalled.
+    """
+
+    DEFAULT_PATH = "batch_journal"
+    _BATCH_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+    @classmethod
+    def from_env(cls) -> Optional["BatchJournal"]:
+        """
+        Builds a journal configured from environment variables.
+
+        Returns:
+            Optional[BatchJournal]: The journal, or None if BATCH_JOURNAL_PATH is empty.
+        """
+        path = os.getenv("BATCH_JOURNAL_PATH", cls.DEFAULT_PATH)
+        return cls(path) if path else None
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def file_for(self, batch_id: str) -> str:
+        """
+        Returns the journal file of a batch.
+
+        Raises:
+            ValueError: If the batch id is not 1-64 letters, digits, "-" or "_".
+        """
+        if not self._BATCH_ID_PATTERN.fullmatch(batch_id):
+            raise ValueError(f"Invalid batch id '{batch_id}': use 1-64 letters, digits, '-' or '_'.")
+        return os.path.join(self.path, f"{batch_id}.jsonl")
+
+    def load(self, batch_id: str) -> dict[str, BatchResult]:
+        """Returns the journalled results of a batch, by job id; empty for a new batch."""
+        results = {}
+        try:
+            with open(self.file_for(batch_id), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        result = BatchResult.from_dict(json.loads(line))
+                    except (ValueError, KeyError, TypeError):
+                        logger.warning("Skipping an unreadable line in the journal of batch %s.", batch_id)
+                        continue
+                    results[result.job.job_id] = result
+        except FileNotFoundError:
+            pass
+        return results
+
+    async def aappend(self, batch_id: str, result: BatchResult) -> None:
+        """Journals a finished job, writing on a worker thread."""
+        await asyncio.to_thread(self._append, self.file_for(batch_id), result.to_json() + "\n")
+
+    def _append(self, file: str, line: str) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        with open(file, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+async def arun_batch(
+    jobs: Sequence[BatchJob],
+    generator_for: Callable[[Optional[str]], "QuizGenerator"],
+    provider_of: Callable[[str], str],
+    max_concurrency_per_provider: int,
+    journal: Optional[BatchJournal] = None,
+    batch_id: Optional[str] = None,
+) -> AsyncGenerator[BatchResult, None]:
+    """
+    Runs a batch of quiz jobs, yielding each result as soon as its job finishes.
+
+    Jobs are grouped by the provider of their model, and each provider's jobs are run in submission order
+    by up to `max_concurrency_per_provider` workers. A failing job yields an error result and does not stop
+    the batch. With a journal, results already journalled for the batch are yielded first (marked as
+    resumed) and their jobs are not run again; new successful results are journalled before being yielded.
+    Closing the generator cancels the jobs still running.
+
+    Args:
+        jobs (Sequence[BatchJob]): The jobs; their ids must be unique.
+        generator_for (Callable[[Optional[str]], QuizGenerator]): Returns the quiz generator of a job's model.
+        provider_of (Callable[[str], str]): Returns the provider of a model, which bounds its concurrency.
+        max_concurrency_per_provider (int): Jobs run at once against each provider.
+        journal (BatchJournal, optional): Where finished jobs are journalled. Defaults to None (not resumable).
+        batch_id (str, optional): The batch's journal name. Defaults to `make_batch_id(jobs)`.
+
+    Yields:
+        BatchResult: One result per job, in completion order.
+
+    Raises:
+        ValueError: If two jobs share an id, or the batch id is invalid.
+    """
+    job_ids = [job.job_id for job in jobs]
+    if len(set(job_ids)) != len(job_ids):
+        raise ValueError("Batch job ids must be unique.")
+    batch_id = batch_id or make_batch_id(jobs)
+    journalled = journal.load(batch_id) if journal is not None else {}
+
+    pending: dict[str, deque] = defaultdict(deque)
+    unscheduled = []
+    for job in jobs:
+        if job.job_id in journalled:
+            continue
+        try:
+            quiz_generator = generator_for(job.model)
+        except ValueError as e:
+            unscheduled.append(BatchResult(job, error=str(e)))
+            continue
+        pending[provider_of(quiz_generator.model)].append((job, quiz_generator))
+
+    logger.info(
+        "Batch %s: %d jobs, %d resumed from the journal, %d to run across %d providers.",
+        batch_id,
+        len(jobs),
+        len(journalled),
+        sum(len(queue) for queue in pending.values()),
+        len(pending),
+    )
+    for job in jobs:
+        if job.job_id in journalled:
+            result = journalled[job.job_id]
+            result.resumed = True
+            yield result
+    for result in unscheduled:
+        yield result
+
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def work(queue: deque) -> None:
+        while queue:
+            job, quiz_generator = queue.popleft()
+            try:
+                questions = await quiz_generator.agenerate_question_list(job.topic, job.difficulty, job.n_questions)
+                result = BatchResult(job, quiz_generator.model, questions)
+            except Exception as e:
+                logger.warning("Batch %s: job %s failed: %s", batch_id, job.job_id, e)
+                result = BatchResult(job, quiz_generator.model, error=str(e) or type(e).__name__)
+            if journal is not None and result.ok:
+                try:
+                    await journal.aappend(batch_id, result)
+                except OSError as e:
+                    logger.error("Batch %s: could not journal job %s: %s", batch_id, job.job_id, e)
+            results.put_nowait(result)
+
+    remaining = sum(len(queue) for queue in pending.values())
+    workers = [
+        asyncio.create_task(work(queue))
+        for queue in pending.values()
+        for _ in range(max(1, min(max_concurrency_per_provider, len(queue))))
+    ]
+    try:
+        for _ in range(remaining):
+            yield await results.get()
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
@@ -0,0 +1,200 @@
+"""
+Offline bulk quiz generation: `python quiz_bulk.py topics.txt --store quizzes.sqlite3`.
+
+Reads one topic per line from a topics file (blank lines and lines starting with "#" are skipped) and
+generates a quiz for every topic, difficulty and model on a pool of async workers per provider (see
+`QuizGenerator.agenerate_batch`). Each validated quiz is written to a `QuizStore` as soon as it is finished,
+and quizzes already in the store are skipped, so an interrupted run picks up where it stopped. Throughput is
+printed at the end.
+
+Point the API server's QUIZ_STORE_PATH at the same file to serve the stored quizzes as a warm cache.
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from dataclasses import dataclass
+from typing import Optional, TextIO
+
+from dotenv import load_dotenv
+
+from generate_quiz import QuizGenerator
+from log_config import configure_logging, shutdown_logging
+from quiz_batch import BatchJob
+from quiz_cache import QuizCache
+from quiz_store import QuizStore
+from resilience import Resilience
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_PATH = "quiz_store.sqlite3"
+DEFAULT_DIFFICULTIES = ["easy", "medium", "hard"]
+
+
+@dataclass
+class BulkStats:
+    """Counts of a bulk run, printed when it ends."""
+
+    jobs: int = 0
+    skipped: int = 0
+    generated: int = 0
+    failed: int = 0
+    questions: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        """Returns the counts and throughput as one line."""
+        seconds = max(self.seconds, 1e-9)
+        return (
+            f"{self.jobs} quizzes: {self.generated} generated, {self.skipped} already stored, {self.failed} failed. "
+            f"{self.questions} questions in {self.seconds:.1f}s "
+            f"({self.generated / seconds:.2f} quizzes/s, {self.questions / seconds:.2f} questions/s)."
+        )
+
+
+def read_topics(file: TextIO) -> list[str]:
+    """Returns the topics of a topics file in order, without blank lines, comments or repeats."""
+    topics = []
+    for line in file:
+        topic = " ".join(line.split())
+        if topic and not topic.startswith("#") and topic not in topics:
+            topics.append(topic)
+    return topics
+
+
+def make_jobs(topics: list[str], difficulties: list[str], models: list[str], n_questions: int) -> list[BatchJob]:
+    """Returns one job per topic, difficulty and model, identified by its position."""
+    jobs = []
+    for topic in topics:
+        for difficulty in difficulties:
+            for model in models:
+                jobs.append(BatchJob(str(len(jobs)), topic, difficulty, n_questions, model))
+    return jobs
+
+
+async def agenerate_to_store(
+    jobs: list[BatchJob],
+    store: QuizStore,
+    quiz_generator: QuizGenerator,
+    max_concurrency_per_provider: int = QuizGenerator.DEFAULT_BATCH_CONCURRENCY,
+    stats: Optional[BulkStats] = None,
+) -> BulkStats:
+    """
+    Generates the jobs not already in the store and stores each quiz as soon as it is finished.
+
+    Args:
+        jobs (list[BatchJob]): The quizzes to generate; their models must be supported (not "any").
+        store (QuizStore): Where the quizzes are written, and which ones already exist.
+        quiz_generator (QuizGenerator): Generates the quizzes; other models get generators sharing its settings.
+        max_concurrency_per_provider (int, optional): Quizzes generated at once against each provider.
+        stats (BulkStats, optional): Counts to update as the run goes, so they survive an interruption.
+
+    Returns:
+        BulkStats: The counts of the run.
+    """
+    stats = stats if stats is not None else BulkStats()
+    started = time.perf_counter()
+    stats.jobs = len(jobs)
+    pending = [
+        job
+        for job in jobs
+        if QuizCache.make_key(job.model or quiz_generator.model, job.topic, job.difficulty, job.n_questions)
+        not in store
+    ]
+    stats.skipped = len(jobs) - len(pending)
+    logger.info("%d of %d quizzes are already stored; generating %d.", stats.skipped, len(jobs), len(pending))
+
+    results = quiz_generator.agenerate_batch(pending, max_concurrency_per_provider=max_concurrency_per_provider)
+    try:
+        async for result in results:
+            job = result.job
+            if not result.ok or not result.questions:
+                stats.failed += 1
+                logger.error("Failed: %r (%s, %s): %s", job.topic, job.difficulty, result.model, result.error)
+                continue
+            await asyncio.to_thread(
+                store.put, result.model, job.topic, job.difficulty, job.n_questions, result.questions
+            )
+            stats.generated += 1
+            stats.questions += len(result.questions)
+            logger.info(
+                "Stored %d questions: %r (%s, %s).", len(result.questions), job.topic, job.difficulty, result.model
+            )
+    finally:
+        await results.aclose()
+        stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="quiz_bulk.py",
+        description="Generate quizzes for every topic in a file into a quiz store the API server can serve.",
+    )
+    parser.add_argument("topics", type=argparse.FileType("r", encoding="utf-8"), help="File of topics, one per line")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help=f"Quiz store file (default {DEFAULT_STORE_PATH})")
+    parser.add_argument(
+        "--difficulty",
+        action="append",
+        dest="difficulties",
+        help=f"Difficulty to generate; repeat for several (default {', '.join(DEFAULT_DIFFICULTIES)})",
+    )
+    parser.add_argument(
+        "--model",
+        action="append",
+        dest="models",
+        choices=QuizGenerator.SUPPORTED_MODELS,
+        help=f"Model to generate with; repeat for several (default {QuizGenerator.DEFAULT_MODEL})",
+    )
+    parser.add_argument("--n-questions", type=int, default=10, help="Questions per quiz (default 10)")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=QuizGenerator.DEFAULT_BATCH_CONCURRENCY,
+        help=f"Quizzes generated at once per provider (default {QuizGenerator.DEFAULT_BATCH_CONCURRENCY})",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Runs the bulk generation command.
+
+    Returns:
+        int: The exit status: 0 if every quiz is stored, 1 if any failed, 2 if no API key is set, 130 if interrupted.
+    """
+    args = parse_args(argv)
+    load_dotenv()
+    configure_logging()
+    with args.topics:
+        topics = read_topics(args.topics)
+    models = args.models or [QuizGenerator.DEFAULT_MODEL]
+    jobs = make_jobs(topics, args.difficulties or DEFAULT_DIFFICULTIES, models, args.n_questions)
+
+    try:
+        quiz_generator = QuizGenerator(model=models[0], resilience=Resilience.from_env())
+    except ValueError as e:
+        shutdown_logging()
+        print(f"quiz_bulk.py: {e}", file=sys.stderr)
+        return 2
+
+    store = QuizStore(args.store)
+    stats = BulkStats()
+    status = 0
+    try:
+        asyncio.run(agenerate_to_store(jobs, store, quiz_generator, args.concurrency, stats))
+        status = 1 if stats.failed else 0
+    except KeyboardInterrupt:
+        logger.warning("Interrupted; the quizzes stored so far are kept and skipped by the next run.")
+        status = 130
+    finally:
+        store.close()
+        shutdown_logging()
+    print(stats.summary())
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from quiz_question import QuizQuestion
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryQuizCache:
+    """
+    An in-process LRU cache of quizzes with a TTL.
+
+    Entries are kept in an OrderedDict in least- to most-recently-used order; reading an entry
+    moves it to the end and inserting past `max_entries` evicts from the front. Expired entries
+    are removed when they are read. The cache is lost when the worker restarts.
+
+    Args:
+        max_entries (int): Maximum number of quizzes kept.
+        ttl (float): Seconds a quiz stays valid after it is stored.
+        clock (Callable[[], float], optional): Time source, replaceable in tests. Defaults to time.time.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, clock: Callable[[], float] = time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[float, list[QuizQuestion]]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[list[QuizQuestion]]:
+        """Returns the questions stored under `key`, or None if missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, questions = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return questions
+
+    def set(self, key: str, questions: list[QuizQuestion]) -> None:
+        """Stores `questions` under `key`, evicting the least recently used quizzes if the cache is full."""
+        self._entries[key] = (self._clock() + self.ttl, list(questions))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Removes every entry."""
+        self._entries.clear()
+
+    def close(self) -> None:
+        """Nothing to release for the in-memory backend."""
+
+
+class SQLiteQuizCache:
+    """
+    A quiz cache stored in a local SQLite file, so hot quizzes survive restarts and are shared
+    by the workers of one host.
+
+    Questions are stored as a JSON array. Each row records when it expires and when it was last read;
+    inserting past `max_entries` deletes the least recently read rows. Expired rows are removed when read.
+
+    Args:
+        path (str): Path to the SQLite database file (created if missing).
+        max_entries (int): Maximum number of quizzes kept.
+        ttl (float): Seconds a quiz stays valid after it is stored.
+        clock (Callable[[], float], optional): Time source, replaceable in tests. Defaults to time.time.
+    """
+
+    def __init__(self, path: str, max_entries: int, ttl: float, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Autocommit mode; every statement below is a single short transaction.
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS quiz_cache ("
+            "key TEXT PRIMARY KEY, questions TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS quiz_cache_accessed_at ON quiz_cache (accessed_at)")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM quiz_cache").fetchone()[0]
+
+    def get(self, key: str) -> Optional[list[QuizQuestion]]:
+        """Returns the questions stored under `key`, or None if missing or expired."""
+        now = self._clock()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT questions, expires_at FROM quiz_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._connection.execute("DELETE FROM quiz_cache WHERE key = ?", (key,))
+                return None
+            self._connection.execute("UPDATE quiz_cache SET accessed_at = ? WHERE key = ?", (now, key))
+
+        questions = [QuizQuestion.from_dict(data) for data in json.loads(row[0])]
+        return [question for question in questions if question is not None]
+
+    def set(self, key: str, questions: list[QuizQuestion]) -> None:
+        """Stores `questions` under `key`, evicting the least recently used quizzes if the cache is full."""
+        now = self._clock()
+        payload = json.dumps([question.to_dict() for question in questions], ensure_ascii=False)
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO quiz_cache (key, questions, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, payload, now + self.ttl, now),
+            )
+            self._connection.execute(
+                "DELETE FROM quiz_cache WHERE key IN "
+                "(SELECT key FROM quiz_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self) -> None:
+        """Removes every entry."""
+        with self._lock:
+            self._connection.execute("DELETE FROM quiz_cache")
+
+    def close(self) -> None:
+        """Closes the database connection."""
+        with self._lock:
+            self._connection.close()
+
+
+class QuizCache:
+    """
+    Caches validated quizzes under a content-addressed key, so repeat requests for popular topics
+    replay instantly instead of calling the LLM again.
+
+    The key is a SHA-256 digest of the model, topic, difficulty and number of questions, with topic and
+    difficulty normalised (case-folded, whitespace collapsed) so "UK History" and " uk  history" share
+    an entry. Storage is delegated to a backend: InMemoryQuizCache or SQLiteQuizCache.
+
+    With a `QuizStore` of quizzes generated offline (QUIZ_STORE_PATH, see quiz_bulk.py), a miss in the backend
+    is looked up in the store, and a stored quiz is copied into the backend and served: the store is a warm,
+    read-only layer under the cache that never expires.
+
+    Configured from the environment by `from_env`:
+      - QUIZ_CACHE_BACKEND: "memory" (default), "sqlite", or "none" to disable caching.
+      - QUIZ_CACHE_MAX_ENTRIES: Maximum number of quizzes kept (default 1000).
+      - QUIZ_CACHE_TTL_SECONDS: Seconds a cached quiz is served for (default 86400).
+      - QUIZ_CACHE_PATH: SQLite database file for the "sqlite" backend (default "quiz_cache.sqlite3").
+
+    Attributes:
+        hits (int): Lookups answered from the cache.
+        misses (int): Lookups that found nothing.
+    """
+
+    BACKEND_MEMORY = "memory"
+    BACKEND_SQLITE = "sqlite"
+    BACKEND_NONE = "none"
+
+    DEFAULT_MAX_ENTRIES = 1000
+    DEFAULT_TTL = 24 * 60 * 60.0
+    DEFAULT_SQLITE_PATH = "quiz_cache.sqlite3"
+
+    @classmethod
+    def from_env(cls, store=None) -> Optional["QuizCache"]:
+        """
+        Builds a cache configured from environment variables.
+
+        Args:
+            store (QuizStore, optional): Quizzes generated offline, served on a miss. Defaults to None.
+
+        Returns:
+            Optional[QuizCache]: The cache, or None if QUIZ_CACHE_BACKEND is "none".
+
+        Raises:
+            ValueError: If QUIZ_CACHE_BACKEND names an unknown backend.
+        """
+        backend_name = os.getenv("QUIZ_CACHE_BACKEND", cls.BACKEND_MEMORY).strip().lower()
+        max_entries = int(os.getenv("QUIZ_CACHE_MAX_ENTRIES", cls.DEFAULT_MAX_ENTRIES))
+        ttl = float(os.getenv("QUIZ_CACHE_TTL_SECONDS", cls.DEFAULT_TTL))
+
+        if backend_name == cls.BACKEND_NONE:
+            if store is not None:
+                logger.warning("QUIZ_CACHE_BACKEND is 'none': the quiz store is not used.")
+                store.close()
+            return None
+        if backend_name == cls.BACKEND_MEMORY:
+            backend = InMemoryQuizCache(max_entries=max_entries, ttl=ttl)
+        elif backend_name == cls.BACKEND_SQLITE:
+            path = os.getenv("QUIZ_CACHE_PATH", cls.DEFAULT_SQLITE_PATH)
+            backend = SQLiteQuizCache(path, max_entries=max_entries, ttl=ttl)
+        else:
+            raise ValueError(
+                f"Unsupported QUIZ_CACHE_BACKEND '{backend_name}'. "
+                f"Choose one of: {cls.BACKEND_MEMORY}, {cls.BACKEND_SQLITE}, {cls.BACKEND_NONE}"
+            )
+        return cls(backend, store)
+
+    def __init__(self, backend, store=None):
+        """
+        Args:
+            backend: An InMemoryQuizCache, SQLiteQuizCache, or any object with the same get/set/clear/close methods.
+            store (QuizStore, optional): Quizzes generated offline, looked up on a miss in the backend.
+                Defaults to None.
+        """
+        self.backend = backend
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        # Hits answered from the store rather than the backend (included in `hits`).
+        self.store_hits = 0
+
+    @staticmethod
+    def normalise_text(text: str) -> str:
+        """Case-folds text and collapses runs of whitespace, so trivially different topics match."""
+        return " ".join(text.split()).casefold()
+
+    @staticmethod
+    def make_key(model: str, topic: str, difficulty: str, n_questions: int) -> str:
+        """
+        Builds the cache key for a quiz request.
+
+        Example:
+            >>> QuizCache.make_key("gpt-3.5-turbo", "UK History", "easy", 3) == QuizCache.make_key(
+            ...     "gpt-3.5-turbo", "  uk   history ", "Easy", 3
+            ... )
+            True
+
+        Returns:
+            str: A hex SHA-256 digest of the normalised request.
+        """
+        normalised = [model, QuizCache.normalise_text(topic), QuizCache.normalise_text(difficulty), n_questions]
+        return hashlib.sha256(json.dumps(normalised).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[list[QuizQuestion]]:
+        """
+        Looks up a quiz.
+
+        Args:
+            key (str): A key from `make_key`.
+
+        Returns:
+            Optional[list[QuizQuestion]]: The cached questions, or None on a miss.
+        """
+        try:
+            questions = self.backend.get(key)
+        except Exception as e:
+            # A broken cache must never fail the request; fall back to generating the quiz.
+            logger.error("Error reading from the quiz cache: %s", e)
+            questions = None
+        if questions:
+            self.hits += 1
+            return questions
+        if self.store is not None:
+            try:
+                questions = self.store.get(key)
+            except Exception as e:
+                logger.error("Error reading from the quiz store: %s", e)
+                questions = None
+            if questions:
+                self.hits += 1
+                self.store_hits += 1
+                self.set(key, questions)
+                return questions
+        self.misses += 1
+        return None
+
+    def set(self, key: str, questions: list[QuizQuestion]) -> None:
+        """
+        Stores a quiz. Empty quizzes are not cached.
+
+        Args:
+            key (str): A key from `make_key`.
+            questions (list[QuizQuestion]): The validated questions, in order.
+        """
+        if not questions:
+            return
+        try:
+            self.backend.set(key, questions)
+        except Exception as e:
+            logger.error("Error writing to the quiz cache: %s", e)
+
+    def close(self) -> None:
+        """Releases the backend's and the store's resources."""
+        self.backend.close()
+        if self.store is not None:
+            self.store.close()
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+from typing import AsyncGenerator, Awaitable, Callable, Optional
+
+from quiz_question import QuizQuestion
+
+logger = logging.getLogger(__name__)
+
+# Starts an upstream quiz stream, returning its validated questions.
+QuestionStreamFactory = Callable[[], Awaitable[AsyncGenerator[QuizQuestion, None]]]
+
+
+class _Flight:
+    """
+    One upstream quiz stream shared by every request for the same key.
+
+    A background task drains the upstream stream into `questions`, which doubles as the replay buffer:
+    each subscriber keeps its own position in it, so late joiners start from the first question and a
+    slow subscriber never holds up the upstream stream or the other subscribers.
+    """
+
+    def __init__(self, key: str, start: QuestionStreamFactory, on_finished: Callable[["_Flight"], None]):
+        self.key = key
+        self.questions: list[QuizQuestion] = []
+        self.subscribers = 0
+        self.done = False
+        self.error: Optional[Exception] = None
+        self.started: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._start = start
+        self._on_finished = on_finished
+        self._changed = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        """Starts the upstream stream and buffers its questions until it ends, fails or is cancelled."""
+        questions = None
+        try:
+            questions = await self._start()
+            self.started.set_result(None)
+            async for question in questions:
+                self.questions.append(question)
+                self._notify()
+        except asyncio.CancelledError:
+            logger.info("Cancelled upstream quiz stream %s after %d questions.", self.key[:12], len(self.questions))
+            raise
+        except Exception as e:
+            self.error = e
+            if not self.started.done():
+                self.started.set_exception(e)
+            else:
+                logger.error("Upstream quiz stream %s failed: %s", self.key[:12], e)
+        finally:
+            if not self.started.done():
+                self.started.cancel()
+            if questions is not None:
+                await questions.aclose()
+            self.done = True
+            self._notify()
+            self._on_finished(self)
+
+    def _notify(self) -> None:
+        """Wakes every subscriber waiting for the next question."""
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def iterate(self) -> AsyncGenerator[QuizQuestion, None]:
+        """
+        Yields every question of the flight, replaying buffered ones first. Ends the subscription when closed.
+
+        Raises:
+            Exception: The upstream error, if the stream failed part-way.
+        """
+        index = 0
+        try:
+            while True:
+                if index < len(self.questions):
+                    yield self.questions[index]
+                    index += 1
+                elif self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                else:
+                    await self._changed.wait()
+        finally:
+            self.leave()
+
+    def leave(self) -> None:
+        """Removes a subscriber, cancelling the upstream stream once nobody is left to read it."""
+        self.subscribers -= 1
+        if self.subscribers == 0 and not self.done:
+            self._task.cancel()
+
+
+class QuizCoalescer:
+    """
+    Coalesces identical concurrent quiz requests onto one upstream LLM stream (single flight).
+
+    The first request for a key starts the upstream stream; requests for the same key that arrive while
+    it is running subscribe to it instead of starting their own. Questions already emitted are replayed
+    to them from the flight's buffer, then new ones are broadcast as they arrive. Each subscriber reads
+    at its own pace, so a slow client does not stall the others.
+
+    The upstream stream is cancelled only once every subscriber has disconnected. When it completes, the
+    flight is forgotten: later requests start a new stream (or hit the quiz cache).
+
+    Note that a subscription is counted from the moment `join` returns, so a caller must iterate (or close)
+    the returned generator; a generator that is never started keeps the upstream stream running until it ends.
+
+    Attributes:
+        flights_started (int): Upstream streams started.
+        requests_coalesced (int): Requests that joined a stream started by an earlier request.
+    """
+
+    def __init__(self):
+        self._flights: dict[str, _Flight] = {}
+        self.flights_started = 0
+        self.requests_coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def join(self, key: str, start: QuestionStreamFactory) -> AsyncGenerator[QuizQuestion, None]:
+        """
+        Subscribes to the upstream stream for `key`, starting it with `start` if none is running.
+
+        Waits until the upstream stream has been created, so errors starting it are raised here
+        (to every subscriber) rather than part-way through the response.
+
+        Args:
+            key (str): Identifies identical requests, e.g. from `QuizCache.make_key`.
+            start (QuestionStreamFactory): Async callable that starts the upstream stream and returns its questions.
+
+        Returns:
+            AsyncGenerator[QuizQuestion, None]: The flight's questions, from the first one.
+
+        Raises:
+            Exception: Whatever `start` raised.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(key, start, self._forget)
+            self._flights[key] = flight
+            self.flights_started += 1
+        else:
+            self.requests_coalesced += 1
+            logger.info("Joining in-flight quiz stream %s (%d subscribers).", key[:12], flight.subscribers)
+
+        flight.subscribers += 1
+        try:
+            # Shielded so a waiter being cancelled does not cancel the start shared with other subscribers.
+            await asyncio.shield(flight.started)
+        except BaseException:
+            flight.leave()
+            raise
+        return flight.iterate()
+
+    def _forget(self, flight: _Flight) -> None:
+        """Removes a finished flight so later requests start a new one."""
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
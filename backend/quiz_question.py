@@ -0,0 +1,200 @@
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+try:
+    # Optional fast JSON backend; the stdlib json module is used when it is not installed.
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# The multiple-choice option keys every question must provide.
+OPTION_KEYS = ("A", "B", "C")
+
+# Answers such as "b", "(B)", "B)", "B.", "Option B" or "B: Augustus".
+_ANSWER_PATTERN = re.compile(r"^\(?(?:option\s+)?([ABC])(?:\)|\.|:|\s|-|$)", re.IGNORECASE)
+
+
+def _clean_text(value: Any) -> Optional[str]:
+    """Returns a stripped string for text-like values (numbers are stringified), otherwise None."""
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return None
+
+
+def _normalise_answer(value: Any, options: list[str]) -> Optional[str]:
+    """Resolves an answer to "A", "B" or "C", from a letter-like answer or the text of an option."""
+    answer = _clean_text(value)
+    if not answer:
+        return None
+    match = _ANSWER_PATTERN.match(answer)
+    if match:
+        return match.group(1).upper()
+    folded = answer.casefold()
+    for key, option in zip(OPTION_KEYS, options):
+        if option.casefold() == folded:
+            return key
+    return None
+
+
+@dataclass(slots=True)
+class QuizQuestion:
+    """
+    A validated, normalised quiz question.
+
+    The fields match the JSON the frontend expects (see `QuizGenerator.EXAMPLE_RESPONSE`).
+    `raw` optionally holds the model's original JSON text for the question; it is only set when that
+    text already matches the normalised record, so `to_json` can reuse it instead of re-serialising.
+
+    Example:
+        >>> question = QuizQuestion.from_dict({"question": "2+2?", "A": "3", "B": "4", "C": "5", "answer": "b)"})
+        >>> question.answer
+        'B'
+    """
+
+    question_id: int
+    question: str
+    A: str
+    B: str
+    C: str
+    answer: str
+    explanation: str = ""
+    wikipedia: str = ""
+    raw: Optional[str] = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def from_dict(cls, data: Any) -> Optional["QuizQuestion"]:
+        """
+        Validates and normalises a parsed JSON value into a QuizQuestion.
+
+        - `question`, `A`, `B` and `C` must be non-empty text; whitespace is stripped.
+        - `answer` is normalised to "A", "B" or "C" (accepting e.g. "b", "(B)", "Option B" or an option's text).
+        - `explanation` and `wikipedia` are optional; a `wikipedia` value that is not an http(s) URL is dropped.
+        - A missing or non-integer `question_id` becomes 0; callers renumber questions anyway.
+
+        Args:
+            data: A value parsed from the model's JSON output.
+
+        Returns:
+            Optional[QuizQuestion]: The normalised question, or None if it cannot be repaired.
+        """
+        if not isinstance(data, dict):
+            return None
+
+        question = _clean_text(data.get("question"))
+        options = [_clean_text(data.get(key)) for key in OPTION_KEYS]
+        if not question or not all(options):
+            return None
+
+        answer = _normalise_answer(data.get("answer"), options)
+        if answer is None:
+            return None
+
+        wikipedia = _clean_text(data.get("wikipedia")) or ""
+        if not wikipedia.startswith(("https://", "http://")):
+            wikipedia = ""
+
+        question_id = data.get("question_id")
+        if not isinstance(question_id, int) or isinstance(question_id, bool):
+            question_id = 0
+
+        return cls(
+            question_id=question_id,
+            question=question,
+            A=options[0],
+            B=options[1],
+            C=options[2],
+            answer=answer,
+            explanation=_clean_text(data.get("explanation")) or "",
+            wikipedia=wikipedia,
+        )
+
+    @property
+    def dedupe_key(self) -> str:
+        """Identifies repeats of the same question: its text, compared case-insensitively."""
+        return self.question.casefold()
+
+    def to_dict(self) -> dict:
+        """Returns the question as the dictionary sent to the frontend."""
+        return {
+            "question_id": self.question_id,
+            "question": self.question,
+            "A": self.A,
+            "B": self.B,
+            "C": self.C,
+            "answer": self.answer,
+            "explanation": self.explanation,
+            "wikipedia": self.wikipedia,
+        }
+
+    def to_json(self) -> str:
+        """Returns the question as compact JSON text, reusing the original text when it is still accurate."""
+        if self.raw is None:
+            if orjson is not None:
+                self.raw = orjson.dumps(self.to_dict()).decode()
+            else:
+                self.raw = json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":"))
+        return self.raw
+
+
+class QuizQuestionValidator:
+    """
+    Validates the questions of one quiz stream as they arrive.
+
+    Each item is normalised with `QuizQuestion.from_dict`; items that cannot be repaired and repeats of
+    an earlier question (compared case-insensitively) are dropped without stopping the stream.
+    Accepted questions are renumbered `start_id, start_id + 1, ...` so ids are unique and sequential.
+
+    One validator is created per stream.
+
+    Attributes:
+        accepted (int): Number of questions accepted so far.
+        dropped (int): Number of invalid or duplicate items dropped so far.
+    """
+
+    __slots__ = ("_seen", "_next_id", "accepted", "dropped")
+
+    def __init__(self, start_id: int = 1):
+        self._seen: set[str] = set()
+        self._next_id = start_id
+        self.accepted = 0
+        self.dropped = 0
+
+    def validate(self, data: Any, raw: Optional[str] = None) -> Optional[QuizQuestion]:
+        """
+        Validates, normalises and renumbers one parsed item.
+
+        Args:
+            data: A value parsed from the model's JSON output.
+            raw (str, optional): The JSON text `data` was parsed from. It is kept on the question when
+                normalisation and renumbering left the item unchanged, so it can be emitted as-is.
+
+        Returns:
+            Optional[QuizQuestion]: The accepted question, or None if the item was dropped.
+        """
+        question = QuizQuestion.from_dict(data)
+        if question is None:
+            self.dropped += 1
+            logger.debug("Dropping invalid quiz question.")
+            return None
+
+        key = question.dedupe_key
+        if key in self._seen:
+            self.dropped += 1
+            logger.debug("Dropping duplicate quiz question: %r", question.question)
+            return None
+        self._seen.add(key)
+
+        question.question_id = self._next_id
+        self._next_id += 1
+        self.accepted += 1
+
+        if raw is not None and question.to_dict() == data:
+            question.raw = raw
+        return question
@@ -0,0 +1,148 @@
+import asyncio
+import dataclasses
+import logging
+import re
+from typing import AsyncGenerator, Sequence
+
+from quiz_question import QuizQuestion
+
+logger = logging.getLogger(__name__)
+
+# Words compared by the near-duplicate check: runs of letters and digits, punctuation ignored.
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def split_questions(n_questions: int, shards: int, min_questions_per_shard: int = 1) -> list[int]:
+    """
+    Splits a quiz into shard sizes that differ by at most one question.
+
+    Fewer shards are used when there are not enough questions to give each one `min_questions_per_shard`.
+
+    Example:
+        >>> split_questions(10, 3)
+        [4, 3, 3]
+        >>> split_questions(10, 4, min_questions_per_shard=5)
+        [5, 5]
+
+    Args:
+        n_questions (int): Number of questions in the quiz.
+        shards (int): Maximum number of shards.
+        min_questions_per_shard (int, optional): Smallest shard worth a separate LLM call. Defaults to 1.
+
+    Returns:
+        list[int]: The number of questions asked of each shard, largest first.
+    """
+    shards = max(1, min(shards, n_questions // max(1, min_questions_per_shard)))
+    size, remainder = divmod(n_questions, shards)
+    return [size + 1 if i < remainder else size for i in range(shards)]
+
+
+class NearDuplicateFilter:
+    """
+    Drops questions that are near-duplicates of one already accepted.
+
+    Shards generate their questions independently, so two of them may ask the same thing in slightly
+    different words. Two questions are near-duplicates when the Jaccard similarity of their (case-folded)
+    word sets reaches `threshold`. Each question is compared with every accepted one, which is cheap for
+    the few dozen questions in a quiz.
+
+    Example:
+        >>> duplicates = NearDuplicateFilter()
+        >>> q = QuizQuestion(1, "Who was the first emperor of Rome?", "a", "b", "c", "B")
+        >>> duplicates.accept(q)
+        True
+        >>> duplicates.accept(dataclasses.replace(q, question="Who was Rome's first emperor?"))
+        True
+        >>> duplicates.accept(dataclasses.replace(q, question="Who was the first Emperor of Rome ?"))
+        False
+
+    Args:
+        threshold (float, optional): Similarity from which questions count as duplicates. Defaults to 0.8.
+    """
+
+    DEFAULT_THRESHOLD = 0.8
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self.dropped = 0
+        self._accepted: list[frozenset[str]] = []
+
+    @staticmethod
+    def _words(question: QuizQuestion) -> frozenset[str]:
+        return frozenset(_WORD_PATTERN.findall(question.question.casefold()))
+
+    def accept(self, question: QuizQuestion) -> bool:
+        """
+        Records a question unless it is a near-duplicate of one accepted earlier.
+
+        Returns:
+            bool: True if the question is new.
+        """
+        words = self._words(question)
+        for accepted in self._accepted:
+            union = len(words | accepted)
+            if union and len(words & accepted) / union >= self.threshold:
+                self.dropped += 1
+                logger.debug("Dropping near-duplicate quiz question: %r", question.question)
+                return False
+        self._accepted.append(words)
+        return True
+
+
+async def amerge_questions(
+    streams: Sequence[AsyncGenerator[QuizQuestion, None]], threshold: float = NearDuplicateFilter.DEFAULT_THRESHOLD
+) -> AsyncGenerator[QuizQuestion, None]:
+    """
+    Merges the question streams of a sharded quiz into one, in arrival order.
+
+    Every stream is drained concurrently by its own task, so a question is yielded as soon as any shard
+    produces it. Near-duplicates across shards are dropped and the remaining questions are renumbered
+    1, 2, ... in the order they are yielded. If a shard fails, the error is raised once the questions
+    that arrived before it have been yielded. Closing the merged stream closes every shard's stream.
+
+    Args:
+        streams (Sequence[AsyncGenerator[QuizQuestion, None]]): Validated questions of each shard.
+        threshold (float, optional): Near-duplicate similarity threshold (see `NearDuplicateFilter`).
+
+    Yields:
+        QuizQuestion: Copies of the accepted questions, numbered globally.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    # Put on the queue by a shard's task when its stream is exhausted.
+    finished = object()
+
+    async def drain(stream: AsyncGenerator[QuizQuestion, None]) -> None:
+        try:
+            async for question in stream:
+                queue.put_nowait(question)
+            queue.put_nowait(finished)
+        except Exception as e:
+            queue.put_nowait(e)
+        finally:
+            await stream.aclose()
+
+    tasks = [asyncio.create_task(drain(stream)) for stream in streams]
+    duplicates = NearDuplicateFilter(threshold)
+    question_id = 0
+    try:
+        remaining = len(tasks)
+        while remaining:
+            item = await queue.get()
+            if item is finished:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            elif duplicates.accept(item):
+                question_id += 1
+                # The shard's original JSON text carries its own numbering, so it cannot be reused.
+                yield dataclasses.replace(item, question_id=question_id, raw=None)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info(
+            "Merged %d quiz shards into %d questions, dropped %d near-duplicates.",
+            len(tasks),
+            question_id,
+            duplicates.dropped,
+        )
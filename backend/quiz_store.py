@@ -0,0 +1,134 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Callable, Optional
+
+from quiz_cache import QuizCache
+from quiz_question import QuizQuestion
+
+logger = logging.getLogger(__name__)
+
+
+class QuizStore:
+    """
+    A durable store of generated quizzes in a local SQLite file, filled offline by the bulk generation
+    command (see quiz_bulk.py) and read by the API server as a warm cache (see `QuizCache`).
+
+    - Quizzes are keyed by `QuizCache.make_key`, so a stored quiz answers exactly the requests the quiz cache
+      would; the model, topic, difficulty and number of questions are also kept, indexed on
+      (topic, difficulty, model) for listing what has been generated.
+    - The store is append-only: a quiz is never replaced or expired once stored, so a run that is interrupted
+      and started again skips the quizzes already stored.
+    - Questions are stored as zlib-compressed JSON, about a third of their size as text.
+
+    Configured from the environment by `from_env`:
+      - QUIZ_STORE_PATH: SQLite database file of the store (default unset: no store).
+
+    Safe to share between threads: statements are serialised by a lock.
+
+    Args:
+        path (str): Path to the SQLite database file (created if missing).
+        clock (Callable[[], float], optional): Time source, replaceable in tests. Defaults to time.time.
+    """
+
+    # zlib level: the store is written once and read many times, so favour size over speed.
+    COMPRESSION_LEVEL = 9
+
+    @classmethod
+    def from_env(cls) -> Optional["QuizStore"]:
+        """
+        Opens the store configured by QUIZ_STORE_PATH.
+
+        Returns:
+            Optional[QuizStore]: The store, or None if QUIZ_STORE_PATH is not set.
+        """
+        path = os.getenv("QUIZ_STORE_PATH")
+        return cls(path) if path else None
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time):
+        self.path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Autocommit mode; every statement below is a single short transaction.
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS quizzes ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, topic TEXT NOT NULL, difficulty TEXT NOT NULL, "
+            "n_questions INTEGER NOT NULL, questions BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS quizzes_topic_difficulty_model ON quizzes (topic, difficulty, model)"
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM quizzes").fetchone()[0]
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return self._connection.execute("SELECT 1 FROM quizzes WHERE key = ?", (key,)).fetchone() is not None
+
+    def get(self, key: str) -> Optional[list[QuizQuestion]]:
+        """Returns the questions stored under `key`, or None if there are none."""
+        with self._lock:
+            row = self._connection.execute("SELECT questions FROM quizzes WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        questions = [QuizQuestion.from_dict(data) for data in json.loads(zlib.decompress(row[0]))]
+        return [question for question in questions if question is not None]
+
+    def put(self, model: str, topic: str, difficulty: str, n_questions: int, questions: list[QuizQuestion]) -> bool:
+        """
+        Stores a quiz, unless a quiz is already stored for the same request.
+
+        Returns:
+            bool: True if the quiz was stored, False if it was already there or has no questions.
+        """
+        if not questions:
+            return False
+        key = QuizCache.make_key(model, topic, difficulty, n_questions)
+        payload = json.dumps([question.to_dict() for question in questions], ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT OR IGNORE INTO quizzes (key, model, topic, difficulty, n_questions, questions, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    model,
+                    QuizCache.normalise_text(topic),
+                    QuizCache.normalise_text(difficulty),
+                    n_questions,
+                    zlib.compress(payload.encode(), self.COMPRESSION_LEVEL),
+                    self._clock(),
+                ),
+            )
+        return cursor.rowcount == 1
+
+    def find(self, topic: str, difficulty: Optional[str] = None, model: Optional[str] = None) -> list[dict]:
+        """
+        Lists the quizzes stored for a topic, optionally only of one difficulty and model.
+
+        Returns:
+            list[dict]: {"key", "model", "topic", "difficulty", "n_questions"} for each quiz, oldest first.
+        """
+        query = "SELECT key, model, topic, difficulty, n_questions FROM quizzes WHERE topic = ?"
+        params = [QuizCache.normalise_text(topic)]
+        if difficulty is not None:
+            query += " AND difficulty = ?"
+            params.append(QuizCache.normalise_text(difficulty))
+        if model is not None:
+            query += " AND model = ?"
+            params.append(model)
+        with self._lock:
+            rows = self._connection.execute(query + " ORDER BY created_at", params).fetchall()
+        return [dict(zip(("key", "model", "topic", "difficulty", "n_questions"), row)) for row in rows]
+
+    def close(self) -> None:
+        """Closes the database connection."""
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,62 @@
+import time
+from typing import Callable
+
+
+class TokenBucket:
+    """
+    A token-bucket rate limiter.
+
+    The bucket holds up to `capacity` tokens and refills continuously at `rate` tokens per second.
+    Each permitted action takes one token, so `capacity` actions can burst at once and the long-run
+    rate is bounded by `rate`. Not thread-safe: use it from the event loop.
+
+    Example:
+        >>> bucket = TokenBucket(rate=0.1, capacity=1)
+        >>> bucket.try_acquire()
+        True
+        >>> bucket.try_acquire()
+        False
+
+    Args:
+        rate (float): Tokens added per second.
+        capacity (float): Maximum tokens held; the bucket starts full.
+        clock (Callable[[], float], optional): Time source, replaceable in tests. Defaults to time.monotonic.
+    """
+
+    __slots__ = ("rate", "capacity", "_tokens", "_updated", "_clock")
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """
+        Takes `tokens` from the bucket if it holds enough.
+
+        Returns:
+            bool: True if the tokens were taken, False if the caller should wait.
+        """
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    def time_until_available(self, tokens: float = 1.0) -> float:
+        """
+        Returns the seconds until `tokens` can be taken (0 if they can be taken now).
+        """
+        self._refill()
+        if self._tokens >= tokens:
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (tokens - self._tokens) / self.rate
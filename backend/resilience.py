@@ -0,0 +1,385 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+from lazy_imports import lazy_import
+
+# Imported on first use; see lazy_imports.py.
+openai = lazy_import("openai")
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# HTTP statuses worth retrying: request timeout, conflict, rate limited, and server errors.
+_RETRYABLE_STATUSES = (408, 409, 429)
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a provider whose circuit breaker is open.
+
+    Attributes:
+        provider (str): The provider that is failing.
+        retry_after (float): Seconds until the breaker lets a trial request through.
+    """
+
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(f"Provider '{provider}' is failing; not calling it for another {retry_after:.0f}s.")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class ProviderTimeoutError(TimeoutError):
+    """Raised when a provider does not connect, start streaming or send the next chunk in time."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Returns True for errors a retry may fix: timeouts, connection errors, rate limits and server errors.
+    Client errors such as a bad request or an invalid API key are not retried.
+    """
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError, openai.APIConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return isinstance(status, int) and (status in _RETRYABLE_STATUSES or status >= 500)
+
+
+@dataclass(frozen=True)
+class Timeouts:
+    """
+    Timeouts for one provider, in seconds.
+
+    Attributes:
+        connect (float): To send a request and receive the response headers (the stream object).
+        first_token (float): From opening a stream to its first chunk.
+        idle (float): Between two chunks of a stream.
+    """
+
+    connect: float = 10.0
+    first_token: float = 30.0
+    idle: float = 15.0
+
+
+class RetryPolicy:
+    """
+    Bounded retries with "full jitter" exponential backoff: the delay before retry `n` (from 0) is drawn
+    uniformly from [0, min(max_delay, base_delay * 2**n)], so clients recovering from an outage spread out.
+
+    Args:
+        max_attempts (int, optional): Total attempts, including the first.
+        base_delay (float, optional): Backoff ceiling before the first retry, in seconds.
+        max_delay (float, optional): Largest backoff ceiling, in seconds.
+        random (Callable[[], float], optional): Source of uniform [0, 1) numbers, replaceable in tests.
+    """
+
+    DEFAULT_MAX_ATTEMPTS = 3
+    DEFAULT_BASE_DELAY = 0.25
+    DEFAULT_MAX_DELAY = 4.0
+
+    def __init__(
+        self,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        base_delay: float = DEFAULT_BASE_DELAY,
+        max_delay: float = DEFAULT_MAX_DELAY,
+        random: Callable[[], float] = random.random,
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._random = random
+
+    def delay(self, retry: int) -> float:
+        """Returns the seconds to wait before retry number `retry` (0 for the first retry)."""
+        return self._random() * min(self.max_delay, self.base_delay * 2**retry)
+
+
+class CircuitBreaker:
+    """
+    Fails fast while a provider's recent error rate is too high.
+
+    The breaker keeps the outcomes of the last `window` calls. While closed, it opens once at least
+    `min_calls` outcomes are recorded and the failure rate reaches `failure_rate`. While open, calls are
+    refused for `cooldown` seconds; then it is half-open and lets one trial call through at a time. A
+    successful trial closes the breaker (forgetting the old outcomes); a failed one opens it again.
+
+    Args:
+        failure_rate (float, optional): Failure rate that opens the breaker.
+        window (int, optional): Number of recent outcomes considered.
+        min_calls (int, optional): Outcomes needed before the breaker may open.
+        cooldown (float, optional): Seconds the breaker stays open.
+        clock (Callable[[], float], optional): Time source, replaceable in tests. Defaults to time.monotonic.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    DEFAULT_FAILURE_RATE = 0.5
+    DEFAULT_WINDOW = 20
+    DEFAULT_MIN_CALLS = 10
+    DEFAULT_COOLDOWN = 30.0
+
+    def __init__(
+        self,
+        failure_rate: float = DEFAULT_FAILURE_RATE,
+        window: int = DEFAULT_WINDOW,
+        min_calls: int = DEFAULT_MIN_CALLS,
+        cooldown: float = DEFAULT_COOLDOWN,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self._clock = clock
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        """The breaker's state: CLOSED, OPEN or HALF_OPEN."""
+        if self._opened_at is None:
+            return self.CLOSED
+        if self._clock() - self._opened_at < self.cooldown:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def retry_after(self) -> float:
+        """Returns the seconds until the breaker lets a call through (0 if it would now)."""
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self._opened_at + self.cooldown - self._clock())
+
+    def available(self) -> bool:
+        """Returns True if a call would be let through now, without reserving the half-open trial."""
+        state = self.state
+        return state == self.CLOSED or (state == self.HALF_OPEN and not self._trial_in_flight)
+
+    def allow(self) -> bool:
+        """Returns True if a call may be made now. In the half-open state this reserves the single trial call."""
+        if not self.available():
+            return False
+        if self.state == self.HALF_OPEN:
+            self._trial_in_flight = True
+        return True
+
+    def release(self) -> None:
+        """Frees the half-open trial reserved by `allow` for a call abandoned without an outcome."""
+        self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        """Records a successful call; a successful trial closes the breaker."""
+        if self._opened_at is not None:
+            logger.info("Circuit breaker closed after a successful trial call.")
+            self._opened_at = None
+            self._outcomes.clear()
+        self._trial_in_flight = False
+        self._outcomes.append(True)
+
+    def record_failure(self) -> None:
+        """Records a failed call, opening the breaker if the failure rate is too high or a trial failed."""
+        self._trial_in_flight = False
+        if self._opened_at is not None:
+            self._open()
+            return
+        self._outcomes.append(False)
+        failures = self._outcomes.count(False)
+        if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate:
+            self._open()
+
+    def _open(self) -> None:
+        self._opened_at = self._clock()
+        self.opened += 1
+
+    def to_dict(self) -> dict:
+        """Returns the breaker's state as a JSON-serialisable dictionary."""
+        return {
+            "state": self.state,
+            "failure_rate": self._outcomes.count(False) / len(self._outcomes) if self._outcomes else 0.0,
+            "retry_after_seconds": self.retry_after(),
+            "opened": self.opened,
+        }
+
+
+class Resilience:
+    """
+    Timeouts, retries and circuit breakers around provider calls, shared by the quiz and image generators.
+
+    - `acall` runs one provider call: it fails fast with CircuitOpenError while the provider's breaker is
+      open, and retries retryable errors (see `is_retryable`) with jittered backoff, up to the retry policy's
+      attempts. Every attempt's outcome is recorded with the provider's breaker.
+    - `astream` enforces the first-token and idle timeouts on a streamed response.
+
+    Quiz streams wrap everything up to their first question in one `acall`, so retries never happen after
+    a question has been sent to the client.
+
+    Configured from the environment by `from_env`:
+      - PROVIDER_CONNECT_TIMEOUT_SECONDS, PROVIDER_FIRST_TOKEN_TIMEOUT_SECONDS, PROVIDER_IDLE_TIMEOUT_SECONDS:
+        default timeouts; a variable suffixed with a provider name (e.g. PROVIDER_FIRST_TOKEN_TIMEOUT_SECONDS_GEMINI)
+        overrides it for that provider.
+      - PROVIDER_MAX_ATTEMPTS, PROVIDER_RETRY_BASE_DELAY_SECONDS: the retry policy.
+      - CIRCUIT_BREAKER_FAILURE_RATE, CIRCUIT_BREAKER_MIN_CALLS, CIRCUIT_BREAKER_COOLDOWN_SECONDS: the breakers.
+
+    Args:
+        timeouts (Timeouts, optional): Default timeouts for every provider.
+        provider_timeouts (dict[str, Timeouts], optional): Timeouts for specific providers.
+        retry_policy (RetryPolicy, optional): Retries for failed calls. Defaults to RetryPolicy().
+        breaker_factory (Callable[[], CircuitBreaker], optional): Creates each provider's breaker.
+            Defaults to CircuitBreaker.
+    """
+
+    PROVIDERS = ("openai", "gemini", "azure_ai", "deepseek")
+
+    @classmethod
+    def from_env(cls) -> "Resilience":
+        """Builds a Resilience configured from environment variables, falling back to the class defaults."""
+        defaults = Timeouts()
+
+        def timeouts(suffix: str = "", base: Timeouts = defaults) -> Timeouts:
+            return Timeouts(
+                connect=float(os.getenv(f"PROVIDER_CONNECT_TIMEOUT_SECONDS{suffix}", base.connect)),
+                first_token=float(os.getenv(f"PROVIDER_FIRST_TOKEN_TIMEOUT_SECONDS{suffix}", base.first_token)),
+                idle=float(os.getenv(f"PROVIDER_IDLE_TIMEOUT_SECONDS{suffix}", base.idle)),
+            )
+
+        default_timeouts = timeouts()
+        provider_timeouts = {provider: timeouts(f"_{provider.upper()}", default_timeouts) for provider in cls.PROVIDERS}
+        failure_rate = float(os.getenv("CIRCUIT_BREAKER_FAILURE_RATE", CircuitBreaker.DEFAULT_FAILURE_RATE))
+        min_calls = int(os.getenv("CIRCUIT_BREAKER_MIN_CALLS", CircuitBreaker.DEFAULT_MIN_CALLS))
+        cooldown = float(os.getenv("CIRCUIT_BREAKER_COOLDOWN_SECONDS", CircuitBreaker.DEFAULT_COOLDOWN))
+        return cls(
+            timeouts=default_timeouts,
+            provider_timeouts={p: t for p, t in provider_timeouts.items() if t != default_timeouts},
+            retry_policy=RetryPolicy(
+                max_attempts=int(os.getenv("PROVIDER_MAX_ATTEMPTS", RetryPolicy.DEFAULT_MAX_ATTEMPTS)),
+                base_delay=float(os.getenv("PROVIDER_RETRY_BASE_DELAY_SECONDS", RetryPolicy.DEFAULT_BASE_DELAY)),
+            ),
+            breaker_factory=lambda: CircuitBreaker(failure_rate=failure_rate, min_calls=min_calls, cooldown=cooldown),
+        )
+
+    def __init__(
+        self,
+        timeouts: Optional[Timeouts] = None,
+        provider_timeouts: Optional[dict[str, Timeouts]] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        breaker_factory: Callable[[], CircuitBreaker] = CircuitBreaker,
+    ):
+        self.timeouts = timeouts if timeouts is not None else Timeouts()
+        self.provider_timeouts = dict(provider_timeouts or {})
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self._breaker_factory = breaker_factory
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self.retries = 0
+
+    def timeouts_for(self, provider: str) -> Timeouts:
+        """Returns the timeouts for a provider."""
+        return self.provider_timeouts.get(provider, self.timeouts)
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        """Returns a provider's circuit breaker, creating it on first use."""
+        breaker = self._breakers.get(provider)
+        if breaker is None:
+            breaker = self._breakers[provider] = self._breaker_factory()
+        return breaker
+
+    def is_available(self, provider: str) -> bool:
+        """Returns True unless the provider's circuit breaker would refuse a call now."""
+        return self.breaker(provider).available()
+
+    async def acall(self, provider: str, attempt: Callable[[], Awaitable[T]]) -> T:
+        """
+        Runs a provider call with the provider's circuit breaker and the retry policy.
+
+        Args:
+            provider (str): The provider called (see `generate_quiz.provider_of`).
+            attempt (Callable[[], Awaitable[T]]): Makes one attempt at the call. It should apply its own
+                timeouts, e.g. with `aconnect` and `astream`.
+
+        Returns:
+            T: The result of the first successful attempt.
+
+        Raises:
+            CircuitOpenError: If the breaker is open, before an attempt or between retries.
+            Exception: The last attempt's error, or the first error that is not retryable.
+        """
+        breaker = self.breaker(provider)
+        retry = 0
+        while True:
+            if not breaker.allow():
+                raise CircuitOpenError(provider, breaker.retry_after())
+            try:
+                result = await attempt()
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    # The provider answered, e.g. a bad request; that says nothing about its health.
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                if retry + 1 >= self.retry_policy.max_attempts:
+                    raise
+                delay = self.retry_policy.delay(retry)
+                logger.warning("Provider '%s' call failed (%r); retrying in %.2fs.", provider, e, delay)
+                self.retries += 1
+                retry += 1
+                await asyncio.sleep(delay)
+            else:
+                breaker.record_success()
+                return result
+
+    async def aconnect(self, provider: str, request: Awaitable[T]) -> T:
+        """
+        Awaits a provider request within the provider's connect timeout.
+
+        Raises:
+            ProviderTimeoutError: If the request does not complete in time.
+        """
+        timeout = self.timeouts_for(provider).connect
+        try:
+            return await asyncio.wait_for(request, timeout)
+        except asyncio.TimeoutError:
+            raise ProviderTimeoutError(f"Provider '{provider}' did not respond within {timeout}s.") from None
+
+    async def astream(self, provider: str, stream: AsyncIterator[T]) -> AsyncIterator[T]:
+        """
+        Passes a streamed response through, enforcing the provider's first-token and idle timeouts.
+        The upstream stream is closed when this generator is closed or a timeout fires.
+
+        Raises:
+            ProviderTimeoutError: If the first chunk, or any later chunk, is late.
+        """
+        timeouts = self.timeouts_for(provider)
+        timeout, waiting_for = timeouts.first_token, "first token"
+        iterator = stream.__aiter__()
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(iterator.__anext__(), timeout)
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    raise ProviderTimeoutError(
+                        f"Provider '{provider}' stalled: no {waiting_for} within {timeout}s."
+                    ) from None
+                yield chunk
+                timeout, waiting_for = timeouts.idle, "chunk"
+        finally:
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    def stats(self) -> dict:
+        """Returns each provider's circuit breaker state, keyed by provider, and the number of retries."""
+        return {
+            "retries": self.retries,
+            "breakers": {provider: breaker.to_dict() for provider, breaker in self._breakers.items()},
+        }
@@ -1,9 +1,197 @@
 import json
 import logging
-from typing import Generator, Optional
+import re
+import time
+from typing import AsyncGenerator, Generator, Optional, Union
+
+from metrics import QUIZ_ITEMS_DROPPED, QUIZ_QUESTION_PARSE
+from quiz_question import QuizQuestion, QuizQuestionValidator
+
+try:
+    # Optional fast JSON backend; the stdlib json module is used when it is not installed.
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+# Validates a JSON document, using orjson when available. Both raise a json.JSONDecodeError subclass.
+json_loads = orjson.loads if orjson is not None else json.loads
+
+
+class StreamComplete(Exception):
+    """
+    Thrown into an LLM stream (with `athrow`) by a consumer that has everything it asked for, e.g. every
+    question of the quiz, while the model is still generating. Wrappers that measure the stream count it
+    as a completed stream rather than an abandoned one.
+    """
+
+
+class NewlineScanner:
+    """
+    Incrementally splits streamed text into newline-terminated lines.
+
+    Text that has not yet been terminated by a newline is kept as a list of pending fragments
+    rather than one growing string. Only each new delta is searched for newlines and fragments
+    are joined once, when their line completes, so the total work is linear in the stream length
+    even when a model emits thousands of tiny deltas on a long line.
+
+    One scanner is created per stream.
+
+    Example:
+        >>> scanner = NewlineScanner()
+        >>> scanner.feed('{"a": 1}\n{"b"')
+        ['{"a": 1}']
+        >>> scanner.feed(': 2}\n')
+        ['{"b": 2}']
+    """
+
+    __slots__ = ("_pending",)
+
+    def __init__(self):
+        self._pending: list[str] = []
+
+    def feed(self, content: str) -> list[str]:
+        """
+        Adds a delta to the scanner.
+
+        Args:
+            content: The next piece of streamed text.
+
+        Returns:
+            The lines completed by this delta, without their trailing newline (possibly empty).
+        """
+        if "\n" not in content:
+            if content:
+                self._pending.append(content)
+            return []
+
+        parts = content.split("\n")
+        self._pending.append(parts[0])
+        lines = ["".join(self._pending)]
+        lines.extend(parts[1:-1])
+        # The last part is the start of the next, still incomplete, line.
+        self._pending = [parts[-1]] if parts[-1] else []
+        return lines
+
+    def flush(self) -> str:
+        """
+        Returns and clears whatever text is pending once the stream has ended.
+
+        Returns:
+            The unterminated remainder (possibly an empty string).
+        """
+        remainder = "".join(self._pending)
+        self._pending = []
+        return remainder
+
+
+class JsonObjectScanner:
+    """
+    Incrementally frames streamed text into top-level JSON objects by tracking brace depth.
+
+    String and escape state are tracked so braces inside string values are ignored. Each top-level
+    `{...}` object is returned the moment its closing brace arrives, whatever surrounds it: several
+    objects on one line, a wrapping JSON array, pretty-printing across many lines, or stray prose
+    and code fences (which are discarded).
+
+    Like NewlineScanner, only each new delta is scanned and the current object's text is kept as
+    pending fragments, so total work is linear in the stream length. One scanner is created per stream.
+
+    Example:
+        >>> scanner = JsonObjectScanner()
+        >>> scanner.feed('[{"a": "}"}, {"b":')
+        ['{"a": "}"}']
+        >>> scanner.feed(' 2}]')
+        ['{"b": 2}']
+    """
+
+    __slots__ = ("_pending", "_depth", "_in_string", "_escape")
+
+    # Characters that change state outside and inside a JSON string respectively.
+    _STRUCTURAL = re.compile(r'[{}"]')
+    _STRING_SPECIAL = re.compile(r'["\\]')
+
+    def __init__(self):
+        self._pending: list[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, content: str) -> list[str]:
+        """
+        Adds a delta to the scanner.
+
+        Args:
+            content: The next piece of streamed text.
+
+        Returns:
+            The text of each top-level object closed by this delta (possibly empty).
+        """
+        objects = []
+        pos = 0
+        end = len(content)
+        # Start of the current object's text within this delta, if one is open.
+        start = 0 if self._depth else None
+
+        while pos < end:
+            if self._depth == 0:
+                # Skip anything between objects (whitespace, commas, brackets, prose).
+                pos = content.find("{", pos)
+                if pos == -1:
+                    break
+                start = pos
+                self._depth = 1
+                pos += 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                    pos += 1
+                    continue
+                match = self._STRING_SPECIAL.search(content, pos)
+                if match is None:
+                    break
+                pos = match.end()
+                if content[match.start()] == "\\":
+                    self._escape = True
+                else:
+                    self._in_string = False
+            else:
+                match = self._STRUCTURAL.search(content, pos)
+                if match is None:
+                    break
+                pos = match.end()
+                char = content[match.start()]
+                if char == '"':
+                    self._in_string = True
+                elif char == "{":
+                    self._depth += 1
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._pending.append(content[start:pos])
+                        objects.append("".join(self._pending))
+                        self._pending = []
+                        start = None
+
+        if start is not None:
+            self._pending.append(content[start:])
+        return objects
+
+    def flush(self) -> str:
+        """
+        Returns and clears the text of any object left unclosed when the stream ended.
+
+        Returns:
+            The unclosed remainder (possibly an empty string).
+        """
+        remainder = "".join(self._pending)
+        self._pending = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        return remainder
+
 
 class ResponseStreamParser:
     """
@@ -11,18 +199,39 @@ class ResponseStreamParser:
 
     Parses streamed data chunks from the LLM into complete JSON objects and yields them as SSE strings.
 
-    Accumulates data in a buffer and attempts to parse complete JSON objects. If successful,
+    Accumulates data in a per-stream scanner and attempts to parse complete JSON objects. If successful,
     the JSON object is yielded as a string and the buffer is cleared for the next object.
     Ignores empty chunks and continues buffering if the JSON is incomplete.
 
+    Two framing modes decide what counts as a complete object:
+      - "json_object" (default): JsonObjectScanner emits each top-level `{...}` as soon as it closes,
+        regardless of newlines, arrays or pretty-printing.
+      - "newline": NewlineScanner emits one candidate per newline-terminated line.
+
+    Two emission modes decide what is yielded:
+      - str (default): each object is parsed and re-serialised with json.dumps into `data: ...\n\n`.
+      - bytes (`emit_bytes=True`): each object is validated once (with orjson when installed) and its
+        original text is written straight into a pre-encoded `b"data: ...\n\n"` frame. There is no
+        re-serialisation, and StreamingResponse can send the bytes without encoding them.
+
+    With `validate_questions=True` every object is checked against the quiz question schema by a per-stream
+    QuizQuestionValidator: items are normalised (e.g. answer "b)" -> "B") and renumbered, and invalid or
+    duplicate items are dropped without stopping the stream. Questions left unchanged by validation keep
+    their original text in bytes mode.
+
     Similar-ish SSE Fast API blog: https://medium.com/@nandagopal05/server-sent-events-with-python-fastapi-f1960e0c8e4b
     Helpful SO that says about the SSE format of data: {your-json}: https://stackoverflow.com/a/49486869/11902832
 
     Methods:
       - parse_stream(llm_stream): Processes an LLM stream and yields complete SSE-formatted JSON objects.
+      - aparse_stream(llm_stream): Async counterpart of parse_stream for async LLM streams.
+      - aparse_questions(llm_stream, max_questions): Like aparse_stream, but yields validated QuizQuestion objects.
+      - encode_question(question): Frames a QuizQuestion as pre-encoded SSE bytes.
       - _extract_chunk_content(chunk): Extracts text content from a single chunk.
-      - _split_buffer(): Splits the internal buffer on newline characters into complete lines and a remainder.
+      - _process_lines(lines): Processes the lines (or objects) completed by a chunk into SSE strings.
+      - _flush(scanner): Processes whatever is left in the scanner once the stream has ended.
       - _process_line(line): Parses a single line as JSON and formats it as an SSE string.
+      - _encode_line(line): Validates a single line as JSON and frames its original text as SSE bytes.
 
     Example:
         Suppose the LLM returns chunks that, when combined, look like:
@@ -31,33 +240,74 @@ class ResponseStreamParser:
             '{"question_id": 2, "question": "Which Roman Emperor issued the Edict on Maximum Prices?", ...}\n'
 
         The parser will:
-          - Accumulate these chunks into a buffer.
-          - Split the buffer on newlines.
-          - Parse each complete JSON line.
+          - Scan each chunk for the end of an object (a closing brace, or a newline in "newline" mode).
+          - Parse each complete JSON object.
           - Format each parsed JSON as:
 
                 data: {"question_id": 1, ...}\n\n
 
           - Yield each formatted SSE string.
+
+    The parser keeps no state between streams: each call to parse_stream/aparse_stream owns its own
+    scanner, so a single instance can safely be shared by concurrent requests.
     """
 
-    def __init__(self):
-        self.buffer = ""
+    FRAMING_JSON_OBJECT = "json_object"
+    FRAMING_NEWLINE = "newline"
+    SCANNERS = {
+        FRAMING_JSON_OBJECT: JsonObjectScanner,
+        FRAMING_NEWLINE: NewlineScanner,
+    }
+
+    def __init__(
+        self,
+        framing: str = FRAMING_JSON_OBJECT,
+        emit_bytes: bool = False,
+        validate_questions: bool = False,
+        model: str = "unknown",
+    ):
+        """
+        Initialises the parser.
+
+        Args:
+            framing (str, optional): How complete objects are detected in the stream,
+                "json_object" (default) or "newline".
+            emit_bytes (bool, optional): Yield pre-encoded SSE bytes built from the original object text
+                instead of re-serialised strings. Defaults to False.
+            validate_questions (bool, optional): Validate, normalise and renumber each object as a quiz question,
+                dropping items that do not fit the schema. Defaults to False.
+            model (str, optional): The model whose streams are parsed, used to label the parse metrics.
+
+        Raises:
+            ValueError: If the framing mode is not supported.
+        """
+        if framing not in self.SCANNERS:
+            raise ValueError(f"Unsupported framing '{framing}'. Choose one of: {', '.join(self.SCANNERS)}")
+        self.framing = framing
+        self._scanner_class = self.SCANNERS[framing]
+        self.emit_bytes = emit_bytes
+        self._emit = self._encode_line if emit_bytes else self._process_line
+        self.validate_questions = validate_questions
+        self.model = model
+        # Metric children are looked up once here rather than for every question.
+        self._parse_seconds = {
+            outcome: QUIZ_QUESTION_PARSE.labels(model, outcome) for outcome in ("accepted", "invalid_json", "rejected")
+        }
+        self._dropped = {reason: QUIZ_ITEMS_DROPPED.labels(model, reason) for reason in ("invalid_json", "rejected")}
 
     # Public Method
-    def parse_stream(self, llm_stream) -> Generator[str, None, None]:
+    def parse_stream(self, llm_stream) -> Generator[Union[str, bytes], None, None]:
         """
         Processes the LLM stream and yields complete SSE-formatted JSON objects.
 
         For each chunk in the stream:
           - The private method _extract_chunk_content is used to get text content.
-          - This content is appended to the internal buffer.
-          - When the buffer contains one or more newline characters, the private method _split_buffer
-            splits it into complete lines and a remainder.
-          - Each complete line is processed by _process_line to parse it as JSON and format it as an SSE string.
+          - This content is fed to the stream's scanner, which returns any objects (or lines) it
+            completes and keeps the incomplete remainder.
+          - Each complete object is processed by _process_line to parse it as JSON and format it as an SSE string.
           - The formatted string is then yielded.
 
-        After the stream ends, any remaining data in the buffer is processed similarly.
+        After the stream ends, any remaining data in the scanner is processed similarly.
 
         Args:
             llm_stream: An iterable or generator yielding chunks from the LLM.
@@ -65,6 +315,8 @@ class ResponseStreamParser:
         Yields:
             SSE-formatted strings, each representing a complete JSON object.
         """
+        scanner = self._scanner_class()
+        validator = QuizQuestionValidator() if self.validate_questions else None
         for chunk in llm_stream:
             # Extract text from the chunk.
             content = self._extract_chunk_content(chunk)
@@ -72,25 +324,178 @@ class ResponseStreamParser:
                 logger.debug("Received an empty or invalid chunk; skipping...")
                 continue
 
-            # Append the new content to the buffer.
-            self.buffer += content
+            # Most deltas do not complete a line; only hand completed lines to the JSON step.
+            lines = scanner.feed(content)
+            if lines:
+                yield from self._process_lines(lines, validator)
+
+        # After processing all chunks, process any remaining data in the scanner.
+        yield from self._flush(scanner, validator)
+
+        self._log_finished(validator)
+
+    async def aparse_stream(self, llm_stream) -> AsyncGenerator[Union[str, bytes], None]:
+        """
+        Processes an async LLM stream and yields complete SSE-formatted JSON objects.
+
+        Behaves exactly like parse_stream, but consumes the stream with `async for` so it can be
+        driven directly by the event loop (e.g. from `litellm.acompletion(stream=True)`).
+        The LLM stream is closed when it ends or when this generator is closed early.
 
-            # If the buffer contains a newline, process the complete lines.
-            if "\n" in self.buffer:
-                complete_lines, self.buffer = self._split_buffer()
-                for line in complete_lines:
-                    sse_line = self._process_line(line)
-                    if sse_line is not None:
+        Args:
+            llm_stream: An async iterable yielding chunks from the LLM.
+
+        Yields:
+            SSE-formatted strings, each representing a complete JSON object.
+        """
+        scanner = self._scanner_class()
+        validator = QuizQuestionValidator() if self.validate_questions else None
+        try:
+            async for chunk in llm_stream:
+                content = self._extract_chunk_content(chunk)
+                if content is None:
+                    logger.debug("Received an empty or invalid chunk; skipping...")
+                    continue
+
+                lines = scanner.feed(content)
+                if lines:
+                    for sse_line in self._process_lines(lines, validator):
                         yield sse_line
+        finally:
+            await self._aclose_stream(llm_stream)
+
+        for sse_line in self._flush(scanner, validator):
+            yield sse_line
+
+        self._log_finished(validator)
 
-        # After processing all chunks, process any remaining data in the buffer.
-        if self.buffer.strip():
-            logging.warning(f"Unprocessed data in the buffer! {self.buffer=}")
-            sse_line = self._process_line(self.buffer)
+    async def aparse_questions(
+        self, llm_stream, max_questions: Optional[int] = None
+    ) -> AsyncGenerator[QuizQuestion, None]:
+        """
+        Processes an async LLM stream and yields validated QuizQuestion objects rather than SSE frames.
+
+        Framing and validation work as in aparse_stream (questions are always validated here, whatever
+        `validate_questions` is set to). Used by callers that need the questions themselves, e.g. to cache
+        them, and frame each one with `encode_question`.
+
+        Args:
+            llm_stream: An async iterable yielding chunks from the LLM.
+            max_questions (int, optional): Stop the LLM stream once this many questions have been accepted,
+                rather than paying for whatever the model keeps generating. Defaults to None (no limit).
+
+        Yields:
+            QuizQuestion: Each accepted question, as soon as its object is complete.
+        """
+        scanner = self._scanner_class()
+        validator = QuizQuestionValidator()
+        try:
+            async for chunk in llm_stream:
+                content = self._extract_chunk_content(chunk)
+                if content is None:
+                    logger.debug("Received an empty or invalid chunk; skipping...")
+                    continue
+
+                for line in scanner.feed(content):
+                    question = self._parse_question(line, validator)
+                    if question is not None:
+                        yield question
+                        if validator.accepted == max_questions:
+                            logger.info("Received all %d questions; stopping the stream.", max_questions)
+                            await self._astop_stream(llm_stream)
+                            self._log_finished(validator)
+                            return
+        finally:
+            await self._aclose_stream(llm_stream)
+
+        buffer = scanner.flush()
+        if buffer.strip():
+            logger.warning("Unprocessed data in the buffer (%d characters): %.200r", len(buffer), buffer)
+            question = self._parse_question(buffer, validator)
+            if question is not None:
+                yield question
+
+        self._log_finished(validator)
+
+    @classmethod
+    async def _astop_stream(cls, llm_stream) -> None:
+        """
+        Stops an LLM stream whose consumer needs nothing more from it, although the model has not finished.
+
+        The stream is told why by throwing StreamComplete into it, so a measuring wrapper records a completed
+        stream; streams that cannot be thrown into are just closed.
+        """
+        athrow = getattr(llm_stream, "athrow", None)
+        if athrow is None:
+            await cls._aclose_stream(llm_stream)
+            return
+        try:
+            await athrow(StreamComplete())
+        except (StreamComplete, StopAsyncIteration):
+            pass
+
+    @staticmethod
+    async def _aclose_stream(llm_stream) -> None:
+        """
+        Closes an async LLM stream, releasing its upstream HTTP response.
+
+        Called when the stream ends and when the consumer stops early (e.g. the client disconnected),
+        so an abandoned quiz does not keep the provider generating tokens nobody will read.
+        """
+        aclose = getattr(llm_stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+    def _process_lines(
+        self, lines: list[str], validator: Optional[QuizQuestionValidator] = None
+    ) -> list[Union[str, bytes]]:
+        """
+        Processes the lines completed by a chunk.
+
+        Args:
+            lines: Complete lines (or object texts) returned by the stream's scanner.
+            validator: The stream's QuizQuestionValidator, or None when questions are not validated.
+
+        Returns:
+            A list of SSE frames (str, or bytes with `emit_bytes`) for the lines that parsed as JSON.
+        """
+        sse_lines = []
+        for line in lines:
+            sse_line = self._emit(line, validator)
             if sse_line is not None:
-                yield sse_line
+                sse_lines.append(sse_line)
+        return sse_lines
 
-        logger.info("Finished processing the stream!")
+    def _flush(self, scanner, validator: Optional[QuizQuestionValidator] = None) -> list[Union[str, bytes]]:
+        """
+        Processes any data left in the scanner after the stream has ended.
+
+        Args:
+            scanner: The stream's NewlineScanner or JsonObjectScanner.
+            validator: The stream's QuizQuestionValidator, or None when questions are not validated.
+
+        Returns:
+            A list containing the SSE-formatted remainder, or an empty list.
+        """
+        sse_lines = []
+        buffer = scanner.flush()
+        if buffer.strip():
+            logger.warning("Unprocessed data in the buffer (%d characters): %.200r", len(buffer), buffer)
+            sse_line = self._emit(buffer, validator)
+            if sse_line is not None:
+                sse_lines.append(sse_line)
+        return sse_lines
+
+    def _log_finished(self, validator: Optional[QuizQuestionValidator]) -> None:
+        """Logs the end of a stream, with validation counts when questions were validated."""
+        if validator is None:
+            logger.info("Finished processing the stream!")
+        else:
+            logger.info(
+                "Finished processing the stream! Accepted %d questions, dropped %d invalid or duplicate items.",
+                validator.accepted,
+                validator.dropped,
+            )
 
     def _extract_chunk_content(self, chunk) -> Optional[str]:
         """
@@ -122,37 +527,7 @@ class ResponseStreamParser:
             logger.debug("Chunk format unexpected or chunk is empty!")
             return None
 
-    def _split_buffer(self) -> (list[str], str):
-        """
-        Splits the internal buffer on newline characters.
-
-        Since each complete JSON object is expected to end with a newline,
-        this function splits the buffer into complete lines and a remaining
-        (possibly incomplete) portion.
-
-        Example:
-            If self.buffer is:
-                '{"question": "Who was ..."}\n"question": "What is ..."}\nincomplete'
-            Then:
-                complete_lines = ['{"question": "Who was ..."}', '{"question": "What is ..."}']
-                remainder = "incomplete"
-
-        Returns:
-            A tuple (list of complete JSON lines, remainder string).
-        """
-        if "\n" not in self.buffer:
-            return [], self.buffer  # No full lines, everything is remainder
-
-        lines = self.buffer.split("\n")
-
-        # The remainder is empty if the buffer ends with a newline.
-        if self.buffer.endswith("\n"):
-            return lines[:-1], ""
-
-        # Otherwise, the last line is incomplete.
-        return lines[:-1], lines[-1]
-
-    def _process_line(self, line: str) -> Optional[str]:
+    def _process_line(self, line: str, validator: Optional[QuizQuestionValidator] = None) -> Optional[str]:
         """
         Processes a single line by parsing it as JSON and formatting it as an SSE string.
 
@@ -166,12 +541,16 @@ class ResponseStreamParser:
 
           5. If parsing fails, log a debug message and return None.
 
+        When a validator is given, the parsed object is validated and normalised as a quiz question
+        before formatting, and None is returned if the validator drops it.
+
         Example:
             Input: '{"question_id": 1, "question": "Who was the first emperor of Rome?"}'
             Output: 'data: {"question_id": 1, "question": "Who was the first emperor of Rome?"}\n\n'
 
         Args:
             line: The line of text to process.
+            validator: Optional QuizQuestionValidator for the stream.
 
         Returns:
             An SSE-formatted string if parsing is successful; otherwise, None.
@@ -181,7 +560,103 @@ class ResponseStreamParser:
             return None
         try:
             json_obj = json.loads(line)
-            return f"data: {json.dumps(json_obj)}\n\n"
         except json.JSONDecodeError as e:
-            logger.debug(f"Error parsing line '{line}': {e}")
+            logger.debug("Error parsing line '%s': %s", line, e)
             return None
+        if validator is not None:
+            question = validator.validate(json_obj)
+            if question is None:
+                return None
+            json_obj = question.to_dict()
+        return f"data: {json.dumps(json_obj)}\n\n"
+
+    def _encode_line(self, line: str, validator: Optional[QuizQuestionValidator] = None) -> Optional[bytes]:
+        """
+        Validates a single line as JSON and frames its original text as pre-encoded SSE bytes.
+
+        The line is parsed once, only to check that it is valid JSON; the parsed value is discarded
+        and the original text is written into the frame. JSON strings cannot contain raw line breaks,
+        so any line breaks in a valid document are insignificant whitespace and are replaced by spaces
+        to keep the frame on a single `data:` line.
+
+        When a validator is given, the parsed object is validated as a quiz question. The original text is
+        only reused if validation left the question unchanged; otherwise the normalised question is serialised.
+
+        Example:
+            Input: '{"question_id": 1,\n "question": "Who was the first emperor of Rome?"}'
+            Output: b'data: {"question_id": 1,  "question": "Who was the first emperor of Rome?"}\n\n'
+
+        Args:
+            line: The line of text to process.
+            validator: Optional QuizQuestionValidator for the stream.
+
+        Returns:
+            An SSE frame as bytes if the line is valid JSON; otherwise, None.
+        """
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            json_obj = json_loads(line)
+        except json.JSONDecodeError as e:
+            logger.debug("Error parsing line '%s': %s", line, e)
+            return None
+        if "\n" in line or "\r" in line:
+            line = line.replace("\r", " ").replace("\n", " ")
+        if validator is not None:
+            question = validator.validate(json_obj, raw=line)
+            if question is None:
+                return None
+            return self.encode_question(question)
+        return b"data: " + line.encode() + b"\n\n"
+
+    def _parse_question(self, line: str, validator: QuizQuestionValidator) -> Optional[QuizQuestion]:
+        """
+        Parses a single line as JSON and validates it as a quiz question.
+
+        Like `_encode_line`, line breaks are flattened so the original text can be kept on the question
+        (when validation leaves it unchanged) and later written into a single-line SSE frame.
+        The time taken, and any dropped object, are recorded in the parse metrics.
+
+        Args:
+            line: The line of text to process.
+            validator: The stream's QuizQuestionValidator.
+
+        Returns:
+            The accepted QuizQuestion, or None if the line is not valid JSON or the validator drops it.
+        """
+        line = line.strip()
+        if not line:
+            return None
+        started = time.perf_counter()
+        try:
+            json_obj = json_loads(line)
+        except json.JSONDecodeError as e:
+            logger.debug("Error parsing line '%s': %s", line, e)
+            self._parse_seconds["invalid_json"].observe(time.perf_counter() - started)
+            self._dropped["invalid_json"].inc()
+            return None
+        if "\n" in line or "\r" in line:
+            line = line.replace("\r", " ").replace("\n", " ")
+        question = validator.validate(json_obj, raw=line)
+        outcome = "accepted" if question is not None else "rejected"
+        self._parse_seconds[outcome].observe(time.perf_counter() - started)
+        if question is None:
+            self._dropped["rejected"].inc()
+        return question
+
+    @staticmethod
+    def encode_question(question: QuizQuestion) -> bytes:
+        """
+        Frames a validated question as pre-encoded SSE bytes.
+
+        Example:
+            Output: b'data: {"question_id":1,"question":"Who was the first emperor of Rome?",...}\n\n'
+
+        Args:
+            question: The question to send.
+
+        Returns:
+            The SSE frame as bytes.
+        """
+        return b"data: " + question.to_json().encode() + b"\n\n"
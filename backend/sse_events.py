@@ -0,0 +1,259 @@
+"""
+Server-sent event responses, and named events for streams that carry more than one kind of message.
+
+`SSEResponse` (and `NDJSONResponse`, for /GenerateQuizBatch) stops a stream as soon as its client disconnects,
+so the upstream LLM stream behind it is closed rather than left generating tokens nobody will read.
+
+/GenerateQuiz sends one unnamed `data:` frame per question, each with an `id:` so a reconnecting client can
+resume (see sse_replay.py), then an `error` event if the quiz failed and a final `done` event.
+/GenerateQuizWithImage multiplexes a quiz and its image over one stream, so every frame is named by an
+`event:` line, which browsers dispatch to `EventSource.addEventListener(<name>, ...)`:
+  - question: a quiz question, exactly as /GenerateQuiz sends it.
+  - image: {"image_url": ...}, sent as soon as the image is ready, usually between the first questions.
+  - error: {"source": "quiz" or "image", "error": ...}. The other source carries on after an error.
+  - done: {"questions": <questions sent>, "image": <whether an image was sent>}, always the last event.
+
+Both endpoints send a comment line (`aheartbeat`) whenever nothing else has been sent for a while, so proxies
+do not close a stream that is waiting on a slow model.
+"""
+
+import asyncio
+import json
+import logging
+from typing import AsyncGenerator, Awaitable, Optional
+
+from starlette.background import BackgroundTask
+from starlette.requests import ClientDisconnect
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from stream_output import StreamCompressor, acoalesce
+
+logger = logging.getLogger(__name__)
+
+QUESTION = "question"
+IMAGE = "image"
+ERROR = "error"
+DONE = "done"
+
+# A comment frame: ignored by EventSource, but it keeps idle connections open through proxies.
+HEARTBEAT = b": keep-alive\n\n"
+
+
+def encode_event(event: str, data: dict) -> bytes:
+    """
+    Frames `data` as a named SSE event.
+
+    Example:
+        >>> encode_event("image", {"image_url": "https://example.com/1.png"})
+        b'event: image\\ndata: {"image_url":"https://example.com/1.png"}\\n\\n'
+    """
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+def name_frame(event: str, frame: bytes) -> bytes:
+    """Names a pre-encoded `data:` frame (such as a question from `QuizGenerator.agenerate_quiz`) as `event`."""
+    return b"event: " + event.encode() + b"\n" + frame
+
+
+def with_event_id(frame: bytes, event_id: str) -> bytes:
+    """Gives a pre-encoded frame an `id:`, which the browser sends back as Last-Event-ID when it reconnects."""
+    return b"id: " + event_id.encode() + b"\n" + frame
+
+
+async def aheartbeat(events: AsyncGenerator[bytes, None], interval: float) -> AsyncGenerator[bytes, None]:
+    """
+    Passes events through, sending a HEARTBEAT whenever none has been sent for `interval` seconds.
+
+    Args:
+        events (AsyncGenerator[bytes, None]): SSE frames.
+        interval (float): Seconds of silence before a heartbeat; 0 or less sends none.
+
+    Yields:
+        bytes: The frames, with heartbeats in the gaps.
+    """
+    if interval <= 0:
+        try:
+            async for event in events:
+                yield event
+        finally:
+            await events.aclose()
+        return
+
+    next_event = None
+    try:
+        while True:
+            if next_event is None:
+                next_event = asyncio.ensure_future(anext(events))
+            done, _ = await asyncio.wait((next_event,), timeout=interval)
+            if not done:
+                yield HEARTBEAT
+                continue
+            next_event = None
+            try:
+                event = done.pop().result()
+            except StopAsyncIteration:
+                return
+            yield event
+    finally:
+        if next_event is not None:
+            next_event.cancel()
+            await asyncio.gather(next_event, return_exceptions=True)
+        await events.aclose()
+
+
+async def aquiz_with_image(
+    questions: AsyncGenerator[bytes, None], image_url: Awaitable[Optional[str]]
+) -> AsyncGenerator[bytes, None]:
+    """
+    Multiplexes a quiz and its image over one stream of named events, in arrival order.
+
+    The questions and the image are each awaited by their own task, so the image event is sent as soon as
+    the image is ready rather than after the next question. A failure of either is sent as an error event
+    and the other carries on; a `done` event follows once both have finished. Closing the stream cancels
+    the image and closes the question stream.
+
+    Args:
+        questions (AsyncGenerator[bytes, None]): Question SSE frames, from `QuizGenerator.agenerate_quiz`.
+        image_url (Awaitable[Optional[str]]): The image's URL, or None if it could not be generated.
+            Usually a task started before the quiz, so the image is generated while the quiz connects.
+
+    Yields:
+        bytes: Named SSE events.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    # Put on the queue by each task when it has finished.
+    finished = object()
+    sent = {QUESTION: 0, IMAGE: 0}
+
+    async def send_questions() -> None:
+        try:
+            async for frame in questions:
+                sent[QUESTION] += 1
+                queue.put_nowait(name_frame(QUESTION, frame))
+        except Exception as e:
+            logger.error("Quiz stream failed after %d questions: %s", sent[QUESTION], e)
+            queue.put_nowait(encode_event(ERROR, {"source": "quiz", "error": "Error - Quiz generation failed."}))
+        finally:
+            queue.put_nowait(finished)
+            await questions.aclose()
+
+    async def send_image() -> None:
+        try:
+            url = await image_url
+        except Exception as e:
+            logger.error("Image generation failed: %s", e)
+            url = None
+        if url is None:
+            queue.put_nowait(encode_event(ERROR, {"source": "image", "error": "Error - Image generation failed."}))
+        else:
+            sent[IMAGE] += 1
+            queue.put_nowait(encode_event(IMAGE, {"image_url": url}))
+        queue.put_nowait(finished)
+
+    tasks = [asyncio.create_task(send_questions()), asyncio.create_task(send_image())]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            item = await queue.get()
+            if item is finished:
+                remaining -= 1
+            else:
+                yield item
+        yield encode_event(DONE, {"questions": sent[QUESTION], "image": bool(sent[IMAGE])})
+    finally:
+        for task in tasks:
+            task.cancel()
+        if isinstance(image_url, asyncio.Future):
+            image_url.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class DisconnectAwareResponse(StreamingResponse):
+    """
+    A StreamingResponse that stops its stream as soon as the client disconnects.
+
+    StreamingResponse notices a disconnect only when it next writes to the client (ASGI 2.4 servers), or
+    cancels the stream in an anyio cancel scope that also cancels every await in the stream's cleanup
+    (older servers), so an upstream stream waiting on the provider may be left open. Here the disconnect is
+    always listened for: the stream's task is cancelled once, then the body is closed, so the generators'
+    `finally` blocks can close the upstream HTTP stream and release its admission slot straight away.
+
+    The body goes through the output stage of stream_output.py: chunks arriving within `coalesce_window`
+    seconds are sent as one write, and with an `encoding` every write is compressed and flushed.
+
+    Args:
+        content (AsyncGenerator[bytes, None]): The response body.
+        coalesce_window (float, optional): Seconds to wait for more chunks before a write. Defaults to 0
+            (every chunk is its own write).
+        encoding (str, optional): "gzip" or "br", from `negotiate_encoding`. Defaults to None (uncompressed,
+            sent with "Content-Encoding: identity").
+    """
+
+    def __init__(
+        self,
+        content: AsyncGenerator[bytes, None],
+        status_code: int = 200,
+        headers: Optional[dict] = None,
+        media_type: Optional[str] = None,
+        background: Optional[BackgroundTask] = None,
+        coalesce_window: float = 0.0,
+        encoding: Optional[str] = None,
+    ):
+        super().__init__(content, status_code, headers, media_type, background)
+        self.coalesce_window = coalesce_window
+        self.compressor = StreamCompressor(encoding) if encoding else None
+        if self.compressor is not None:
+            self.headers["Content-Encoding"] = encoding
+            self.headers.add_vary_header("Accept-Encoding")
+        else:
+            # Marks the stream as already encoded, so GZipMiddleware leaves it alone instead of buffering it.
+            self.headers["Content-Encoding"] = "identity"
+
+    async def stream_response(self, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        chunks = acoalesce(self.body_iterator, self.coalesce_window)
+        try:
+            async for chunk in chunks:
+                if self.compressor is not None:
+                    chunk = self.compressor.compress(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        finally:
+            await chunks.aclose()
+        tail = self.compressor.finish() if self.compressor is not None else b""
+        await send({"type": "http.response.body", "body": tail, "more_body": False})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        streaming = asyncio.ensure_future(self.stream_response(send))
+        disconnected = asyncio.ensure_future(self.listen_for_disconnect(receive))
+        try:
+            await asyncio.wait((streaming, disconnected), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (streaming, disconnected):
+                task.cancel()
+            await asyncio.gather(streaming, disconnected, return_exceptions=True)
+            # A no-op if the stream finished, or if the cancellation already ran through it.
+            await self.body_iterator.aclose()
+
+        if streaming.cancelled():
+            logger.info("Client disconnected; stopped the stream.")
+            return
+        error = streaming.exception()
+        if isinstance(error, OSError):
+            raise ClientDisconnect() from error
+        if error is not None:
+            raise error
+        if self.background is not None:
+            await self.background()
+
+
+class SSEResponse(DisconnectAwareResponse):
+    """A text/event-stream response that stops its stream as soon as the client disconnects."""
+
+    media_type = "text/event-stream"
+
+
+class NDJSONResponse(DisconnectAwareResponse):
+    """A newline-delimited JSON response that stops its stream as soon as the client disconnects."""
+
+    media_type = "application/x-ndjson"
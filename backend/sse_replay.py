@@ -0,0 +1,304 @@
+"""
+Resumable quiz streams: SSE event ids, a short-lived replay buffer and Last-Event-ID resume.
+
+Every question of a /GenerateQuiz stream is sent with the id "<stream id>.<question number>". When the
+connection drops, the browser's EventSource reconnects to the same URL with a Last-Event-ID header, and the
+stream carries on from the next question instead of starting a new quiz:
+  - Questions the client missed are replayed from the `ReplayBuffer`, which keeps each stream's frames for
+    a few minutes after it was last written.
+  - If the stream's generation is still running (the server has not noticed the old connection dropping
+    yet), the new connection follows it.
+  - Otherwise only the questions still missing are generated, numbered on from the last one received.
+
+The stream ends with a `done` event, after an `error` event if the quiz failed, so clients can close the
+EventSource rather than count questions (EventSource reconnects when a stream ends).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import secrets
+import time
+from collections import OrderedDict
+from typing import AsyncGenerator, Awaitable, Callable, Optional
+
+import metrics
+from sse_events import DONE, ERROR, encode_event, with_event_id
+
+logger = logging.getLogger(__name__)
+
+_DATA_PREFIX = b"data: "
+
+
+class ReplayStream:
+    """
+    The question frames sent on one quiz stream, each with its event id.
+
+    Args:
+        stream_id (str): The stream's id, the first part of its event ids.
+        n_questions (int): Number of questions the quiz was asked for.
+        first_number (int, optional): Number of the first question kept. Questions before it were sent
+            before the stream was lost from the buffer; they are not replayed. Defaults to 1.
+    """
+
+    def __init__(self, stream_id: str, n_questions: int, first_number: int = 1):
+        self.stream_id = stream_id
+        self.n_questions = n_questions
+        self.first_number = first_number
+        self.frames: list[bytes] = []
+        # True once the quiz has been generated in full (or the model stopped early): nothing more will come.
+        self.finished = False
+        # True while a connection is generating the stream's questions.
+        self.producing = False
+        # True while the questions being generated are numbered from 1 but follow earlier ones.
+        self._renumber = False
+        self._changed = asyncio.Event()
+
+    @property
+    def sent(self) -> int:
+        """Number of the last question added to the stream (0 if none)."""
+        return self.first_number - 1 + len(self.frames)
+
+    def frames_after(self, number: int) -> list[bytes]:
+        """Returns the frames of the questions after question `number`."""
+        return self.frames[max(0, number - self.first_number + 1) :]
+
+    def add(self, frame: bytes) -> None:
+        """
+        Adds a question frame from `QuizGenerator.agenerate_quiz`, numbering it on from the last question.
+
+        Frames of a new stream are kept as they are; the questions of a resumed stream, numbered from 1 by
+        the generator, are re-encoded with their number in the stream.
+        """
+        number = self.sent + 1
+        if self._renumber:
+            question = json.loads(frame[len(_DATA_PREFIX) :])
+            question["question_id"] = number
+            frame = _DATA_PREFIX + json.dumps(question, ensure_ascii=False, separators=(",", ":")).encode() + b"\n\n"
+        self.frames.append(with_event_id(frame, f"{self.stream_id}.{number}"))
+        self.notify()
+
+    def start_producing(self) -> None:
+        """Marks the stream as being generated by a connection, which adds the questions after the last one."""
+        self.producing = True
+        self._renumber = self.sent > 0
+
+    def notify(self) -> None:
+        """Wakes the connections following the stream."""
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self) -> None:
+        """Waits until the stream changes: a question is added, or its producer stops."""
+        await self._changed.wait()
+
+
+class ReplayBuffer:
+    """
+    Keeps the frames of recent quiz streams in memory, so a client reconnecting with Last-Event-ID is
+    replayed the questions it missed rather than charged a new generation.
+
+    Streams are kept for `ttl` seconds after they were last written, and at most `max_streams` are kept
+    (the least recently used are dropped). A reconnect for a stream that is no longer kept still resumes,
+    by generating only the missing questions.
+
+    Configured from the environment by `from_env`:
+      - SSE_REPLAY_TTL_SECONDS: Seconds a stream is kept after its last question (default 300).
+      - SSE_REPLAY_MAX_STREAMS: Maximum number of streams kept (default 1000; 0 keeps none).
+
+    Not thread-safe: use it from the event loop.
+
+    Args:
+        ttl (float): Seconds a stream is kept after it was last written.
+        max_streams (int): Maximum number of streams kept.
+        clock (Callable[[], float], optional): Time source, replaceable in tests. Defaults to time.monotonic.
+    """
+
+    DEFAULT_TTL = 300.0
+    DEFAULT_MAX_STREAMS = 1000
+    _EVENT_ID_PATTERN = re.compile(r"([A-Za-z0-9_-]{1,32})\.(\d{1,6})")
+
+    @classmethod
+    def from_env(cls) -> "ReplayBuffer":
+        """Builds a buffer configured from environment variables, falling back to the class defaults."""
+        return cls(
+            ttl=float(os.getenv("SSE_REPLAY_TTL_SECONDS", cls.DEFAULT_TTL)),
+            max_streams=int(os.getenv("SSE_REPLAY_MAX_STREAMS", cls.DEFAULT_MAX_STREAMS)),
+        )
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_TTL,
+        max_streams: int = DEFAULT_MAX_STREAMS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.max_streams = max_streams
+        self._clock = clock
+        # stream id -> (expiry time, stream), least recently used first.
+        self._streams: OrderedDict[str, tuple[float, ReplayStream]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    @classmethod
+    def parse_event_id(cls, event_id: Optional[str]) -> Optional[tuple[str, int]]:
+        """
+        Splits a Last-Event-ID into its stream id and question number.
+
+        Example:
+            >>> ReplayBuffer.parse_event_id("k3Jx9.4")
+            ('k3Jx9', 4)
+
+        Returns:
+            Optional[tuple[str, int]]: (stream id, question number), or None if `event_id` is not one of ours.
+        """
+        match = cls._EVENT_ID_PATTERN.fullmatch(event_id.strip()) if event_id else None
+        if match is None:
+            return None
+        return match.group(1), int(match.group(2))
+
+    def open(self, n_questions: int, last_event_id: Optional[str] = None) -> tuple[ReplayStream, int]:
+        """
+        Returns the stream a request should follow, and the number of questions its client already has.
+
+        Args:
+            n_questions (int): Number of questions requested.
+            last_event_id (str, optional): The request's Last-Event-ID header, if it is a reconnect.
+
+        Returns:
+            tuple[ReplayStream, int]: A new stream and 0 for a new request. For a reconnect, the kept stream
+            (or, if it is no longer kept, a new one under the same id starting after the client's last question)
+            and the number of the client's last question.
+        """
+        self._expire()
+        resumed = self.parse_event_id(last_event_id)
+        if resumed is None:
+            stream = ReplayStream(secrets.token_urlsafe(12), n_questions)
+            self._keep(stream)
+            return stream, 0
+
+        stream_id, received = resumed
+        entry = self._streams.get(stream_id)
+        if entry is not None and received <= entry[1].sent:
+            stream = entry[1]
+            self._streams.move_to_end(stream_id)
+        else:
+            stream = ReplayStream(stream_id, n_questions, first_number=received + 1)
+            self._keep(stream)
+        return stream, received
+
+    def touch(self, stream: ReplayStream) -> None:
+        """Keeps a stream for another `ttl` seconds, e.g. after a question has been added."""
+        if stream.stream_id in self._streams:
+            self._streams[stream.stream_id] = (self._clock() + self.ttl, stream)
+            self._streams.move_to_end(stream.stream_id)
+
+    def _keep(self, stream: ReplayStream) -> None:
+        if self.max_streams <= 0 or self.ttl <= 0:
+            return
+        self._streams[stream.stream_id] = (self._clock() + self.ttl, stream)
+        while len(self._streams) > self.max_streams:
+            self._streams.popitem(last=False)
+
+    def _expire(self) -> None:
+        now = self._clock()
+        expired = [stream_id for stream_id, (expires_at, _) in self._streams.items() if expires_at <= now]
+        for stream_id in expired:
+            del self._streams[stream_id]
+
+    def stats(self) -> dict:
+        """Returns the number of streams kept."""
+        return {"streams": len(self._streams)}
+
+
+async def aresumable_quiz(
+    buffer: ReplayBuffer,
+    stream: ReplayStream,
+    received: int,
+    astart_questions: Callable[[int], Awaitable[AsyncGenerator[bytes, None]]],
+    first_questions: Optional[asyncio.Future] = None,
+) -> AsyncGenerator[bytes, None]:
+    """
+    Sends a quiz stream from after question `received`: replayed questions first, then new ones as they are
+    generated, then a `done` event {"questions": <questions in the quiz>, "resumed": <whether this was a
+    reconnect>, "seconds": <time this connection took>}.
+
+    New questions are generated by this connection unless another connection is already generating the stream,
+    in which case it is followed. A failed generation is sent as an `error` event before `done`.
+
+    Args:
+        buffer (ReplayBuffer): The buffer the stream is kept in.
+        stream (ReplayStream): The stream, from `ReplayBuffer.open`.
+        received (int): Number of the last question the client has.
+        astart_questions (Callable[[int], Awaitable[AsyncGenerator[bytes, None]]]): Starts generating the given
+            number of questions, as `QuizGenerator.agenerate_quiz` frames.
+        first_questions (asyncio.Future, optional): The questions of a new stream, already being started by the
+            endpoint (so errors before the response starts get their status code). Used instead of the first
+            call to `astart_questions`, and cancelled if the stream is closed before it is used.
+
+    Yields:
+        bytes: SSE frames.
+    """
+    started = time.perf_counter()
+    resumed = received > 0
+    if resumed:
+        replayed = len(stream.frames_after(received))
+        metrics.SSE_RESUMES.labels("replay" if replayed or stream.producing else "regenerated").inc()
+        logger.info(
+            "Resuming stream %s after question %d; %d questions to replay.", stream.stream_id, received, replayed
+        )
+
+    failed = False
+    try:
+        while True:
+            for frame in stream.frames_after(received):
+                received += 1
+                yield frame
+            if stream.finished or stream.sent >= stream.n_questions:
+                break
+            if stream.producing:
+                await stream.wait()
+                continue
+
+            stream.start_producing()
+            try:
+                if first_questions is not None:
+                    start, first_questions = first_questions, None
+                    questions = await start
+                else:
+                    questions = await astart_questions(stream.n_questions - stream.sent)
+                try:
+                    async for frame in questions:
+                        stream.add(frame)
+                        buffer.touch(stream)
+                        for frame in stream.frames_after(received):
+                            received += 1
+                            yield frame
+                        if stream.sent >= stream.n_questions:
+                            break
+                finally:
+                    await questions.aclose()
+                stream.finished = True
+            except Exception as e:
+                logger.error("Quiz stream %s failed after %d questions: %s", stream.stream_id, stream.sent, e)
+                failed = True
+                break
+            finally:
+                stream.producing = False
+                stream.notify()
+    finally:
+        if first_questions is not None:
+            # Closed before the first questions were used: stop them, or close them if they had started.
+            first_questions.cancel()
+            await asyncio.gather(first_questions, return_exceptions=True)
+            if not first_questions.cancelled() and first_questions.exception() is None:
+                await first_questions.result().aclose()
+
+    if failed:
+        yield encode_event(ERROR, {"error": "Error - Quiz generation failed."})
+    yield encode_event(
+        DONE, {"questions": stream.sent, "resumed": resumed, "seconds": round(time.perf_counter() - started, 3)}
+    )
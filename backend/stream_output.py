@@ -0,0 +1,143 @@
+"""
+The output stage of streaming responses: coalescing frames into fewer writes, and compressing each write.
+
+Without it every SSE frame is its own ASGI body message, and so its own socket write (and TLS record) on the
+server. A quiz replayed from the cache or the replay buffer arrives all at once, and a model's last question is
+followed straight away by the `done` event, so `acoalesce` joins frames arriving within a few milliseconds
+into one write.
+
+`StreamCompressor` compresses a stream with gzip, or brotli when the `brotli` package is installed and the
+client accepts it. Each write is flushed (a gzip sync flush, a brotli flush), so the client can decode every
+frame as soon as it arrives: compression never holds a question back. Questions repeat the same keys and
+phrasing, so later frames compress well against the earlier ones in the same stream.
+"""
+
+import asyncio
+import zlib
+from typing import AsyncGenerator, Optional
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - exercised only when brotli is not installed
+    brotli = None
+
+GZIP = "gzip"
+BROTLI = "br"
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Picks the encoding of a streamed response from a request's Accept-Encoding header.
+
+    Brotli is preferred when it is installed, then gzip; encodings the client gives q=0 are never used.
+
+    Example:
+        >>> negotiate_encoding("gzip, deflate")
+        'gzip'
+
+    Returns:
+        Optional[str]: "br", "gzip", or None to send the response uncompressed.
+    """
+    accepted = set()
+    for item in (accept_encoding or "").lower().split(","):
+        name, _, params = item.partition(";")
+        q = params.strip().removeprefix("q=")
+        try:
+            if q and float(q) <= 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(name.strip())
+    if brotli is not None and (BROTLI in accepted or "*" in accepted):
+        return BROTLI
+    if GZIP in accepted or "*" in accepted:
+        return GZIP
+    return None
+
+
+class StreamCompressor:
+    """
+    Compresses a response body written in parts, flushing after each part so it can be decoded on arrival.
+
+    Args:
+        encoding (str): "gzip", or "br" (needs the `brotli` package).
+    """
+
+    # Mid-range levels: each frame is compressed as it is sent, on the event loop, so favour speed over size.
+    GZIP_LEVEL = 6
+    BROTLI_QUALITY = 5
+
+    def __init__(self, encoding: str):
+        if encoding == GZIP:
+            self._compressor = zlib.compressobj(self.GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        elif encoding == BROTLI and brotli is not None:
+            self._compressor = brotli.Compressor(quality=self.BROTLI_QUALITY)
+        else:
+            raise ValueError(f"Unsupported content encoding: {encoding!r}")
+        self.encoding = encoding
+
+    def compress(self, chunk: bytes) -> bytes:
+        """Compresses one part of the body, flushed so the client can decode it without waiting for more."""
+        if self.encoding == GZIP:
+            return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        return self._compressor.process(chunk) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        """Ends the compressed body."""
+        if self.encoding == GZIP:
+            return self._compressor.flush()
+        return self._compressor.finish()
+
+
+async def acoalesce(chunks: AsyncGenerator[bytes, None], window: float) -> AsyncGenerator[bytes, None]:
+    """
+    Joins chunks arriving within `window` seconds of the first one into a single chunk.
+
+    A chunk is held back for at most `window` seconds; chunks that are further apart than that are passed on
+    one by one, as they arrive.
+
+    Args:
+        chunks (AsyncGenerator[bytes, None]): The response body, e.g. SSE frames.
+        window (float): Seconds to wait for more chunks after the first of a write; 0 or less joins none.
+
+    Yields:
+        bytes: The chunks, joined where they arrived together.
+    """
+    if window <= 0:
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+        return
+
+    loop = asyncio.get_running_loop()
+    next_chunk = None
+    try:
+        while True:
+            if next_chunk is None:
+                next_chunk = asyncio.ensure_future(anext(chunks))
+            try:
+                batch = [await next_chunk]
+            except StopAsyncIteration:
+                return
+            next_chunk = None
+            deadline = loop.time() + window
+            while (remaining := deadline - loop.time()) > 0:
+                next_chunk = asyncio.ensure_future(anext(chunks))
+                done, _ = await asyncio.wait((next_chunk,), timeout=remaining)
+                if not done:
+                    # Still pending: it starts the next write.
+                    break
+                next_chunk = None
+                try:
+                    batch.append(done.pop().result())
+                except StopAsyncIteration:
+                    yield b"".join(batch)
+                    return
+            yield b"".join(batch)
+    finally:
+        if next_chunk is not None:
+            next_chunk.cancel()
+            await asyncio.gather(next_chunk, return_exceptions=True)
+        await chunks.aclose()
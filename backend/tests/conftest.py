@@ -4,3 +4,6 @@ import sys
 # Add backend directory explicitly
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))  # Add tests directory
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))  # Add backend directory
+
+# Use litellm's bundled model cost map instead of fetching it over the network at import time.
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
@@ -0,0 +1,126 @@
+"""
+Fake streaming LLM provider used by the unit tests and benchmarks.
+
+Stands in for `litellm.completion` / `litellm.acompletion` with `stream=True`, producing
+chunks shaped like litellm's (`chunk.choices[0].delta.content`) from canned quiz questions.
+No network calls are made.
+"""
+
+import asyncio
+import json
+import re
+import time
+from types import SimpleNamespace
+
+
+def make_chunk(content):
+    """Build a single litellm-style streaming chunk carrying `content`."""
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+def make_question(question_id: int, topic: str = "Testing") -> dict:
+    """Build a valid quiz question dictionary."""
+    return {
+        "question_id": question_id,
+        "question": f"Question {question_id} about {topic}?",
+        "A": f"Option A{question_id}",
+        "B": f"Option B{question_id}",
+        "C": f"Option C{question_id}",
+        "answer": "B",
+        "explanation": f"Because B{question_id} is correct.",
+        "wikipedia": "https://en.wikipedia.org/wiki/Test",
+    }
+
+
+def make_quiz_text(n_questions: int, topic: str = "Testing") -> str:
+    """Build the newline-delimited text an LLM would return for `n_questions` questions."""
+    return "".join(json.dumps(make_question(i, topic)) + "\n" for i in range(1, n_questions + 1))
+
+
+def quiz_text_for_prompt(kwargs: dict, topic: str = "Testing") -> str:
+    """
+    Build the quiz a model would return for a call's prompt: the requested number of questions,
+    numbered from the first id a shard prompt asks for.
+    """
+    prompt = kwargs["messages"][-1]["content"]
+    first_id = 1
+    shard = re.search(r"number the questions from (\d+) to (\d+)", prompt)
+    if shard:
+        first_id, last_id = int(shard.group(1)), int(shard.group(2))
+    else:
+        last_id = int(re.search(r"Provide (\d+) responses", prompt).group(1))
+    return "".join(json.dumps(make_question(i, topic)) + "\n" for i in range(first_id, last_id + 1))
+
+
+class FakeProviderError(Exception):
+    """An error from a fake provider, carrying an HTTP status code like the provider SDKs' errors."""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"Fake provider error {status_code}")
+        self.status_code = status_code
+
+
+class FakeStreamingProvider:
+    """
+    A fake streaming completion provider.
+
+    Each call streams `text` split into `chunk_size`-character chunks, sleeping `delay` seconds
+    before every chunk. The number of calls and the keyword arguments of the last call are recorded,
+    as is the number of async streams that were closed (finished or abandoned by the consumer).
+
+    Args:
+        n_questions (int): Number of canned questions to stream when `text` is not given.
+        chunk_size (int): Characters per streamed chunk.
+        delay (float): Seconds to sleep before each chunk.
+        text (str or Callable[[dict], str], optional): Exact text to stream instead of canned questions,
+            or a function building the text from each call's keyword arguments (e.g. from its prompt).
+        faults (list, optional): Faults injected into the first async calls, one per call: an exception is
+            raised by the call, and an int makes its stream stall forever after that many chunks.
+    """
+
+    def __init__(
+        self, n_questions: int = 3, chunk_size: int = 16, delay: float = 0.0, text: str = None, faults: list = None
+    ):
+        self.text = text if text is not None else make_quiz_text(n_questions)
+        self.chunk_size = chunk_size
+        self.delay = delay
+        self.faults = list(faults or [])
+        self.calls = 0
+        self.closed = 0
+        self.last_kwargs = None
+
+    def _pieces(self, kwargs):
+        text = self.text(kwargs) if callable(self.text) else self.text
+        return [text[i : i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+
+    def completion(self, **kwargs):
+        """Synchronous stand-in for `litellm.completion(stream=True)`."""
+        self.calls += 1
+        self.last_kwargs = kwargs
+        return self._sync_stream(self._pieces(kwargs))
+
+    async def acompletion(self, **kwargs):
+        """Asynchronous stand-in for `litellm.acompletion(stream=True)`."""
+        self.calls += 1
+        self.last_kwargs = kwargs
+        fault = self.faults.pop(0) if self.faults else None
+        if isinstance(fault, Exception):
+            raise fault
+        return self._async_stream(self._pieces(kwargs), stall_after=fault)
+
+    def _sync_stream(self, pieces):
+        for piece in pieces:
+            if self.delay:
+                time.sleep(self.delay)
+            yield make_chunk(piece)
+
+    async def _async_stream(self, pieces, stall_after: int = None):
+        try:
+            for i, piece in enumerate(pieces):
+                if i == stall_after:
+                    await asyncio.Event().wait()
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                yield make_chunk(piece)
+        finally:
+            self.closed += 1
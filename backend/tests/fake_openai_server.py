@@ -0,0 +1,84 @@
+"""
+A fake OpenAI-compatible HTTP server for tests and benchmarks that need real sockets.
+
+Runs a `ThreadingHTTPServer` on a free localhost port in a background thread and counts
+the TCP connections it accepts, so connection reuse can be measured end to end.
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep connections alive between requests.
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; avoid Nagle/delayed-ACK stalls on keep-alive connections.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        self.server.requests += 1
+
+        if self.path.endswith("/images/generations"):
+            body = json.dumps({"created": 0, "data": [{"url": self.server.image_url}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+
+class _CountingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connections = 0
+        self.requests = 0
+        self.image_url = "https://example.com/fake.png"
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+
+class FakeOpenAIServer:
+    """
+    Context manager running a fake OpenAI API on localhost.
+
+    Attributes:
+        base_url (str): The `/v1` base URL to pass to an OpenAI client.
+        connections (int): TCP connections accepted so far.
+        requests (int): HTTP requests served so far.
+    """
+
+    def __init__(self):
+        self._server = _CountingServer(("127.0.0.1", 0), _Handler)
+        host, port = self._server.server_address
+        self.base_url = f"http://{host}:{port}/v1"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def connections(self) -> int:
+        return self._server.connections
+
+    @property
+    def requests(self) -> int:
+        return self._server.requests
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,151 @@
+import asyncio
+import gc
+
+import pytest
+
+from backend.admission import AdmissionController, AdmissionRejected
+
+"""
+Test file for AdmissionController.
+
+Unit tests only: slots are acquired and released directly, and time is a fake clock for rate limits.
+"""
+
+
+class FakeClock:
+    """A settable monotonic clock."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def _pending(controller: AdmissionController, model: str) -> asyncio.Task:
+    """Starts acquiring a slot in a task and lets it reach the wait queue."""
+    task = asyncio.create_task(controller.acquire(model))
+    await asyncio.sleep(0.01)
+    return task
+
+
+class TestClientRateLimit:
+    """Unit tests for AdmissionController.check_rate."""
+
+    def test_burst_then_429_until_refilled(self):
+        """Test that a client gets its burst, is then rejected with 429, and is let through once refilled."""
+        clock = FakeClock()
+        controller = AdmissionController(client_rate=1.0, client_burst=2, clock=clock)
+        controller.check_rate("ip:1")
+        controller.check_rate("ip:1")
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            controller.check_rate("ip:1")
+        assert (rejected.value.status_code, rejected.value.reason) == (429, "rate_limited")
+        assert rejected.value.retry_after == pytest.approx(1.0)
+        controller.check_rate("ip:2")
+
+        clock.now = 1.0
+        controller.check_rate("ip:1")
+        assert controller.rejected["rate_limited"] == 1
+
+    def test_forgets_least_recently_seen_clients(self):
+        """Test that at most max_clients buckets are kept, and a zero rate disables the limit."""
+        controller = AdmissionController(client_rate=1.0, client_burst=1, max_clients=2, clock=FakeClock())
+        for client in ("a", "b", "a", "c"):
+            try:
+                controller.check_rate(client)
+            except AdmissionRejected:
+                pass
+
+        assert list(controller._clients) == ["a", "c"]
+        unlimited = AdmissionController(client_rate=0)
+        for _ in range(100):
+            unlimited.check_rate("a")
+
+
+class TestAdmissionSlots:
+    """Unit tests for AdmissionController.acquire."""
+
+    def test_waiters_are_admitted_in_order_as_slots_free(self):
+        """Test that requests beyond the global limit wait, and are admitted oldest first."""
+
+        async def run():
+            controller = AdmissionController(max_in_flight=1, max_wait=1.0)
+            release = await controller.acquire("gpt")
+            first = await _pending(controller, "gpt")
+            second = await _pending(controller, "gemini")
+            assert controller.queue_depth == 2
+
+            release()
+            release()  # Releasing twice frees one slot only.
+            await asyncio.sleep(0.01)
+            assert first.done() and not second.done()
+            (await first)()
+            await second
+            return controller.stats()
+
+        stats = asyncio.run(run())
+        assert (stats["in_flight"], stats["queue_depth"], stats["peak_queue_depth"]) == (1, 0, 2)
+        assert (stats["admitted"], stats["queued"]) == (3, 2)
+
+    def test_busy_model_does_not_block_other_models(self):
+        """Test that a waiter for a model at its limit does not hold up a later waiter for another model."""
+
+        async def run():
+            controller = AdmissionController(max_in_flight=2, max_in_flight_per_model=1, max_wait=1.0)
+            await controller.acquire("gpt")
+            release_gemini = await controller.acquire("gemini")
+            blocked = await _pending(controller, "gpt")
+            other = await _pending(controller, "azure")
+
+            release_gemini()
+            await asyncio.sleep(0.01)
+            assert other.done() and not blocked.done()
+            blocked.cancel()
+            await asyncio.gather(blocked, return_exceptions=True)
+            return controller.stats()
+
+        stats = asyncio.run(run())
+        assert stats["in_flight_by_model"] == {"gpt": 1, "azure": 1}
+        assert stats["queue_depth"] == 0
+
+    @pytest.mark.parametrize(
+        "max_queue, reason",
+        [(0, "queue_full"), (5, "wait_timeout")],
+    )
+    def test_rejects_with_503_when_queue_full_or_wait_too_long(self, max_queue, reason):
+        """Test that a request that cannot queue, or waits longer than max_wait, is rejected with 503."""
+
+        async def run():
+            controller = AdmissionController(max_in_flight=1, max_queue=max_queue, max_wait=0.02)
+            await controller.acquire("gpt")
+            with pytest.raises(AdmissionRejected) as rejected:
+                await controller.acquire("gpt")
+            return controller, rejected.value
+
+        controller, rejected = asyncio.run(run())
+        assert (rejected.status_code, rejected.reason) == (503, reason)
+        assert rejected.retry_after == 0.02
+        assert controller.rejected[reason] == 1
+        assert (controller.in_flight, controller.queue_depth) == (1, 0)
+
+    def test_held_stream_releases_its_slot(self):
+        """Test that a held stream releases its slot when closed early, or when dropped without being iterated."""
+
+        async def numbers():
+            for i in range(3):
+                yield i
+
+        async def run():
+            controller = AdmissionController()
+            held = controller.hold_until_closed(numbers(), await controller.acquire("gpt"))
+            assert await anext(held) == 0
+            await held.aclose()
+            in_flight_after_close = controller.in_flight
+
+            controller.hold_until_closed(numbers(), await controller.acquire("gpt"))
+            gc.collect()
+            return in_flight_after_close, controller.in_flight
+
+        assert asyncio.run(run()) == (0, 0)
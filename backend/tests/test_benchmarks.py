@@ -0,0 +1,696 @@
+"""
+Benchmarks for the backend hot paths.
+
+These run against local fakes only (no real API calls) and are sized to finish in a few seconds. Their
+timing and memory thresholds depend on the machine, so they are left out of the default test run and CI.
+Run `pytest -m benchmark -s` to run them and see the reported numbers.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import queue
+import re
+import statistics
+import subprocess
+import sys
+import time
+import zlib
+from logging.handlers import QueueListener
+from unittest.mock import patch
+from urllib.parse import urlencode
+
+import httpx
+import litellm
+import pytest
+from fake_llm import FakeStreamingProvider, make_chunk, make_question, make_quiz_text, quiz_text_for_prompt
+from fake_openai_server import FakeOpenAIServer
+
+from backend import response_stream_parser, stream_output
+from backend.fastapi_generate_quiz import app
+from backend.generate_image import ImageGenerator
+from backend.generate_quiz import QuizGenerator
+from backend.log_config import REQUEST_ID, TEXT_FORMAT, DeferredQueueHandler, RequestContextFilter
+from backend.provider_registry import ProviderRegistry
+from backend.quiz_cache import InMemoryQuizCache, QuizCache
+from backend.quiz_question import QuizQuestionValidator
+from backend.response_stream_parser import ResponseStreamParser
+
+
+@pytest.mark.benchmark
+class TestConnectionReuseBenchmark:
+    """
+    Counts new TCP connections opened to the provider per 1,000 image requests.
+
+    Before: a new ImageGenerator (and so new clients and connection pools) per request, as the endpoint used to do.
+    After: the worker's ProviderRegistry hands every request the same pooled client.
+
+    Building clients per request is slow (each one loads its own TLS context), so the "before" path
+    runs fewer requests and both results are normalised to 1,000 requests.
+    """
+
+    N_BEFORE = 20
+    N_AFTER = 1000
+    CONCURRENCY = 8
+
+    @pytest.fixture
+    def server(self, monkeypatch):
+        with FakeOpenAIServer() as server:
+            monkeypatch.setenv("OPENAI_API_KEY", "dummy_key")
+            monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+            yield server
+
+    async def _run(self, make_request, n_requests: int) -> float:
+        semaphore = asyncio.Semaphore(self.CONCURRENCY)
+
+        async def limited(i):
+            async with semaphore:
+                assert await make_request(f"prompt {i}") is not None
+
+        start = time.perf_counter()
+        await asyncio.gather(*[limited(i) for i in range(n_requests)])
+        return time.perf_counter() - start
+
+    def test_new_connections_per_1000_requests(self, server):
+        async def per_request_client(prompt):
+            image_generator = ImageGenerator()
+            try:
+                return await image_generator.agenerate_image(prompt)
+            finally:
+                await image_generator.async_client.close()
+
+        before_elapsed = asyncio.run(self._run(per_request_client, self.N_BEFORE))
+        before_connections = server.connections
+
+        async def pooled():
+            registry = ProviderRegistry()
+            registry.start()
+            try:
+                image_generator = registry.get_image_generator()
+                return await self._run(image_generator.agenerate_image, self.N_AFTER)
+            finally:
+                await registry.aclose()
+
+        after_elapsed = asyncio.run(pooled())
+        after_connections = server.connections - before_connections
+
+        print(
+            "\nnew TCP connections per 1000 image requests: "
+            f"before={before_connections * 1000 / self.N_BEFORE:.0f} "
+            f"({before_elapsed * 1000 / self.N_BEFORE:.1f}ms/request), "
+            f"after={after_connections * 1000 / self.N_AFTER:.0f} "
+            f"({after_elapsed * 1000 / self.N_AFTER:.1f}ms/request)"
+        )
+        assert server.requests == self.N_BEFORE + self.N_AFTER
+        assert before_connections == self.N_BEFORE
+        assert after_connections <= self.CONCURRENCY
+
+
+def _legacy_parse_stream(parser: ResponseStreamParser, llm_stream):
+    """The previous buffer-and-resplit parsing loop, kept as a baseline for the benchmarks."""
+    buffer = ""
+    for chunk in llm_stream:
+        content = parser._extract_chunk_content(chunk)
+        if content is None:
+            continue
+        buffer += content
+        if "\n" in buffer:
+            lines = buffer.split("\n")
+            buffer = lines[-1]
+            for line in lines[:-1]:
+                sse_line = parser._process_line(line)
+                if sse_line is not None:
+                    yield sse_line
+    if buffer.strip():
+        sse_line = parser._process_line(buffer)
+        if sse_line is not None:
+            yield sse_line
+
+
+def _best_of(fn, repeats: int = 3) -> tuple[float, list]:
+    best, result = float("inf"), None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+@pytest.mark.benchmark
+class TestParserScanningBenchmark:
+    """
+    Feeds a 50-question quiz to ResponseStreamParser one character per chunk, as reasoning
+    models tend to stream, and compares the incremental scanner with the previous parsing loop.
+
+    With one question per line both are linear; when the quiz arrives as one long line the
+    previous loop rescans the whole buffer on every delta and grows quadratically.
+    """
+
+    N_QUESTIONS = 50
+
+    def _chunks(self, text: str) -> list:
+        return [make_chunk(char) for char in text]
+
+    @pytest.mark.parametrize("layout", ["one-question-per-line", "single-line"])
+    def test_one_character_chunks(self, layout):
+        if layout == "single-line":
+            # Reasoning models sometimes put the whole quiz, with long explanations, on one line.
+            questions = [make_question(i) for i in range(1, self.N_QUESTIONS + 1)]
+            for question in questions:
+                question["explanation"] = "x" * 2000
+            text = json.dumps(questions) + "\n"
+        else:
+            text = make_quiz_text(self.N_QUESTIONS)
+        chunks = self._chunks(text)
+        newline_parser = ResponseStreamParser(framing=ResponseStreamParser.FRAMING_NEWLINE)
+        object_parser = ResponseStreamParser(framing=ResponseStreamParser.FRAMING_JSON_OBJECT)
+
+        legacy_time, legacy_output = _best_of(lambda: list(_legacy_parse_stream(newline_parser, chunks)))
+        newline_time, newline_output = _best_of(lambda: list(newline_parser.parse_stream(chunks)))
+        object_time, object_output = _best_of(lambda: list(object_parser.parse_stream(chunks)))
+
+        print(
+            f"\n{len(chunks)} one-character chunks ({layout}): legacy={legacy_time * 1000:.1f}ms, "
+            f"newline={newline_time * 1000:.1f}ms ({legacy_time / newline_time:.2f}x), "
+            f"json_object={object_time * 1000:.1f}ms ({legacy_time / object_time:.2f}x)"
+        )
+        assert newline_output == legacy_output
+        assert len(newline_output) == (1 if layout == "single-line" else self.N_QUESTIONS)
+        # Brace framing recovers every question, even when they share a line.
+        assert len(object_output) == self.N_QUESTIONS
+
+
+@pytest.mark.benchmark
+class TestSSEEmissionBenchmark:
+    """
+    Compares per-question CPU time of the two emission modes.
+
+    Current path: json.loads + json.dumps into a str frame, which StreamingResponse then encodes.
+    New path: validate once (orjson when installed) and write the original text into a bytes frame.
+    """
+
+    N_ITERATIONS = 20000
+
+    def test_per_question_cpu_time(self):
+        lines = [json.dumps(make_question(i)) for i in range(1, 51)]
+        str_parser = ResponseStreamParser()
+        bytes_parser = ResponseStreamParser(emit_bytes=True)
+        rounds = self.N_ITERATIONS // len(lines)
+
+        def current_path():
+            for _ in range(rounds):
+                for line in lines:
+                    str_parser._process_line(line).encode("utf-8")
+
+        def bytes_path():
+            for _ in range(rounds):
+                for line in lines:
+                    bytes_parser._encode_line(line)
+
+        def measure(fn):
+            best = float("inf")
+            for _ in range(3):
+                start = time.process_time()
+                fn()
+                best = min(best, time.process_time() - start)
+            return best / (rounds * len(lines)) * 1e6
+
+        current_us = measure(current_path)
+        bytes_us = measure(bytes_path)
+        backend = "orjson" if response_stream_parser.orjson is not None else "json"
+
+        print(
+            f"\nper-question CPU time: loads+dumps+encode={current_us:.2f}us, "
+            f"validate-once bytes ({backend})={bytes_us:.2f}us ({current_us / bytes_us:.2f}x)"
+        )
+        for line in lines:
+            assert bytes_parser._encode_line(line) == str_parser._process_line(line).encode("utf-8")
+        assert bytes_us < current_us
+
+
+@pytest.mark.benchmark
+class TestQuestionValidationBenchmark:
+    """
+    Measures how many questions per second QuizQuestionValidator accepts on top of JSON parsing,
+    so validation stays negligible next to the time it takes a model to stream a question.
+    """
+
+    N_QUESTIONS = 20000
+
+    def test_questions_per_second(self):
+        lines = [json.dumps(make_question(i)) for i in range(1, self.N_QUESTIONS + 1)]
+        objects = [json.loads(line) for line in lines]
+
+        def validate_all():
+            validator = QuizQuestionValidator()
+            for line, obj in zip(lines, objects):
+                validator.validate(obj, raw=line)
+            return validator
+
+        elapsed, validator = _best_of(validate_all)
+        rate = self.N_QUESTIONS / elapsed
+
+        print(f"\nvalidated {self.N_QUESTIONS} questions in {elapsed * 1000:.1f}ms ({rate:,.0f} questions/s)")
+        assert validator.accepted == self.N_QUESTIONS
+        assert rate > 20000
+
+
+@pytest.mark.benchmark
+class TestQuizCacheBenchmark:
+    """
+    Compares the p50 time to stream a whole quiz on a cache miss (fake provider with a per-chunk delay,
+    standing in for model latency) and on a cache hit (replayed from the in-memory cache).
+    """
+
+    N_REQUESTS = 20
+    CHUNK_DELAY = 0.002
+
+    def test_p50_latency_hit_vs_miss(self, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "dummy_key")
+        provider = FakeStreamingProvider(n_questions=5, chunk_size=64, delay=self.CHUNK_DELAY)
+        quiz_generator = QuizGenerator(cache=QuizCache(InMemoryQuizCache(max_entries=10, ttl=60.0)))
+
+        async def timed_quiz(use_cache):
+            start = time.perf_counter()
+            generator = await quiz_generator.agenerate_quiz("UK History", "easy", n_questions=5, use_cache=use_cache)
+            frames = [frame async for frame in generator]
+            return time.perf_counter() - start, frames
+
+        async def run():
+            misses = [await timed_quiz(use_cache=False) for _ in range(self.N_REQUESTS)]
+            hits = [await timed_quiz(use_cache=True) for _ in range(self.N_REQUESTS)]
+            return misses, hits
+
+        with patch("litellm.acompletion", side_effect=provider.acompletion):
+            misses, hits = asyncio.run(run())
+
+        miss_p50 = statistics.median(elapsed for elapsed, _ in misses)
+        hit_p50 = statistics.median(elapsed for elapsed, _ in hits)
+        print(
+            f"\np50 quiz latency: miss={miss_p50 * 1000:.2f}ms, hit={hit_p50 * 1000:.3f}ms "
+            f"({miss_p50 / hit_p50:.0f}x), provider calls={provider.calls} for {2 * self.N_REQUESTS} requests"
+        )
+        assert all(frames == misses[0][1] for _, frames in hits)
+        assert provider.calls == self.N_REQUESTS
+        assert hit_p50 < miss_p50 / 10
+
+
+@pytest.mark.benchmark
+class TestQuestionPoolBenchmark:
+    """
+    Measures the p50 time for /GenerateQuiz to stream a quiz on a pooled topic once the lifespan's
+    background worker has filled the pool, against a fake provider with a per-chunk delay.
+    """
+
+    N_REQUESTS = 20
+    N_QUESTIONS = 5
+
+    def test_p50_latency_pool_hit(self, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "dummy_key")
+        monkeypatch.setenv("QUIZ_CACHE_BACKEND", "none")
+        monkeypatch.setenv("QUESTION_POOL_TOPICS", "UK History")
+        monkeypatch.setenv("QUESTION_POOL_DIFFICULTIES", "easy")
+        monkeypatch.setenv("QUESTION_POOL_REFILL_SIZE", "200")
+        provider = FakeStreamingProvider(text=make_quiz_text(200, "UK History"), chunk_size=64, delay=0.0005)
+        params = {"topic": "UK History", "difficulty": "easy", "n_questions": self.N_QUESTIONS}
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with app.router.lifespan_context(app):
+                pool = app.state.providers.question_pool
+                while len(pool) < self.N_REQUESTS * self.N_QUESTIONS:
+                    await asyncio.sleep(0.01)
+                calls_before = provider.calls
+                latencies = []
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    for _ in range(self.N_REQUESTS):
+                        start = time.perf_counter()
+                        response = await client.get("/GenerateQuiz", params=params)
+                        latencies.append(time.perf_counter() - start)
+                        assert len(re.findall(r"^id: ", response.text, re.MULTILINE)) == self.N_QUESTIONS
+            return latencies, calls_before, pool.hits
+
+        with patch("litellm.acompletion", side_effect=provider.acompletion):
+            latencies, calls_before, hits = asyncio.run(run())
+
+        p50 = statistics.median(latencies)
+        print(f"\np50 pooled quiz latency: {p50 * 1000:.2f}ms over {self.N_REQUESTS} requests, {hits} pool hits")
+        assert hits == self.N_REQUESTS
+        assert p50 < 0.010
+
+
+@pytest.mark.benchmark
+class TestShardedGenerationBenchmark:
+    """
+    Compares the wall-clock time to stream a 30-question quiz from one LLM call and from concurrent
+    shards, with a fake provider that answers each prompt with the questions it asked for and sleeps
+    a fixed delay per token-sized chunk, so decode time grows with the number of questions.
+    """
+
+    N_QUESTIONS = 30
+    TOKEN_DELAY = 0.0005
+
+    @pytest.mark.parametrize("shards", [3, 6])
+    def test_speedup(self, monkeypatch, shards):
+        monkeypatch.setenv("OPENAI_API_KEY", "dummy_key")
+        provider = FakeStreamingProvider(text=quiz_text_for_prompt, chunk_size=8, delay=self.TOKEN_DELAY)
+
+        async def timed_quiz(quiz_generator):
+            start = time.perf_counter()
+            generator = await quiz_generator.agenerate_quiz("UK History", "easy", n_questions=self.N_QUESTIONS)
+            frames = [frame async for frame in generator]
+            return time.perf_counter() - start, frames
+
+        async def run():
+            single = await timed_quiz(QuizGenerator())
+            sharded = await timed_quiz(QuizGenerator(shards=shards))
+            return single, sharded
+
+        with patch("litellm.acompletion", side_effect=provider.acompletion):
+            (single_time, single_frames), (sharded_time, sharded_frames) = asyncio.run(run())
+
+        print(
+            f"\n{self.N_QUESTIONS} questions: single stream {single_time * 1000:.0f}ms, "
+            f"{shards} shards {sharded_time * 1000:.0f}ms ({single_time / sharded_time:.1f}x speedup)"
+        )
+        assert len(sharded_frames) == len(single_frames) == self.N_QUESTIONS
+        assert provider.calls == 1 + shards
+        assert single_time / sharded_time > shards / 2
+
+
+@pytest.mark.benchmark
+class TestMetricsOverheadBenchmark:
+    """
+    Measures what the metrics add per streamed chunk: a 50-question quiz in 4-character chunks is parsed
+    bare, and through the instrumented stream and question wrappers QuizGenerator uses.
+    """
+
+    N_QUESTIONS = 50
+
+    def test_overhead_per_chunk(self, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "dummy_key")
+        quiz_generator = QuizGenerator()
+        text = make_quiz_text(self.N_QUESTIONS)
+        chunks = [make_chunk(text[i : i + 4]) for i in range(0, len(text), 4)]
+        parser = ResponseStreamParser(framing=ResponseStreamParser.FRAMING_JSON_OBJECT)
+
+        async def llm_stream():
+            for chunk in chunks:
+                yield chunk
+
+        async def bare():
+            return [question async for question in parser.aparse_questions(llm_stream())]
+
+        async def instrumented():
+            started = time.perf_counter()
+            stream = quiz_generator._ameasure_stream("benchmark", llm_stream(), started, "prompt")
+            questions = quiz_generator._ameasure_questions("benchmark", parser.aparse_questions(stream), started)
+            return [question async for question in questions]
+
+        bare_time, bare_questions = _best_of(lambda: asyncio.run(bare()), repeats=5)
+        instrumented_time, instrumented_questions = _best_of(lambda: asyncio.run(instrumented()), repeats=5)
+        overhead_ns = (instrumented_time - bare_time) / len(chunks) * 1e9
+
+        print(
+            f"\n{len(chunks)} chunks: bare={bare_time * 1000:.2f}ms, instrumented={instrumented_time * 1000:.2f}ms "
+            f"({overhead_ns:.0f}ns/chunk, {(instrumented_time / bare_time - 1) * 100:.1f}%)"
+        )
+        assert len(instrumented_questions) == len(bare_questions) == self.N_QUESTIONS
+        assert overhead_ns < 5000
+
+
+@pytest.mark.benchmark
+class TestRequestLoggingBenchmark:
+    """
+    Measures the logging cost one quiz request pays on the event loop thread, writing to /dev/null.
+
+    Before: eager f-strings written synchronously by a StreamHandler, with the request line logged twice
+    and the whole prompt at INFO. After: lazy arguments handed to a queue, the prompt at DEBUG, and the
+    lines formatted and written by a listener thread; with and without sampling 10% of requests.
+    """
+
+    N_REQUESTS = 5000
+
+    @staticmethod
+    def _logger(name: str, handler: logging.Handler) -> logging.Logger:
+        logger = logging.getLogger(f"benchmark.{name}")
+        logger.handlers = [handler]
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        return logger
+
+    def _before(self, logger, prompt, topic, n_questions, model):
+        logger.info(f"Quiz request: topic={topic}, difficulty=easy, n_questions={n_questions}, model={model}")
+        logger.info(f"Generating quiz with: {topic=}, {n_questions=}, {model=}.")
+        logger.info(f"Prompt for LLM: {prompt}")
+        logger.info(f"Finished processing the stream! Accepted {n_questions} questions, dropped 0 items.")
+
+    def _after(self, logger, prompt, topic, n_questions, model):
+        logger.info("Quiz request: topic=%r, difficulty=easy, n_questions=%d, model=%r", topic, n_questions, model)
+        logger.info("Requesting %d questions from %s.", n_questions, model)
+        logger.debug("Prompt for LLM: %s", prompt)
+        logger.info("Finished processing the stream! Accepted %d questions, dropped %d items.", n_questions, 0)
+
+    def _per_request_us(self, log_request, logger, prompt: str) -> float:
+        start = time.perf_counter()
+        for i in range(self.N_REQUESTS):
+            token = REQUEST_ID.set(f"request-{i}")
+            log_request(logger, prompt, "UK History", 10, "gpt-4-turbo")
+            REQUEST_ID.reset(token)
+        return (time.perf_counter() - start) / self.N_REQUESTS * 1e6
+
+    def test_per_request_cost(self, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "dummy_key")
+        prompt = QuizGenerator()._create_role("UK History", "easy", 10)
+        with open(os.devnull, "w") as devnull:
+            formatter = logging.Formatter(TEXT_FORMAT)
+            output = logging.StreamHandler(devnull)
+            output.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+            before_us = self._per_request_us(self._before, self._logger("before", output), prompt)
+
+            after = {}
+            for sample_rate in (1.0, 0.1):
+                handler = DeferredQueueHandler(queue.SimpleQueue())
+                handler.addFilter(RequestContextFilter(sample_rate))
+                written = logging.StreamHandler(devnull)
+                written.setFormatter(formatter)
+                listener = QueueListener(handler.queue, written)
+                listener.start()
+                try:
+                    logger = self._logger(f"after{sample_rate}", handler)
+                    after[sample_rate] = self._per_request_us(self._after, logger, prompt)
+                finally:
+                    listener.stop()
+
+        print(
+            f"\nlogging cost per quiz request on the calling thread: before={before_us:.1f}us, "
+            f"after={after[1.0]:.1f}us ({before_us / after[1.0]:.1f}x), "
+            f"after with 10% sampling={after[0.1]:.1f}us ({before_us / after[0.1]:.1f}x)"
+        )
+        assert after[1.0] < before_us
+        assert after[0.1] < after[1.0]
+
+
+def _legacy_create_role(topic: str, difficulty: str, n_questions: int) -> str:
+    """The previous single-message prompt, with the request's values in the middle, kept as a baseline."""
+    return (
+        f"You are an AI that generates quiz questions. "
+        f"You will be given a topic (e.g., Roman History) with a difficulty level. "
+        f"Provide {n_questions} responses in JSON format similar to this example: \n{QuizGenerator.EXAMPLE_RESPONSE}. "
+        f"Generate similar responses for the topic '{topic}' with a difficulty of '{difficulty}'. "
+        f"ENSURE THESE ARE CORRECT. DO NOT INCLUDE INCORRECT ANSWERS! "
+        f"DO NOT PREFIX THE RESPONSE WITH ANYTHING EXCEPT THE RAW JSON! "
+        f"Return each question on a new line."
+    )
+
+
+@pytest.mark.benchmark
+class TestPromptPrefixBenchmark:
+    """
+    Reports the input tokens per quiz request that a provider can serve from its prompt cache.
+
+    Before: one user message with the number of questions near its start, so only the first sentence
+    or so is shared between requests. After: a static system message shared by every request, and
+    a short user message with the topic, difficulty and number of questions.
+    """
+
+    def test_cacheable_input_tokens_per_request(self, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "dummy_key")
+        quiz_generator = QuizGenerator(model="gpt-4-turbo")
+        model = quiz_generator.model
+        requests = [("UK History", "easy", 5), ("Crested Geckos", "hard", 10)]
+
+        def count(text: str) -> int:
+            return litellm.token_counter(model=model, text=text)
+
+        before = [_legacy_create_role(*request) for request in requests]
+        shared = os.path.commonprefix(before)
+        before_total = count(before[0])
+        before_cacheable = count(shared)
+
+        after = [quiz_generator._create_messages(quiz_generator._create_role(*request)) for request in requests]
+        assert after[0][0] == after[1][0]
+        after_cacheable = count(after[0][0]["content"])
+        after_total = after_cacheable + count(after[0][1]["content"])
+
+        before_uncached = before_total - before_cacheable
+        after_uncached = after_total - after_cacheable
+        print(
+            f"\ninput tokens per request ({model}): before={before_total} ({before_cacheable} cacheable, "
+            f"{before_uncached} uncached), after={after_total} ({after_cacheable} cacheable, "
+            f"{after_uncached} uncached): {before_uncached - after_uncached} fewer uncached tokens per request"
+        )
+        assert after_uncached < before_uncached / 10
+
+
+async def _asgi_get(path: str, params: dict, headers: dict) -> list[bytes]:
+    """Calls the app as an ASGI server would and returns the body of every write it makes, in order."""
+    writes = []
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            writes.append(message["body"])
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.4"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": urlencode(params).encode(),
+        "headers": [(b"host", b"test")] + [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+        "client": ("127.0.0.1", 50000),
+        "server": ("test", 80),
+    }
+    await app(scope, receive, send)
+    return writes
+
+
+@pytest.mark.benchmark
+class TestStreamOutputBenchmark:
+    """
+    Reports the writes (each one a send syscall on the server) and bytes on the wire per /GenerateQuiz stream,
+    for a quiz streamed from a fake provider with a per-chunk delay and for the same quiz replayed from the cache.
+
+    Before: every frame is its own uncompressed write. After: frames arriving within STREAM_COALESCE_SECONDS
+    share a write, and each write is compressed (gzip, and brotli when installed) with a flush per write.
+    """
+
+    N_QUESTIONS = 10
+    CHUNK_DELAY = 0.002
+
+    def _run(self, monkeypatch, coalesce: float, accept_encoding: str) -> dict:
+        monkeypatch.setenv("QUIZ_CACHE_BACKEND", "memory")
+        monkeypatch.setenv("STREAM_COALESCE_SECONDS", str(coalesce))
+        provider = FakeStreamingProvider(n_questions=self.N_QUESTIONS, chunk_size=64, delay=self.CHUNK_DELAY)
+        params = {"topic": "Stream output", "difficulty": "easy", "n_questions": self.N_QUESTIONS}
+        headers = {"Accept-Encoding": accept_encoding}
+
+        async def run():
+            async with app.router.lifespan_context(app):
+                return {source: await _asgi_get("/GenerateQuiz", params, headers) for source in ("live", "cached")}
+
+        with patch("litellm.acompletion", side_effect=provider.acompletion):
+            results = asyncio.run(run())
+        assert provider.calls == 1
+        return results
+
+    def test_writes_and_bytes_per_quiz(self, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "dummy_key")
+        modes = {"before": (0, "identity"), "coalesced": (0.005, "identity"), "gzip": (0.005, "gzip")}
+        if stream_output.brotli is not None:
+            modes["br"] = (0.005, "br")
+        results = {mode: self._run(monkeypatch, *settings) for mode, settings in modes.items()}
+
+        print()
+        for source in ("live", "cached"):
+            print(
+                f"{source} quiz of {self.N_QUESTIONS} questions: "
+                + ", ".join(
+                    f"{mode}={len(writes[source])} writes/{sum(map(len, writes[source]))} bytes"
+                    for mode, writes in results.items()
+                )
+            )
+
+        gzip_body = zlib.decompress(b"".join(results["gzip"]["cached"]), 16 + zlib.MAX_WBITS)
+        assert len(re.findall(rb"^id: ", gzip_body, re.MULTILINE)) == self.N_QUESTIONS
+        before, coalesced, gzipped = results["before"], results["coalesced"], results["gzip"]
+        assert len(before["cached"]) == self.N_QUESTIONS + 1
+        assert len(coalesced["cached"]) < len(before["cached"]) / 2
+        assert len(coalesced["live"]) < len(before["live"])
+        assert sum(map(len, gzipped["live"])) < sum(map(len, coalesced["live"])) * 0.8
+
+
+_STARTUP_SCRIPT = """
+import sys, time
+started = time.perf_counter()
+import fastapi_generate_quiz, lazy_imports
+if sys.argv[1] == "warm":
+    lazy_imports.load(*lazy_imports.PROVIDER_SDKS)
+seconds = time.perf_counter() - started
+# Peak RSS of this process image (ru_maxrss would include the pytest process it was forked from).
+with open("/proc/self/status") as status:
+    rss = next(line.split()[1] for line in status if line.startswith("VmHWM:"))
+print(seconds, rss, *map(lazy_imports.is_loaded, lazy_imports.PROVIDER_SDKS))
+"""
+
+
+@pytest.mark.benchmark
+class TestStartupBenchmark:
+    """
+    Reports the import time and peak RSS of a fresh process importing the app, run under `python -X importtime`.
+
+    Cold: the app module alone, as the server imports it before accepting connections; the provider SDKs
+    are imported lazily. Warm: the same, then the provider SDKs loaded as the lifespan warm-up does, which is
+    what importing the app used to cost. The slowest modules are listed from the importtime report.
+    """
+
+    def _start(self, mode: str) -> tuple[float, int, list[str], list[tuple[int, str]]]:
+        backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _STARTUP_SCRIPT, mode],
+            cwd=backend_dir,
+            env={**os.environ, "LITELLM_LOCAL_MODEL_COST_MAP": "True"},
+            capture_output=True,
+            text=True,
+            check=True,
+            timeout=120,
+        )
+        # "import time: <self us> | <cumulative us> | <module>", one line per module; nested ones are indented.
+        top_level = []
+        for line in result.stderr.splitlines():
+            fields = line.removeprefix("import time:").split("|")
+            if len(fields) == 3 and fields[1].strip().isdigit() and not fields[2].startswith("   "):
+                top_level.append((int(fields[1]), fields[2].strip()))
+        seconds, max_rss_kb, *loaded = result.stdout.split()
+        return float(seconds), int(max_rss_kb), loaded, sorted(top_level, reverse=True)[:3]
+
+    def test_import_time_and_rss(self):
+        cold_seconds, cold_rss, cold_loaded, cold_slowest = self._start("cold")
+        warm_seconds, warm_rss, warm_loaded, warm_slowest = self._start("warm")
+
+        def slowest(modules):
+            return ", ".join(f"{name} {us / 1e6:.2f}s" for us, name in modules)
+
+        print(
+            f"\ncold (app only): {cold_seconds:.2f}s, peak RSS {cold_rss / 1024:.0f}MB; "
+            f"slowest: {slowest(cold_slowest)}"
+            f"\nwarm (app + provider SDKs): {warm_seconds:.2f}s, peak RSS {warm_rss / 1024:.0f}MB; "
+            f"slowest: {slowest(warm_slowest)}"
+        )
+        assert cold_loaded == ["False", "False"]
+        assert warm_loaded == ["True", "True"]
+        assert cold_seconds < warm_seconds / 2
+        assert cold_rss < warm_rss
@@ -0,0 +1,810 @@
+import asyncio
+import json
+import logging
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+from urllib.parse import urlencode
+
+import anyio
+import httpx
+import pytest
+from fake_llm import FakeProviderError, FakeStreamingProvider
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+from backend import fastapi_generate_quiz
+from backend.fastapi_generate_quiz import app, get_image_generator
+from backend.generate_image import ImageGenerator
+from backend.generate_quiz import QuizGenerator
+
+"""
+Test file for the FastAPI endpoints.
+
+Requests are sent in-process through httpx's ASGI transport and the LLM provider is replaced
+by a fake local streaming provider, so no real API calls are made.
+"""
+
+
+@pytest.fixture(autouse=True)
+def api_keys(monkeypatch):
+    """Set dummy API keys so QuizGenerator can be constructed."""
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy_key")
+
+
+async def _run_concurrent_quizzes(asgi_app, n_requests: int, threadpool_size: int) -> tuple[float, list[str]]:
+    """Fire `n_requests` concurrent quiz requests with a threadpool capped at `threadpool_size`."""
+    anyio.to_thread.current_default_thread_limiter().total_tokens = threadpool_size
+    transport = httpx.ASGITransport(app=asgi_app)
+    # httpx's ASGI transport does not run the lifespan, so enter it explicitly.
+    async with asgi_app.router.lifespan_context(asgi_app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            start = time.perf_counter()
+            responses = await asyncio.gather(
+                *[
+                    # Distinct topics, so every request gets its own upstream stream rather than being coalesced.
+                    client.get("/GenerateQuiz", params={"topic": f"Load {i}", "difficulty": "easy", "n_questions": 3})
+                    for i in range(n_requests)
+                ]
+            )
+            elapsed = time.perf_counter() - start
+    return elapsed, [response.text for response in responses]
+
+
+def _parse_events(body: str) -> list[tuple[str, dict]]:
+    """Splits an SSE body into (event name, JSON data) pairs, skipping heartbeat comments."""
+    events = []
+    for frame in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in frame.splitlines() if not line.startswith(":"))
+        if "data" in fields:
+            events.append((fields.get("event", "message"), json.loads(fields["data"])))
+    return events
+
+
+def _questions(body: str) -> list[dict]:
+    """Returns the questions of a /GenerateQuiz body (its unnamed events)."""
+    return [data for name, data in _parse_events(body) if name == "message"]
+
+
+class TestGenerateQuizEndpoint:
+    """Unit tests for /GenerateQuiz."""
+
+    def test_streams_sse_questions(self):
+        """Test the endpoint streams each question as an SSE frame."""
+        provider = FakeStreamingProvider(n_questions=3)
+        with patch("litellm.acompletion", side_effect=provider.acompletion):
+            _, bodies = asyncio.run(_run_concurrent_quizzes(app, n_requests=1, threadpool_size=40))
+
+        assert len(_questions(bodies[0])) == 3
+        assert _parse_events(bodies[0])[-1][0] == "done"
+        assert provider.calls == 1
+
+    def test_repeat_request_is_served_from_cache(self, monkeypatch):
+        """Test that a repeat request replays the cached quiz and that cache=false bypasses it."""
+        monkeypatch.setenv("QUIZ_CACHE_BACKEND", "memory")
+        provider = FakeStreamingProvider(n_questions=3)
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            params = {"topic": "UK History", "difficulty": "easy", "n_questions": 3}
+            async with app.router.lifespan_context(app):
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    first = await client.get("/GenerateQuiz", params=params)
+                    cached = await client.get("/GenerateQuiz", params=params)
+                    calls_after_cached = provider.calls
+                    fresh = await client.get("/GenerateQuiz", params={**params, "cache": "false"})
+            return first.text, cached.text, calls_after_cached, fresh.text
+
+        with patch("litellm.acompletion", side_effect=provider.acompletion):
+            first, cached, calls_after_cached, fresh = asyncio.run(run())
+
+        assert len(_questions(first)) == 3
+        assert _questions(cached) == _questions(first)
+        assert calls_after_cached == 1
+        assert _questions(fresh) == _questions(first)
+        assert provider.calls == 2
+
+    def test_identical_concurrent_requests_share_one_upstream_stream(self):
+        """Test that 30 identical concurrent requests make a single upstream LLM call."""
+        provider = FakeStreamingProvider(n_questions=3, delay=0.005)
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            params = {"topic": "Shared link", "difficulty": "easy", "n_questions": 3, "cache": "false"}
+            async with app.router.lifespan_context(app):
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    responses = await asyncio.gather(*[client.get("/GenerateQuiz", params=params) for _ in range(30)])
+            return [response.text for response in responses]
+
+        with patch("litellm.acompletion", side_effect=provider.acompletion):
+            bodies = asyncio.run(run())
+
+        assert provider.calls == 1
+        assert all(_questions(body) == _questions(bodies[0]) for body in bodies)
+        assert len(_questions(bodies[0])) == 3
+
+    def test_log_lines_carry_the_request_id(self, caplog):
+        """Test that the endpoint, generator and parser log lines of a request share its X-Request-ID."""
+        provider = FakeStreamingProvider(n_questions=2)
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with app.router.lifespan_context(app):
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    params = {"topic": "Request ids", "difficulty": "easy", "n_questions": 2, "cache": "false"}
+                    given = await client.get("/GenerateQuiz", params=params, headers={"X-Request-ID": "req-42"})
+                    generated = await client.get("/SupportedModels")
+            return given, generated
+
+        with caplog.at_level(logging.INFO), patch("litellm.acompletion", side_effect=provider.acompletion):
+            given, generated = asyncio.run(run())
+
+        assert given.headers["X-Request-ID"] == "req-42"
+        assert len(generated.headers["X-Request-ID"]) == 16
+        tagged = {
+            record.name.removeprefix("backend.")
+            for record in caplog.records
+            if getattr(record, "request_id", None) == "req-42"
+        }
+        assert {"fastapi_generate_quiz", "generate_quiz", "response_stream_parser"} <= tagged
+
+    def test_any_model_is_routed_and_reported(self, monkeypatch):
+        """Test that model=any picks a model with a configured key and /RoutingStats reports its latency."""
+        for key in ("GEMINI_API_KEY", "GOOGLE_API_KEY", "AZURE_AI_API_KEY", "AZURE_AI_API_BASE"):
+            monkeypatch.delenv(key, raising=False)
+        provider = FakeStreamingProvider(n_questions=3)
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            params = {"topic": "Routing", "difficulty": "easy", "n_questions": 3, "model": "any"}
+            async with app.router.lifespan_context(app):
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    models = await client.get("/SupportedModels")
+                    quiz = await client.get("/GenerateQuiz", params=params)
+                    stats = await client.get("/RoutingStats")
+            return models.json(), quiz.text, stats.json()
+
+        with patch("litellm.acompletion", side_effect=provider.acompletion):
+            models, quiz, stats = asyncio.run(run())
+
+        assert models["models"][-1] == "any"
+        assert len(_questions(quiz)) == 3
+        assert provider.last_kwargs["model"] == "gpt-3.5-turbo"
+        assert stats["models"]["gpt-3.5-turbo"]["requests"] == 1
+        assert stats["models"]["gpt-3.5-turbo"]["ttft_seconds"] is not None
+        assert stats["models"]["gemini/gemini-2.0-flash"]["healthy"] is False
+
+    def test_open_circuit_returns_503_then_reroutes(self, monkeypatch):
+        """Test that a request opening its provider's breaker gets 503, and later requests are rerouted."""
+        monkeypatch.setenv("CIRCUIT_BREAKER_MIN_CALLS", "2")
+        monkeypatch.setenv("CIRCUIT_BREAKER_COOLDOWN_SECONDS", "30")
+        monkeypatch.setenv("PROVIDER_RETRY_BASE_DELAY_SECONDS", "0")
+        provider = FakeStreamingProvider(faults=[FakeProviderError(503)] * 2)
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            params = {"topic": "Outage", "difficulty": "easy", "n_questions": 3}
+            async with app.router.lifespan_context(app):
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    first = await client.get("/GenerateQuiz", params=params)
+                    second = await client.get("/GenerateQuiz", params=params)
+                    stats = await client.get("/RoutingStats")
+            return first, second, stats.json()
+
+        with patch("litellm.acompletion", side_effect=provider.acompletion):
+            first, second, stats = asyncio.run(run())
+
+        assert first.status_code == 503
+        assert 0 < int(first.headers["Retry-After"]) <= 30
+        assert second.status_code == 200
+        assert len(_questions(second.text)) == 3
+        assert provider.last_kwargs["model"] != "gpt-3.5-turbo"
+        assert stats["models"]["gpt-3.5-turbo"]["healthy"] is False
+        assert stats["providers"]["breakers"]["openai"]["state"] == "open"
+        assert stats["providers"]["retries"] == 2
+
+    def test_reconnect_with_last_event_id_resumes_the_stream(self):
+        """Test that a reconnect sending the id of question 1 is replayed questions 2 and 3, without a new call."""
+        provider = FakeStreamingProvider(n_questions=3)
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            params = {"topic": "Resume", "difficulty": "easy", "n_questions": 3, "cache": "false"}
+            async with app.router.lifespan_context(app):
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    first = await client.get("/GenerateQuiz", params=params)
+                    first_id = next(line for line in first.text.splitlines() if line.startswith("id: "))[4:]
+                    resumed = await client.get("/GenerateQuiz", params=params, headers={"Last-Event-ID": first_id})
+            return first.text, resumed.text
+
+        with patch("litellm.acompletion", side_effect=provider.acompletion):
+            first, resumed = asyncio.run(run())
+
+        assert _questions(resumed) == _questions(first)[1:]
+        assert _parse_events(resumed)[-1][0] == "done"
+        assert _parse_events(resumed)[-1][1]["resumed"] is True
+        assert provider.calls == 1
+
+    def test_slow_stream_gets_heartbeats(self, monkeypatch):
+        """Test that a stream idle for longer than SSE_HEARTBEAT_SECONDS is sent keep-alive comments."""
+        monkeypatch.setenv("SSE_HEARTBEAT_SECONDS", "0.02")
+        provider = FakeStreamingProvider(n_questions=2, delay=0.05)
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            params = {"topic": "Heartbeat", "difficulty": "easy", "n_questions": 2, "cache": "false"}
+            async with app.router.lifespan_context(app):
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    return (await client.get("/GenerateQuiz", params=params)).text
+
+        with patch("litellm.acompletion", side_effect=provider.acompletion):
+            body = asyncio.run(run())
+
+        assert ": keep-alive\n\n" in body
+        assert len(_questions(body)) == 2
+
+
+class TestAdmissionControl:
+    """Unit tests for per-client rate limits and upstream admission on the endpoints."""
+
+    @staticmethod
+    async def _get_all(requests: list[tuple[str, dict, dict]]) -> tuple[list[httpx.Response], dict]:
+        """Sends (path, params, headers) requests concurrently; returns the responses and /AdmissionStats."""
+        transport = httpx.ASGITransport(app=app)
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                responses = await asyncio.gather(
+                    *[client.get(path, params=params, headers=headers) for path, params, headers in requests]
+                )
+                stats = await client.get("/AdmissionStats")
+        return list(responses), stats.json()
+
+    def test_client_over_rate_limit_gets_429(self, monkeypatch):
+        """Test that a client is limited to its burst, and clients with their own API key are limited separately."""
+        monkeypatch.setenv("CLIENT_RATE_LIMIT_BURST", "2")
+        monkeypatch.setenv("CLIENT_RATE_LIMIT_PER_MINUTE", "6")
+        provider = FakeStreamingProvider(n_questions=1)
+        params = {"topic": "Limits", "difficulty": "easy", "n_questions": 1}
+        requests = [("/GenerateQuiz", params, {})] * 3 + [("/GenerateQuiz", params, {"X-API-Key": "team-a"})]
+
+        with patch("litellm.acompletion", side_effect=provider.acompletion):
+            responses, stats = asyncio.run(self._get_all(requests))
+
+        assert [response.status_code for response in responses].count(429) == 1
+        assert responses[-1].status_code == 200
+        rejected = next(response for response in responses if response.status_code == 429)
+        assert 0 < int(rejected.headers["Retry-After"]) <= 10
+        assert stats["rejected"]["rate_limited"] == 1
+
+    def test_upstream_overload_gets_503(self, monkeypatch):
+        """Test that a quiz stream beyond the in-flight limit and queue is rejected with 503 and Retry-After."""
+        monkeypatch.setenv("ADMISSION_MAX_IN_FLIGHT", "1")
+        monkeypatch.setenv("ADMISSION_MAX_QUEUE", "0")
+        monkeypatch.setenv("QUIZ_CACHE_BACKEND", "none")
+        provider = FakeStreamingProvider(n_questions=2, chunk_size=8, delay=0.002)
+        requests = [
+            ("/GenerateQuiz", {"topic": f"Overload {i}", "difficulty": "easy", "n_questions": 2}, {}) for i in range(2)
+        ]
+
+        with patch("litellm.acompletion", side_effect=provider.acompletion):
+            responses, stats = asyncio.run(self._get_all(requests))
+
+        assert sorted(response.status_code for response in responses) == [200, 503]
+        rejected = next(response for response in responses if response.status_code == 503)
+        assert int(rejected.headers["Retry-After"]) >= 1
+        assert provider.calls == 1
+        assert (stats["in_flight"], stats["admitted"], stats["rejected"]["queue_full"]) == (0, 1, 1)
+
+    def test_metrics_endpoint(self):
+        """Test that /metrics serves quiz latencies, active connections and admission metrics in Prometheus format."""
+        provider = FakeStreamingProvider(n_questions=1)
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with app.router.lifespan_context(app):
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    params = {"topic": "Metrics", "difficulty": "easy", "n_questions": 1}
+                    quiz = await client.get("/GenerateQuiz", params=params)
+                    return quiz, await client.get("/metrics")
+
+        with patch("litellm.acompletion", side_effect=provider.acompletion):
+            quiz, response = asyncio.run(run())
+
+        assert quiz.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        body = response.text
+        assert "# TYPE gpteasers_quiz_time_to_first_question_seconds histogram" in body
+        assert (
+            'gpteasers_quiz_time_to_first_question_seconds_bucket{model="gpt-3.5-turbo",outcome="ok",le="+Inf"}' in body
+        )
+        assert 'gpteasers_sse_connections_active{endpoint="GenerateQuiz"} 0' in body
+        assert "gpteasers_admission_in_flight 0" in body
+        assert "gpteasers_admission_queue_depth 0" in body
+
+
+class TestGenerateQuizLoad:
+    """
+    Load tests showing that concurrent quiz streams are not capped by the threadpool size.
+
+    The fake provider sleeps between chunks. With the old sync path each `next()` on the stream
+    occupies a threadpool worker, so throughput is bounded by the pool; the async path is not.
+    """
+
+    N_REQUESTS = 20
+    THREADPOOL_SIZE = 2
+    CHUNK_DELAY = 0.02
+
+    def _provider(self):
+        # 3 questions split into 6 chunks, i.e. ~0.12s of upstream time per stream.
+        provider = FakeStreamingProvider(n_questions=3, delay=self.CHUNK_DELAY)
+        provider.chunk_size = -(-len(provider.text) // 6)
+        return provider
+
+    def test_async_endpoint_not_capped_by_threadpool(self):
+        """All streams should run concurrently even with a 2-thread pool."""
+        provider = self._provider()
+        with patch("litellm.acompletion", side_effect=provider.acompletion):
+            elapsed, bodies = asyncio.run(
+                _run_concurrent_quizzes(app, n_requests=self.N_REQUESTS, threadpool_size=self.THREADPOOL_SIZE)
+            )
+
+        per_stream = 6 * self.CHUNK_DELAY
+        serialised = per_stream * self.N_REQUESTS / self.THREADPOOL_SIZE
+        print(f"async path: {self.N_REQUESTS} streams in {elapsed:.3f}s (threadpool-bound would be {serialised:.3f}s)")
+        assert all(len(_questions(body)) == 3 for body in bodies)
+        assert elapsed < serialised / 3
+
+    def test_sync_baseline_is_capped_by_threadpool(self):
+        """The previous sync-generator path is bounded by the threadpool; kept as a baseline."""
+        sync_app = FastAPI()
+
+        @sync_app.get("/GenerateQuiz")
+        async def sync_endpoint(topic: str, difficulty: str, n_questions: int = 10):
+            return StreamingResponse(
+                QuizGenerator().generate_quiz(topic, difficulty, n_questions), media_type="text/event-stream"
+            )
+
+        provider = self._provider()
+        with patch("litellm.completion", side_effect=provider.completion):
+            elapsed, bodies = asyncio.run(
+                _run_concurrent_quizzes(sync_app, n_requests=self.N_REQUESTS, threadpool_size=self.THREADPOOL_SIZE)
+            )
+
+        serialised = 6 * self.CHUNK_DELAY * self.N_REQUESTS / self.THREADPOOL_SIZE
+        print(f"sync path: {self.N_REQUESTS} streams in {elapsed:.3f}s")
+        assert all(len(_questions(body)) == 3 for body in bodies)
+        assert elapsed >= serialised * 0.8
+
+
+async def _disconnect_after_first_event(path: str, params: dict, spec_version: str) -> tuple[float, list[bytes]]:
+    """
+    Calls the app directly as an ASGI server would, and disconnects once the first body chunk has arrived
+    (httpx's ASGI transport cannot disconnect mid-response). Returns the seconds the app took to return
+    after the disconnect, and the body chunks received.
+    """
+    first_chunk = asyncio.Event()
+    request_sent = False
+    chunks = []
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await first_chunk.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            chunks.append(message["body"])
+            first_chunk.set()
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": spec_version},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": urlencode(params).encode(),
+        "headers": [(b"host", b"test")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("test", 80),
+    }
+    call = asyncio.create_task(app(scope, receive, send))
+    await first_chunk.wait()
+    disconnected = time.perf_counter()
+    await asyncio.wait_for(call, timeout=5)
+    return time.perf_counter() - disconnected, chunks
+
+
+class TestClientDisconnect:
+    """Unit tests for stopping the upstream LLM stream when an SSE client goes away."""
+
+    # 20 questions, one chunk each, 0.1s apart: a full stream takes ~2s.
+    @pytest.fixture
+    def provider(self):
+        return FakeStreamingProvider(n_questions=20, chunk_size=400, delay=0.1)
+
+    @pytest.mark.parametrize("spec_version", ["2.3", "2.4"])
+    @pytest.mark.parametrize("path", ["/GenerateQuiz", "/GenerateQuizWithImage"])
+    def test_disconnect_closes_the_upstream_stream(self, monkeypatch, provider, path, spec_version):
+        """The upstream stream is closed within a bounded time of the client leaving, and its slot is freed."""
+        monkeypatch.setenv("IMAGE_STORE_MAX_MB", "0")
+        image_generator = ImageGenerator()
+        monkeypatch.setattr(image_generator, "agenerate_image", lambda prompt: asyncio.sleep(0.01, "https://x/1.png"))
+        app.dependency_overrides[get_image_generator] = lambda: image_generator
+        params = {"topic": "Leaving early", "difficulty": "easy", "n_questions": 20, "cache": "false"}
+
+        async def run():
+            async with app.router.lifespan_context(app):
+                result = await _disconnect_after_first_event(path, params, spec_version)
+                return result, app.state.providers.admission.in_flight
+
+        try:
+            with patch("litellm.acompletion", side_effect=provider.acompletion):
+                (seconds, chunks), in_flight = asyncio.run(run())
+        finally:
+            app.dependency_overrides.clear()
+
+        print(f"{path} (ASGI {spec_version}): upstream closed {seconds * 1000:.0f}ms after the disconnect")
+        assert provider.closed == 1
+        assert seconds < 0.5
+        assert len(chunks) < 5
+        assert in_flight == 0
+
+
+class TestReadiness:
+    """Unit tests for the provider SDK warm-up and the /ready probe."""
+
+    def test_not_ready_until_warmed_up_and_requests_wait(self):
+        """Test that /ready is 503 while the SDKs load, and a quiz requested meanwhile is served once they have."""
+        provider = FakeStreamingProvider(n_questions=2)
+
+        def slow_load(*names):
+            time.sleep(0.2)
+            return 0.2
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            params = {"topic": "Cold start", "difficulty": "easy", "n_questions": 2, "cache": "false"}
+            async with app.router.lifespan_context(app):
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    before = await client.get("/ready")
+                    quiz = asyncio.create_task(client.get("/GenerateQuiz", params=params))
+                    models = await client.get("/SupportedModels")
+                    quiz_done_early = quiz.done()
+                    quiz = await quiz
+                    after = await client.get("/ready")
+            return before, models, quiz_done_early, quiz, after
+
+        with (
+            patch("provider_registry.load", side_effect=slow_load),
+            patch("litellm.acompletion", side_effect=provider.acompletion),
+        ):
+            before, models, quiz_done_early, quiz, after = asyncio.run(run())
+
+        assert before.status_code == 503
+        assert before.json() == {"ready": False}
+        assert models.status_code == 200
+        assert not quiz_done_early
+        assert len(_questions(quiz.text)) == 2
+        assert after.status_code == 200
+        assert after.json() == {"ready": True, "warm_up_seconds": 0.2}
+
+
+class TestGenerateImageEndpoint:
+    """Unit tests for /GenerateImage using a slow fake image backend."""
+
+    IMAGE_DELAY = 0.3
+
+    @pytest.fixture
+    def slow_image_generator(self, mocker, monkeypatch):
+        """An ImageGenerator whose async backend takes IMAGE_DELAY seconds per image; the image store is disabled."""
+        monkeypatch.setenv("IMAGE_STORE_MAX_MB", "0")
+        image_generator = ImageGenerator()
+
+        async def slow_generate(**kwargs):
+            await asyncio.sleep(self.IMAGE_DELAY)
+            return SimpleNamespace(data=[SimpleNamespace(url="https://example.com/slow.png")])
+
+        mocker.patch.object(image_generator.async_client.images, "generate", side_effect=slow_generate)
+        app.dependency_overrides[get_image_generator] = lambda: image_generator
+        yield image_generator
+        app.dependency_overrides.clear()
+
+    def test_image_generation_does_not_stall_event_loop(self, slow_image_generator):
+        """Event-loop lag should stay small while several slow image requests are being served."""
+
+        async def measure():
+            max_lag = 0.0
+            done = asyncio.Event()
+
+            async def ticker(interval=0.01):
+                nonlocal max_lag
+                while not done.is_set():
+                    expected = time.perf_counter() + interval
+                    await asyncio.sleep(interval)
+                    max_lag = max(max_lag, time.perf_counter() - expected)
+
+            transport = httpx.ASGITransport(app=app)
+            async with app.router.lifespan_context(app):
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    ticker_task = asyncio.create_task(ticker())
+                    responses = await asyncio.gather(
+                        *[client.get("/GenerateImage", params={"prompt": f"Slow {i}"}) for i in range(4)]
+                    )
+                    done.set()
+                    await ticker_task
+            return max_lag, responses
+
+        max_lag, responses = asyncio.run(measure())
+        print(f"max event-loop lag while serving images: {max_lag * 1000:.1f}ms")
+        assert all(response.json() == {"image_url": "https://example.com/slow.png"} for response in responses)
+        assert max_lag < self.IMAGE_DELAY / 3
+
+    def test_image_generation_failure_returns_500(self, mocker, slow_image_generator):
+        """A failed generation is reported as a 500 with an error message."""
+        mocker.patch.object(slow_image_generator, "agenerate_image", mocker.AsyncMock(return_value=None))
+
+        async def call():
+            transport = httpx.ASGITransport(app=app)
+            async with app.router.lifespan_context(app):
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    return await client.get("/GenerateImage", params={"prompt": "Broken"})
+
+        response = asyncio.run(call())
+        assert response.status_code == 500
+        assert response.json() == {"error": "Error - Image generation failed."}
+
+    @pytest.mark.parametrize(
+        "error, status_code",
+        [
+            (fastapi_generate_quiz.CircuitOpenError("openai", 12.0), 503),
+            (fastapi_generate_quiz.ProviderTimeoutError("Provider 'openai' did not respond within 60.0s."), 504),
+        ],
+    )
+    def test_unavailable_provider_fails_like_quizzes(self, mocker, slow_image_generator, error, status_code):
+        """An open circuit breaker is answered with 503 and a timeout with 504, as for quiz requests."""
+        mocker.patch.object(slow_image_generator, "agenerate_image", mocker.AsyncMock(side_effect=error))
+
+        async def call():
+            transport = httpx.ASGITransport(app=app)
+            async with app.router.lifespan_context(app):
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    return await client.get("/GenerateImage", params={"prompt": "Outage"})
+
+        response = asyncio.run(call())
+        assert response.status_code == status_code
+        assert "error" in response.json()
+
+
+class TestImageStoreEndpoints:
+    """Unit tests for /GenerateImage with the image store enabled, and for /Images/{image_id}."""
+
+    IMAGE = b"\x89PNG\r\n\x1a\n fake image"
+
+    @pytest.fixture
+    def image_generator(self, mocker, monkeypatch, tmp_path):
+        """An ImageGenerator returning a provider URL, whose download is faked; images are stored in tmp_path."""
+        monkeypatch.setenv("IMAGE_STORE_PATH", str(tmp_path))
+        image_generator = ImageGenerator()
+        mocker.patch.object(
+            image_generator, "agenerate_image", mocker.AsyncMock(return_value="https://provider.example/1.png")
+        )
+        # The app imports the store as the top-level "image_store" module.
+        mocker.patch("image_store.ImageStore.adownload", mocker.AsyncMock(return_value=self.IMAGE))
+        app.dependency_overrides[get_image_generator] = lambda: image_generator
+        yield image_generator
+        app.dependency_overrides.clear()
+
+    def test_repeat_prompt_is_served_from_the_store(self, image_generator):
+        """A repeat prompt gets the same local URL without a second generation, and the URL serves the image."""
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with app.router.lifespan_context(app):
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    first = await client.get("/GenerateImage", params={"prompt": "A Juicy Burger"})
+                    second = await client.get("/GenerateImage", params={"prompt": "a juicy  burger"})
+                    image = await client.get(first.json()["image_url"])
+                    revalidated = await client.get(
+                        first.json()["image_url"], headers={"If-None-Match": image.headers["ETag"]}
+                    )
+                    missing = await client.get("/Images/../../etc/passwd")
+                    unknown = await client.get(f"/Images/{'0' * 64}-{'0' * 16}")
+            return first, second, image, revalidated, missing, unknown
+
+        first, second, image, revalidated, missing, unknown = asyncio.run(run())
+        assert first.json()["image_url"].startswith("http://test/Images/")
+        assert second.json() == first.json()
+        image_generator.agenerate_image.assert_awaited_once()
+
+        assert image.status_code == 200
+        assert image.content == self.IMAGE
+        assert image.headers["content-type"] == "image/png"
+        assert image.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+        assert (revalidated.status_code, revalidated.content) == (304, b"")
+        assert missing.status_code == 404
+        assert unknown.status_code == 404
+
+
+class TestGenerateQuizWithImageEndpoint:
+    """Unit tests for /GenerateQuizWithImage, with a fake LLM provider and a fake image backend."""
+
+    @pytest.fixture
+    def image_generator(self, mocker, monkeypatch):
+        """An ImageGenerator whose async backend takes 50ms per image; the image store is disabled."""
+        monkeypatch.setenv("IMAGE_STORE_MAX_MB", "0")
+        image_generator = ImageGenerator()
+
+        async def generate(**kwargs):
+            await asyncio.sleep(0.05)
+            return SimpleNamespace(data=[SimpleNamespace(url="https://example.com/quiz.png")])
+
+        mocker.patch.object(image_generator.async_client.images, "generate", side_effect=generate)
+        app.dependency_overrides[get_image_generator] = lambda: image_generator
+        yield image_generator
+        app.dependency_overrides.clear()
+
+    @staticmethod
+    def _run(provider: FakeStreamingProvider, **params) -> httpx.Response:
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            params.setdefault("difficulty", "easy")
+            params.setdefault("cache", "false")
+            async with app.router.lifespan_context(app):
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    return await client.get("/GenerateQuizWithImage", params=params)
+
+        with patch("litellm.acompletion", side_effect=provider.acompletion):
+            return asyncio.run(run())
+
+    def test_image_arrives_between_the_questions(self, image_generator):
+        """The image is generated alongside the quiz and sent before the slow quiz stream has finished."""
+        # 4 questions of ~250 characters in 50-character chunks, 10ms apart: ~200ms of streaming.
+        provider = FakeStreamingProvider(n_questions=4, chunk_size=50, delay=0.01)
+
+        response = self._run(provider, topic="Overlap", n_questions=4, image_prompt="A juicy burger")
+
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = _parse_events(response.text)
+        names = [name for name, _ in events]
+        assert names.count("question") == 4
+        assert names.index("image") < len(names) - 2
+        assert events[names.index("image")][1] == {"image_url": "https://example.com/quiz.png"}
+        assert events[-1] == ("done", {"questions": 4, "image": True})
+        assert [data["question_id"] for name, data in events if name == "question"] == [1, 2, 3, 4]
+        assert image_generator.async_client.images.generate.call_args.kwargs["prompt"] == "A juicy burger"
+
+    def test_image_failure_is_an_error_event(self, mocker, image_generator):
+        """A failed image is reported as an error event, and the quiz is still streamed in full."""
+        mocker.patch.object(image_generator, "agenerate_image", mocker.AsyncMock(return_value=None))
+        provider = FakeStreamingProvider(n_questions=3)
+
+        response = self._run(provider, topic="Broken image", n_questions=3)
+
+        events = _parse_events(response.text)
+        assert ("error", {"source": "image", "error": "Error - Image generation failed."}) in events
+        assert [name for name, _ in events].count("question") == 3
+        assert events[-1] == ("done", {"questions": 3, "image": False})
+        image_generator.agenerate_image.assert_awaited_once_with("Broken image")
+
+
+class TestGenerateQuizBatchEndpoint:
+    """Unit tests for POST /GenerateQuizBatch, with a fake LLM provider and the journal in tmp_path."""
+
+    @pytest.fixture(autouse=True)
+    def journal_path(self, monkeypatch, tmp_path):
+        monkeypatch.setenv("BATCH_JOURNAL_PATH", str(tmp_path))
+        monkeypatch.setenv("QUIZ_CACHE_BACKEND", "none")
+        return tmp_path
+
+    @staticmethod
+    def _post(provider: FakeStreamingProvider, body: dict) -> httpx.Response:
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with app.router.lifespan_context(app):
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    return await client.post("/GenerateQuizBatch", json=body)
+
+        with patch("litellm.acompletion", side_effect=provider.acompletion):
+            return asyncio.run(run())
+
+    def test_streams_one_ndjson_line_per_quiz_and_resumes(self):
+        """Each quiz is one NDJSON line tagged with its job id; the same batch again is replayed from the journal."""
+        provider = FakeStreamingProvider(n_questions=2)
+        body = {
+            "jobs": [
+                {"topic": "Rome", "difficulty": "easy", "n_questions": 2},
+                {"job_id": "python", "topic": "Python", "difficulty": "hard", "n_questions": 2},
+            ]
+        }
+
+        response = self._post(provider, body)
+
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        assert response.headers["content-encoding"] == "gzip"
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert sorted(line["job_id"] for line in lines) == ["0", "python"]
+        assert all(line["status"] == "ok" and len(line["questions"]) == 2 for line in lines)
+        assert provider.calls == 2
+
+        again = [json.loads(line) for line in self._post(provider, body).text.splitlines()]
+        assert [line["resumed"] for line in again] == [True, True]
+        assert provider.calls == 2
+
+    def test_uncompressed_stream_is_not_gzipped_by_the_middleware(self, monkeypatch):
+        """With STREAM_COMPRESSION=false the NDJSON stream is sent as it is, even to a client accepting gzip."""
+        monkeypatch.setenv("STREAM_COMPRESSION", "false")
+        provider = FakeStreamingProvider(n_questions=2)
+
+        response = self._post(provider, {"jobs": [{"topic": "Rome", "difficulty": "easy", "n_questions": 2}]})
+
+        assert response.headers["content-encoding"] == "identity"
+        assert json.loads(response.text)["status"] == "ok"
+
+    @pytest.mark.parametrize(
+        "body",
+        [
+            {"jobs": []},
+            {"jobs": [{"job_id": "a", "topic": "A", "difficulty": "easy"}] * 2},
+            {"jobs": [{"topic": "A", "difficulty": "easy"}], "batch_id": "../escape"},
+        ],
+    )
+    def test_invalid_batch_gets_422(self, body):
+        """Empty batches, duplicate job ids and malformed batch ids are refused before any quiz is generated."""
+        provider = FakeStreamingProvider(n_questions=1)
+
+        assert self._post(provider, body).status_code == 422
+        assert provider.calls == 0
+
+
+class TestResponseCompression:
+    """Unit tests for the compression of streamed and JSON responses."""
+
+    @staticmethod
+    def _get_all(paths: list[tuple[str, dict]], accept_encoding: str) -> list[httpx.Response]:
+        provider = FakeStreamingProvider(n_questions=3)
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            headers = {"Accept-Encoding": accept_encoding}
+            async with app.router.lifespan_context(app):
+                async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=headers) as client:
+                    return [await client.get(path, params=params) for path, params in paths]
+
+        with patch("litellm.acompletion", side_effect=provider.acompletion):
+            return asyncio.run(run())
+
+    def test_streams_and_large_json_responses_are_compressed(self):
+        """Test that a quiz stream and a large JSON response are gzipped for a client accepting gzip."""
+        quiz, stats, models = self._get_all(
+            [
+                ("/GenerateQuiz", {"topic": "Gzip", "difficulty": "easy", "n_questions": 3, "cache": "false"}),
+                ("/RoutingStats", {}),
+                ("/SupportedModels", {}),
+            ],
+            "gzip",
+        )
+
+        assert quiz.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in quiz.headers["vary"]
+        assert len(_questions(quiz.text)) == 3
+        assert stats.headers["content-encoding"] == "gzip"
+        assert "gpt-3.5-turbo" in stats.json()["models"]
+        # Too small to be worth compressing.
+        assert "content-encoding" not in models.headers
+
+    def test_streams_are_not_compressed_when_disabled_or_not_accepted(self, monkeypatch):
+        """Test that a stream is sent as it is to a client not accepting gzip, and with STREAM_COMPRESSION=false."""
+        params = {"topic": "Identity", "difficulty": "easy", "n_questions": 3, "cache": "false"}
+        (identity,) = self._get_all([("/GenerateQuiz", params)], "identity")
+        monkeypatch.setenv("STREAM_COMPRESSION", "false")
+        (disabled,) = self._get_all([("/GenerateQuiz", params)], "gzip")
+
+        for response in (identity, disabled):
+            assert response.headers["content-encoding"] == "identity"
+            assert len(_questions(response.text)) == 3
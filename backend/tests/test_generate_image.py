@@ -1,9 +1,12 @@
+import asyncio
 import os
 from types import SimpleNamespace
 
 import pytest
 
+from backend import generate_image
 from backend.generate_image import ImageGenerator
+from backend.resilience import Resilience, RetryPolicy
 
 """
 Test file for ImageGenerator class.
@@ -89,7 +92,115 @@ class TestImageGeneratorUnit:
         )
 
         image_generator.generate_image("Test prompt")
-        mock_logger.assert_called_with("Error when calling OpenAI API: API failure")
+        message, *args = mock_logger.call_args.args
+        assert message % tuple(args) == "Error when calling OpenAI API: API failure"
+
+
+class TestImageGeneratorAsync:
+    """
+    Unit tests for the async image API.
+    The AsyncOpenAI client's generate method is replaced with a fake coroutine.
+    """
+
+    def test_agenerate_image_success(self, mocker, image_generator):
+        """Test agenerate_image awaits the async client and returns the URL."""
+        mock_response = SimpleNamespace(data=[SimpleNamespace(url="https://example.com/async_image.png")])
+        mocker.patch.object(
+            image_generator.async_client.images, "generate", mocker.AsyncMock(return_value=mock_response)
+        )
+
+        url = asyncio.run(image_generator.agenerate_image("A test prompt"))
+        assert url == "https://example.com/async_image.png"
+
+    def test_agenerate_image_does_not_create_a_sync_client(self, mocker, image_generator):
+        """Test that the async API never creates the sync client, which is only built for generate_image."""
+        mock_response = SimpleNamespace(data=[SimpleNamespace(url="https://example.com/async_image.png")])
+        mocker.patch.object(
+            image_generator.async_client.images, "generate", mocker.AsyncMock(return_value=mock_response)
+        )
+
+        asyncio.run(image_generator.agenerate_image("A test prompt"))
+
+        assert image_generator._client is None
+        assert image_generator.client is image_generator.client
+
+    def test_agenerate_image_api_failure(self, mocker, image_generator):
+        """Test agenerate_image returns None when the async client raises."""
+        mocker.patch.object(
+            image_generator.async_client.images, "generate", mocker.AsyncMock(side_effect=Exception("API failure"))
+        )
+
+        assert asyncio.run(image_generator.agenerate_image("A test prompt")) is None
+
+    def test_agenerate_image_timeout(self, mocker, monkeypatch):
+        """Test agenerate_image gives up after the configured timeout with a ProviderTimeoutError."""
+        monkeypatch.setenv("OPENAI_API_KEY", "dummy_key")
+        image_generator = ImageGenerator(timeout=0.05)
+
+        async def hang(**kwargs):
+            await asyncio.sleep(10)
+
+        mocker.patch.object(image_generator.async_client.images, "generate", side_effect=hang)
+
+        with pytest.raises(generate_image.ProviderTimeoutError):
+            asyncio.run(image_generator.agenerate_image("A test prompt"))
+
+    def test_agenerate_image_open_circuit(self, mocker, monkeypatch):
+        """Test that agenerate_image raises CircuitOpenError, not None, while the OpenAI breaker is open."""
+        monkeypatch.setenv("OPENAI_API_KEY", "dummy_key")
+        # The generator's own CircuitOpenError class, as raised by the registry's Resilience in the API.
+        circuit_open = generate_image.CircuitOpenError("openai", 30.0)
+        resilience = mocker.Mock(acall=mocker.AsyncMock(side_effect=circuit_open))
+        image_generator = ImageGenerator(resilience=resilience)
+        generate = mocker.patch.object(image_generator.async_client.images, "generate")
+
+        with pytest.raises(generate_image.CircuitOpenError):
+            asyncio.run(image_generator.agenerate_image("A test prompt"))
+        generate.assert_not_called()
+
+    def test_agenerate_image_concurrency_cap(self, mocker, monkeypatch):
+        """Test that no more than max_concurrency generations are in flight at once."""
+        monkeypatch.setenv("OPENAI_API_KEY", "dummy_key")
+        image_generator = ImageGenerator(max_concurrency=2)
+        in_flight = 0
+        peak = 0
+
+        async def slow_generate(**kwargs):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.02)
+            in_flight -= 1
+            return SimpleNamespace(data=[SimpleNamespace(url="https://example.com/image.png")])
+
+        mocker.patch.object(image_generator.async_client.images, "generate", side_effect=slow_generate)
+
+        async def run_all():
+            return await asyncio.gather(*[image_generator.agenerate_image(f"prompt {i}") for i in range(6)])
+
+        urls = asyncio.run(run_all())
+        assert urls == ["https://example.com/image.png"] * 6
+        assert peak == 2
+
+    def test_agenerate_image_retries_with_resilience(self, mocker, monkeypatch):
+        """Test that a timed-out generation is retried when the generator has a Resilience."""
+        monkeypatch.setenv("OPENAI_API_KEY", "dummy_key")
+        resilience = Resilience(retry_policy=RetryPolicy(random=lambda: 0.0))
+        image_generator = ImageGenerator(timeout=0.05, resilience=resilience)
+        calls = 0
+
+        async def hang_once(**kwargs):
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                await asyncio.sleep(10)
+            return SimpleNamespace(data=[SimpleNamespace(url="https://example.com/image.png")])
+
+        mocker.patch.object(image_generator.async_client.images, "generate", side_effect=hang_once)
+
+        assert asyncio.run(image_generator.agenerate_image("A test prompt")) == "https://example.com/image.png"
+        assert calls == 2
+        assert resilience.retries == 1
 
 
 class TestImageGeneratorIntegration:
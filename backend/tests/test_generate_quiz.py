@@ -1,10 +1,19 @@
+import asyncio
+import json
 import logging
 import os
+import time
 from unittest.mock import MagicMock, patch
 
 import pytest
+from fake_llm import FakeProviderError, FakeStreamingProvider, make_question, make_quiz_text, quiz_text_for_prompt
 
-from backend.generate_quiz import QuizGenerator
+from backend import generate_quiz
+from backend.generate_quiz import ModelRouter, QuizGenerator
+from backend.question_pool import QuestionPool, SessionHistory
+from backend.quiz_cache import InMemoryQuizCache, QuizCache
+from backend.quiz_question import QuizQuestion
+from backend.resilience import CircuitBreaker, CircuitOpenError, ProviderTimeoutError, Resilience, RetryPolicy, Timeouts
 
 """
 Test file for QuizGenerator class.
@@ -56,7 +65,8 @@ class TestQuizGenerator:
         """
         Test that the _create_role method produces a prompt that contains the expected parameters.
 
-        The role prompt should include the topic, difficulty, number of questions, and the example JSON.
+        The role prompt should include the topic, difficulty and number of questions; the example JSON
+        is in the system prompt sent before it.
         """
         topic = "Science"
         difficulty = "Easy"
@@ -66,7 +76,50 @@ class TestQuizGenerator:
         assert topic in role
         assert difficulty in role
         assert str(n_questions) in role
-        assert quiz_generator.EXAMPLE_RESPONSE in role
+        assert quiz_generator.EXAMPLE_RESPONSE not in role
+        assert quiz_generator.EXAMPLE_RESPONSE in quiz_generator.SYSTEM_PROMPT
+
+    def test_static_prompt_prefix_is_identical_across_requests(self, quiz_generator):
+        """Test that every request, whatever its topic or shard, starts with the same system message bytes."""
+        provider = FakeStreamingProvider(text=quiz_text_for_prompt)
+        sent = []
+
+        async def acompletion(**kwargs):
+            sent.append(kwargs)
+            return await provider.acompletion(**kwargs)
+
+        async def run():
+            for topic, difficulty, n_questions in [("Math", "Easy", 2), ("Roman History", "Hard", 10)]:
+                generator = await quiz_generator.agenerate_quiz(topic, difficulty, n_questions=n_questions)
+                [line async for line in generator]
+
+        quiz_generator.shards = 2
+        with patch("backend.generate_quiz.litellm.acompletion", side_effect=acompletion):
+            asyncio.run(run())
+
+        assert len(sent) == 3
+        prefixes = {json.dumps(kwargs["messages"][0]).encode() for kwargs in sent}
+        assert prefixes == {json.dumps({"role": "system", "content": QuizGenerator.SYSTEM_PROMPT}).encode()}
+        cache_params = generate_quiz.prompt_cache_params(quiz_generator.model, QuizGenerator.SYSTEM_PROMPT_KEY)
+        assert cache_params
+        assert all({name: kwargs.get(name) for name in cache_params} == cache_params for kwargs in sent)
+        assert "Roman History" in sent[-1]["messages"][-1]["content"]
+
+    @pytest.mark.parametrize(
+        "model, expected",
+        [
+            ("gpt-4-turbo", {"extra_body": {"prompt_cache_key": "quiz-key"}}),
+            ("gemini/gemini-2.0-flash", {}),
+        ],
+    )
+    def test_prompt_cache_key_is_sent_to_openai_when_litellm_lacks_it(self, monkeypatch, model, expected):
+        """Test that OpenAI models get the prompt cache key in the request body when litellm does not list it."""
+        monkeypatch.setattr(generate_quiz.litellm, "get_supported_openai_params", lambda model: ["temperature"])
+        generate_quiz.prompt_cache_params.cache_clear()
+        try:
+            assert generate_quiz.prompt_cache_params(model, "quiz-key") == expected
+        finally:
+            generate_quiz.prompt_cache_params.cache_clear()
 
     @patch("backend.generate_quiz.litellm.completion")
     def test_generate_quiz(self, mock_completion, quiz_generator):
@@ -83,6 +136,193 @@ class TestQuizGenerator:
 
         assert result == ['data: {"question": "What is 2+2?", "answer": "4"}\n\n']
 
+    def test_agenerate_quiz(self, quiz_generator):
+        """Test that agenerate_quiz streams parsed questions from litellm's async completion API."""
+        provider = FakeStreamingProvider(n_questions=2)
+
+        async def collect():
+            generator = await quiz_generator.agenerate_quiz("Math", "Easy", n_questions=2)
+            return [line async for line in generator]
+
+        with patch("backend.generate_quiz.litellm.acompletion", side_effect=provider.acompletion):
+            result = asyncio.run(collect())
+
+        assert provider.calls == 1
+        assert provider.last_kwargs["stream"] is True
+        assert provider.last_kwargs["model"] == quiz_generator.model
+        assert len(result) == 2
+        assert all(line.startswith(b"data: ") and line.endswith(b"\n\n") for line in result)
+
+    def test_agenerate_quiz_replays_cached_quiz(self, quiz_generator):
+        """Test that a repeat request is replayed from the cache without calling the LLM again."""
+        quiz_generator.cache = QuizCache(InMemoryQuizCache(max_entries=10, ttl=60.0))
+        provider = FakeStreamingProvider(n_questions=2)
+
+        async def collect(topic, use_cache=True):
+            generator = await quiz_generator.agenerate_quiz(topic, "Easy", n_questions=2, use_cache=use_cache)
+            return [line async for line in generator]
+
+        with patch("backend.generate_quiz.litellm.acompletion", side_effect=provider.acompletion):
+            first = asyncio.run(collect("Math"))
+            second = asyncio.run(collect(" math "))
+            assert provider.calls == 1
+            fresh = asyncio.run(collect("Math", use_cache=False))
+            assert provider.calls == 2
+
+        assert second == first
+        assert fresh == first
+        assert (quiz_generator.cache.hits, quiz_generator.cache.misses) == (1, 1)
+
+    def test_agenerate_quiz_does_not_cache_abandoned_stream(self, quiz_generator):
+        """Test that a stream closed before it completes (e.g. a client disconnect) is not cached."""
+        quiz_generator.cache = QuizCache(InMemoryQuizCache(max_entries=10, ttl=60.0))
+        provider = FakeStreamingProvider(n_questions=3)
+
+        async def read_first_question():
+            generator = await quiz_generator.agenerate_quiz("Math", "Easy", n_questions=3)
+            first = await generator.__anext__()
+            await generator.aclose()
+            return first
+
+        with patch("backend.generate_quiz.litellm.acompletion", side_effect=provider.acompletion):
+            assert asyncio.run(read_first_question()).startswith(b"data: ")
+
+        assert len(quiz_generator.cache.backend) == 0
+
+    def test_agenerate_quiz_stops_upstream_after_n_questions(self, quiz_generator):
+        """Test that the upstream stream is stopped once the questions asked for have arrived, as a complete quiz."""
+        quiz_generator.cache = QuizCache(InMemoryQuizCache(max_entries=10, ttl=60.0))
+        # The model keeps going past the 3 questions asked for: 8 questions take ~1.6s to stream.
+        provider = FakeStreamingProvider(n_questions=8, chunk_size=64, delay=0.05)
+        metrics = generate_quiz.metrics
+        completed = metrics.QUIZ_TIME_TO_FIRST_CHUNK.labels(quiz_generator.model, "ok")
+        cancelled = metrics.QUIZ_TIME_TO_FIRST_CHUNK.labels(quiz_generator.model, "cancelled")
+        before = (completed.count, cancelled.count)
+
+        async def collect():
+            started = time.perf_counter()
+            generator = await quiz_generator.agenerate_quiz("Math", "Easy", n_questions=3)
+            lines = [line async for line in generator]
+            return lines, time.perf_counter() - started
+
+        with patch("backend.generate_quiz.litellm.acompletion", side_effect=provider.acompletion):
+            lines, elapsed = asyncio.run(collect())
+
+        assert len(lines) == 3
+        assert provider.closed == 1
+        assert elapsed < 1.0
+        assert (completed.count - before[0], cancelled.count - before[1]) == (1, 0)
+        assert len(quiz_generator.cache.backend) == 1
+
+    def test_agenerate_quiz_serves_from_pool(self, quiz_generator):
+        """Test that a pooled topic is answered from the pool without calling the LLM."""
+        quiz_generator.pool = QuestionPool(topics=["Math"], difficulties=["easy"], models=[quiz_generator.model])
+        for i in range(1, 4):
+            quiz_generator.pool.add(quiz_generator.model, "Math", "easy", QuizQuestion.from_dict(make_question(i)))
+        provider = FakeStreamingProvider(n_questions=2)
+
+        async def collect():
+            generator = await quiz_generator.agenerate_quiz("Math", "Easy", n_questions=2)
+            return [line async for line in generator]
+
+        with patch("backend.generate_quiz.litellm.acompletion", side_effect=provider.acompletion):
+            result = asyncio.run(collect())
+
+        assert provider.calls == 0
+        assert len(result) == 2
+        assert len(quiz_generator.pool) == 1
+
+    def test_agenerate_quiz_does_not_repeat_questions_to_a_session(self, quiz_generator):
+        """Test that a session is not replayed a cached quiz it has already been sent."""
+        quiz_generator.cache = QuizCache(InMemoryQuizCache(max_entries=10, ttl=60.0))
+        quiz_generator.sessions = SessionHistory()
+        provider = FakeStreamingProvider(n_questions=2)
+
+        async def collect(session_id):
+            generator = await quiz_generator.agenerate_quiz("Math", "Easy", n_questions=2, session_id=session_id)
+            return [line async for line in generator]
+
+        with patch("backend.generate_quiz.litellm.acompletion", side_effect=provider.acompletion):
+            first = asyncio.run(collect("alice"))
+            # Another session is served the cached quiz.
+            assert asyncio.run(collect("bob")) == first
+            assert provider.calls == 1
+
+            # The first session gets a fresh quiz instead, without the question it was already sent.
+            provider.text = make_quiz_text(1) + make_quiz_text(3, topic="Algebra")
+            again = asyncio.run(collect("alice"))
+
+        assert provider.calls == 2
+        # The stream is stopped once the model has sent the 2 questions asked for, one of them a repeat.
+        assert len(again) == 1
+        assert not any(b"about Testing" in line for line in again)
+
+    def test_agenerate_quiz_sharded(self, quiz_generator):
+        """Test that a sharded quiz makes one call per shard and merges them into one numbered quiz."""
+        quiz_generator.shards = 3
+        provider = FakeStreamingProvider(text=quiz_text_for_prompt)
+
+        async def collect():
+            generator = await quiz_generator.agenerate_quiz("Math", "Easy", n_questions=16)
+            return [line async for line in generator]
+
+        with patch("backend.generate_quiz.litellm.acompletion", side_effect=provider.acompletion):
+            result = asyncio.run(collect())
+
+        questions = [json.loads(line[len(b"data: ") :]) for line in result]
+        assert provider.calls == 3
+        assert provider.closed == 3
+        assert [question["question_id"] for question in questions] == list(range(1, 17))
+        assert sorted(question["question"] for question in questions) == sorted(
+            make_question(i)["question"] for i in range(1, 17)
+        )
+
+    def test_small_quiz_is_not_sharded(self, quiz_generator):
+        """Test that quizzes too small to split are generated with a single call."""
+        quiz_generator.shards = 4
+        provider = FakeStreamingProvider(text=quiz_text_for_prompt)
+
+        async def collect():
+            generator = await quiz_generator.agenerate_quiz("Math", "Easy", n_questions=9)
+            return [line async for line in generator]
+
+        with patch("backend.generate_quiz.litellm.acompletion", side_effect=provider.acompletion):
+            result = asyncio.run(collect())
+
+        assert provider.calls == 1
+        assert "part 1 of" not in provider.last_kwargs["messages"][-1]["content"]
+        assert len(result) == 9
+
+    def test_sharded_quiz_start_failure_closes_started_shards(self, quiz_generator):
+        """Test that if one shard cannot start, the error is raised and the other shards are closed."""
+        quiz_generator.shards = 2
+        provider = FakeStreamingProvider(text=quiz_text_for_prompt)
+
+        async def acompletion(**kwargs):
+            if "part 2 of" in kwargs["messages"][-1]["content"]:
+                raise RuntimeError("provider down")
+            stream = await provider.acompletion(**kwargs)
+            # Started, so closing it runs the fake stream's cleanup.
+            await stream.__anext__()
+            return stream
+
+        async def collect():
+            await quiz_generator.agenerate_quiz("Math", "Easy", n_questions=10)
+
+        with patch("backend.generate_quiz.litellm.acompletion", side_effect=acompletion):
+            with pytest.raises(RuntimeError, match="provider down"):
+                asyncio.run(collect())
+
+        assert provider.closed == 1
+
+    def test_create_role_for_shard(self, quiz_generator):
+        """Test that each shard's prompt asks for its own id range and sub-theme."""
+        prompt = quiz_generator._create_role("Science", "Hard", 4, shard=(2, 3, 5))
+
+        assert "Provide 4 responses" in prompt
+        assert "part 2 of 3" in prompt
+        assert "number the questions from 5 to 8" in prompt
+
     def test_print_quiz(self, quiz_generator, caplog):
         """Test that print_quiz correctly logs the generated questions."""
         caplog.set_level(logging.INFO)
@@ -91,6 +331,307 @@ class TestQuizGenerator:
         assert 'data: {"question": "What is 2+2?", "answer": "4"}\n\n' in result
 
 
+class FakeClock:
+    """A controllable time source."""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestModelRouter:
+    """Unit tests for the ModelRouter class."""
+
+    @pytest.fixture(autouse=True)
+    def api_keys(self, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "dummy_key")
+        monkeypatch.setenv("GEMINI_API_KEY", "dummy_key")
+
+    def test_records_ewma_statistics(self):
+        """Test that time to first token and decode rate are exponentially weighted moving averages."""
+        router = ModelRouter(alpha=0.5)
+        router.record_first_token("gpt-3.5-turbo", 1.0)
+        router.record_first_token("gpt-3.5-turbo", 3.0)
+        router.record_decode("gpt-3.5-turbo", tokens=100, seconds=2.0)
+        router.record_decode("gpt-3.5-turbo", tokens=100, seconds=1.0)
+
+        stats = router.stats_for("gpt-3.5-turbo")
+        assert stats.ttft == 2.0
+        assert stats.tokens_per_second == 75.0
+
+    def test_fastest_prefers_unmeasured_then_lowest_expected_time(self):
+        """Test that unmeasured models are tried first, then the model expected to finish soonest wins."""
+        router = ModelRouter(models=["gpt-3.5-turbo", "gpt-4-turbo", "gemini/gemini-2.0-flash"])
+        router.record_first_token("gpt-3.5-turbo", 0.5)
+        router.record_decode("gpt-3.5-turbo", tokens=100, seconds=1.0)
+        router.record_first_token("gpt-4-turbo", 0.2)
+        router.record_decode("gpt-4-turbo", tokens=100, seconds=4.0)
+
+        assert router.fastest() == "gemini/gemini-2.0-flash"
+        router.record_first_token("gemini/gemini-2.0-flash", 2.0)
+        router.record_decode("gemini/gemini-2.0-flash", tokens=100, seconds=1.0)
+        assert router.fastest() == "gpt-3.5-turbo"
+        # With a tiny quiz, time to first token dominates.
+        assert router.fastest(n_questions=0) == "gpt-4-turbo"
+
+    def test_unhealthy_models_are_skipped(self, monkeypatch):
+        """Test that models without an API key, or failing repeatedly, are not routed to until they cool down."""
+        monkeypatch.delenv("GEMINI_API_KEY")
+        monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+        clock = FakeClock()
+        router = ModelRouter(
+            models=["gpt-3.5-turbo", "gpt-4-turbo", "gemini/gemini-2.0-flash"],
+            failure_threshold=2,
+            cooldown=10.0,
+            clock=clock,
+        )
+        assert not router.is_healthy("gemini/gemini-2.0-flash")
+
+        router.record_failure("gpt-3.5-turbo")
+        assert router.fastest() == "gpt-3.5-turbo"
+        router.record_failure("gpt-3.5-turbo")
+        assert router.fastest() == "gpt-4-turbo"
+
+        clock.now = 11.0
+        assert router.fastest() == "gpt-3.5-turbo"
+
+    def test_hedge_delay_is_p95_after_min_samples(self):
+        """Test that the hedging deadline is the p95 first-question time, once there are enough samples."""
+        router = ModelRouter(min_samples=20)
+        for seconds in range(1, 20):
+            router.record_first_question("gpt-3.5-turbo", seconds / 10)
+        assert router.hedge_delay("gpt-3.5-turbo") is None
+
+        router.record_first_question("gpt-3.5-turbo", 2.0)
+        assert router.hedge_delay("gpt-3.5-turbo") == 1.9
+
+    def test_backup_is_on_another_provider(self):
+        """Test that the backup for a hedged request never shares the primary model's provider."""
+        router = ModelRouter(models=["gpt-3.5-turbo", "gpt-4-turbo", "gemini/gemini-2.0-flash"])
+
+        assert router.backup_for("gpt-3.5-turbo") == "gemini/gemini-2.0-flash"
+        assert router.backup_for("gemini/gemini-2.0-flash") == "gpt-3.5-turbo"
+
+
+class TestQuizGeneratorRouting:
+    """Unit tests for latency recording and hedging in QuizGenerator."""
+
+    @staticmethod
+    def _providers(primary: FakeStreamingProvider, backup: FakeStreamingProvider):
+        """Routes fake completions to `primary` for the generator's model and `backup` for any other."""
+
+        async def acompletion(**kwargs):
+            provider = primary if kwargs["model"] == QuizGenerator.DEFAULT_MODEL else backup
+            return await provider.acompletion(**kwargs)
+
+        return acompletion
+
+    @staticmethod
+    def _collect(quiz_generator, n_questions=2):
+        async def collect():
+            generator = await quiz_generator.agenerate_quiz("Math", "Easy", n_questions=n_questions)
+            return [line async for line in generator]
+
+        return asyncio.run(collect())
+
+    def test_records_stream_latency(self, quiz_generator):
+        """Test that every routed stream records its time to first token, decode rate and first question."""
+        quiz_generator.router = ModelRouter()
+        provider = FakeStreamingProvider(n_questions=2, delay=0.001)
+
+        with patch("backend.generate_quiz.litellm.acompletion", side_effect=provider.acompletion):
+            result = self._collect(quiz_generator)
+
+        stats = quiz_generator.router.stats_for(quiz_generator.model).to_dict()
+        assert len(result) == 2
+        assert stats["ttft_seconds"] > 0
+        assert stats["tokens_per_second"] > 0
+        assert stats["samples"] == 1
+        assert (stats["requests"], stats["failures"]) == (1, 0)
+
+    def test_records_failures(self, quiz_generator):
+        """Test that a provider error is recorded against the model and raised."""
+        quiz_generator.router = ModelRouter()
+
+        with patch("backend.generate_quiz.litellm.acompletion", side_effect=RuntimeError("provider down")):
+            with pytest.raises(RuntimeError, match="provider down"):
+                self._collect(quiz_generator)
+
+        assert quiz_generator.router.stats_for(quiz_generator.model).failures == 1
+
+    def test_slow_request_is_hedged_and_loser_closed(self, quiz_generator):
+        """Test that a request slower than its p95 deadline is hedged, the backup wins and the primary is closed."""
+        quiz_generator.router = ModelRouter(min_samples=1)
+        quiz_generator.router.record_first_question(quiz_generator.model, 0.02)
+        quiz_generator.hedging = True
+        primary = FakeStreamingProvider(text=make_quiz_text(2, "Slow"), delay=0.5)
+        backup = FakeStreamingProvider(text=make_quiz_text(2, "Fast"))
+
+        with patch("backend.generate_quiz.litellm.acompletion", side_effect=self._providers(primary, backup)):
+            result = self._collect(quiz_generator)
+
+        assert len(result) == 2
+        assert all(b"about Fast" in line for line in result)
+        assert backup.last_kwargs["model"] == "gemini/gemini-2.0-flash"
+        assert primary.closed == 1
+        stats = quiz_generator.router.stats()
+        assert stats[quiz_generator.model]["hedges"] == 1
+        assert stats["gemini/gemini-2.0-flash"]["hedge_wins"] == 1
+
+    def test_fast_request_is_not_hedged(self, quiz_generator):
+        """Test that a request answering within its deadline never starts a backup."""
+        quiz_generator.router = ModelRouter(min_samples=1)
+        quiz_generator.router.record_first_question(quiz_generator.model, 1.0)
+        quiz_generator.hedging = True
+        primary = FakeStreamingProvider(n_questions=2)
+        backup = FakeStreamingProvider(n_questions=2)
+
+        with patch("backend.generate_quiz.litellm.acompletion", side_effect=self._providers(primary, backup)):
+            result = self._collect(quiz_generator)
+
+        assert len(result) == 2
+        assert backup.calls == 0
+
+    def test_hedged_request_keeps_primary_if_backup_fails(self, quiz_generator):
+        """Test that a failing backup does not fail a slow but working primary."""
+        quiz_generator.router = ModelRouter(min_samples=1)
+        quiz_generator.router.record_first_question(quiz_generator.model, 0.01)
+        quiz_generator.hedging = True
+        primary = FakeStreamingProvider(n_questions=2, delay=0.02)
+
+        async def acompletion(**kwargs):
+            if kwargs["model"] != QuizGenerator.DEFAULT_MODEL:
+                raise RuntimeError("backup down")
+            return await primary.acompletion(**kwargs)
+
+        with patch("backend.generate_quiz.litellm.acompletion", side_effect=acompletion):
+            result = self._collect(quiz_generator)
+
+        assert len(result) == 2
+        assert quiz_generator.router.stats_for("gemini/gemini-2.0-flash").failures == 1
+
+
+class TestQuizGeneratorResilience:
+    """Unit tests for timeouts, retries and circuit breakers in QuizGenerator."""
+
+    @pytest.fixture
+    def resilient_generator(self, quiz_generator):
+        """The quiz generator with short timeouts, retries without backoff and a breaker opening after 3 calls."""
+        quiz_generator.resilience = Resilience(
+            timeouts=Timeouts(connect=0.05, first_token=0.05, idle=0.05),
+            retry_policy=RetryPolicy(random=lambda: 0.0),
+            breaker_factory=lambda: CircuitBreaker(min_calls=3, window=4),
+        )
+        return quiz_generator
+
+    @staticmethod
+    def _collect(quiz_generator, received=None):
+        async def collect():
+            generator = await quiz_generator.agenerate_quiz("Math", "Easy", n_questions=2)
+            async for line in generator:
+                if received is not None:
+                    received.append(line)
+            return received
+
+        return asyncio.run(collect())
+
+    def test_retries_before_first_question(self, resilient_generator):
+        """Test that an error and a stall before the first question are retried, and the stalled stream closed."""
+        provider = FakeStreamingProvider(n_questions=2, faults=[FakeProviderError(503), 0])
+
+        with patch("backend.generate_quiz.litellm.acompletion", side_effect=provider.acompletion):
+            result = self._collect(resilient_generator, [])
+
+        assert len(result) == 2
+        assert provider.calls == 3
+        assert provider.closed == 2
+        assert resilient_generator.resilience.retries == 2
+
+    def test_no_retry_after_first_question(self, resilient_generator):
+        """Test that a stream stalling after a question was sent times out without a retry."""
+        text = make_quiz_text(2)
+        provider = FakeStreamingProvider(text=text, chunk_size=text.index("\n") + 1, faults=[1])
+        received = []
+
+        with patch("backend.generate_quiz.litellm.acompletion", side_effect=provider.acompletion):
+            with pytest.raises(ProviderTimeoutError):
+                self._collect(resilient_generator, received)
+
+        assert len(received) == 1
+        assert (provider.calls, provider.closed) == (1, 1)
+        assert resilient_generator.resilience.breaker("openai").to_dict()["failure_rate"] == 0.5
+
+    def test_open_circuit_fails_fast(self, resilient_generator):
+        """Test that once the provider's breaker opens, requests fail without calling the provider."""
+        provider = FakeStreamingProvider(faults=[FakeProviderError(500)] * 3)
+
+        with patch("backend.generate_quiz.litellm.acompletion", side_effect=provider.acompletion):
+            with pytest.raises(FakeProviderError):
+                self._collect(resilient_generator)
+            with pytest.raises(CircuitOpenError):
+                self._collect(resilient_generator)
+
+        assert provider.calls == 3
+
+    def test_open_circuit_reroutes_to_healthy_model(self, resilient_generator):
+        """Test that with a router, a request for a model whose breaker is open goes to a healthy model."""
+        resilient_generator.router = ModelRouter(resilience=resilient_generator.resilience)
+        for _ in range(3):
+            resilient_generator.resilience.breaker("openai").record_failure()
+        primary = FakeStreamingProvider(n_questions=2)
+        backup = FakeStreamingProvider(text=make_quiz_text(2, "Backup"))
+
+        with patch(
+            "backend.generate_quiz.litellm.acompletion",
+            side_effect=TestQuizGeneratorRouting._providers(primary, backup),
+        ):
+            result = self._collect(resilient_generator, [])
+
+        assert all(b"about Backup" in line for line in result)
+        assert primary.calls == 0
+        assert not resilient_generator.router.is_healthy(resilient_generator.model)
+
+    def test_sync_stream_has_timeout(self, quiz_generator):
+        """Test that the synchronous stream is requested with a read timeout."""
+        with patch("backend.generate_quiz.litellm.completion") as mock_completion:
+            quiz_generator._create_llm_stream("prompt")
+
+        assert mock_completion.call_args.kwargs["timeout"] == Timeouts().first_token
+
+
+class TestQuizGeneratorMetrics:
+    """Unit tests for the Prometheus metrics recorded by QuizGenerator."""
+
+    def test_records_stream_metrics(self, quiz_generator):
+        """Test that a quiz stream records its latencies, parse times, dropped items and estimated tokens."""
+        # The module QuizGenerator records into (imported by its flat name, as the app does).
+        metrics = generate_quiz.metrics
+        model = quiz_generator.model
+        text = make_quiz_text(2) + "{not json}\n"
+        provider = FakeStreamingProvider(text=text, chunk_size=16)
+        first_question = metrics.QUIZ_TIME_TO_FIRST_QUESTION.labels(model, "ok")
+        gaps = metrics.QUIZ_INTER_QUESTION_GAP.labels(model, "ok")
+        parsed = metrics.QUIZ_QUESTION_PARSE.labels(model, "accepted")
+        dropped = metrics.QUIZ_ITEMS_DROPPED.labels(model, "invalid_json")
+        tokens_out = metrics.LLM_TOKENS.labels(model, "out")
+        before = (first_question.count, gaps.count, parsed.count, dropped.value, tokens_out.value)
+
+        async def collect():
+            # More questions than the model sends, so the stream runs to its end and the invalid item is parsed.
+            generator = await quiz_generator.agenerate_quiz("Metrics", "Easy", n_questions=3, use_cache=False)
+            return [line async for line in generator]
+
+        with patch("backend.generate_quiz.litellm.acompletion", side_effect=provider.acompletion):
+            asyncio.run(collect())
+
+        after = (first_question.count, gaps.count, parsed.count, dropped.value, tokens_out.value)
+        assert [new - old for new, old in zip(after, before)] == [1, 1, 2, 1, -(-len(text) // 16)]
+        assert metrics.LLM_TOKENS.labels(model, "in").value > 0
+        assert "gpteasers_quiz_time_to_first_chunk_seconds_bucket" in metrics.REGISTRY.render()
+
+
 class TestQuizGeneratorIntegration:
     """
     Integration tests for the QuizGenerator class.
@@ -0,0 +1,141 @@
+import asyncio
+import os
+
+import httpx
+import pytest
+
+from backend.image_store import ImageStore
+
+"""
+Test file for ImageStore.
+
+Images are kept in pytest's tmp_path, and downloads go through an httpx mock transport,
+so no provider is called.
+"""
+
+
+def _client(image: bytes = b"image", status_code: int = 200) -> httpx.AsyncClient:
+    """An HTTP client answering every request with `image`."""
+    return httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(status_code, content=image)))
+
+
+class TestImageStore:
+    """Unit tests for ImageStore."""
+
+    def test_make_key_normalises_the_prompt(self):
+        """Test that case and whitespace do not change the key, but the prompt, size and model do."""
+        key = ImageStore.make_key("A Juicy Burger", "256x256", "dall-e-2")
+
+        assert key == ImageStore.make_key("  a juicy\tburger ", "256x256", "dall-e-2")
+        assert key != ImageStore.make_key("A Juicy Pizza", "256x256", "dall-e-2")
+        assert key != ImageStore.make_key("A Juicy Burger", "512x512", "dall-e-2")
+        assert key != ImageStore.make_key("A Juicy Burger", "256x256", "dall-e-3")
+
+    def test_put_get_and_evict_least_recently_used(self, tmp_path):
+        """Test that images are stored as files, and the least recently used are evicted once over max_bytes."""
+        store = ImageStore(str(tmp_path), max_bytes=10)
+        keys = [ImageStore.make_key(f"prompt {i}", "256x256", "dall-e-2") for i in range(3)]
+
+        async def run():
+            first = await store.aput(keys[0], b"aaaa")
+            await store.aput(keys[1], b"bbbb")
+            assert store.get(keys[0]) == first  # Now the most recently used.
+            await store.aput(keys[2], b"cccc")
+            return first
+
+        first = asyncio.run(run())
+        with open(store.file_for(first), "rb") as f:
+            assert f.read() == b"aaaa"
+        assert store.get(keys[1]) is None
+        assert (len(store), store.total_bytes) == (2, 8)
+        assert sorted(os.listdir(tmp_path)) == sorted(
+            os.path.basename(store._file_for(store.get(k))) for k in keys[::2]
+        )
+
+    def test_reload_from_disk(self, tmp_path):
+        """Test that a new store indexes the images left on disk and forgets a deleted file."""
+        store = ImageStore(str(tmp_path), max_bytes=100)
+        key = ImageStore.make_key("burger", "256x256", "dall-e-2")
+        image_id = asyncio.run(store.aput(key, b"image"))
+
+        reloaded = ImageStore(str(tmp_path), max_bytes=100)
+        assert reloaded.get(key) == image_id
+        assert reloaded.total_bytes == 5
+
+        os.remove(reloaded.file_for(image_id))
+        assert reloaded.get(key) is None
+        assert (len(reloaded), reloaded.total_bytes) == (0, 0)
+
+    @pytest.mark.parametrize(
+        "image_id",
+        ["../../etc/passwd", "a" * 64, f"{'a' * 64}-{'b' * 16}.png", f"{'A' * 64}-{'b' * 16}"],
+    )
+    def test_file_for_rejects_malformed_ids(self, tmp_path, image_id):
+        """Test that only well-formed ids of stored images map to a file."""
+        assert ImageStore(str(tmp_path), max_bytes=100).file_for(image_id) is None
+
+    def test_concurrent_requests_share_one_generation(self, tmp_path):
+        """Test that concurrent misses for one key generate and download once, and later calls are hits."""
+        store = ImageStore(str(tmp_path), max_bytes=100)
+        key = ImageStore.make_key("burger", "256x256", "dall-e-2")
+        calls = 0
+
+        async def agenerate_url():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return "https://provider.example/burger.png"
+
+        async def run():
+            async with _client() as client:
+                results = await asyncio.gather(*[store.aget_or_create(key, agenerate_url, client) for _ in range(5)])
+                results.append(await store.aget_or_create(key, agenerate_url, client))
+            return results
+
+        results = asyncio.run(run())
+        assert calls == 1
+        assert len(set(results)) == 1 and results[0][1] is None
+        assert (store.hits, store.misses) == (1, 1)
+
+    @pytest.mark.parametrize(
+        "url, status_code, expected",
+        [
+            ("https://provider.example/burger.png", 404, (None, "https://provider.example/burger.png")),
+            (None, 200, (None, None)),
+        ],
+    )
+    def test_falls_back_when_the_download_or_generation_fails(self, tmp_path, url, status_code, expected):
+        """Test that the provider URL is returned when the image cannot be downloaded, and nothing when it failed."""
+        store = ImageStore(str(tmp_path), max_bytes=100)
+        key = ImageStore.make_key("burger", "256x256", "dall-e-2")
+
+        async def agenerate_url():
+            return url
+
+        async def run():
+            async with _client(status_code=status_code) as client:
+                return await store.aget_or_create(key, agenerate_url, client)
+
+        assert asyncio.run(run()) == expected
+        assert len(store) == 0
+
+    def test_download_is_capped(self, monkeypatch):
+        """Test that an image larger than MAX_IMAGE_BYTES is refused."""
+        monkeypatch.setattr(ImageStore, "MAX_IMAGE_BYTES", 4)
+
+        async def run():
+            async with _client(image=b"too large") as client:
+                return await ImageStore.adownload("https://provider.example/large.png", client)
+
+        with pytest.raises(ValueError):
+            asyncio.run(run())
+
+    def test_from_env(self, monkeypatch, tmp_path):
+        """Test that the store is configured from the environment, and disabled by a zero size."""
+        monkeypatch.setenv("IMAGE_STORE_PATH", str(tmp_path))
+        monkeypatch.setenv("IMAGE_STORE_MAX_MB", "1")
+        store = ImageStore.from_env()
+        assert (store.path, store.max_bytes) == (str(tmp_path), 1024 * 1024)
+
+        monkeypatch.setenv("IMAGE_STORE_MAX_MB", "0")
+        assert ImageStore.from_env() is None
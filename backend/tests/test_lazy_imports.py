@@ -0,0 +1,60 @@
+import sys
+
+import pytest
+
+from backend.lazy_imports import is_loaded, lazy_import, load
+
+"""
+Test file for the lazy imports of the provider SDKs.
+
+A small standard library module the test session never imports stands in for an SDK, and is removed from
+sys.modules after each test.
+"""
+
+MODULE = "tabnanny"
+
+
+@pytest.fixture(autouse=True)
+def unimported():
+    """Makes sure the stand-in module is not imported before the test, and not left imported after it."""
+    sys.modules.pop(MODULE, None)
+    yield
+    sys.modules.pop(MODULE, None)
+
+
+class TestLazyImport:
+    """Unit tests for lazy_import, is_loaded and load."""
+
+    def test_module_runs_on_first_attribute_use(self):
+        """Test that a lazily imported module is registered but only runs when an attribute is used."""
+        module = lazy_import(MODULE)
+
+        assert sys.modules[MODULE] is module
+        assert not is_loaded(MODULE)
+        assert callable(module.check)
+        assert is_loaded(MODULE)
+
+    def test_load_runs_a_lazy_module(self):
+        """Test that load runs a lazily imported module, and that importing it again returns the same module."""
+        module = lazy_import(MODULE)
+
+        assert load(MODULE) >= 0
+        assert is_loaded(MODULE)
+        assert lazy_import(MODULE) is module
+
+    def test_missing_module_fails_straight_away(self):
+        """Test that a module that is not installed raises ModuleNotFoundError at import, not on first use."""
+        with pytest.raises(ModuleNotFoundError):
+            lazy_import("no_such_provider_sdk")
+
+    def test_load_drops_a_module_that_fails(self, monkeypatch, tmp_path):
+        """Test that load re-raises a failing module's error and removes it, so loading it again raises it again."""
+        (tmp_path / "failing_provider_sdk.py").write_text("raise RuntimeError('no credentials')\n")
+        monkeypatch.syspath_prepend(str(tmp_path))
+        monkeypatch.delitem(sys.modules, "failing_provider_sdk", raising=False)
+        lazy_import("failing_provider_sdk")
+
+        for _ in range(2):
+            with pytest.raises(RuntimeError, match="no credentials"):
+                load("failing_provider_sdk")
+            assert not is_loaded("failing_provider_sdk")
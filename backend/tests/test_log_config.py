@@ -0,0 +1,106 @@
+import io
+import json
+import logging
+import threading
+
+import pytest
+
+from backend import log_config
+from backend.log_config import REQUEST_ID, JsonFormatter, RequestContextFilter, configure_logging, shutdown_logging
+
+"""
+Test file for the logging setup: request-id tagging, sampling, JSON output and the queue listener.
+"""
+
+
+def _record(level: int = logging.INFO, msg: str = "hello %s", args: tuple = ("world",), **extra) -> logging.LogRecord:
+    record = logging.LogRecord("test", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+class TestRequestContextFilter:
+    """Unit tests for the RequestContextFilter class."""
+
+    def test_tags_records_with_request_id(self):
+        """Test that records get the current request id, and "-" outside a request."""
+        log_filter = RequestContextFilter()
+        outside = _record()
+        log_filter.filter(outside)
+
+        token = REQUEST_ID.set("abc123")
+        try:
+            inside = _record()
+            log_filter.filter(inside)
+        finally:
+            REQUEST_ID.reset(token)
+
+        assert (outside.request_id, inside.request_id) == ("-", "abc123")
+
+    def test_samples_info_per_request(self):
+        """Test that about sample_rate of requests keep INFO lines, consistently, and warnings are always kept."""
+        log_filter = RequestContextFilter(sample_rate=0.25)
+        kept = 0
+        for i in range(2000):
+            token = REQUEST_ID.set(f"request-{i}")
+            try:
+                info = log_filter.filter(_record())
+                assert log_filter.filter(_record(logging.DEBUG)) == info
+                assert log_filter.filter(_record(logging.WARNING))
+            finally:
+                REQUEST_ID.reset(token)
+            kept += info
+
+        assert 0.2 < kept / 2000 < 0.3
+        assert RequestContextFilter(sample_rate=0.0).filter(_record())  # Outside a request.
+
+
+class TestJsonFormatter:
+    """Unit tests for the JsonFormatter class."""
+
+    def test_formats_one_json_object(self):
+        """Test that the message is rendered lazily and extra fields are included."""
+        line = JsonFormatter().format(_record(request_id="abc123", model="gpt-4"))
+
+        entry = json.loads(line)
+        assert entry["message"] == "hello world"
+        assert (entry["level"], entry["request_id"], entry["model"]) == ("INFO", "abc123", "gpt-4")
+
+
+class TestConfigureLogging:
+    """Unit tests for configure_logging and shutdown_logging."""
+
+    @pytest.fixture
+    def stream(self):
+        stream = io.StringIO()
+        yield stream
+        shutdown_logging()
+
+    def test_records_are_formatted_off_the_calling_thread(self, stream):
+        """Test that the message is formatted and written by the listener thread, and DEBUG not formatted at all."""
+        formatted_on = {}
+
+        class Prompt:
+            def __init__(self, name):
+                self.name = name
+
+            def __str__(self):
+                formatted_on.setdefault(self.name, set()).add(threading.current_thread())
+                return "a long prompt"
+
+        listener = configure_logging(level="INFO", sample_rate=1.0, stream=stream)
+        assert configure_logging() is listener
+        token = REQUEST_ID.set("abc123")
+        try:
+            logging.getLogger("backend.test").info("Prompt: %s", Prompt("info"))
+            logging.getLogger("backend.test").debug("Not logged: %s", Prompt("debug"))
+        finally:
+            REQUEST_ID.reset(token)
+        shutdown_logging()
+
+        assert stream.getvalue().endswith(" - INFO - backend.test - [abc123] Prompt: a long prompt\n")
+        # (pytest's own log capture formats it on this thread too.)
+        assert any(thread is not threading.current_thread() for thread in formatted_on["info"])
+        assert "debug" not in formatted_on
+        assert log_config._listener is None
+        assert log_config.DeferredQueueHandler not in map(type, logging.getLogger().handlers)
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from backend.metrics import Counter, Gauge, Histogram, MetricsRegistry, outcome_of
+
+"""
+Test file for the Prometheus metrics and their text exposition format.
+
+Each test uses its own MetricsRegistry, so the process-wide metrics are not touched.
+"""
+
+
+class TestMetrics:
+    """Unit tests for Counter, Gauge, Histogram and MetricsRegistry."""
+
+    def test_counter_and_gauge(self):
+        """Test that labelled counters and gauges render one sample per label combination, sorted."""
+        registry = MetricsRegistry()
+        tokens = Counter("tokens_total", "Tokens.", ("model", "direction"), registry=registry)
+        connections = Gauge("connections", "Open connections.", registry=registry)
+        tokens.labels("gpt-4", "out").inc(12)
+        tokens.labels("gpt-4", "in").inc(3)
+        tokens.labels("gpt-4", "out").inc()
+        connections.inc()
+        connections.inc()
+        connections.dec()
+
+        assert registry.render() == (
+            "# HELP tokens_total Tokens.\n"
+            "# TYPE tokens_total counter\n"
+            'tokens_total{model="gpt-4",direction="in"} 3\n'
+            'tokens_total{model="gpt-4",direction="out"} 13\n'
+            "# HELP connections Open connections.\n"
+            "# TYPE connections gauge\n"
+            "connections 1\n"
+        )
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test that observations land in the first bucket they fit (inclusive) and buckets render cumulatively."""
+        registry = MetricsRegistry()
+        latency = Histogram("latency_seconds", "Latency.", ("model",), buckets=(0.1, 1.0), registry=registry)
+        for value in (0.05, 0.1, 0.5, 3.0):
+            latency.labels("gpt-4").observe(value)
+
+        lines = registry.render().splitlines()[2:]
+
+        assert lines == [
+            'latency_seconds_bucket{model="gpt-4",le="0.1"} 2',
+            'latency_seconds_bucket{model="gpt-4",le="1"} 3',
+            'latency_seconds_bucket{model="gpt-4",le="+Inf"} 4',
+            'latency_seconds_sum{model="gpt-4"} 3.65',
+            'latency_seconds_count{model="gpt-4"} 4',
+        ]
+
+    def test_label_values_are_escaped(self):
+        """Test that quotes, backslashes and newlines in label values are escaped."""
+        registry = MetricsRegistry()
+        Counter("errors_total", "Errors.", ("message",), registry=registry).labels('a "b"\\\n').inc()
+
+        assert 'errors_total{message="a \\"b\\"\\\\\\n"} 1' in registry.render()
+
+    def test_rejects_wrong_labels_and_duplicate_names(self):
+        """Test that label values must match the label names, and a name can only be registered once."""
+        registry = MetricsRegistry()
+        counter = Counter("requests_total", "Requests.", ("model",), registry=registry)
+
+        with pytest.raises(ValueError):
+            counter.labels("gpt-4", "extra")
+        with pytest.raises(ValueError):
+            Counter("requests_total", "Requests again.", registry=registry)
+
+    @pytest.mark.parametrize(
+        "error, outcome",
+        [
+            (None, "ok"),
+            (TimeoutError(), "timeout"),
+            (asyncio.TimeoutError(), "timeout"),
+            (asyncio.CancelledError(), "cancelled"),
+            (GeneratorExit(), "cancelled"),
+            (ValueError(), "error"),
+        ],
+    )
+    def test_outcome_of(self, error, outcome):
+        """Test how the end of a stream or call is classified for the outcome label."""
+        assert outcome_of(error) == outcome
@@ -0,0 +1,111 @@
+import asyncio
+from types import ModuleType
+
+import litellm
+import pytest
+
+from backend import provider_registry
+from backend.provider_registry import ProviderRegistry
+from backend.quiz_cache import InMemoryQuizCache, QuizCache
+
+"""
+Test file for ProviderRegistry class.
+
+Unit tests only: the registry is started and closed in-process and no provider calls are made.
+"""
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Fixture to create a started ProviderRegistry with dummy API keys, closed after the test."""
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy_key")
+    registry = ProviderRegistry(max_connections=10, max_keepalive_connections=5, keepalive_expiry=15.0)
+    registry.start()
+    yield registry
+    asyncio.run(registry.aclose())
+
+
+class TestProviderRegistry:
+    """Unit tests for the ProviderRegistry class."""
+
+    def test_from_env(self, monkeypatch):
+        """Test that pool limits, quiz sharding and hedging are read from the environment."""
+        monkeypatch.setenv("PROVIDER_MAX_CONNECTIONS", "7")
+        monkeypatch.setenv("PROVIDER_MAX_KEEPALIVE_CONNECTIONS", "3")
+        monkeypatch.setenv("PROVIDER_KEEPALIVE_EXPIRY_SECONDS", "12.5")
+        monkeypatch.setenv("QUIZ_SHARDS", "3")
+        monkeypatch.setenv("QUIZ_HEDGING", "true")
+        monkeypatch.setenv("OPENAI_API_KEY", "dummy_key")
+
+        registry = ProviderRegistry.from_env()
+
+        assert registry.limits.max_connections == 7
+        assert registry.limits.max_keepalive_connections == 3
+        assert registry.limits.keepalive_expiry == 12.5
+        assert registry.get_quiz_generator().shards == 3
+        assert registry.get_quiz_generator().hedging is True
+        assert registry.get_quiz_generator().router is registry.model_router
+
+    def test_start_installs_shared_litellm_session(self, registry):
+        """Test that litellm's async session is the registry's pooled client."""
+        assert registry.http_client is not None
+        assert litellm.aclient_session is registry.http_client
+
+    def test_aclose_removes_litellm_session(self, monkeypatch):
+        """Test that closing the registry uninstalls and closes its pool."""
+        registry = ProviderRegistry()
+        registry.start()
+        http_client = registry.http_client
+
+        asyncio.run(registry.aclose())
+
+        assert litellm.aclient_session is None
+        assert http_client.is_closed
+
+    def test_aclose_before_start_does_not_use_litellm(self, mocker, monkeypatch):
+        """Test that closing a registry that never started (e.g. its SDK import failed) still closes the cache."""
+        # A half-initialised module, as a failed import leaves behind: it has no aclient_session.
+        monkeypatch.setattr(provider_registry, "litellm", ModuleType("litellm"))
+        quiz_cache = mocker.Mock(spec=QuizCache)
+        registry = ProviderRegistry(quiz_cache=quiz_cache)
+
+        asyncio.run(registry.aclose())
+
+        quiz_cache.close.assert_called_once()
+
+    def test_quiz_generator_is_reused_per_model(self, mocker, registry):
+        """Test that each model gets one QuizGenerator and API keys are checked once."""
+        # Spy on the class the registry actually imported.
+        quiz_generator_cls = provider_registry.QuizGenerator
+        check_keys = mocker.spy(quiz_generator_cls, "check_api_key_from_env")
+
+        first = registry.get_quiz_generator("o3-mini")
+        second = registry.get_quiz_generator("o3-mini")
+        default = registry.get_quiz_generator(None)
+
+        assert first is second
+        assert first.model == "o3-mini"
+        assert default.model == quiz_generator_cls.DEFAULT_MODEL
+        assert check_keys.call_count == 2
+
+    def test_quiz_generators_share_the_quiz_cache(self, registry):
+        """Test that every model's generator uses the registry's cache."""
+        registry.quiz_cache = QuizCache(InMemoryQuizCache(max_entries=10, ttl=60.0))
+
+        assert registry.get_quiz_generator("o3-mini").cache is registry.quiz_cache
+        assert registry.get_quiz_generator("gpt-4-turbo").cache is registry.quiz_cache
+
+    def test_unsupported_models_share_the_fallback_generator(self, registry):
+        """Test that arbitrary model names do not grow the registry."""
+        first = registry.get_quiz_generator("not-a-model")
+        second = registry.get_quiz_generator("also-not-a-model")
+
+        assert first is second
+        assert first.model == "gpt-4-turbo"
+
+    def test_image_generator_uses_pooled_client(self, registry):
+        """Test that the shared ImageGenerator's AsyncOpenAI client uses the registry's pool."""
+        image_generator = registry.get_image_generator()
+
+        assert registry.get_image_generator() is image_generator
+        assert image_generator.async_client._client is registry.http_client
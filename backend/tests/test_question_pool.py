@@ -0,0 +1,223 @@
+import asyncio
+
+import pytest
+from fake_llm import FakeStreamingProvider, make_question
+
+from backend.question_pool import QuestionPool, SessionHistory, provider_of
+from backend.quiz_question import QuizQuestion
+
+"""
+Test file for QuestionPool and SessionHistory.
+
+Unit tests only: pools are refilled from a fake streaming provider through a stand-in QuizGenerator.
+"""
+
+
+def _question(i: int, topic: str = "Testing") -> QuizQuestion:
+    return QuizQuestion.from_dict(make_question(i, topic))
+
+
+def _pool(**kwargs) -> QuestionPool:
+    options = {"topics": ["UK History"], "difficulties": ["easy"], "models": ["gpt-3.5-turbo"]}
+    options.update(kwargs)
+    return QuestionPool(**options)
+
+
+def _fill(pool: QuestionPool, n: int, start: int = 1) -> None:
+    for i in range(start, start + n):
+        pool.add("gpt-3.5-turbo", "UK History", "easy", _question(i))
+
+
+class FakeQuizGenerator:
+    """
+    Stands in for QuizGenerator.agenerate_questions, yielding one distinct question per chunk
+    of a fake provider's stream.
+    """
+
+    def __init__(self, provider: FakeStreamingProvider):
+        self.provider = provider
+        self.requests = []
+
+    async def agenerate_questions(self, topic, difficulty, n_questions):
+        self.requests.append((topic, difficulty, n_questions))
+        llm_stream = await self.provider.acompletion(model="fake", stream=True)
+        offset = len(self.requests) * 1000
+
+        async def questions():
+            # One question per chunk; each refill gets distinct questions, as a real model would give.
+            i = offset
+            async for _ in llm_stream:
+                i += 1
+                yield _question(i, topic)
+
+        return questions()
+
+
+class TestSessionHistory:
+    """Unit tests for the SessionHistory class."""
+
+    def test_records_questions_per_session(self):
+        """Test that questions are remembered per session."""
+        history = SessionHistory()
+        history.record("alice", _question(1))
+
+        assert _question(1).dedupe_key in history.seen("alice")
+        assert _question(1).dedupe_key not in history.seen("bob")
+
+    def test_limits_sessions_and_questions(self):
+        """Test that the oldest sessions and questions are forgotten beyond the limits."""
+        history = SessionHistory(max_sessions=2, max_questions=2)
+        for i in range(1, 4):
+            history.record("alice", _question(i))
+        history.record("bob", _question(1))
+        history.record("carol", _question(1))
+
+        assert len(history) == 2
+        assert list(history.seen("alice")) == []
+        assert list(history.seen("carol")) == [_question(1).dedupe_key]
+
+    def test_idle_sessions_expire(self):
+        """Test that a session idle for longer than the TTL is forgotten."""
+        now = [0.0]
+        history = SessionHistory(ttl=10.0, clock=lambda: now[0])
+        history.record("alice", _question(1))
+
+        now[0] = 11.0
+        assert list(history.seen("alice")) == []
+        assert len(history) == 0
+
+
+class TestQuestionPool:
+    """Unit tests for the QuestionPool class."""
+
+    def test_from_env(self, monkeypatch):
+        """Test that pools are configured from the environment and disabled without topics."""
+        monkeypatch.delenv("QUESTION_POOL_TOPICS", raising=False)
+        assert QuestionPool.from_env() is None
+
+        monkeypatch.setenv("QUESTION_POOL_TOPICS", "UK History, Roman History")
+        monkeypatch.setenv("QUESTION_POOL_DIFFICULTIES", "easy")
+        monkeypatch.setenv("QUESTION_POOL_MODELS", "gpt-3.5-turbo,not-a-model,gpt-4-turbo")
+        monkeypatch.setenv("QUESTION_POOL_MAX_QUESTIONS", "50")
+        pool = QuestionPool.from_env()
+
+        assert pool.max_questions == 50
+        # The unsupported model resolves to the same fallback as gpt-4-turbo.
+        assert len(pool._pools) == 4
+        assert pool.available("gpt-4-turbo", "roman history", "Easy") == 0
+
+    def test_provider_of(self):
+        """Test that models are grouped by provider for rate limiting."""
+        assert provider_of("gpt-3.5-turbo") == "openai"
+        assert provider_of("gemini/gemini-2.0-flash") == "gemini"
+        assert provider_of("azure_ai/DeepSeek-R1") == "azure_ai"
+
+    def test_take_renumbers_and_removes_questions(self):
+        """Test that taken questions are removed from the pool and numbered from 1."""
+        pool = _pool()
+        _fill(pool, 5, start=10)
+
+        taken = pool.take("gpt-3.5-turbo", "  uk history", "EASY", 3)
+
+        assert [question.question_id for question in taken] == [1, 2, 3]
+        assert [question.question for question in taken] == [_question(i).question for i in (10, 11, 12)]
+        assert all(question.raw is None for question in taken)
+        assert pool.available("gpt-3.5-turbo", "UK History", "easy") == 2
+        assert (pool.hits, pool.size) == (1, 2)
+
+    def test_take_is_all_or_nothing(self):
+        """Test that a pool that cannot provide every question keeps them all."""
+        pool = _pool()
+        _fill(pool, 2)
+
+        assert pool.take("gpt-3.5-turbo", "UK History", "easy", 3) is None
+        assert pool.available("gpt-3.5-turbo", "UK History", "easy") == 2
+        assert pool.misses == 1
+
+    def test_take_unpooled_topic(self):
+        """Test that topics, difficulties and models outside the configuration are not served."""
+        pool = _pool()
+        _fill(pool, 3)
+
+        assert pool.take("gpt-3.5-turbo", "Geology", "easy", 1) is None
+        assert pool.take("gpt-3.5-turbo", "UK History", "hard", 1) is None
+        assert pool.take("gpt-4-turbo", "UK History", "easy", 1) is None
+
+    def test_take_skips_questions_the_session_has_seen(self):
+        """Test that excluded questions are skipped and left in the pool for other sessions."""
+        pool = _pool()
+        _fill(pool, 4)
+
+        taken = pool.take("gpt-3.5-turbo", "UK History", "easy", 2, exclude={_question(1).dedupe_key})
+
+        assert [question.question for question in taken] == [_question(2).question, _question(3).question]
+        remaining = pool.take("gpt-3.5-turbo", "UK History", "easy", 2)
+        assert [question.question for question in remaining] == [_question(1).question, _question(4).question]
+
+    def test_add_respects_memory_cap_and_duplicates(self):
+        """Test that the pool holds at most max_questions and ignores repeats."""
+        pool = _pool(max_questions=3)
+
+        assert pool.add("gpt-3.5-turbo", "UK History", "easy", _question(1))
+        assert not pool.add("gpt-3.5-turbo", "UK History", "easy", _question(1))
+        _fill(pool, 5, start=2)
+
+        assert len(pool) == 3
+
+    def test_worker_refills_below_low_water(self):
+        """Test that the worker fills empty pools and refills after questions are taken."""
+        provider = FakeStreamingProvider(text="." * 5, chunk_size=1)
+        quiz_generator = FakeQuizGenerator(provider)
+        pool = _pool(low_water=4, refill_size=5, refills_per_minute=60000)
+
+        async def run():
+            pool.start(lambda model: quiz_generator)
+            try:
+                await asyncio.sleep(0.05)
+                filled = pool.available("gpt-3.5-turbo", "UK History", "easy")
+                pool.take("gpt-3.5-turbo", "UK History", "easy", filled - 1)
+                await asyncio.sleep(0.05)
+                return filled, pool.available("gpt-3.5-turbo", "UK History", "easy")
+            finally:
+                await pool.aclose()
+
+        filled, refilled = asyncio.run(run())
+
+        assert filled >= 4
+        assert refilled >= 4
+        assert quiz_generator.requests[0] == ("UK History", "easy", 5)
+        assert provider.closed == provider.calls
+
+    def test_refills_are_rate_limited_per_provider(self):
+        """Test that refills beyond the per-provider burst wait for the rate limit."""
+        provider = FakeStreamingProvider(text=".", chunk_size=1)
+        quiz_generator = FakeQuizGenerator(provider)
+        # Two pools on one provider: a burst of two refills, then one per minute.
+        pool = _pool(difficulties=["easy", "hard"], low_water=1000, refill_size=1, refills_per_minute=1)
+
+        async def run():
+            pool.start(lambda model: quiz_generator)
+            try:
+                await asyncio.sleep(0.1)
+            finally:
+                await pool.aclose()
+
+        asyncio.run(run())
+        assert provider.calls == 2
+
+    @pytest.mark.parametrize("max_questions", [0, 5])
+    def test_refills_stop_at_memory_cap(self, max_questions):
+        """Test that no refill starts when it could take the pool past its memory cap."""
+        provider = FakeStreamingProvider(text="." * 10, chunk_size=1)
+        quiz_generator = FakeQuizGenerator(provider)
+        pool = _pool(low_water=100, refill_size=10, max_questions=max_questions, refills_per_minute=600)
+
+        async def run():
+            pool.start(lambda model: quiz_generator)
+            try:
+                await asyncio.sleep(0.05)
+            finally:
+                await pool.aclose()
+
+        asyncio.run(run())
+        assert provider.calls == 0
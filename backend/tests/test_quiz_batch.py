@@ -0,0 +1,176 @@
+import asyncio
+import json
+import os
+from unittest.mock import patch
+
+import pytest
+from fake_llm import FakeStreamingProvider, make_question
+
+from backend.generate_quiz import ModelRouter, QuizGenerator
+from backend.quiz_batch import BatchJob, BatchJournal, arun_batch, make_batch_id
+from backend.quiz_question import QuizQuestion
+
+"""
+Test file for batch quiz generation.
+
+`arun_batch` is driven by fake quiz generators that sleep instead of calling a provider, recording how many
+quizzes each provider was asked for at once. Journals are kept in pytest's tmp_path.
+"""
+
+
+class _FakeQuizGenerator:
+    """Stands in for a QuizGenerator: returns canned questions after `delay` seconds, tracking concurrency."""
+
+    def __init__(self, model: str, delay: float = 0.01, failing_topics: tuple = ()):
+        self.model = model
+        self.delay = delay
+        self.failing_topics = failing_topics
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def agenerate_question_list(self, topic: str, difficulty: str, n_questions: int) -> list[QuizQuestion]:
+        self.calls.append(topic)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if topic in self.failing_topics:
+                raise RuntimeError(f"provider failed on {topic}")
+            return [QuizQuestion.from_dict(make_question(i, topic)) for i in range(1, n_questions + 1)]
+        finally:
+            self.in_flight -= 1
+
+
+def _jobs(n: int, model: str = "model-a") -> list[BatchJob]:
+    return [BatchJob(f"job-{i}", f"Topic {i}", "easy", 2, model) for i in range(n)]
+
+
+async def _collect(results):
+    return [result async for result in results]
+
+
+class TestRunBatch:
+    """Unit tests for arun_batch."""
+
+    def test_concurrency_is_bounded_per_provider(self):
+        """Test that each provider runs at most max_concurrency_per_provider jobs at once, concurrently with others."""
+        generators = {"model-a": _FakeQuizGenerator("model-a"), "model-b": _FakeQuizGenerator("model-b")}
+        jobs = _jobs(6, "model-a") + [BatchJob(f"b-{i}", f"B {i}", "easy", 2, "model-b") for i in range(3)]
+
+        results = asyncio.run(_collect(arun_batch(jobs, generators.get, lambda model: model, 2)))
+
+        assert sorted(result.job.job_id for result in results) == sorted(job.job_id for job in jobs)
+        assert all(result.ok and len(result.questions) == 2 for result in results)
+        assert generators["model-a"].max_in_flight == 2
+        assert generators["model-b"].max_in_flight == 2
+
+    def test_throughput_scales_with_concurrency(self):
+        """Test that doubling the per-provider concurrency roughly halves the time a batch takes."""
+        timings = []
+        for concurrency in (2, 4):
+            generator = _FakeQuizGenerator("model-a", delay=0.05)
+
+            async def run():
+                started = asyncio.get_running_loop().time()
+                await _collect(arun_batch(_jobs(8), lambda model: generator, lambda model: model, concurrency))
+                return asyncio.get_running_loop().time() - started
+
+            timings.append(asyncio.run(run()))
+
+        assert timings[1] < timings[0] * 0.75
+
+    def test_failed_job_does_not_stop_the_batch(self):
+        """Test that a failing job yields an error result, and an unknown model fails only its own job."""
+        generator = _FakeQuizGenerator("model-a", failing_topics=("Topic 1",))
+
+        def generator_for(model):
+            if model == "unknown":
+                raise ValueError("No API key for unknown")
+            return generator
+
+        jobs = _jobs(3) + [BatchJob("odd", "Odd", "easy", 2, "unknown")]
+        results = {r.job.job_id: r for r in asyncio.run(_collect(arun_batch(jobs, generator_for, str, 2)))}
+
+        assert [job_id for job_id, result in results.items() if not result.ok] == ["odd", "job-1"]
+        assert results["job-1"].to_dict()["error"] == "provider failed on Topic 1"
+        assert results["odd"].to_dict()["status"] == "error"
+        assert results["job-2"].to_dict()["questions"][1]["question_id"] == 2
+
+    def test_duplicate_job_ids_are_rejected(self):
+        """Test that a batch whose job ids are not unique is refused before any job runs."""
+        generator = _FakeQuizGenerator("model-a")
+        jobs = [BatchJob("same", "A", "easy"), BatchJob("same", "B", "easy")]
+
+        with pytest.raises(ValueError):
+            asyncio.run(_collect(arun_batch(jobs, lambda model: generator, str, 2)))
+        assert generator.calls == []
+
+    def test_interrupted_batch_resumes_from_the_journal(self, tmp_path):
+        """Test that a batch closed part-way journals its finished jobs, and resubmitting it runs only the rest."""
+        journal = BatchJournal(str(tmp_path))
+        jobs = _jobs(5)
+        first = _FakeQuizGenerator("model-a")
+
+        async def interrupted():
+            results = arun_batch(jobs, lambda model: first, str, 1, journal)
+            finished = [await anext(results), await anext(results)]
+            await results.aclose()
+            return finished
+
+        finished = asyncio.run(interrupted())
+        second = _FakeQuizGenerator("model-a")
+        resumed = asyncio.run(_collect(arun_batch(jobs, lambda model: second, str, 1, journal)))
+
+        assert [result.job.job_id for result in resumed[:2]] == [result.job.job_id for result in finished]
+        assert all(result.resumed for result in resumed[:2]) and not any(result.resumed for result in resumed[2:])
+        assert resumed[0].to_dict()["questions"] == finished[0].to_dict()["questions"]
+        assert len(second.calls) == 3
+        assert os.path.basename(journal.file_for(make_batch_id(jobs))) in os.listdir(tmp_path)
+
+    def test_journal_skips_a_half_written_line(self, tmp_path):
+        """Test that a line left half-written by a crash is ignored rather than failing the batch."""
+        journal = BatchJournal(str(tmp_path))
+        jobs = _jobs(2)
+        asyncio.run(_collect(arun_batch(jobs, lambda model: _FakeQuizGenerator("model-a"), str, 2, journal, "b1")))
+        with open(journal.file_for("b1"), "a", encoding="utf-8") as f:
+            f.write('{"job_id": "job-9", "top')
+
+        assert sorted(journal.load("b1")) == ["job-0", "job-1"]
+
+    @pytest.mark.parametrize("batch_id", ["../escape", "", "a" * 65])
+    def test_journal_rejects_malformed_batch_ids(self, tmp_path, batch_id):
+        """Test that a batch id cannot name a file outside the journal directory."""
+        with pytest.raises(ValueError):
+            BatchJournal(str(tmp_path)).file_for(batch_id)
+
+
+class TestGenerateBatch:
+    """Unit tests for QuizGenerator.agenerate_batch."""
+
+    def test_quizzes_are_generated_per_model(self, monkeypatch):
+        """Test that each job streams from its own model, returning its questions whole."""
+        monkeypatch.setenv("OPENAI_API_KEY", "dummy_key")
+        provider = FakeStreamingProvider(n_questions=3)
+        jobs = [BatchJob("a", "Rome", "easy", 3), BatchJob("b", "Rome", "easy", 3, "gpt-4-turbo")]
+
+        with patch("litellm.acompletion", side_effect=provider.acompletion):
+            results = asyncio.run(_collect(QuizGenerator().agenerate_batch(jobs)))
+
+        assert {result.job.job_id: result.model for result in results} == {"a": "gpt-3.5-turbo", "b": "gpt-4-turbo"}
+        assert [len(result.questions) for result in results] == [3, 3]
+        assert json.loads(results[0].to_json())["status"] == "ok"
+        assert provider.calls == 2
+
+    def test_other_models_share_the_generator_settings(self, monkeypatch):
+        """Test that the generators created for other models record to the same router as this generator."""
+        monkeypatch.setenv("OPENAI_API_KEY", "dummy_key")
+        provider = FakeStreamingProvider(n_questions=3)
+        router = ModelRouter()
+        jobs = [BatchJob("a", "Rome", "easy", 3), BatchJob("b", "Rome", "easy", 3, "gpt-4-turbo")]
+
+        with patch("litellm.acompletion", side_effect=provider.acompletion):
+            asyncio.run(_collect(QuizGenerator(router=router).agenerate_batch(jobs)))
+
+        assert router.stats_for("gpt-3.5-turbo").requests == 1
+        assert router.stats_for("gpt-4-turbo").requests == 1
@@ -0,0 +1,75 @@
+from unittest.mock import patch
+
+from fake_llm import FakeStreamingProvider, quiz_text_for_prompt
+
+from backend.quiz_bulk import main, read_topics
+from backend.quiz_cache import QuizCache
+from backend.quiz_store import QuizStore
+
+"""
+Test file for the quiz_bulk.py bulk generation command.
+
+The LLM provider is replaced by a fake local streaming provider, and the store is a temporary SQLite file.
+"""
+
+
+class TestBulkGeneration:
+    """Unit tests for the quiz_bulk.py command."""
+
+    def test_read_topics(self, tmp_path):
+        """Test that blank lines, comments and repeated topics are skipped."""
+        path = tmp_path / "topics.txt"
+        path.write_text("# Curriculum\nUK History\n\n  Roman   Empire \nUK History\n", encoding="utf-8")
+
+        with open(path, encoding="utf-8") as f:
+            assert read_topics(f) == ["UK History", "Roman Empire"]
+
+    def test_generates_into_the_store_and_skips_stored_quizzes(self, monkeypatch, tmp_path, capsys):
+        """Test that every topic and difficulty is stored, and a second run generates nothing."""
+        monkeypatch.setenv("OPENAI_API_KEY", "dummy_key")
+        topics = tmp_path / "topics.txt"
+        topics.write_text("UK History\nPython\n", encoding="utf-8")
+        store_path = str(tmp_path / "store.sqlite3")
+        argv = [
+            str(topics),
+            "--store",
+            store_path,
+            "--difficulty",
+            "easy",
+            "--difficulty",
+            "hard",
+            "--n-questions",
+            "3",
+        ]
+        provider = FakeStreamingProvider(text=quiz_text_for_prompt)
+
+        with patch("litellm.acompletion", side_effect=provider.acompletion):
+            assert main(argv) == 0
+            first = capsys.readouterr().out
+            assert main(argv) == 0
+            second = capsys.readouterr().out
+
+        assert provider.calls == 4
+        assert "4 quizzes: 4 generated, 0 already stored, 0 failed. 12 questions" in first
+        assert "4 quizzes: 0 generated, 4 already stored, 0 failed." in second
+        store = QuizStore(store_path)
+        try:
+            assert len(store) == 4
+            assert len(store.get(QuizCache.make_key("gpt-3.5-turbo", "python", "hard", 3))) == 3
+        finally:
+            store.close()
+
+    def test_failed_quizzes_are_retried_by_the_next_run(self, monkeypatch, tmp_path, capsys):
+        """Test that a failed quiz makes the run exit with 1 and is generated by the next run."""
+        monkeypatch.setenv("OPENAI_API_KEY", "dummy_key")
+        monkeypatch.setenv("PROVIDER_MAX_ATTEMPTS", "1")
+        topics = tmp_path / "topics.txt"
+        topics.write_text("UK History\n", encoding="utf-8")
+        argv = [str(topics), "--store", str(tmp_path / "store.sqlite3"), "--difficulty", "easy"]
+        provider = FakeStreamingProvider(text=quiz_text_for_prompt, faults=[ValueError("bad request")])
+
+        with patch("litellm.acompletion", side_effect=provider.acompletion):
+            assert main(argv) == 1
+            assert "0 generated, 0 already stored, 1 failed" in capsys.readouterr().out
+            assert main(argv) == 0
+            assert "1 generated" in capsys.readouterr().out
@@ -0,0 +1,190 @@
+import pytest
+from fake_llm import make_question
+
+from backend.quiz_cache import InMemoryQuizCache, QuizCache, SQLiteQuizCache
+from backend.quiz_question import QuizQuestion
+from backend.quiz_store import QuizStore
+
+"""
+Test file for QuizCache and its backends.
+
+Unit tests only: the SQLite backend uses a temporary file and time is driven by a fake clock.
+"""
+
+
+class FakeClock:
+    """A controllable time source."""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _questions(*ids) -> list[QuizQuestion]:
+    return [QuizQuestion.from_dict(make_question(i)) for i in ids]
+
+
+def _dicts(questions) -> list[dict]:
+    # Compare as dicts: the backends build questions with the app's (flat-imported) QuizQuestion class.
+    return [question.to_dict() for question in questions]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_backend(request, tmp_path):
+    """Fixture returning a factory for each backend, so both are tested against the same behaviour."""
+    backends = []
+
+    def factory(max_entries=10, ttl=60.0, clock=None):
+        clock = clock or FakeClock()
+        if request.param == "memory":
+            backend = InMemoryQuizCache(max_entries=max_entries, ttl=ttl, clock=clock)
+        else:
+            backend = SQLiteQuizCache(str(tmp_path / "cache.sqlite3"), max_entries=max_entries, ttl=ttl, clock=clock)
+        backends.append(backend)
+        return backend
+
+    yield factory
+    for backend in backends:
+        backend.close()
+
+
+class TestQuizCacheBackends:
+    """Behaviour shared by InMemoryQuizCache and SQLiteQuizCache."""
+
+    def test_round_trip(self, make_backend):
+        """Test that stored questions are returned in order."""
+        backend = make_backend()
+        backend.set("key", _questions(1, 2))
+
+        assert _dicts(backend.get("key")) == _dicts(_questions(1, 2))
+        assert backend.get("missing") is None
+
+    def test_entries_expire_after_ttl(self, make_backend):
+        """Test that entries are not served once their TTL has passed."""
+        clock = FakeClock()
+        backend = make_backend(ttl=60.0, clock=clock)
+        backend.set("key", _questions(1))
+
+        clock.now += 59
+        assert backend.get("key") is not None
+        clock.now += 2
+        assert backend.get("key") is None
+        assert len(backend) == 0
+
+    def test_least_recently_used_entry_is_evicted(self, make_backend):
+        """Test that the entry read least recently is evicted when the cache is full."""
+        clock = FakeClock()
+        backend = make_backend(max_entries=2, clock=clock)
+        backend.set("first", _questions(1))
+        clock.now += 1
+        backend.set("second", _questions(2))
+        clock.now += 1
+        backend.get("first")
+        clock.now += 1
+        backend.set("third", _questions(3))
+
+        assert backend.get("second") is None
+        assert _dicts(backend.get("first")) == _dicts(_questions(1))
+        assert _dicts(backend.get("third")) == _dicts(_questions(3))
+        assert len(backend) == 2
+
+
+class TestSQLiteQuizCache:
+    """Unit tests specific to the SQLite backend."""
+
+    def test_survives_restart(self, tmp_path):
+        """Test that a new cache on the same file sees earlier entries."""
+        path = str(tmp_path / "cache.sqlite3")
+        first = SQLiteQuizCache(path, max_entries=10, ttl=60.0)
+        first.set("key", _questions(1, 2))
+        first.close()
+
+        second = SQLiteQuizCache(path, max_entries=10, ttl=60.0)
+        try:
+            assert _dicts(second.get("key")) == _dicts(_questions(1, 2))
+        finally:
+            second.close()
+
+
+class TestQuizCache:
+    """Unit tests for the QuizCache facade."""
+
+    def test_make_key_normalises_topic_and_difficulty(self):
+        """Test that case and whitespace differences share a key, while other fields do not."""
+        key = QuizCache.make_key("gpt-3.5-turbo", "UK History", "easy", 3)
+
+        assert key == QuizCache.make_key("gpt-3.5-turbo", "  uk   HISTORY ", "Easy", 3)
+        assert key != QuizCache.make_key("gpt-4-turbo", "UK History", "easy", 3)
+        assert key != QuizCache.make_key("gpt-3.5-turbo", "UK History", "hard", 3)
+        assert key != QuizCache.make_key("gpt-3.5-turbo", "UK History", "easy", 5)
+
+    def test_counts_hits_and_misses(self):
+        """Test that lookups are counted and empty quizzes are not stored."""
+        cache = QuizCache(InMemoryQuizCache(max_entries=10, ttl=60.0))
+        cache.set("empty", [])
+        cache.set("key", _questions(1))
+
+        assert cache.get("empty") is None
+        assert cache.get("key") == _questions(1)
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_backend_errors_are_treated_as_misses(self, mocker):
+        """Test that a failing backend never fails the request."""
+        backend = mocker.Mock()
+        backend.get.side_effect = RuntimeError("disk full")
+        backend.set.side_effect = RuntimeError("disk full")
+        cache = QuizCache(backend)
+
+        assert cache.get("key") is None
+        cache.set("key", _questions(1))
+        assert cache.misses == 1
+
+    def test_misses_are_served_from_the_quiz_store(self, tmp_path):
+        """Test that a quiz generated offline is served on a miss and copied into the backend."""
+        store = QuizStore(str(tmp_path / "store.sqlite3"))
+        store.put("gpt-3.5-turbo", "UK History", "easy", 2, _questions(1, 2))
+        cache = QuizCache(InMemoryQuizCache(max_entries=10, ttl=60.0), store)
+        key = QuizCache.make_key("gpt-3.5-turbo", " uk history", "Easy", 2)
+
+        try:
+            assert _dicts(cache.get(key)) == _dicts(_questions(1, 2))
+            assert cache.get(key) is not None
+            assert cache.get(QuizCache.make_key("gpt-3.5-turbo", "UK History", "hard", 2)) is None
+            assert (cache.hits, cache.store_hits, cache.misses) == (2, 1, 1)
+        finally:
+            cache.close()
+
+    @pytest.mark.parametrize(
+        "backend_name, expected",
+        [(None, InMemoryQuizCache), ("memory", InMemoryQuizCache), ("SQLite", SQLiteQuizCache)],
+    )
+    def test_from_env(self, monkeypatch, tmp_path, backend_name, expected):
+        """Test that the backend and its limits are read from the environment."""
+        if backend_name is None:
+            monkeypatch.delenv("QUIZ_CACHE_BACKEND", raising=False)
+        else:
+            monkeypatch.setenv("QUIZ_CACHE_BACKEND", backend_name)
+        monkeypatch.setenv("QUIZ_CACHE_MAX_ENTRIES", "5")
+        monkeypatch.setenv("QUIZ_CACHE_TTL_SECONDS", "30")
+        monkeypatch.setenv("QUIZ_CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+
+        cache = QuizCache.from_env()
+        try:
+            assert isinstance(cache.backend, expected)
+            assert cache.backend.max_entries == 5
+            assert cache.backend.ttl == 30.0
+        finally:
+            cache.close()
+
+    def test_from_env_disabled(self, monkeypatch):
+        """Test that caching can be switched off."""
+        monkeypatch.setenv("QUIZ_CACHE_BACKEND", "none")
+        assert QuizCache.from_env() is None
+
+    def test_from_env_unsupported_backend(self, monkeypatch):
+        """Test that an unknown backend name is rejected."""
+        monkeypatch.setenv("QUIZ_CACHE_BACKEND", "redis")
+        with pytest.raises(ValueError, match="Unsupported QUIZ_CACHE_BACKEND"):
+            QuizCache.from_env()
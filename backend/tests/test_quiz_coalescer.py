@@ -0,0 +1,173 @@
+import asyncio
+import time
+
+from fake_llm import FakeStreamingProvider
+
+from backend.quiz_coalescer import QuizCoalescer
+from backend.response_stream_parser import ResponseStreamParser
+
+"""
+Test file for QuizCoalescer.
+
+Unit tests only: upstream streams come from a fake provider that counts calls and closed streams.
+"""
+
+
+def _starter(provider: FakeStreamingProvider):
+    """Returns a QuestionStreamFactory that starts a fake upstream stream, as QuizGenerator does."""
+    parser = ResponseStreamParser(emit_bytes=True, validate_questions=True)
+
+    async def start():
+        llm_stream = await provider.acompletion(model="fake", stream=True)
+        return parser.aparse_questions(llm_stream)
+
+    return start
+
+
+async def _collect(questions, delay: float = 0.0) -> list[str]:
+    received = []
+    async for question in questions:
+        received.append(question.question)
+        if delay:
+            await asyncio.sleep(delay)
+    return received
+
+
+class TestQuizCoalescer:
+    """Unit tests for the QuizCoalescer class."""
+
+    def test_identical_concurrent_requests_share_one_upstream_stream(self):
+        """Test that 30 identical requests make one upstream call and all receive every question."""
+        provider = FakeStreamingProvider(n_questions=3, delay=0.005)
+        coalescer = QuizCoalescer()
+
+        async def run():
+            start = _starter(provider)
+            subscriptions = await asyncio.gather(*[coalescer.join("key", start) for _ in range(30)])
+            return await asyncio.gather(*[_collect(questions) for questions in subscriptions])
+
+        results = asyncio.run(run())
+
+        assert provider.calls == 1
+        assert all(result == results[0] for result in results)
+        assert len(results[0]) == 3
+        assert (coalescer.flights_started, coalescer.requests_coalesced) == (1, 29)
+        assert len(coalescer) == 0
+
+    def test_different_keys_are_not_coalesced(self):
+        """Test that requests for different keys get their own upstream streams."""
+        provider = FakeStreamingProvider(n_questions=2)
+        coalescer = QuizCoalescer()
+
+        async def run():
+            start = _starter(provider)
+            subscriptions = [await coalescer.join(key, start) for key in ("a", "b")]
+            return await asyncio.gather(*[_collect(questions) for questions in subscriptions])
+
+        asyncio.run(run())
+        assert provider.calls == 2
+
+    def test_late_subscriber_replays_emitted_questions(self):
+        """Test that a request joining mid-stream receives the questions it missed first."""
+        provider = FakeStreamingProvider(n_questions=3, delay=0.005)
+        coalescer = QuizCoalescer()
+
+        async def run():
+            start = _starter(provider)
+            first = await coalescer.join("key", start)
+            first_question = await first.__anext__()
+            late = await coalescer.join("key", start)
+            return [first_question.question] + await _collect(first), await _collect(late)
+
+        first, late = asyncio.run(run())
+
+        assert provider.calls == 1
+        assert late == first
+        assert len(late) == 3
+
+    def test_slow_subscriber_does_not_stall_fast_one(self):
+        """Test that a subscriber pausing between questions does not delay another subscriber."""
+        provider = FakeStreamingProvider(n_questions=3, chunk_size=64, delay=0.005)
+        coalescer = QuizCoalescer()
+
+        async def run():
+            start = _starter(provider)
+            fast, slow = [await coalescer.join("key", start) for _ in range(2)]
+
+            async def timed(questions, delay):
+                started = time.perf_counter()
+                received = await _collect(questions, delay)
+                return time.perf_counter() - started, received
+
+            return await asyncio.gather(timed(fast, 0.0), timed(slow, 0.2))
+
+        (fast_elapsed, fast_received), (slow_elapsed, slow_received) = asyncio.run(run())
+
+        assert fast_received == slow_received
+        assert slow_elapsed >= 0.6
+        assert fast_elapsed < 0.3
+
+    def test_upstream_cancelled_only_when_every_subscriber_leaves(self):
+        """Test that the upstream stream keeps going for remaining subscribers and closes when all have left."""
+        provider = FakeStreamingProvider(n_questions=3, delay=0.01)
+        coalescer = QuizCoalescer()
+
+        async def run():
+            start = _starter(provider)
+            first, second = [await coalescer.join("key", start) for _ in range(2)]
+            await first.__anext__()
+            await second.__anext__()
+
+            await first.aclose()
+            await asyncio.sleep(0.02)
+            closed_after_first_left = provider.closed
+
+            await second.aclose()
+            # Give the cancelled upstream task a moment to unwind.
+            await asyncio.sleep(0.01)
+            return closed_after_first_left, provider.closed
+
+        closed_after_first_left, closed_after_all_left = asyncio.run(run())
+
+        assert closed_after_first_left == 0
+        assert closed_after_all_left == 1
+        assert len(coalescer) == 0
+
+    def test_start_errors_reach_every_subscriber(self):
+        """Test that a failure starting the upstream stream is raised to every request."""
+        coalescer = QuizCoalescer()
+
+        async def failing_start():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("provider down")
+
+        async def run():
+            return await asyncio.gather(
+                *[coalescer.join("key", failing_start) for _ in range(3)], return_exceptions=True
+            )
+
+        results = asyncio.run(run())
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert len(coalescer) == 0
+
+    def test_mid_stream_errors_reach_every_subscriber(self):
+        """Test that an upstream failure after the first question ends every subscription with the error."""
+        coalescer = QuizCoalescer()
+        provider = FakeStreamingProvider(n_questions=1)
+
+        async def broken_stream(questions):
+            async for question in questions:
+                yield question
+            raise RuntimeError("connection reset")
+
+        async def start():
+            return broken_stream(await _starter(provider)())
+
+        async def run():
+            subscriptions = [await coalescer.join("key", start) for _ in range(2)]
+            return await asyncio.gather(*[_collect(questions) for questions in subscriptions], return_exceptions=True)
+
+        results = asyncio.run(run())
+
+        assert all(isinstance(result, RuntimeError) for result in results)
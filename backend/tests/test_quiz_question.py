@@ -0,0 +1,126 @@
+import json
+
+import pytest
+from fake_llm import make_question
+
+from backend.quiz_question import QuizQuestion, QuizQuestionValidator
+
+"""
+Test file for QuizQuestion and QuizQuestionValidator.
+
+Unit tests only: validation is pure Python and needs no API calls.
+"""
+
+
+class TestQuizQuestion:
+    """Unit tests for the QuizQuestion record."""
+
+    def test_from_dict_valid(self):
+        """Test that a well-formed question round-trips unchanged."""
+        data = make_question(1)
+        question = QuizQuestion.from_dict(data)
+
+        assert question is not None
+        assert question.to_dict() == data
+
+    @pytest.mark.parametrize(
+        "answer, expected",
+        [("B", "B"), ("b", "B"), (" (B) ", "B"), ("B)", "B"), ("b.", "B"), ("Option B", "B"), ("B: Option B1", "B")],
+    )
+    def test_answer_is_normalised(self, answer, expected):
+        """Test that letter-like answers are normalised to a single upper-case letter."""
+        data = make_question(1)
+        data["answer"] = answer
+        assert QuizQuestion.from_dict(data).answer == expected
+
+    def test_answer_matching_option_text(self):
+        """Test that an answer given as an option's text resolves to that option."""
+        data = make_question(1)
+        data["answer"] = "option c1"
+        assert QuizQuestion.from_dict(data).answer == "C"
+
+    @pytest.mark.parametrize("answer", [None, "", "D", "Augustus", 2])
+    def test_invalid_answer_is_rejected(self, answer):
+        """Test that answers outside A/B/C are rejected."""
+        data = make_question(1)
+        data["answer"] = answer
+        assert QuizQuestion.from_dict(data) is None
+
+    @pytest.mark.parametrize("missing", ["question", "A", "B", "C", "answer"])
+    def test_missing_required_field_is_rejected(self, missing):
+        """Test that questions missing a required field are rejected."""
+        data = make_question(1)
+        del data[missing]
+        assert QuizQuestion.from_dict(data) is None
+
+    def test_not_an_object_is_rejected(self):
+        """Test that non-object JSON values are rejected."""
+        assert QuizQuestion.from_dict([make_question(1)]) is None
+        assert QuizQuestion.from_dict("question") is None
+
+    def test_optional_fields_are_repaired(self):
+        """Test that whitespace is stripped, numbers stringified and bad optional fields cleared."""
+        data = make_question(1)
+        data.update({"question": "  Spaced?  ", "A": 1945, "wikipedia": "not a url", "question_id": "one"})
+        del data["explanation"]
+
+        question = QuizQuestion.from_dict(data)
+
+        assert question.question == "Spaced?"
+        assert question.A == "1945"
+        assert question.wikipedia == ""
+        assert question.explanation == ""
+        assert question.question_id == 0
+
+    def test_to_json_reuses_raw_text(self):
+        """Test that to_json returns the raw text when set and compact JSON otherwise."""
+        question = QuizQuestion.from_dict(make_question(1))
+        assert json.loads(question.to_json()) == make_question(1)
+
+        question.raw = '{"kept": true}'
+        assert question.to_json() == '{"kept": true}'
+
+
+class TestQuizQuestionValidator:
+    """Unit tests for the per-stream QuizQuestionValidator."""
+
+    def test_renumbers_sequentially(self):
+        """Test that accepted questions are renumbered from 1, whatever ids the model used."""
+        validator = QuizQuestionValidator()
+        ids = []
+        for model_id in (7, 7, 3):
+            data = make_question(model_id)
+            data["question"] = f"Question with model id {model_id} #{len(ids)}"
+            ids.append(validator.validate(data).question_id)
+
+        assert ids == [1, 2, 3]
+
+    def test_drops_duplicates_and_invalid_items(self):
+        """Test that repeats and unrepairable items are dropped and counted."""
+        validator = QuizQuestionValidator()
+        duplicate = make_question(2)
+        duplicate["question"] = duplicate["question"].upper()
+
+        results = [
+            validator.validate(make_question(1)),
+            validator.validate({"question": "No options"}),
+            validator.validate(make_question(2)),
+            validator.validate(duplicate),
+        ]
+
+        assert [q.question_id if q else None for q in results] == [1, None, 2, None]
+        assert validator.accepted == 2
+        assert validator.dropped == 2
+
+    def test_keeps_raw_only_when_unchanged(self):
+        """Test that the original text is kept only if validation did not change the question."""
+        validator = QuizQuestionValidator()
+        unchanged = make_question(1)
+        renumbered = make_question(5)
+
+        first = validator.validate(unchanged, raw=json.dumps(unchanged))
+        second = validator.validate(renumbered, raw=json.dumps(renumbered))
+
+        assert first.raw == json.dumps(unchanged)
+        assert second.raw is None
+        assert json.loads(second.to_json())["question_id"] == 2
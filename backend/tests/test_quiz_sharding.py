@@ -0,0 +1,133 @@
+import asyncio
+import dataclasses
+
+import pytest
+from fake_llm import make_question
+
+from backend.quiz_question import QuizQuestion
+from backend.quiz_sharding import NearDuplicateFilter, amerge_questions, split_questions
+
+"""
+Test file for sharded quiz generation helpers.
+
+Unit tests only: shard streams are plain async generators with scripted delays.
+"""
+
+
+def _question(i: int, text: str = None) -> QuizQuestion:
+    question = QuizQuestion.from_dict(make_question(i))
+    if text is not None:
+        question.question = text
+    return question
+
+
+class FakeShard:
+    """An async question stream yielding `questions` after `delay` seconds each, optionally failing at the end."""
+
+    def __init__(self, questions: list[QuizQuestion], delay: float = 0.0, error: Exception = None):
+        self.questions = questions
+        self.delay = delay
+        self.error = error
+        self.closed = False
+
+    async def stream(self):
+        try:
+            for question in self.questions:
+                await asyncio.sleep(self.delay)
+                yield question
+            if self.error is not None:
+                raise self.error
+        finally:
+            self.closed = True
+
+
+async def _collect(shards: list[FakeShard]) -> list[QuizQuestion]:
+    return [question async for question in amerge_questions([shard.stream() for shard in shards])]
+
+
+class TestSplitQuestions:
+    """Unit tests for split_questions."""
+
+    @pytest.mark.parametrize(
+        "n_questions, shards, min_questions, expected",
+        [
+            (10, 1, 1, [10]),
+            (10, 3, 1, [4, 3, 3]),
+            (30, 3, 5, [10, 10, 10]),
+            (12, 4, 5, [6, 6]),
+            (4, 4, 5, [4]),
+            (2, 8, 1, [1, 1]),
+        ],
+    )
+    def test_split(self, n_questions, shards, min_questions, expected):
+        """Test that quizzes split into near-equal shards no smaller than the minimum."""
+        assert split_questions(n_questions, shards, min_questions) == expected
+
+
+class TestNearDuplicateFilter:
+    """Unit tests for the NearDuplicateFilter class."""
+
+    def test_drops_rewordings_but_keeps_distinct_questions(self):
+        """Test that case, punctuation and small wording changes count as duplicates."""
+        duplicates = NearDuplicateFilter()
+
+        assert duplicates.accept(_question(1, "Which planet is known as the Red Planet?"))
+        assert not duplicates.accept(_question(2, "which planet is known as the red planet"))
+        assert not duplicates.accept(_question(3, "Which planet is commonly known as the Red Planet?"))
+        assert duplicates.accept(_question(4, "Which planet has the most moons?"))
+        assert duplicates.dropped == 2
+
+
+class TestAmergeQuestions:
+    """Unit tests for amerge_questions."""
+
+    def test_merges_in_arrival_order_and_renumbers(self):
+        """Test that questions are yielded as they arrive from any shard and numbered globally."""
+        slow = FakeShard([_question(1), _question(2)], delay=0.03)
+        fast = FakeShard([_question(3), _question(4)], delay=0.01)
+
+        merged = asyncio.run(_collect([slow, fast]))
+
+        assert [question.question for question in merged] == [_question(i).question for i in (3, 4, 1, 2)]
+        assert [question.question_id for question in merged] == [1, 2, 3, 4]
+        assert all(question.raw is None for question in merged)
+        assert slow.closed and fast.closed
+
+    def test_drops_near_duplicates_across_shards(self):
+        """Test that a question asked by two shards is only yielded once."""
+        first = FakeShard([_question(1), _question(2)])
+        second = FakeShard([dataclasses.replace(_question(1), question_id=7), _question(3)], delay=0.01)
+
+        merged = asyncio.run(_collect([first, second]))
+
+        assert [question.question for question in merged] == [_question(i).question for i in (1, 2, 3)]
+        assert [question.question_id for question in merged] == [1, 2, 3]
+
+    def test_shard_error_is_raised_and_closes_other_shards(self):
+        """Test that a failing shard fails the merged stream and stops the other shards."""
+        failing = FakeShard([_question(1)], error=RuntimeError("shard failed"))
+        slow = FakeShard([_question(i) for i in range(2, 10)], delay=0.05)
+        received = []
+
+        async def run():
+            async for question in amerge_questions([failing.stream(), slow.stream()]):
+                received.append(question)
+
+        with pytest.raises(RuntimeError, match="shard failed"):
+            asyncio.run(run())
+
+        assert [question.question for question in received] == [_question(1).question]
+        assert failing.closed and slow.closed
+
+    def test_closing_merged_stream_closes_shards(self):
+        """Test that a consumer stopping early closes every shard's stream."""
+        shards = [FakeShard([_question(i), _question(i + 10)], delay=0.01) for i in range(3)]
+
+        async def run():
+            merged = amerge_questions([shard.stream() for shard in shards])
+            first = await merged.__anext__()
+            await merged.aclose()
+            return first
+
+        assert asyncio.run(run()).question_id == 1
+        assert all(shard.closed for shard in shards)
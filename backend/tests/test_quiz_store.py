@@ -0,0 +1,78 @@
+import os
+import zlib
+
+from fake_llm import make_question
+
+from backend.quiz_cache import QuizCache
+from backend.quiz_question import QuizQuestion
+from backend.quiz_store import QuizStore
+
+"""
+Test file for QuizStore, the offline store of generated quizzes.
+
+Unit tests only: stores are temporary SQLite files.
+"""
+
+
+def _questions(n: int, topic: str = "Testing") -> list[QuizQuestion]:
+    return [QuizQuestion.from_dict(make_question(i, topic)) for i in range(1, n + 1)]
+
+
+class TestQuizStore:
+    """Unit tests for QuizStore."""
+
+    def test_put_get_and_survive_restart(self, tmp_path):
+        """Test that a stored quiz is found by its cache key, also after reopening the file."""
+        path = str(tmp_path / "store.sqlite3")
+        store = QuizStore(path)
+        assert store.put("gpt-3.5-turbo", "UK History", "Easy", 2, _questions(2))
+        store.close()
+
+        store = QuizStore(path)
+        try:
+            key = QuizCache.make_key("gpt-3.5-turbo", "uk  history", "easy", 2)
+            assert key in store
+            assert [question.to_dict() for question in store.get(key)] == [q.to_dict() for q in _questions(2)]
+            assert store.get(QuizCache.make_key("gpt-4-turbo", "UK History", "easy", 2)) is None
+        finally:
+            store.close()
+
+    def test_store_is_append_only(self, tmp_path):
+        """Test that a second quiz for the same request, or an empty one, is not stored."""
+        store = QuizStore(str(tmp_path / "store.sqlite3"))
+        try:
+            assert not store.put("gpt-3.5-turbo", "Rome", "easy", 2, [])
+            assert store.put("gpt-3.5-turbo", "Rome", "easy", 2, _questions(2, "Rome"))
+            assert not store.put("gpt-3.5-turbo", "Rome", "easy", 2, _questions(2, "Carthage"))
+            assert len(store) == 1
+            key = QuizCache.make_key("gpt-3.5-turbo", "Rome", "easy", 2)
+            assert store.get(key)[0].question == "Question 1 about Rome?"
+        finally:
+            store.close()
+
+    def test_find_and_compression(self, tmp_path):
+        """Test that quizzes are listed by topic, difficulty and model, and their questions are compressed."""
+        store = QuizStore(str(tmp_path / "store.sqlite3"))
+        try:
+            for difficulty in ("easy", "hard"):
+                for model in ("gpt-3.5-turbo", "gpt-4-turbo"):
+                    store.put(model, "Rome", difficulty, 10, _questions(10, "Rome"))
+
+            assert len(store.find("ROME")) == 4
+            assert [(q["difficulty"], q["model"]) for q in store.find("Rome", "hard", "gpt-4-turbo")] == [
+                ("hard", "gpt-4-turbo")
+            ]
+            blob = store._connection.execute("SELECT questions FROM quizzes LIMIT 1").fetchone()[0]
+            assert len(blob) < len(zlib.decompress(blob)) / 2
+        finally:
+            store.close()
+
+    def test_from_env(self, monkeypatch, tmp_path):
+        """Test that the store is opened from QUIZ_STORE_PATH, and is off when it is not set."""
+        monkeypatch.delenv("QUIZ_STORE_PATH", raising=False)
+        assert QuizStore.from_env() is None
+
+        monkeypatch.setenv("QUIZ_STORE_PATH", str(tmp_path / "store.sqlite3"))
+        store = QuizStore.from_env()
+        store.close()
+        assert os.path.exists(tmp_path / "store.sqlite3")
@@ -0,0 +1,49 @@
+from backend.rate_limit import TokenBucket
+
+"""
+Test file for TokenBucket.
+
+Unit tests only: time is driven by a fake clock.
+"""
+
+
+class FakeClock:
+    """A controllable time source."""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestTokenBucket:
+    """Unit tests for the TokenBucket class."""
+
+    def test_allows_bursts_up_to_capacity(self):
+        """Test that a full bucket allows `capacity` acquisitions at once, then refuses."""
+        bucket = TokenBucket(rate=1.0, capacity=3, clock=FakeClock())
+
+        assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+    def test_refills_at_rate(self):
+        """Test that tokens come back at `rate` per second, never beyond capacity."""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2.0, capacity=2, clock=clock)
+        bucket.try_acquire(2)
+
+        assert bucket.time_until_available() == 0.5
+        clock.now += 0.5
+        assert bucket.try_acquire()
+        assert not bucket.try_acquire()
+
+        clock.now += 100
+        assert bucket.try_acquire(2)
+        assert not bucket.try_acquire()
+
+    def test_zero_rate_never_refills(self):
+        """Test that a bucket with no refill rate reports it will never have tokens again."""
+        bucket = TokenBucket(rate=0.0, capacity=1, clock=FakeClock())
+        bucket.try_acquire()
+
+        assert bucket.time_until_available() == float("inf")
@@ -0,0 +1,225 @@
+import asyncio
+
+import pytest
+from fake_llm import FakeProviderError, FakeStreamingProvider
+
+from backend.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    ProviderTimeoutError,
+    Resilience,
+    RetryPolicy,
+    Timeouts,
+    is_retryable,
+)
+
+"""
+Test file for the provider resilience helpers: retries, timeouts and circuit breakers.
+
+Unit tests only: provider calls are scripted coroutines and fake streams, and time is a fake clock.
+"""
+
+
+class FakeClock:
+    """A settable monotonic clock."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _resilience(max_attempts: int = 3, **breaker_options) -> Resilience:
+    """A Resilience that retries without sleeping and uses small breakers."""
+    options = {"min_calls": 2, "window": 4, "cooldown": 10.0}
+    options.update(breaker_options)
+    return Resilience(
+        timeouts=Timeouts(connect=0.05, first_token=0.05, idle=0.05),
+        retry_policy=RetryPolicy(max_attempts=max_attempts, random=lambda: 0.0),
+        breaker_factory=lambda: CircuitBreaker(**options),
+    )
+
+
+class ScriptedCall:
+    """An attempt that raises the scripted errors in turn, then returns "ok"."""
+
+    def __init__(self, *errors: Exception):
+        self.errors = list(errors)
+        self.attempts = 0
+
+    async def __call__(self):
+        self.attempts += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+class TestIsRetryable:
+    """Unit tests for is_retryable."""
+
+    @pytest.mark.parametrize(
+        "error, retryable",
+        [
+            (ProviderTimeoutError("late"), True),
+            (ConnectionResetError(), True),
+            (FakeProviderError(429), True),
+            (FakeProviderError(503), True),
+            (FakeProviderError(400), False),
+            (FakeProviderError(401), False),
+            (ValueError("bad"), False),
+        ],
+    )
+    def test_classification(self, error, retryable):
+        """Test that timeouts, connection errors, rate limits and server errors are retried, client errors not."""
+        assert is_retryable(error) is retryable
+
+
+class TestRetryPolicy:
+    """Unit tests for the RetryPolicy class."""
+
+    def test_full_jitter_backoff_is_capped(self):
+        """Test that delays are drawn below an exponentially growing, capped ceiling."""
+        policy = RetryPolicy(base_delay=0.25, max_delay=1.0, random=lambda: 1.0)
+
+        assert [policy.delay(retry) for retry in range(4)] == [0.25, 0.5, 1.0, 1.0]
+        assert RetryPolicy(random=lambda: 0.0).delay(3) == 0.0
+
+
+class TestCircuitBreaker:
+    """Unit tests for the CircuitBreaker class."""
+
+    def test_opens_on_failure_rate_and_recovers_after_trial(self):
+        """Test closed -> open -> half-open -> closed, with a single trial call while half-open."""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_rate=0.5, window=4, min_calls=4, cooldown=10.0, clock=clock)
+        for outcome in (True, False, True):
+            breaker.record_success() if outcome else breaker.record_failure()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow()
+        assert breaker.retry_after() == 10.0
+
+        clock.now = 10.0
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.to_dict()["failure_rate"] == 0.0
+
+    def test_failed_trial_reopens(self):
+        """Test that a failed half-open trial opens the breaker for another cooldown."""
+        clock = FakeClock()
+        breaker = CircuitBreaker(min_calls=1, cooldown=10.0, clock=clock)
+        breaker.record_failure()
+        clock.now = 10.0
+        assert breaker.allow()
+
+        breaker.record_failure()
+
+        assert breaker.state == CircuitBreaker.OPEN
+        assert breaker.opened == 2
+
+    def test_abandoned_trial_is_released(self):
+        """Test that a trial call cancelled without an outcome lets the next call through."""
+        clock = FakeClock()
+        breaker = CircuitBreaker(min_calls=1, cooldown=10.0, clock=clock)
+        breaker.record_failure()
+        clock.now = 10.0
+        assert breaker.allow()
+
+        breaker.release()
+
+        assert breaker.allow()
+
+
+class TestResilience:
+    """Unit tests for the Resilience class."""
+
+    def test_from_env(self, monkeypatch):
+        """Test that timeouts, per-provider overrides, retries and breakers are read from the environment."""
+        monkeypatch.setenv("PROVIDER_FIRST_TOKEN_TIMEOUT_SECONDS", "12")
+        monkeypatch.setenv("PROVIDER_IDLE_TIMEOUT_SECONDS_GEMINI", "3")
+        monkeypatch.setenv("PROVIDER_MAX_ATTEMPTS", "5")
+        monkeypatch.setenv("CIRCUIT_BREAKER_COOLDOWN_SECONDS", "7")
+
+        resilience = Resilience.from_env()
+
+        assert resilience.timeouts_for("openai") == Timeouts(first_token=12.0)
+        assert resilience.timeouts_for("gemini") == Timeouts(first_token=12.0, idle=3.0)
+        assert resilience.retry_policy.max_attempts == 5
+        assert resilience.breaker("openai").cooldown == 7.0
+
+    def test_retries_retryable_errors(self):
+        """Test that rate limits and timeouts are retried until an attempt succeeds."""
+        resilience = _resilience(min_calls=10)
+        call = ScriptedCall(FakeProviderError(429), ProviderTimeoutError("late"))
+
+        assert asyncio.run(resilience.acall("openai", call)) == "ok"
+        assert call.attempts == 3
+        assert resilience.retries == 2
+
+    def test_gives_up_after_max_attempts(self):
+        """Test that the last error is raised once the attempts are used up."""
+        resilience = _resilience(max_attempts=2, min_calls=10)
+        call = ScriptedCall(FakeProviderError(500), FakeProviderError(502))
+
+        with pytest.raises(FakeProviderError, match="502"):
+            asyncio.run(resilience.acall("openai", call))
+        assert call.attempts == 2
+
+    def test_does_not_retry_client_errors(self):
+        """Test that a client error is raised at once and does not count against the provider."""
+        resilience = _resilience()
+        call = ScriptedCall(FakeProviderError(400))
+
+        with pytest.raises(FakeProviderError):
+            asyncio.run(resilience.acall("openai", call))
+        assert call.attempts == 1
+        assert resilience.breaker("openai").state == CircuitBreaker.CLOSED
+
+    def test_open_breaker_fails_fast(self):
+        """Test that once the breaker opens, calls fail with CircuitOpenError without reaching the provider."""
+        resilience = _resilience()
+        failing = ScriptedCall(*[FakeProviderError(503)] * 3)
+
+        with pytest.raises(CircuitOpenError) as raised:
+            asyncio.run(resilience.acall("gemini", failing))
+        assert failing.attempts == 2
+        assert raised.value.provider == "gemini"
+        assert raised.value.retry_after > 0
+
+        healthy = ScriptedCall()
+        with pytest.raises(CircuitOpenError):
+            asyncio.run(resilience.acall("gemini", healthy))
+        assert healthy.attempts == 0
+        assert resilience.is_available("openai")
+        assert resilience.stats()["breakers"]["gemini"]["state"] == CircuitBreaker.OPEN
+
+    def test_connect_timeout(self):
+        """Test that a request that does not complete in time raises ProviderTimeoutError."""
+
+        async def run():
+            await _resilience().aconnect("openai", asyncio.sleep(1))
+
+        with pytest.raises(ProviderTimeoutError, match="did not respond"):
+            asyncio.run(run())
+
+    @pytest.mark.parametrize("stall_after, message", [(0, "no first token"), (2, "no chunk")])
+    def test_stalled_stream_times_out_and_closes_upstream(self, stall_after, message):
+        """Test that a stream stalling before or after its first token times out and is closed."""
+        provider = FakeStreamingProvider(chunk_size=4, faults=[stall_after])
+        received = []
+
+        async def run():
+            stream = _resilience().astream("openai", await provider.acompletion(model="fake", stream=True))
+            async for chunk in stream:
+                received.append(chunk)
+
+        with pytest.raises(ProviderTimeoutError, match=message):
+            asyncio.run(run())
+        assert len(received) == stall_after
+        assert provider.closed == 1
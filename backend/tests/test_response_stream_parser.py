@@ -1,8 +1,11 @@
+import asyncio
+import json
 from types import SimpleNamespace
 
 import pytest
 
-from backend.response_stream_parser import ResponseStreamParser
+from backend import response_stream_parser
+from backend.response_stream_parser import JsonObjectScanner, NewlineScanner, ResponseStreamParser
 
 """
 Test file for ResponseStreamParser class.
@@ -42,11 +45,11 @@ class TestResponseStreamParser:
         content = response_parser._extract_chunk_content(chunk)
         assert content is None
 
-    def test_split_buffer(self, response_parser):
+    def test_scanner_splits_lines(self):
         """
-        Test splitting the buffer into complete lines and a remainder.
+        Test splitting streamed text into complete lines and a remainder.
         """
-        response_parser.buffer = '{"question": "Who was ..."}\n{"question": "What is ..."}\nincomplete'
+        scanner = NewlineScanner()
 
         expected_complete_lines = [
             '{"question": "Who was ..."}',
@@ -54,10 +57,8 @@ class TestResponseStreamParser:
         ]
         expected_remainder = "incomplete"
 
-        complete_lines, remainder = response_parser._split_buffer()
-
-        print("Complete Lines:", complete_lines)
-        print("Remainder:", remainder)
+        complete_lines = scanner.feed('{"question": "Who was ..."}\n{"question": "What is ..."}\nincomplete')
+        remainder = scanner.flush()
 
         assert complete_lines == expected_complete_lines, (
             f"Expected complete lines '{expected_complete_lines}', but got {complete_lines}"
@@ -65,6 +66,129 @@ class TestResponseStreamParser:
 
         assert remainder == expected_remainder, f"Expected remainder '{expected_remainder}', but got {remainder}"
 
+    def test_scanner_joins_fragments_across_deltas(self):
+        """
+        Test that a line split over many single-character deltas is reassembled once it completes.
+        """
+        scanner = NewlineScanner()
+        text = '{"question": "First"}\n\n{"question": "Second"}\n'
+
+        lines = []
+        for char in text:
+            lines.extend(scanner.feed(char))
+
+        assert lines == ['{"question": "First"}', "", '{"question": "Second"}']
+        assert scanner.flush() == ""
+
+    def test_scanner_matches_split_for_any_chunking(self):
+        """
+        Test that the scanner output is independent of how the text is chunked.
+        """
+        text = "a\nbb\n\nccc\ndddd"
+        expected = text.split("\n")
+
+        for size in range(1, len(text) + 1):
+            scanner = NewlineScanner()
+            lines = []
+            for start in range(0, len(text), size):
+                lines.extend(scanner.feed(text[start : start + size]))
+            lines.append(scanner.flush())
+            assert lines == expected, f"Mismatch for chunk size {size}"
+
+    def test_object_scanner_emits_each_object_on_close(self):
+        """
+        Test that objects are framed by brace depth, whatever surrounds them.
+        """
+        scanner = JsonObjectScanner()
+        text = 'Sure! ```json\n[{"a": 1}, {"b": {"c": 2}}\n,\n{\n  "d": 3\n}]\n```'
+
+        objects = scanner.feed(text)
+
+        assert objects == ['{"a": 1}', '{"b": {"c": 2}}', '{\n  "d": 3\n}']
+        assert scanner.flush() == ""
+
+    def test_object_scanner_ignores_braces_in_strings(self):
+        """
+        Test that braces and escaped quotes inside string values do not affect framing.
+        """
+        scanner = JsonObjectScanner()
+        text = '{"q": "What does } or { mean?", "e": "A \\"quoted\\" } brace \\\\"}{"n": 2}'
+
+        objects = scanner.feed(text)
+
+        assert objects == ['{"q": "What does } or { mean?", "e": "A \\"quoted\\" } brace \\\\"}', '{"n": 2}']
+        assert [json.loads(obj) for obj in objects][1] == {"n": 2}
+
+    def test_object_scanner_matches_for_any_chunking(self):
+        """
+        Test that object framing is independent of how the text is chunked, including escapes split across deltas.
+        """
+        text = '[{"a": "x\\"}y"}, {"b": [1, {"c": "}"}]}] trailing {"d": "\\\\"}'
+        expected = JsonObjectScanner().feed(text)
+        assert len(expected) == 3
+
+        for size in range(1, len(text) + 1):
+            scanner = JsonObjectScanner()
+            objects = []
+            for start in range(0, len(text), size):
+                objects.extend(scanner.feed(text[start : start + size]))
+            assert objects == expected, f"Mismatch for chunk size {size}"
+            assert scanner.flush() == ""
+
+    def test_object_scanner_flushes_unclosed_object(self):
+        """
+        Test that an unclosed object is returned by flush.
+        """
+        scanner = JsonObjectScanner()
+        assert scanner.feed('{"a": 1} {"b": ') == ['{"a": 1}']
+        assert scanner.flush() == '{"b": '
+
+    def test_parse_stream_emits_before_newline(self, response_parser):
+        """
+        Test that a question is yielded as soon as its object closes, before any newline arrives.
+        """
+        chunks = iter(
+            [
+                SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content='[{"question": "First"},'))]),
+                SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content='{"question": "Second"}]'))]),
+            ]
+        )
+        results = response_parser.parse_stream(chunks)
+
+        # The first object is available after consuming only the first chunk.
+        assert next(results) == 'data: {"question": "First"}\n\n'
+        assert list(results) == ['data: {"question": "Second"}\n\n']
+
+    def test_parse_stream_pretty_printed(self, response_parser):
+        """
+        Test that pretty-printed objects spanning several lines are not dropped.
+        """
+        text = '{\n  "question": "First"\n}\n{\n  "question": "Second"\n}\n'
+        chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=char))]) for char in text]
+
+        assert list(response_parser.parse_stream(chunks)) == [
+            'data: {"question": "First"}\n\n',
+            'data: {"question": "Second"}\n\n',
+        ]
+
+    def test_newline_framing_is_selectable(self):
+        """
+        Test that the newline framing mode keeps its line-based behaviour.
+        """
+        parser = ResponseStreamParser(framing=ResponseStreamParser.FRAMING_NEWLINE)
+        text = '{"question": "First"} {"question": "Same line"}\n{"question": "Second"}\n'
+        chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])]
+
+        # Two objects on one line are not valid JSON as a line, so only the second line is emitted.
+        assert list(parser.parse_stream(chunks)) == ['data: {"question": "Second"}\n\n']
+
+    def test_unsupported_framing(self):
+        """
+        Test that an unknown framing mode is rejected.
+        """
+        with pytest.raises(ValueError, match="Unsupported framing"):
+            ResponseStreamParser(framing="xml")
+
     def test_process_line_valid_json(self, response_parser):
         """
         Test processing a valid JSON line.
@@ -96,3 +220,138 @@ class TestResponseStreamParser:
             'data: {"question": "First"}\n\n',
             'data: {"question": "Second"}\n\n',
         ]
+
+    def test_aparse_stream(self, response_parser):
+        """
+        Test that the async parser yields the same SSE strings as parse_stream for an async stream.
+        """
+
+        async def fake_stream():
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content='{"question": "Fir'))])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None))])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content='st"}\n{"question": '))])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content='"Second"}'))])
+
+        async def collect():
+            return [line async for line in response_parser.aparse_stream(fake_stream())]
+
+        results = asyncio.run(collect())
+        assert results == [
+            'data: {"question": "First"}\n\n',
+            'data: {"question": "Second"}\n\n',
+        ]
+
+
+class TestResponseStreamParserBytes:
+    """
+    Unit tests for the pre-encoded bytes emission mode.
+    """
+
+    @pytest.fixture
+    def bytes_parser(self):
+        return ResponseStreamParser(emit_bytes=True)
+
+    def test_encode_line_keeps_original_text(self, bytes_parser):
+        """
+        Test that a valid line is framed as bytes without being re-serialised.
+        """
+        line = '{"question":"Qui était le premier empereur ?","answer":"B"}'
+        assert bytes_parser._encode_line(line) == b"data: " + line.encode() + b"\n\n"
+
+    def test_encode_line_invalid_json(self, bytes_parser):
+        """
+        Test that an invalid line is dropped.
+        """
+        assert bytes_parser._encode_line('{"question": "Who was the first emperor of Rome?"') is None
+        assert bytes_parser._encode_line("   ") is None
+
+    def test_encode_line_flattens_pretty_printed_json(self, bytes_parser):
+        """
+        Test that line breaks in a pretty-printed object become spaces so the frame stays on one data line.
+        """
+        frame = bytes_parser._encode_line('{\r\n  "question": "First",\n  "answer": "A"\n}')
+
+        assert frame.count(b"\n") == 2 and frame.endswith(b"\n\n")
+        payload = frame[len(b"data: ") : -2]
+        assert json.loads(payload) == {"question": "First", "answer": "A"}
+
+    def test_encode_line_without_fast_backend(self, monkeypatch, bytes_parser):
+        """
+        Test that the stdlib json module is used when orjson is not available.
+        """
+        monkeypatch.setattr(response_stream_parser, "json_loads", json.loads)
+
+        assert bytes_parser._encode_line('{"a": 1}') == b'data: {"a": 1}\n\n'
+        assert bytes_parser._encode_line('{"a": ') is None
+
+    def test_parse_stream_yields_bytes(self, bytes_parser):
+        """
+        Test that parse_stream yields bytes frames in bytes mode.
+        """
+        fake_stream = iter(
+            [
+                SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content='{"question": "First"}\n'))]),
+                SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content='{"question": "Second"}'))]),
+            ]
+        )
+        assert list(bytes_parser.parse_stream(fake_stream)) == [
+            b'data: {"question": "First"}\n\n',
+            b'data: {"question": "Second"}\n\n',
+        ]
+
+
+class TestResponseStreamParserValidation:
+    """Unit tests for ResponseStreamParser with validate_questions=True."""
+
+    @staticmethod
+    def _stream(*objects):
+        text = "".join(json.dumps(obj) if isinstance(obj, dict) else obj for obj in objects)
+        return iter([SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])])
+
+    @staticmethod
+    def _question(question_id, question, answer="A"):
+        return {
+            "question_id": question_id,
+            "question": question,
+            "A": "a",
+            "B": "b",
+            "C": "c",
+            "answer": answer,
+            "explanation": "",
+            "wikipedia": "",
+        }
+
+    @pytest.mark.parametrize("emit_bytes", [False, True])
+    def test_invalid_items_are_dropped_and_stream_continues(self, emit_bytes):
+        """
+        Test that unrepairable items are skipped and later questions still arrive.
+        """
+        parser = ResponseStreamParser(emit_bytes=emit_bytes, validate_questions=True)
+        stream = self._stream(
+            self._question(1, "First"),
+            {"question": "Missing options", "answer": "A"},
+            self._question(2, "Second", answer="D"),
+            self._question(3, "Third", answer="option b"),
+        )
+
+        frames = list(parser.parse_stream(stream))
+        payloads = [json.loads(frame[len("data: ") : -2]) for frame in frames]
+
+        assert [(p["question_id"], p["question"], p["answer"]) for p in payloads] == [
+            (1, "First", "A"),
+            (2, "Third", "B"),
+        ]
+
+    def test_duplicates_are_dropped_and_ids_renumbered(self):
+        """
+        Test that repeated questions are dropped and ids are made sequential.
+        """
+        parser = ResponseStreamParser(emit_bytes=True, validate_questions=True)
+        stream = self._stream(self._question(1, "First"), self._question(1, "Second"), self._question(5, "first "))
+
+        frames = list(parser.parse_stream(stream))
+
+        # The first question is unchanged, so its original text is forwarded as-is; the second is re-serialised.
+        assert frames[0] == b"data: " + json.dumps(self._question(1, "First")).encode() + b"\n\n"
+        assert json.loads(frames[1][len(b"data: ") : -2]) == self._question(2, "Second")
+        assert len(frames) == 2
@@ -0,0 +1,92 @@
+import asyncio
+
+from backend.sse_events import HEARTBEAT, aheartbeat, aquiz_with_image, encode_event, name_frame
+
+"""
+Test file for the named SSE events multiplexing a quiz and its image, and SSE heartbeats.
+
+The question streams are small async generators of pre-encoded frames, and the images are plain tasks.
+"""
+
+
+async def _questions(n: int, delay: float = 0.0, fail: bool = False):
+    for i in range(1, n + 1):
+        await asyncio.sleep(delay)
+        yield f'data: {{"question_id":{i}}}\n\n'.encode()
+    if fail:
+        raise RuntimeError("provider went away")
+
+
+class TestQuizWithImage:
+    """Unit tests for aquiz_with_image."""
+
+    def test_quiz_failure_is_an_error_event_and_the_image_is_still_sent(self):
+        """A quiz stream failing part-way is reported as an error event, followed by the image and done."""
+
+        async def image():
+            await asyncio.sleep(0.02)
+            return "https://example.com/1.png"
+
+        async def run():
+            return [frame async for frame in aquiz_with_image(_questions(2, fail=True), asyncio.create_task(image()))]
+
+        frames = asyncio.run(run())
+
+        assert frames == [
+            name_frame("question", b'data: {"question_id":1}\n\n'),
+            name_frame("question", b'data: {"question_id":2}\n\n'),
+            encode_event("error", {"source": "quiz", "error": "Error - Quiz generation failed."}),
+            encode_event("image", {"image_url": "https://example.com/1.png"}),
+            encode_event("done", {"questions": 2, "image": True}),
+        ]
+
+    def test_closing_the_stream_cancels_the_image(self):
+        """A client leaving after the first question cancels the pending image and closes the question stream."""
+
+        async def run():
+            image = asyncio.create_task(asyncio.sleep(10, result="https://example.com/never.png"))
+            questions = _questions(5, delay=0.01)
+            stream = aquiz_with_image(questions, image)
+            first = await anext(stream)
+            await stream.aclose()
+            return first, image, questions
+
+        first, image, questions = asyncio.run(run())
+
+        assert first.startswith(b"event: question\n")
+        assert image.cancelled()
+        assert questions.ag_frame is None
+
+
+class TestHeartbeat:
+    """Unit tests for aheartbeat."""
+
+    def test_heartbeats_fill_the_gaps_between_events(self):
+        """A stream silent for longer than the interval gets heartbeats, and its events are passed through."""
+
+        async def run():
+            return [frame async for frame in aheartbeat(_questions(2, delay=0.05), 0.02)]
+
+        frames = asyncio.run(run())
+
+        assert [frame for frame in frames if frame != HEARTBEAT] == [
+            b'data: {"question_id":1}\n\n',
+            b'data: {"question_id":2}\n\n',
+        ]
+        assert frames[0] == HEARTBEAT
+        assert frames.count(HEARTBEAT) >= 2
+
+    def test_closing_the_stream_closes_the_events(self):
+        """Closing the heartbeat stream while it waits for an event closes the events it wraps."""
+
+        async def run():
+            questions = _questions(5, delay=0.05)
+            stream = aheartbeat(questions, 0.01)
+            first = await anext(stream)
+            await stream.aclose()
+            return first, questions
+
+        first, questions = asyncio.run(run())
+
+        assert first == HEARTBEAT
+        assert questions.ag_frame is None
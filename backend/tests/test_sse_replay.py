@@ -0,0 +1,174 @@
+import asyncio
+import json
+
+import pytest
+
+from backend.sse_replay import ReplayBuffer, aresumable_quiz
+
+"""
+Test file for resumable quiz streams: event ids, the replay buffer and Last-Event-ID resume.
+
+Question streams are small async generators of pre-encoded frames numbered from 1, like
+`QuizGenerator.agenerate_quiz`, so no provider is called.
+"""
+
+
+class FakeClock:
+    """A controllable time source."""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _starter(delay: float = 0.0, fail_after: int = None):
+    """Returns an `astart_questions` generating `count` frames numbered from 1, and the counts it was asked for."""
+    calls = []
+
+    async def astart_questions(count: int):
+        calls.append(count)
+
+        async def questions():
+            for i in range(1, count + 1):
+                if fail_after is not None and i > fail_after:
+                    raise RuntimeError("provider went away")
+                await asyncio.sleep(delay)
+                yield f'data: {{"question_id":{i},"question":"Q{i}?"}}\n\n'.encode()
+
+        return questions()
+
+    return astart_questions, calls
+
+
+def _events(frames: list[bytes]) -> list[tuple[str, str, dict]]:
+    """Splits frames into (event name, id, data) triples."""
+    events = []
+    for frame in frames:
+        fields = dict(line.split(": ", 1) for line in frame.decode().strip().splitlines())
+        events.append((fields.get("event", "message"), fields.get("id"), json.loads(fields["data"])))
+    return events
+
+
+async def _collect(frames) -> list[bytes]:
+    return [frame async for frame in frames]
+
+
+class TestReplayBuffer:
+    """Unit tests for ReplayBuffer."""
+
+    @pytest.mark.parametrize(
+        "event_id, expected",
+        [("abc_-9.4", ("abc_-9", 4)), (" abc.12 ", ("abc", 12)), ("abc", None), ("a/b.1", None), (None, None)],
+    )
+    def test_parse_event_id(self, event_id, expected):
+        """Test that only ids of the form '<stream id>.<question number>' are accepted."""
+        assert ReplayBuffer.parse_event_id(event_id) == expected
+
+    def test_streams_expire_and_are_bounded(self):
+        """Test that streams are dropped ttl seconds after their last write, and past max_streams."""
+        clock = FakeClock()
+        buffer = ReplayBuffer(ttl=60.0, max_streams=2, clock=clock)
+        first, _ = buffer.open(3)
+        buffer.open(3)
+        buffer.open(3)
+        assert len(buffer) == 2
+        assert buffer.open(3, f"{first.stream_id}.1")[0] is not first
+
+        clock.now += 61
+        buffer.open(3)
+        assert len(buffer) == 1
+
+
+class TestResumableQuiz:
+    """Unit tests for aresumable_quiz."""
+
+    def test_new_stream_has_event_ids_and_a_done_event(self):
+        """Test that each question gets '<stream id>.<n>' as its id, and the stream ends with done."""
+        buffer = ReplayBuffer()
+        stream, received = buffer.open(3)
+        astart_questions, calls = _starter()
+
+        events = _events(asyncio.run(_collect(aresumable_quiz(buffer, stream, received, astart_questions))))
+
+        assert [event_id for _, event_id, _ in events[:3]] == [f"{stream.stream_id}.{n}" for n in (1, 2, 3)]
+        assert events[-1][0] == "done" and events[-1][2]["questions"] == 3 and events[-1][2]["resumed"] is False
+        assert calls == [3]
+
+    def test_reconnect_replays_missed_questions_without_generating(self):
+        """Test that a reconnect after question 1 of a finished stream replays questions 2 and 3 only."""
+        buffer = ReplayBuffer()
+        stream, _ = buffer.open(3)
+        astart_questions, calls = _starter()
+        asyncio.run(_collect(aresumable_quiz(buffer, stream, 0, astart_questions)))
+
+        resumed, received = buffer.open(3, f"{stream.stream_id}.1")
+        events = _events(asyncio.run(_collect(aresumable_quiz(buffer, resumed, received, astart_questions))))
+
+        assert resumed is stream
+        assert [data["question_id"] for name, _, data in events if name == "message"] == [2, 3]
+        assert events[-1][2]["resumed"] is True
+        assert calls == [3]
+
+    def test_dropped_stream_generates_only_the_missing_questions(self):
+        """Test that a stream closed after 2 questions resumes by generating 3 more, numbered from 3."""
+        buffer = ReplayBuffer()
+        stream, _ = buffer.open(5)
+        astart_questions, calls = _starter()
+
+        async def interrupted():
+            frames = aresumable_quiz(buffer, stream, 0, astart_questions)
+            received = [await anext(frames), await anext(frames)]
+            await frames.aclose()
+            return received
+
+        asyncio.run(interrupted())
+        resumed, received = buffer.open(5, f"{stream.stream_id}.2")
+        events = _events(asyncio.run(_collect(aresumable_quiz(buffer, resumed, received, astart_questions))))
+
+        questions = [(event_id, data["question_id"]) for name, event_id, data in events if name == "message"]
+        assert questions == [(f"{stream.stream_id}.{n}", n) for n in (3, 4, 5)]
+        assert calls == [5, 3]
+
+    def test_stream_no_longer_buffered_is_resumed_under_its_id(self):
+        """Test that a reconnect for an expired stream generates the missing questions, not a new quiz."""
+        buffer = ReplayBuffer(max_streams=0)
+        stream, received = buffer.open(4, "lost.3")
+        astart_questions, calls = _starter()
+
+        events = _events(asyncio.run(_collect(aresumable_quiz(buffer, stream, received, astart_questions))))
+
+        assert [(event_id, data["question_id"]) for name, event_id, data in events if name == "message"] == [
+            ("lost.4", 4)
+        ]
+        assert calls == [1]
+
+    def test_reconnect_follows_a_stream_still_being_generated(self):
+        """Test that a second connection to a stream in progress follows it instead of generating again."""
+        buffer = ReplayBuffer()
+        stream, _ = buffer.open(3)
+        astart_questions, calls = _starter(delay=0.02)
+
+        async def run():
+            original = asyncio.create_task(_collect(aresumable_quiz(buffer, stream, 0, astart_questions)))
+            await asyncio.sleep(0.03)
+            resumed, received = buffer.open(3, f"{stream.stream_id}.1")
+            return await _collect(aresumable_quiz(buffer, resumed, received, astart_questions)), await original
+
+        followed, original = asyncio.run(run())
+
+        assert [data["question_id"] for name, _, data in _events(followed) if name == "message"] == [2, 3]
+        assert len(original) == 4
+        assert calls == [3]
+
+    def test_failure_is_an_error_event_before_done(self):
+        """Test that a generation failing part-way is reported as an error event, then done."""
+        buffer = ReplayBuffer()
+        stream, received = buffer.open(3)
+        astart_questions, _ = _starter(fail_after=1)
+
+        events = _events(asyncio.run(_collect(aresumable_quiz(buffer, stream, received, astart_questions))))
+
+        assert [name for name, _, _ in events] == ["message", "error", "done"]
+        assert events[-1][2]["questions"] == 1
@@ -0,0 +1,119 @@
+import asyncio
+import zlib
+
+import pytest
+
+from backend import stream_output
+from backend.stream_output import StreamCompressor, acoalesce, negotiate_encoding
+
+"""
+Test file for the output stage of streamed responses: frame coalescing and per-write compression.
+
+Streams are small async generators of frames with a delay before each, so no endpoint is involved.
+"""
+
+
+async def _frames(delays: list[float]):
+    for i, delay in enumerate(delays, start=1):
+        await asyncio.sleep(delay)
+        yield f'data: {{"question_id":{i}}}\n\n'.encode()
+
+
+async def _collect(chunks) -> list[bytes]:
+    return [chunk async for chunk in chunks]
+
+
+class TestNegotiateEncoding:
+    """Unit tests for negotiate_encoding."""
+
+    @pytest.mark.parametrize(
+        "accept_encoding, expected",
+        [
+            ("gzip, deflate", "gzip"),
+            ("GZIP;q=0.5", "gzip"),
+            ("gzip;q=0", None),
+            ("deflate", None),
+            ("identity", None),
+            ("", None),
+            (None, None),
+        ],
+    )
+    def test_gzip_is_used_when_accepted(self, monkeypatch, accept_encoding, expected):
+        """Test that gzip is picked only when the client accepts it with a non-zero quality."""
+        monkeypatch.setattr(stream_output, "brotli", None)
+        assert negotiate_encoding(accept_encoding) == expected
+
+    def test_brotli_is_preferred_when_installed(self, monkeypatch):
+        """Test that brotli wins over gzip when it is installed and accepted, and is skipped when it is not."""
+        monkeypatch.setattr(stream_output, "brotli", object())
+        assert negotiate_encoding("gzip, br") == "br"
+        assert negotiate_encoding("gzip, br;q=0") == "gzip"
+        monkeypatch.setattr(stream_output, "brotli", None)
+        assert negotiate_encoding("gzip, br") == "gzip"
+
+
+class TestStreamCompressor:
+    """Unit tests for StreamCompressor."""
+
+    def test_every_gzip_write_decodes_on_arrival(self):
+        """Test that each compressed write decodes to its frame before the next one is written."""
+        compressor = StreamCompressor("gzip")
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        frames = [f'data: {{"question_id":{i},"question":"Which year?"}}\n\n'.encode() for i in range(1, 6)]
+
+        for frame in frames:
+            assert decoder.decompress(compressor.compress(frame)) == frame
+        assert decoder.decompress(compressor.finish()) == b""
+        assert decoder.eof
+
+    def test_brotli_round_trip(self):
+        """Test that a brotli stream decodes to the frames written, each on arrival."""
+        brotli = pytest.importorskip("brotli")
+        compressor = StreamCompressor("br")
+        decoder = brotli.Decompressor()
+        frames = [f'data: {{"question_id":{i}}}\n\n'.encode() for i in range(1, 4)]
+
+        for frame in frames:
+            assert decoder.process(compressor.compress(frame)) == frame
+        decoder.process(compressor.finish())
+        assert decoder.is_finished()
+
+    def test_unsupported_encoding_is_rejected(self):
+        """Test that an encoding the compressor cannot produce raises ValueError."""
+        with pytest.raises(ValueError):
+            StreamCompressor("deflate")
+
+
+class TestCoalesce:
+    """Unit tests for acoalesce."""
+
+    def test_frames_arriving_together_share_a_write(self):
+        """Test that frames within the window are joined, and frames further apart are sent on their own."""
+        frames = asyncio.run(_collect(_frames([0, 0, 0])))
+
+        chunks = asyncio.run(_collect(acoalesce(_frames([0, 0, 0, 0.05, 0]), 0.02)))
+
+        assert chunks[0] == b"".join(frames)
+        assert len(chunks) == 2
+        assert chunks[1].count(b"data: ") == 2
+
+    def test_no_window_passes_frames_through(self):
+        """Test that a window of 0 sends every frame as its own write."""
+        chunks = asyncio.run(_collect(acoalesce(_frames([0, 0, 0]), 0)))
+
+        assert len(chunks) == 3
+
+    def test_closing_the_stream_closes_the_frames(self):
+        """Test that closing the coalesced stream while it waits for a frame closes the frames it wraps."""
+
+        async def run():
+            frames = _frames([0, 0.05, 0.05])
+            chunks = acoalesce(frames, 0.01)
+            first = await anext(chunks)
+            await chunks.aclose()
+            return first, frames
+
+        first, frames = asyncio.run(run())
+
+        assert first.count(b"data: ") == 1
+        assert frames.ag_frame is None
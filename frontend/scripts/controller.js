@@ -3,6 +3,9 @@
 // import EventSource from 'eventsource';
 
 class Controller {
+  // Reconnects attempted in a row after a quiz stream drops, before giving up.
+  static MAX_RECONNECTS = 3;
+
   /**
    * Creates an instance of Controller.
    *
@@ -26,6 +29,23 @@ class Controller {
     this.baseURLModels = `${this.baseURL}/SupportedModels`;
     this.quiz = quiz; // may be set later by App
     this.numQuestions = defaultNumQuestions;
+    // Lets the backend avoid repeating questions to this browser tab.
+    this.sessionId = Controller.#getSessionId();
+  }
+
+  /**
+   * Returns this tab's session id, creating and storing one on first use.
+   *
+   * @private
+   * @returns {string} The session id.
+   */
+  static #getSessionId() {
+    let sessionId = sessionStorage.getItem("gpteasersSessionId");
+    if (!sessionId) {
+      sessionId = crypto.randomUUID();
+      sessionStorage.setItem("gpteasersSessionId", sessionId);
+    }
+    return sessionId;
   }
 
   /**
@@ -48,7 +68,8 @@ class Controller {
     const encodedDifficulty = encodeURIComponent(difficulty);
     const encodedModel = encodeURIComponent(model);
     const numQuestions = encodeURIComponent(this.numQuestions);
-    const url = `${this.baseURLQuiz}?topic=${encodedTopic}&difficulty=${encodedDifficulty}&n_questions=${numQuestions}&model=${encodedModel}`;
+    const encodedSessionId = encodeURIComponent(this.sessionId);
+    const url = `${this.baseURLQuiz}?topic=${encodedTopic}&difficulty=${encodedDifficulty}&n_questions=${numQuestions}&model=${encodedModel}&session_id=${encodedSessionId}`;
     console.log(`Connecting to SSE endpoint: ${url}`);
 
     // Promises are used to handle asynchronous operations. They represent a value that may be available now, 
@@ -57,15 +78,17 @@ class Controller {
     // - fulfilled: meaning that the operation completed successfully.
     // - rejected: meaning that the operation failed.
 
-    // Here, we return a new promise that will resolve with the quizData once we have received 10 messages from the server.
+    // Here, we return a new promise that will resolve with the quizData once the server sends its "done" event.
     return new Promise((resolve, reject) => {
       try {
         // Initialize the EventSource to establish a connection to the server
         this.eventSource = new EventSource(url);
         this.messageCount = 0;
+        let consecutiveErrors = 0;
 
         // Event listener for messages received from the server
         this.eventSource.onmessage = (event) => {
+          consecutiveErrors = 0;
           this.messageCount++;
           const data = JSON.parse(event.data);
           console.log(`Received message ${this.messageCount}:`, data);
@@ -75,15 +98,38 @@ class Controller {
 
           // Notify the App class about the new question
           onQuestionReceived();
+        };
+
+        // The server ends every quiz with a "done" event. Close the connection then, or the EventSource
+        // would reconnect and ask for the quiz again.
+        this.eventSource.addEventListener("done", (event) => {
+          console.log("Quiz complete:", JSON.parse(event.data));
+          this.#stopEventSource();
+          resolve(); // Resolve the promise
+        });
 
-          // Close the EventSource connection after receiving the specified number of messages
-          if (this.messageCount >= this.numQuestions) {
-            this.#stopEventSource();
-            resolve(); // Resolve the promise
+        // A failed quiz is reported as an "error" event with data, before "done".
+        this.eventSource.addEventListener("error", (event) => {
+          if (!event.data) {
+            return; // A connection error, handled by onerror below.
           }
-        };
+          const data = JSON.parse(event.data);
+          console.error("Quiz generation failed:", data.error);
+          this.#stopEventSource();
+          reject(new Error(data.error));
+        });
 
+        // A dropped connection is reopened by the EventSource itself, with a Last-Event-ID header so the
+        // server carries on from the last question received. Give up after a few failed attempts in a row.
         this.eventSource.onerror = (error) => {
+          if (error.data) {
+            return; // A quiz error event, handled above.
+          }
+          consecutiveErrors++;
+          if (this.eventSource.readyState === EventSource.CONNECTING && consecutiveErrors <= Controller.MAX_RECONNECTS) {
+            console.warn(`EventSource connection lost; reconnecting (attempt ${consecutiveErrors}).`);
+            return;
+          }
           console.error('EventSource encountered an error:', error);
           this.#stopEventSource();
           reject(error); // Reject the promise if there's an error
@@ -97,7 +143,7 @@ class Controller {
 
   /**
    * Stops the EventSource and cleans up.
-   * This is called after receiving the specified number of messages or when an error occurs.
+   * This is called after the quiz is complete or when an error occurs.
    *
    * @private
    */
@@ -105,7 +151,7 @@ class Controller {
     if (this.eventSource) {
       this.eventSource.close();
       this.eventSource = null;
-      console.log(`EventSource connection closed after receiving ${this.numQuestions} messages.`);
+      console.log(`EventSource connection closed after receiving ${this.messageCount} messages.`);
     }
   }
 